@@ -26,6 +26,12 @@ pool.on('connect', (client) => {
   client.query('SET pg_trgm.word_similarity_threshold = 0.6');
 });
 
+// 閒置連線被伺服器中斷時 (例如 scripts/dataset_manager.py 切換資料集) 只記錄，
+// 連線池會移除該連線，下一次查詢時重新連線；沒有這個 handler 會讓整個程序結束
+pool.on('error', (error) => {
+  console.error('Idle client error:', error.message);
+});
+
 // Middleware
 app.use(cors());
 app.use(express.json());
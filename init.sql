@@ -1,6 +1,13 @@
 -- Enable pg_trgm extension for trigram-based fuzzy search
 CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
+-- 查詢統計 (需要 shared_preload_libraries=pg_stat_statements,見 docker-compose.yml)
+CREATE EXTENSION IF NOT EXISTS pg_stat_statements;
+
+-- 快取檢查與預熱 (scripts/cache_warmup_bench.py)
+CREATE EXTENSION IF NOT EXISTS pg_buffercache;
+CREATE EXTENSION IF NOT EXISTS pg_prewarm;
+
 -- 設定 pg_trgm 相似度閾值
 -- similarity_threshold: 用於 % 操作符，預設 0.3（範圍 0-1，越小越寬鬆）
 -- word_similarity_threshold: 用於 <<% 操作符，預設 0.6
@@ -19,6 +26,81 @@ CREATE TABLE IF NOT EXISTS worlds (
 CREATE INDEX IF NOT EXISTS idx_title_trgm ON worlds USING gin (title gin_trgm_ops);
 CREATE INDEX IF NOT EXISTS idx_desc_trgm ON worlds USING gin (description gin_trgm_ops);
 
+-- ============================================================================
+-- CJK 二字詞 (bigram) 斷詞
+-- ============================================================================
+
+-- pg_trgm 以空白切出的「詞」取 trigram,中文標題沒有空白 (C locale 下中文字甚至不算字母,完全不產生 trigram),
+-- 短的中文查詢只能落到 ILIKE '%...%' 分支做循序掃描。
+-- cjk_bigrams() 把文字正規化 (NFKC + 小寫,全形英數轉半形) 後,對每段連續的中日韓字元取相鄰二字詞與單字;
+-- seed.py --cjk-bigrams 以它產生 title_cjk_bigrams 欄位並建立 GIN 索引 (見 scripts/search_sql.py)。
+-- query = true 時為查詢端斷詞: 有二字詞就只取二字詞 (鑑別度較高),只有單字時才用單字。
+-- 字元範圍: 平假名/片假名、CJK 擴展 A、CJK 統一漢字、韓文音節 (相容漢字經 NFKC 後會落在統一漢字)
+CREATE OR REPLACE FUNCTION cjk_bigrams(input TEXT, query BOOLEAN DEFAULT false)
+RETURNS TEXT[] AS $$
+    WITH runs AS (
+        SELECT m[1] AS run
+        FROM regexp_matches(lower(normalize(input, NFKC)),
+                            '([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+)', 'g') AS m
+    )
+    SELECT NULLIF(ARRAY(
+        SELECT DISTINCT token FROM (
+            SELECT substr(run, i, 2) AS token, true AS bigram
+            FROM runs, generate_series(1, length(run) - 1) AS i
+            UNION ALL
+            SELECT substr(run, i, 1), false
+            FROM runs, generate_series(1, length(run)) AS i
+        ) AS tokens
+        WHERE bigram OR NOT query OR NOT EXISTS (SELECT 1 FROM runs WHERE length(run) > 1)
+        ORDER BY token
+    ), '{}')
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+-- ============================================================================
+-- 熱門查詢結果快取 (scripts/hot_results.py)
+-- ============================================================================
+
+-- 資料世代: worlds 每個 INSERT / UPDATE / DELETE / TRUNCATE 敘述都會遞增
+-- 用 sequence 而不是單列計數表,seed.py 多條連線平行插入時不會互相等待同一列的列鎖;
+-- 重新執行 init.sql 也會遞增一次,讓既有的快取失效
+CREATE SEQUENCE IF NOT EXISTS dataset_generation_seq;
+SELECT nextval('dataset_generation_seq');
+
+CREATE OR REPLACE FUNCTION bump_dataset_generation()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM nextval('dataset_generation_seq');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS worlds_dataset_generation ON worlds;
+CREATE TRIGGER worlds_dataset_generation
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON worlds
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_dataset_generation();
+
+-- 熱門查詢的排序後結果 (與 /search 回應的 results 相同格式),以 lower(查詢) + 資料世代為鍵
+-- 只有 generation 等於目前資料世代的列才算命中: 資料異動 commit 的同時舊結果就全部失效
+CREATE TABLE IF NOT EXISTS search_hot_results (
+    query_key TEXT NOT NULL,
+    generation BIGINT NOT NULL,
+    results JSONB NOT NULL,
+    result_count INTEGER NOT NULL,
+    search_ms NUMERIC,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (query_key, generation)
+);
+
+-- 函數: 查詢快取,未命中 (不是熱門查詢或資料已異動) 時回傳 NULL
+-- 只做大小寫正規化: ILIKE 與 pg_trgm 都不分大小寫,其他正規化 (trim、全形轉半形) 會改變四分支查詢的結果
+CREATE OR REPLACE FUNCTION search_hot_lookup(q TEXT)
+RETURNS JSONB AS $$
+    SELECT results
+    FROM search_hot_results
+    WHERE query_key = lower(q)
+      AND generation = (SELECT last_value FROM dataset_generation_seq);
+$$ LANGUAGE sql STABLE;
+
 -- ============================================================================
 -- 管理函數
 -- ============================================================================
@@ -1,10 +1,14 @@
 import http from 'k6/http';
 import { check, sleep } from 'k6';
 import { Rate, Trend } from 'k6/metrics';
+import { SharedArray } from 'k6/data';
 
 // 自訂指標
 const errorRate = new Rate('errors');
 const searchDuration = new Trend('search_duration');
+// 延遲拆解: 後端處理 (http_req_waiting - queryTimeMs) 與網路 / 連線時間,逐一請求在腳本內計算
+const backendOverhead = new Trend('backend_overhead');
+const networkTime = new Trend('network_time');
 
 // 測試配置
 export const options = {
@@ -75,14 +79,65 @@ const searchQueries = [
   'search',      // 功能詞
 ];
 
+// 工作負載檔案 (scripts/build_workload.py 產生的 JSONL,路徑相對於本腳本)
+// 設定 WORKLOAD 時依 weight (Zipf 熱門程度) 抽樣,取代上面的固定查詢
+const workload = new SharedArray('workload', function () {
+  if (!__ENV.WORKLOAD) {
+    return [];
+  }
+  return open(__ENV.WORKLOAD)
+    .split('\n')
+    .filter((line) => line.trim() !== '')
+    .map((line) => JSON.parse(line));
+});
+
+// 累積權重 (二分搜尋抽樣用)
+const cumulativeWeights = [];
+for (let i = 0; i < workload.length; i++) {
+  cumulativeWeights.push((i > 0 ? cumulativeWeights[i - 1] : 0) + (workload[i].weight || 1));
+}
+
+function pickQuery() {
+  if (workload.length === 0) {
+    return { query: searchQueries[Math.floor(Math.random() * searchQueries.length)] };
+  }
+  const target = Math.random() * cumulativeWeights[cumulativeWeights.length - 1];
+  let low = 0;
+  let high = cumulativeWeights.length - 1;
+  while (low < high) {
+    const mid = (low + high) >> 1;
+    if (cumulativeWeights[mid] < target) {
+      low = mid + 1;
+    } else {
+      high = mid;
+    }
+  }
+  return workload[low];
+}
+
+// 查詢分類 (用於 k6 tag,讓分析工具可以依類別拆解延遲)
+// - 測試資料的 title 是 md5 十六進位字串,只含 [0-9a-f] 的查詢會大量命中 (match-heavy)
+// - 長度 <= 3 的查詢可用的 trigram 很少,容易落到 ILIKE '%...%' 分支
+function classifyQuery(query) {
+  const length = query.length <= 3 ? 'short' : 'long';
+  const kind = /^[0-9a-f]+$/i.test(query) ? 'hex' : 'word';
+  return `${length}_${kind}`;
+}
+
 // 基礎 URL (可透過環境變數設定)
 // 使用 [::1] 強制 IPv6,避免 IPv4 連到錯誤的服務
 const BASE_URL = __ENV.BASE_URL || 'http://[::1]:3000';
 
+// 後端名稱 (node: port 3000, go: port 3001),寫入 tag 讓分析工具區分後端
+const BACKEND = __ENV.BACKEND || (BASE_URL.includes(':3001') ? 'go' : 'node');
+
 export function setup() {
   console.log(`🚀 Starting k6 performance test`);
-  console.log(`📍 Target: ${BASE_URL}`);
+  console.log(`📍 Target: ${BASE_URL} (${BACKEND})`);
   console.log(`📊 Scenario: ${__ENV.SCENARIO || 'load'}`);
+  if (workload.length > 0) {
+    console.log(`📄 Workload: ${__ENV.WORKLOAD} (${workload.length} queries)`);
+  }
   
   // 檢查服務是否可用 (帶重試機制)
   let healthCheck;
@@ -123,12 +178,23 @@ export function setup() {
 }
 
 export default function(data) {
-  // 隨機選擇一個搜尋關鍵字
-  const query = searchQueries[Math.floor(Math.random() * searchQueries.length)];
+  // 隨機選擇一個搜尋關鍵字 (有工作負載時依 weight 抽樣)
+  const item = pickQuery();
+  const query = item.query;
+  
+  const tags = {
+    name: 'search',
+    query: query,
+    query_class: classifyQuery(query),
+    backend: BACKEND,
+  };
+  if (item.kind) {
+    tags.query_kind = item.kind;
+  }
   
   // 執行搜尋請求
-  const response = http.get(`${data.baseUrl}/search?q=${query}`, {
-    tags: { name: 'search' },
+  const response = http.get(`${data.baseUrl}/search?q=${encodeURIComponent(query)}`, {
+    tags: tags,
   });
   
   // 檢查回應
@@ -147,14 +213,19 @@ export default function(data) {
   });
   
   // 記錄錯誤率
-  errorRate.add(!success);
+  errorRate.add(!success, tags);
   
   // 記錄搜尋時間
   if (response.status === 200) {
     try {
       const body = JSON.parse(response.body);
-      if (body.meta && body.meta.queryTimeMs) {
-        searchDuration.add(body.meta.queryTimeMs);
+      // queryTimeMs 可能為 0 (整數毫秒),不能用 truthy 判斷
+      if (body.meta && typeof body.meta.queryTimeMs === 'number') {
+        const timings = response.timings;
+        searchDuration.add(body.meta.queryTimeMs, tags);
+        backendOverhead.add(Math.max(timings.waiting - body.meta.queryTimeMs, 0), tags);
+        networkTime.add(timings.blocked + timings.connecting + timings.tls_handshaking +
+          timings.sending + timings.receiving, tags);
       }
     } catch (e) {
       // Ignore parse errors
@@ -185,6 +256,10 @@ export function teardown(data) {
 // 
 // 指定目標 URL:
 // k6 run -e BASE_URL=http://localhost:3000 k6-tests/search-performance.js
+// k6 run -e BASE_URL=http://localhost:3001 -e BACKEND=go k6-tests/search-performance.js
+// 
+// 使用語料衍生的工作負載 (python3 scripts/build_workload.py 產生,建議用絕對路徑):
+// k6 run -e WORKLOAD=$(pwd)/test-results/workload_10000_xxx.jsonl k6-tests/search-performance.js
 // 
 // 輸出結果到檔案:
 // k6 run k6-tests/search-performance.js --out json=results.json
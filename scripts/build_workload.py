@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+從 worlds 語料產生實際的查詢工作負載
+
+k6 腳本只搜尋十個寫死的字串,大多在真實資料中完全不會命中。本工具從 worlds 抽樣 title,產生:
+- prefix:   title 開頭 3~12 個字元 (使用者邊打字邊搜尋)
+- fragment: title 中的一個單字 (md5 這類沒有空白的 title 則取 4~8 字元的片段)
+- typo:     對 prefix / fragment 加入一個錯字: 插入、刪除、相鄰交換、鍵盤相鄰鍵替換
+- exact:    完整 title
+
+每個查詢依 Zipf 分佈 (weight ∝ 1 / rank^s) 指定熱門程度,寫成可重播的 JSONL:
+  {"query": "harri", "kind": "typo", "typo": "delete", "query_class": "long_word",
+   "source_id": 42, "expected_ids": [42], "weight": 0.0123}
+
+expected_ids 是產生該查詢的原始 title;使用方式:
+- k6:  k6 run -e WORKLOAD=../test-results/workload_xxx.jsonl k6-tests/search-performance.js
+- Python 工具: --queries-file / --workload (threshold_sweep.py 會用 expected_ids 計算 recall)
+
+用法:
+  # 抽樣 500 個 title,產生預設比例的查詢
+  python3 scripts/build_workload.py
+
+  # 自訂比例與 Zipf 指數
+  python3 scripts/build_workload.py --titles 2000 --mix prefix=0.3,fragment=0.2,typo=0.4,exact=0.1 --zipf 1.2
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import time
+
+from db import connect
+from search_sql import classify_query
+
+DEFAULT_MIX = {'prefix': 0.35, 'fragment': 0.25, 'typo': 0.3, 'exact': 0.1}
+
+# QWERTY 鍵盤相鄰鍵 (含數字列)
+KEYBOARD_ROWS = ('1234567890', 'qwertyuiop', 'asdfghjkl', 'zxcvbnm')
+
+def _keyboard_neighbors():
+    positions = {key: (row, col) for row, keys in enumerate(KEYBOARD_ROWS) for col, key in enumerate(keys)}
+    neighbors = {}
+    for key, (row, col) in positions.items():
+        neighbors[key] = ''.join(
+            other for other, (other_row, other_col) in positions.items()
+            if other != key and abs(other_row - row) <= 1 and abs(other_col - col) <= 1
+        )
+    return neighbors
+
+KEYBOARD_NEIGHBORS = _keyboard_neighbors()
+TYPO_KINDS = ('insert', 'delete', 'transpose', 'substitute')
+
+# ============================================================================
+# 錯字產生 (typo 矩陣基準測試也會使用)
+# ============================================================================
+
+def typo_insert(text, pos, rng):
+    """在 pos 插入一個鄰近鍵 (重複按到旁邊的鍵)"""
+    anchor = text[pos].lower() if pos < len(text) else text[-1].lower()
+    choices = KEYBOARD_NEIGHBORS.get(anchor) or 'abcdefghijklmnopqrstuvwxyz'
+    return text[:pos] + rng.choice(choices) + text[pos:]
+
+def typo_delete(text, pos, rng):
+    """刪除 pos 的字元"""
+    return text[:pos] + text[pos + 1:]
+
+def typo_transpose(text, pos, rng):
+    """交換 pos 與 pos + 1 的字元"""
+    if pos + 1 >= len(text):
+        pos = len(text) - 2
+    return text[:pos] + text[pos + 1] + text[pos] + text[pos + 2:]
+
+def typo_substitute(text, pos, rng):
+    """把 pos 的字元換成鍵盤相鄰鍵 (沒有相鄰鍵的字元則換成任意字母)"""
+    choices = KEYBOARD_NEIGHBORS.get(text[pos].lower()) or 'abcdefghijklmnopqrstuvwxyz'
+    replacement = rng.choice(choices)
+    if text[pos].isupper():
+        replacement = replacement.upper()
+    return text[:pos] + replacement + text[pos + 1:]
+
+TYPO_FUNCTIONS = {
+    'insert': typo_insert,
+    'delete': typo_delete,
+    'transpose': typo_transpose,
+    'substitute': typo_substitute,
+}
+
+def make_typo(text, rng, kind=None, pos=None):
+    """
+    對 text 加入一個錯字,回傳 (新字串, 錯字類型)
+
+    kind / pos 未指定時隨機選擇;長度不足 2 的字串原樣回傳 (類型為 None)。
+    """
+    if len(text) < 2:
+        return text, None
+    kind = kind or rng.choice(TYPO_KINDS)
+    if pos is None:
+        pos = rng.randrange(len(text) - 1 if kind == 'transpose' else len(text))
+    result = TYPO_FUNCTIONS[kind](text, pos, rng)
+    # 交換相同字元或替換後不變時改用刪除,確保查詢與原字串不同
+    if result == text:
+        return typo_delete(text, pos, rng), 'delete'
+    return result, kind
+
+# ============================================================================
+# 查詢衍生
+# ============================================================================
+
+def sample_titles(conn, count, seed=42):
+    """以隨機 id 抽樣 title (避免 ORDER BY random() 掃描整張表),回傳 [(id, title)]"""
+    rng = random.Random(seed)
+    cur = conn.cursor()
+    cur.execute('SELECT MIN(id), MAX(id) FROM worlds')
+    low, high = cur.fetchone()
+    if low is None:
+        cur.close()
+        return []
+    candidate_ids = list({rng.randint(low, high) for _ in range(count * 3)})
+    cur.execute('SELECT id, title FROM worlds WHERE id = ANY(%s) ORDER BY id', (candidate_ids,))
+    rows = cur.fetchall()
+    cur.close()
+    conn.rollback()
+    rng.shuffle(rows)
+    return rows[:count]
+
+def _words(title):
+    return [word for word in re.split(r'\W+', title) if len(word) >= 3]
+
+def derive_prefix(title, rng):
+    return title[:rng.randint(3, max(min(len(title), 12), 3))]
+
+def derive_fragment(title, rng):
+    """取一個單字;沒有空白分隔的長字串則取 4~8 字元的片段"""
+    words = _words(title)
+    if len(words) > 1:
+        return rng.choice(words)
+    length = min(len(title), rng.randint(4, 8))
+    start = rng.randrange(len(title) - length + 1)
+    return title[start:start + length]
+
+def derive_query(title, kind, rng):
+    """依類型產生查詢,回傳 (query, typo 類型)"""
+    if kind == 'prefix':
+        return derive_prefix(title, rng), None
+    if kind == 'fragment':
+        return derive_fragment(title, rng), None
+    if kind == 'exact':
+        return title, None
+    base = derive_prefix(title, rng) if rng.random() < 0.5 else derive_fragment(title, rng)
+    return make_typo(base, rng)
+
+def zipf_weights(n, exponent):
+    """rank 1..n 的 Zipf 權重 (總和為 1)"""
+    raw = [1 / (rank ** exponent) for rank in range(1, n + 1)]
+    total = sum(raw)
+    return [w / total for w in raw]
+
+def build_workload(titles, mix, zipf_exponent, seed=42):
+    """從 [(id, title)] 產生查詢,依 Zipf 指定權重;重複的查詢字串只保留一筆 (合併 expected_ids)"""
+    rng = random.Random(seed)
+    kinds = list(mix)
+    kind_weights = [mix[k] for k in kinds]
+    by_query = {}
+    for world_id, title in titles:
+        title = title.strip()
+        if len(title) < 3:
+            continue
+        kind = rng.choices(kinds, kind_weights)[0]
+        query, typo = derive_query(title, kind, rng)
+        query = query.strip()
+        if len(query) < 2:
+            continue
+        item = by_query.get(query)
+        if item:
+            item['expected_ids'].append(world_id)
+            continue
+        by_query[query] = {
+            'query': query,
+            'kind': kind,
+            'typo': typo,
+            'query_class': classify_query(query),
+            'source_id': world_id,
+            'expected_ids': [world_id],
+        }
+
+    items = list(by_query.values())
+    rng.shuffle(items)
+    for item, weight in zip(items, zipf_weights(len(items), zipf_exponent)):
+        item['weight'] = weight
+    return items
+
+def parse_mix(text):
+    """'prefix=0.4,typo=0.6' → {'prefix': 0.4, 'typo': 0.6}"""
+    mix = {}
+    for part in text.split(','):
+        name, value = part.split('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f'未知的查詢類型: {name} (可用: {", ".join(DEFAULT_MIX)})')
+        mix[name] = float(value)
+    return mix
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='從 worlds 語料產生帶標籤的查詢工作負載 (JSONL)')
+    parser.add_argument('--titles', type=int, default=500, help='抽樣的 title 數 (預設: 500)')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='查詢類型比例 (預設: prefix=0.35,fragment=0.25,typo=0.3,exact=0.1)')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf 指數 (預設: 1.1,越大越集中)')
+    parser.add_argument('--seed', type=int, default=42, help='亂數種子')
+    parser.add_argument('--output', default=None,
+                        help='輸出 JSONL (預設: test-results/workload_<資料量>_<timestamp>.jsonl)')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT COUNT(*) FROM worlds')
+        records = cur.fetchone()[0]
+        cur.close()
+        titles = sample_titles(conn, args.titles, args.seed)
+    finally:
+        conn.close()
+    if not titles:
+        print("❌ worlds 是空的,請先產生資料")
+        return
+
+    items = build_workload(titles, args.mix, args.zipf, args.seed)
+    output_file = args.output or os.path.join(
+        'test-results', f"workload_{records}_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+    print(f"✅ 已產生 {len(items):,} 個查詢 (來自 {len(titles):,} 個 title, 資料量 {records:,} 筆)")
+    for kind in DEFAULT_MIX:
+        subset = [i for i in items if i['kind'] == kind]
+        if subset:
+            print(f"   {kind:<9} {len(subset):>6,} 個, 流量佔比 {sum(i['weight'] for i in subset):>6.1%}")
+    print(f"   前 10 名查詢佔 {sum(i['weight'] for i in items[:10]):.1%} 流量")
+    print(f"📄 {output_file}")
+
+if __name__ == '__main__':
+    main()
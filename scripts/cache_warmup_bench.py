@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+快取預熱與冷/熱延遲基準測試
+
+重新產生資料、rebuild_indexes() 或重啟容器之後,最初幾分鐘的搜尋都要從磁碟讀 idx_title_trgm,
+一般的 k6 測試會把這段冷啟動尾巴混進穩態數字。本工具把測試拆成明確的三個階段:
+
+1. cold:      清除快取後直接開始搜尋,量測延遲隨時間的變化與 time-to-warm
+2. prewarmed: 清除快取後先以 pg_prewarm 載入 worlds 與 trigram 索引,再開始搜尋
+3. warm:      不清除快取,作為穩態基準
+
+time-to-warm = 滾動中位數 (最近 --window 個查詢) 第一次降到 warm 中位數 x (1 + --tolerance) 以內
+所經過的秒數。每個階段開始與結束時以 pg_buffercache 記錄各 relation 在 shared buffers 中的比例。
+
+清除快取的方式 (--evict):
+- restart: 執行 --restart-cmd (預設 docker restart pg_trgm_demo) 後等待資料庫恢復,清空 shared buffers。
+           OS page cache 仍可能保留資料,若要完全冷啟動需另外 drop_caches。
+- discard: DISCARD ALL 並以 pg_buffercache_evict() (PostgreSQL 17+) 逐一逐出相關 relation 的 buffer;
+           舊版 (含 docker-compose 的 postgres:16) 沒有此函數,冷階段其實是熱的,因此直接結束。
+
+用法:
+  # 直接對資料庫執行 /search SQL (預設以 docker restart 清除快取)
+  python3 scripts/cache_warmup_bench.py
+
+  # 透過 backend HTTP API (包含應用層),PostgreSQL 17+ 可不重啟
+  python3 scripts/cache_warmup_bench.py --evict discard --base-url http://localhost:3000
+
+  # 每個階段 60 秒
+  python3 scripts/cache_warmup_bench.py --duration 60
+"""
+
+import argparse
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+from db import connect
+from search_sql import DEFAULT_QUERIES, apply_search_settings, build_search_sql, load_queries
+
+# 預熱與觀察的 relation
+RELATIONS = ('worlds', 'worlds_pkey', 'idx_title_trgm', 'idx_desc_trgm')
+
+PHASES = ('cold', 'prewarmed', 'warm')
+
+BUFFERCACHE_SQL = """
+    SELECT
+        c.relname,
+        COUNT(b.bufferid) AS cached_blocks,
+        pg_relation_size(c.oid) / current_setting('block_size')::int AS total_blocks
+    FROM pg_class c
+    LEFT JOIN pg_buffercache b
+        ON b.relfilenode = pg_relation_filenode(c.oid)
+        AND b.reldatabase = (SELECT oid FROM pg_database WHERE datname = current_database())
+    WHERE c.relname = ANY(%s)
+    GROUP BY c.relname, c.oid
+"""
+
+# pg_buffercache_evict() 在 17 回傳 boolean、18 回傳 record,這裡只計算嘗試逐出的 buffer 數
+EVICT_SQL = """
+    SELECT COUNT(*) FROM (
+        SELECT pg_buffercache_evict(b.bufferid)
+        FROM pg_buffercache b
+        JOIN pg_class c ON b.relfilenode = pg_relation_filenode(c.oid)
+        WHERE c.relname = ANY(%s)
+          AND b.reldatabase = (SELECT oid FROM pg_database WHERE datname = current_database())
+    ) evicted
+"""
+
+def ensure_extensions(conn):
+    cur = conn.cursor()
+    cur.execute('CREATE EXTENSION IF NOT EXISTS pg_buffercache')
+    cur.execute('CREATE EXTENSION IF NOT EXISTS pg_prewarm')
+    cur.close()
+
+def buffer_residency(conn):
+    """各 relation 在 shared buffers 中的區塊數與比例"""
+    cur = conn.cursor()
+    cur.execute(BUFFERCACHE_SQL, (list(RELATIONS),))
+    residency = {}
+    for relname, cached, total in cur.fetchall():
+        residency[relname] = {
+            'cached_blocks': cached,
+            'total_blocks': total,
+            'ratio': cached / total if total else None,
+        }
+    cur.close()
+    return residency
+
+def has_buffercache_evict(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM pg_proc WHERE proname = 'pg_buffercache_evict'")
+    found = cur.fetchone() is not None
+    cur.close()
+    return found
+
+def evict(conn, mode, restart_cmd):
+    """清除快取,回傳 (新的連線, 說明)"""
+    if mode == 'restart':
+        conn.close()
+        subprocess.run(shlex.split(restart_cmd), check=True, capture_output=True)
+        # 重啟後資料庫尚未就緒時持續重試
+        conn = connect(autocommit=True, retry_timeout=60)
+        return conn, f'已重啟 ({restart_cmd})'
+
+    cur = conn.cursor()
+    cur.execute('DISCARD ALL')
+    conn.forget_prepared()
+    cur.execute(EVICT_SQL, (list(RELATIONS),))
+    evicted = cur.fetchone()[0]
+    cur.close()
+    return conn, f'DISCARD ALL + pg_buffercache_evict ({evicted:,} 個 buffer)'
+
+def prewarm(conn):
+    """以 pg_prewarm 載入所有 relation,回傳 (總區塊數, 耗時 ms)"""
+    cur = conn.cursor()
+    start = time.perf_counter()
+    blocks = 0
+    for relation in RELATIONS:
+        cur.execute('SELECT pg_prewarm(%s)', (relation,))
+        blocks += cur.fetchone()[0]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    cur.close()
+    return blocks, elapsed_ms
+
+def run_phase(conn, queries, duration, base_url=None):
+    """
+    在 duration 秒內依序循環執行查詢,回傳 [(相對秒數, 延遲 ms)]
+
+    base_url 為空時直接對資料庫執行 /search SQL,否則呼叫 backend 的 /search API。
+    """
+    cur = None
+    if base_url is None:
+        cur = conn.cursor()
+        apply_search_settings(cur)
+        sql = build_search_sql()
+    samples = []
+    start = time.perf_counter()
+    i = 0
+    while time.perf_counter() - start < duration:
+        query = queries[i % len(queries)]
+        i += 1
+        t0 = time.perf_counter()
+        if cur is not None:
+            cur.execute(sql, {'q': query})
+            cur.fetchall()
+        else:
+            url = f"{base_url}/search?q={urllib.parse.quote(query)}"
+            with urllib.request.urlopen(url, timeout=30) as response:
+                response.read()
+        t1 = time.perf_counter()
+        samples.append((t0 - start, (t1 - t0) * 1000))
+    if cur is not None:
+        cur.close()
+    return samples
+
+def _percentile(sorted_values, pct):
+    return sorted_values[min(int(len(sorted_values) * pct), len(sorted_values) - 1)]
+
+def latency_stats(samples):
+    values = sorted(ms for _, ms in samples)
+    return {
+        'count': len(values),
+        'p50_ms': _percentile(values, 0.50),
+        'p95_ms': _percentile(values, 0.95),
+        'p99_ms': _percentile(values, 0.99),
+        'max_ms': values[-1],
+        'first_query_ms': samples[0][1],
+    }
+
+def time_to_warm(samples, warm_p50, window, tolerance):
+    """滾動中位數第一次降到 warm_p50 x (1 + tolerance) 以內的時間 (秒);沒有達到則回傳 None"""
+    threshold = warm_p50 * (1 + tolerance)
+    for end in range(window, len(samples) + 1):
+        if statistics.median(ms for _, ms in samples[end - window:end]) <= threshold:
+            return samples[end - 1][0]
+    return None
+
+def print_report(report):
+    """顯示各階段延遲與差距"""
+    warm = report['phases']['warm']['stats']
+    print("\n" + "=" * 100)
+    print("冷 / 熱延遲比較")
+    print("=" * 100)
+    print(f"{'階段':<10} {'查詢數':>8} {'首次(ms)':>10} {'p50':>10} {'p95':>10} {'p99':>10} "
+          f"{'p50 差距':>10} {'time-to-warm':>14}")
+    for phase in PHASES:
+        item = report['phases'][phase]
+        stats = item['stats']
+        ttw = item.get('time_to_warm_s')
+        ttw_text = '-' if phase == 'warm' else (f'{ttw:.1f}s' if ttw is not None else '未達到')
+        print(f"{phase:<10} {stats['count']:>8} {stats['first_query_ms']:>10.2f} {stats['p50_ms']:>8.2f}ms "
+              f"{stats['p95_ms']:>8.2f}ms {stats['p99_ms']:>8.2f}ms "
+              f"{stats['p50_ms'] / warm['p50_ms']:>9.2f}x {ttw_text:>14}")
+    prewarm_info = report['phases']['prewarmed'].get('prewarm')
+    if prewarm_info:
+        print(f"\npg_prewarm: {prewarm_info['blocks']:,} 個區塊, {prewarm_info['elapsed_ms']:.0f}ms")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='冷 / 預熱 / 熱三階段的搜尋延遲基準測試')
+    parser.add_argument('--evict', choices=('restart', 'discard'), default='restart',
+                        help='清除快取的方式 (預設: restart;discard 需要 PostgreSQL 17+)')
+    parser.add_argument('--restart-cmd', default='docker restart pg_trgm_demo',
+                        help='--evict restart 時執行的指令')
+    parser.add_argument('--duration', type=float, default=30, help='每個階段的秒數 (預設: 30)')
+    parser.add_argument('--base-url', default=None,
+                        help='改為呼叫 backend /search API (例如 http://localhost:3000)')
+    parser.add_argument('--queries', nargs='+', default=DEFAULT_QUERIES, help='查詢字串 (預設與 k6 腳本相同)')
+    parser.add_argument('--queries-file', '--workload', dest='queries_file',
+                        help='查詢集檔案 (build_workload.py 的 JSONL 或每行一個查詢)')
+    parser.add_argument('--window', type=int, default=20, help='time-to-warm 的滾動視窗查詢數 (預設: 20)')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='time-to-warm 容許比 warm 中位數高出的比例 (預設: 0.1)')
+    parser.add_argument('--output', default=None,
+                        help='輸出 JSON (預設: test-results/cache_warmup_<timestamp>.json)')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    queries = load_queries(args.queries_file) if args.queries_file else args.queries
+    target = args.base_url or 'PostgreSQL (直接執行 SQL)'
+
+    print("=" * 100)
+    print("快取預熱與冷/熱延遲基準測試")
+    print("=" * 100)
+    print(f"目標: {target}, 每階段 {args.duration:.0f}s, 清除方式: {args.evict}")
+
+    conn = connect(autocommit=True, retry_timeout=60)
+    ensure_extensions(conn)
+    if args.evict == 'discard' and not has_buffercache_evict(conn):
+        conn.close()
+        print("❌ 沒有 pg_buffercache_evict() (需要 PostgreSQL 17+),無法在不重啟的情況下清除 shared buffers;"
+              "請改用 --evict restart")
+        sys.exit(1)
+    report = {'evict': args.evict, 'target': target, 'duration_s': args.duration, 'phases': {}}
+    raw = {}
+    try:
+        for phase in PHASES:
+            item = {}
+            if phase in ('cold', 'prewarmed'):
+                conn, note = evict(conn, args.evict, args.restart_cmd)
+                print(f"\n🧊 {note}")
+            if phase == 'prewarmed':
+                blocks, elapsed_ms = prewarm(conn)
+                item['prewarm'] = {'blocks': blocks, 'elapsed_ms': elapsed_ms}
+                print(f"🔥 pg_prewarm: {blocks:,} 個區塊, {elapsed_ms:.0f}ms")
+            item['residency_before'] = buffer_residency(conn)
+            print(f"▶️  {phase} 階段 ({args.duration:.0f}s)...", end=' ', flush=True)
+            samples = run_phase(conn, queries, args.duration, args.base_url)
+            item['residency_after'] = buffer_residency(conn)
+            item['stats'] = latency_stats(samples)
+            print(f"✓ ({len(samples):,} 個查詢, p50={item['stats']['p50_ms']:.2f}ms)")
+            for relation, info in item['residency_before'].items():
+                after = item['residency_after'].get(relation, {}).get('ratio')
+                before = info['ratio']
+                print(f"   {relation:<16} shared buffers: "
+                      f"{'-' if before is None else f'{before:.0%}'} → {'-' if after is None else f'{after:.0%}'}")
+            report['phases'][phase] = item
+            raw[phase] = samples
+    finally:
+        conn.close()
+
+    warm_p50 = report['phases']['warm']['stats']['p50_ms']
+    for phase in ('cold', 'prewarmed'):
+        report['phases'][phase]['time_to_warm_s'] = time_to_warm(raw[phase], warm_p50, args.window, args.tolerance)
+    report['timeline'] = {phase: raw[phase] for phase in PHASES}
+
+    print_report(report)
+
+    output_file = args.output or os.path.join(
+        'test-results', f"cache_warmup_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果已儲存至: {output_file}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+中文查詢基準測試: 現有四分支 /search 查詢 vs CJK 二字詞 (bigram) 路徑
+
+pg_trgm 對中文幾乎取不到可用的 trigram (中文沒有空白分詞,C locale 下中文字甚至不算字母),
+短的中文查詢會落到 ILIKE '%...%' 分支,等於循序掃描整張表。
+seed.py --cjk-bigrams 另建 title_cjk_bigrams 欄位 (init.sql 的 cjk_bigrams()) 與 GIN 索引,
+中文查詢改以 title_cjk_bigrams @> cjk_bigrams(q, true) 找候選 (SQL 見 search_sql.py)。
+
+本工具在獨立的暫存表 (worlds_cjkbench) 上以固定亂數種子產生繁體中文書名
+(常用詞組合,詞頻近似 Zipf 分布,部分夾帶英文/數字與全形版次),資料量只增不減地依序成長到各個 --volumes,
+每個資料量重建兩種索引後,對同一組查詢比較兩條路徑:
+
+- 查詢類別: cjk_1 / cjk_2 / cjk_3 (1~3 個中文字)、cjk_4+ (4~6 個字,可跨詞)、mixed (英文+中文)
+  查詢從最小資料量的書名中抽取子字串,之後的資料量都包含這些書名
+- 延遲: EXPLAIN ANALYZE 的 Execution Time (中位數 / p95),是否出現 Seq Scan,
+  以及被 recheck / filter 丟掉的列數 (取不到 trigram 時 GIN 退化為整個索引掃描,計畫上看不出 Seq Scan)
+- recall@20: 正解為正規化 (NFKC + 小寫) 後包含查詢字串的書名,
+  recall = 回傳結果中的正解筆數 / min(20, 正解總數)
+- 索引建立時間與大小
+
+worlds 與原有索引不會被修改,需先套用 init.sql (cjk_bigrams() 函數)。
+
+用法:
+  # 預設 1 萬、10 萬筆,每類 10 個查詢
+  python3 scripts/cjk_bigram_bench.py
+
+  # 加到 100 萬筆,每個查詢重複 5 次
+  python3 scripts/cjk_bigram_bench.py --volumes 10000 100000 1000000 --repeat 5
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import re
+import statistics
+import time
+
+from db import connect
+from search_sql import (
+    add_cjk_bigram_column, apply_search_settings, build_search_sql,
+    cjk_bigram_sql, explain, summarize_plan,
+)
+
+SCRATCH_TABLE = 'worlds_cjkbench'
+TRGM_INDEX = 'idx_cjkbench_title_trgm'
+BIGRAM_COLUMN = 'title_cjk_bigrams'
+BIGRAM_INDEX = 'idx_cjkbench_title_bigrams'
+
+DEFAULT_VOLUMES = [10000, 100000]
+QUERY_CLASSES = ('cjk_1', 'cjk_2', 'cjk_3', 'cjk_4+', 'mixed')
+PATHS = {
+    'four_branch': build_search_sql(SCRATCH_TABLE),
+    'cjk_bigram': cjk_bigram_sql(SCRATCH_TABLE, BIGRAM_COLUMN),
+}
+
+# 書名用詞 (依常見程度排列,越前面的詞被選中的機率越高)
+VOCABULARY = (
+    '的', '與', '台灣', '世界', '歷史', '故事', '文學', '小說', '生活', '時間',
+    '科學', '設計', '程式', '資料', '城市', '旅行', '心理', '教育', '社會', '經濟',
+    '哲學', '藝術', '音樂', '電影', '料理', '健康', '管理', '投資', '理財', '創業',
+    '入門', '指南', '實戰', '導論', '概論', '原理', '研究', '分析', '應用', '方法',
+    '技術', '網路', '安全', '資料庫', '人工智慧', '機器學習', '演算法', '作業系統', '數學', '物理',
+    '化學', '生物', '地理', '宇宙', '海洋', '山林', '星空', '記憶', '夢想', '旅人',
+    '秘密', '戰爭', '和平', '愛情', '家庭', '朋友', '老師', '學生', '醫生', '圖書館',
+    '博物館', '咖啡', '茶', '貓', '狗', '花', '雨', '風', '光', '夜',
+    '春', '夏', '秋', '冬', '之', '和', '我們', '你', '一個', '最後',
+    '第一次', '寫作', '閱讀', '兒童', '青少年', '繪本', '漫畫', '詩集', '散文', '傳記',
+    '回憶錄', '行銷', '領導', '溝通', '思考', '習慣', '未來', '過去', '島嶼', '鐵道',
+)
+LATIN_WORDS = ('Python', 'Java', 'SQL', 'AI', 'Linux', 'Web', 'iPhone', '3D', '2024', 'ChatGPT')
+SUFFIXES = ('（增訂版）', '（第２版）', '（第３版）', '（上）', '（下）', '：全新修訂', ' 100 問')
+
+# 與 init.sql cjk_bigrams() 相同的字元範圍
+CJK_RUN_RE = re.compile('[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+')
+MIXED_RE = re.compile('[A-Za-z0-9]+[\u4e00-\u9fff]{2,3}')
+
+# 正規化後包含查詢字串即為正解
+TRUTH_PREDICATE = 'strpos(lower(normalize(title, NFKC)), lower(normalize(%(q)s, NFKC))) > 0'
+
+def make_title(rng, weights):
+    """組合 2~5 個詞,部分書名前面加英文/數字、後面加版次"""
+    title = ''.join(rng.choices(VOCABULARY, weights=weights, k=rng.randint(2, 5)))
+    if rng.random() < 0.15:
+        title = rng.choice(LATIN_WORDS) + rng.choice(('', ' ')) + title
+    if rng.random() < 0.1:
+        title += rng.choice(SUFFIXES)
+    return title
+
+def create_scratch_table(cur):
+    """重建暫存表 (含 generated column,索引於每個資料量填完資料後重建)"""
+    cur.execute(f'DROP TABLE IF EXISTS {SCRATCH_TABLE}')
+    cur.execute(f"""
+        CREATE TABLE {SCRATCH_TABLE} (
+            id SERIAL PRIMARY KEY,
+            title TEXT NOT NULL,
+            description TEXT
+        )
+    """)
+    add_cjk_bigram_column(cur, SCRATCH_TABLE, BIGRAM_COLUMN, BIGRAM_INDEX)
+
+def grow_table(cur, target, rng, batch=50000):
+    """
+    以 COPY 補上差額讓暫存表成長到 target 筆 (寫入時不帶索引),之後重建兩種索引並 VACUUM ANALYZE。
+    回傳填入筆數、填入耗時 (含 generated column 斷詞) 與各索引的建立耗時、大小。
+    """
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(len(VOCABULARY))]
+    cur.execute(f'SELECT COUNT(*) FROM {SCRATCH_TABLE}')
+    delta = max(target - cur.fetchone()[0], 0)
+    cur.execute(f'DROP INDEX IF EXISTS {TRGM_INDEX}')
+    cur.execute(f'DROP INDEX IF EXISTS {BIGRAM_INDEX}')
+
+    start = time.perf_counter()
+    for offset in range(0, delta, batch):
+        buffer = io.StringIO()
+        for _ in range(min(batch, delta - offset)):
+            buffer.write(f"{make_title(rng, weights)}\t{''.join(rng.choices(VOCABULARY, k=8))}\n")
+        buffer.seek(0)
+        cur.copy_expert(f'COPY {SCRATCH_TABLE} (title, description) FROM STDIN', buffer)
+    fill_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    cur.execute(f'CREATE INDEX {TRGM_INDEX} ON {SCRATCH_TABLE} USING gin (title gin_trgm_ops)')
+    trgm_ms = (time.perf_counter() - start) * 1000
+    _, bigram_ms = add_cjk_bigram_column(cur, SCRATCH_TABLE, BIGRAM_COLUMN, BIGRAM_INDEX)
+    cur.execute(f'VACUUM ANALYZE {SCRATCH_TABLE}')
+    cur.execute('SELECT pg_relation_size(%s), pg_relation_size(%s)', (TRGM_INDEX, BIGRAM_INDEX))
+    trgm_bytes, bigram_bytes = cur.fetchone()
+    return {
+        'inserted': delta,
+        'fill_ms': fill_ms,
+        'indexes': {
+            'four_branch': {'index': TRGM_INDEX, 'build_ms': trgm_ms, 'size_bytes': trgm_bytes},
+            'cjk_bigram': {'index': BIGRAM_INDEX, 'build_ms': bigram_ms, 'size_bytes': bigram_bytes},
+        },
+    }
+
+def sample_queries(cur, per_class, rng):
+    """從目前的書名抽取各類別的查詢子字串 (同類別內不重複)"""
+    cur.execute(f'SELECT title FROM {SCRATCH_TABLE} ORDER BY id')
+    titles = [row[0] for row in cur.fetchall()]
+    queries = {query_class: [] for query_class in QUERY_CLASSES}
+    for _ in range(per_class * 200):
+        title = rng.choice(titles)
+        if len(queries['mixed']) < per_class:
+            match = MIXED_RE.search(title)
+            if match and match.group() not in queries['mixed']:
+                queries['mixed'].append(match.group())
+        run = max(CJK_RUN_RE.findall(title), key=len, default='')
+        length = rng.randint(1, min(len(run), 6)) if run else 0
+        query_class = f'cjk_{length}' if length < 4 else 'cjk_4+'
+        if length and len(queries[query_class]) < per_class:
+            start = rng.randint(0, len(run) - length)
+            query = run[start:start + length]
+            if query not in queries[query_class]:
+                queries[query_class].append(query)
+        if all(len(items) >= per_class for items in queries.values()):
+            break
+    return queries
+
+def measure_query(cur, sql, query, repeat):
+    """單一查詢: 取回結果計算 recall@20,再以 EXPLAIN ANALYZE 量測延遲與存取路徑"""
+    params = {'q': query}
+    cur.execute(sql, params)
+    ids = [row[0] for row in cur.fetchall()]
+    cur.execute(f'SELECT COUNT(*) FROM {SCRATCH_TABLE} WHERE {TRUTH_PREDICATE}', params)
+    truth = cur.fetchone()[0]
+    cur.execute(f'SELECT COUNT(*) FROM {SCRATCH_TABLE} WHERE id = ANY(%(ids)s) AND {TRUTH_PREDICATE}',
+                dict(params, ids=ids))
+    hits = cur.fetchone()[0]
+
+    timings = []
+    seq_scan = False
+    indexes = set()
+    for _ in range(repeat):
+        summary = summarize_plan(explain(cur, sql, params))
+        timings.append(summary['execution_ms'])
+        seq_scan = seq_scan or SCRATCH_TABLE in summary['seq_scans']
+        indexes.update(summary['indexes'])
+    # 讀到但被 recheck / filter 丟掉的列: 查詢取不到 trigram 時 GIN 會退化成整個索引掃描,
+    # 計畫上不是 Seq Scan,但這個數字會接近全表筆數
+    discarded = sum(node['rows_removed_by_recheck'] + node['rows_removed_by_filter']
+                    for node in summary['nodes'])
+    return {
+        'query': query,
+        'results': len(ids),
+        'truth': truth,
+        'recall': hits / min(20, truth) if truth else None,
+        'median_ms': statistics.median(timings),
+        'seq_scan': seq_scan,
+        'discarded_rows': discarded,
+        'indexes': sorted(indexes),
+    }
+
+def summarize(items):
+    """彙總同一類別 x 路徑的查詢結果"""
+    timings = sorted(item['median_ms'] for item in items)
+    recalls = [item['recall'] for item in items if item['recall'] is not None]
+    return {
+        'queries': len(items),
+        'median_ms': statistics.median(timings),
+        'p95_ms': timings[min(int(len(timings) * 0.95), len(timings) - 1)],
+        'recall_at_20': statistics.mean(recalls) if recalls else None,
+        'empty_rate': sum(1 for item in items if item['results'] == 0) / len(items),
+        'seq_scan_rate': sum(1 for item in items if item['seq_scan']) / len(items),
+        'discarded_rows': statistics.mean(item['discarded_rows'] for item in items),
+    }
+
+def measure_volume(cur, queries, repeat):
+    """對所有查詢量測兩條路徑,回傳 {path: {'classes': {類別: 彙總}, 'queries': [...]}}"""
+    apply_search_settings(cur)
+    results = {}
+    for path, sql in PATHS.items():
+        per_query = {query_class: [measure_query(cur, sql, query, repeat) for query in items]
+                     for query_class, items in queries.items() if items}
+        results[path] = {
+            'classes': {query_class: summarize(items) for query_class, items in per_query.items()},
+            'queries': [dict(item, query_class=query_class)
+                        for query_class, items in per_query.items() for item in items],
+        }
+    return results
+
+def print_comparison(rows):
+    """輸出比較表 (每列為一個資料量 x 查詢類別)"""
+    print("\n" + "=" * 130)
+    print("四分支查詢 vs CJK bigram 路徑 (延遲為 EXPLAIN ANALYZE 中位數 / p95, ms)")
+    print("=" * 130)
+    print(f"{'資料量':>10} {'類別':<8}"
+          f" {'四分支 ms':>16} {'recall':>7} {'空':>5} {'seq':>5} {'丟棄列':>9}"
+          f" {'bigram ms':>16} {'recall':>7} {'空':>5} {'seq':>5} {'丟棄列':>9}")
+    print("-" * 130)
+    for row in rows:
+        for query_class in QUERY_CLASSES:
+            line = f"{row['volume']:>10,} {query_class:<8}"
+            for path in PATHS:
+                item = row['search'][path]['classes'].get(query_class)
+                if item is None:
+                    line += f" {'-':>16} {'-':>7} {'-':>5} {'-':>5} {'-':>9}"
+                    continue
+                recall = '-' if item['recall_at_20'] is None else f"{item['recall_at_20']:.0%}"
+                latency = f"{item['median_ms']:.2f}/{item['p95_ms']:.2f}"
+                line += (f" {latency:>16} {recall:>7} {item['empty_rate']:>5.0%}"
+                         f" {item['seq_scan_rate']:>5.0%} {item['discarded_rows']:>9,.0f}")
+            print(line)
+    print("\n空 = 沒有回傳任何結果的查詢比例; seq = 計畫中出現 Seq Scan 的查詢比例;"
+          " 丟棄列 = 每次執行被 recheck / filter 丟掉的平均列數")
+
+    print(f"\n{'資料量':>10} {'trigram 索引':>22} {'bigram 索引':>22}")
+    for row in rows:
+        line = f"{row['volume']:>10,}"
+        for path in PATHS:
+            index = row['indexes'][path]
+            cell = f"{index['size_bytes'] / 1024 / 1024:.1f}MB / {index['build_ms']:.0f}ms"
+            line += f" {cell:>22}"
+        print(line)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='比較中文查詢在四分支 /search 查詢與 CJK bigram 路徑的延遲與 recall')
+    parser.add_argument('--volumes', type=int, nargs='+', default=DEFAULT_VOLUMES,
+                        help='資料量 (預設: 10000 100000,依序只增不減)')
+    parser.add_argument('--queries-per-class', type=int, default=10, help='每個查詢類別的查詢數 (預設: 10)')
+    parser.add_argument('--repeat', type=int, default=3, help='每個查詢重複 EXPLAIN ANALYZE 次數 (預設: 3)')
+    parser.add_argument('--seed', type=int, default=42, help='資料與查詢的亂數種子 (預設: 42)')
+    parser.add_argument('--keep', action='store_true', help='測試結束後保留暫存表')
+    parser.add_argument('--output', default=None,
+                        help='輸出 JSON (預設: test-results/cjk_bigram_<timestamp>.json)')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    volumes = sorted(set(args.volumes))
+
+    print("=" * 110)
+    print("中文查詢基準測試: 四分支 vs CJK bigram")
+    print("=" * 110)
+    print(f"資料量: {', '.join(f'{v:,}' for v in volumes)}")
+
+    conn = connect(autocommit=True)
+    cur = conn.cursor()
+    cur.execute("SELECT to_regprocedure('cjk_bigrams(text, boolean)')")
+    if cur.fetchone()[0] is None:
+        print("❌ 找不到 cjk_bigrams() 函數,請先套用 init.sql (psql -f init.sql 或重新執行 seed.py)")
+        return
+
+    rng = random.Random(args.seed)
+    rows = []
+    queries = None
+    try:
+        create_scratch_table(cur)
+        for volume in volumes:
+            print(f"\n🔧 暫存表 {SCRATCH_TABLE} 成長到 {volume:,} 筆...", end=' ', flush=True)
+            growth = grow_table(cur, volume, rng)
+            print(f"✓ (+{growth['inserted']:,} 筆, {growth['fill_ms'] / 1000:.1f}s)")
+            if queries is None:
+                queries = sample_queries(cur, args.queries_per_class, rng)
+                for query_class, items in queries.items():
+                    print(f"  🔎 {query_class:<7} {' '.join(items)}")
+            search = measure_volume(cur, queries, args.repeat)
+            rows.append(dict(growth, volume=volume, search=search))
+            for path in PATHS:
+                classes = search[path]['classes']
+                print(f"  {path:<12} " + '  '.join(
+                    f"{query_class}={item['median_ms']:.2f}ms" for query_class, item in classes.items()))
+    finally:
+        if not args.keep:
+            cur.execute(f'DROP TABLE IF EXISTS {SCRATCH_TABLE}')
+        cur.close()
+        conn.close()
+
+    print_comparison(rows)
+
+    output_file = args.output or os.path.join(
+        'test-results', f"cjk_bigram_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump({'queries': queries, 'rows': rows}, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果已儲存至: {output_file}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+worlds 語料快照: 區塊壓縮的 binary COPY 格式,以 mmap 串流重新載入
+
+dump_data.sh / restore_data.sh 的純文字 SQL dump 產生慢、檔案大、重播時每一列都要重新解析。
+快照直接存放 PostgreSQL binary COPY 的 tuple 資料 (每欄 int32 長度 + UTF-8 bytes,NULL 為 -1),
+每 block_rows 筆壓縮成一個區塊:
+
+    'TRGMSNAP' u16 版本
+    區塊 0..n-1                     壓縮後的 tuple 資料 (zlib 或不壓縮)
+    區塊索引 n × (u64 offset, u32 壓縮長度, u32 原始長度, u32 筆數, u32 crc32)
+    metadata (JSON)                 欄位、筆數、來源、建立時間...
+    u64 索引位置, u32 metadata 長度, 'TRGMSNAP'
+
+載入時 mmap 整個檔案,依區塊索引把壓縮資料 (memoryview,不複製) 交給 worker 解壓,
+解壓後的 bytes 原封不動接在 COPY 標頭後面送進 COPY ... FROM STDIN (FORMAT binary),
+整個過程不會為每一列建立 Python 物件。只有 --limit / 追加載入切到區塊中間時,
+才會逐筆走訪那一個區塊找出切點。
+
+用法:
+    python3 scripts/corpus_snapshot.py --export snapshots/wiki_100k.snap    # 匯出目前的 worlds
+    python3 scripts/corpus_snapshot.py --load snapshots/wiki_100k.snap      # 清空 worlds 後載入
+    python3 scripts/corpus_snapshot.py --load snapshots/wiki_1m.snap --limit 200000
+    python3 scripts/corpus_snapshot.py --info snapshots/wiki_100k.snap
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from db import DB_CONFIG, connect
+
+MAGIC = b'TRGMSNAP'
+VERSION = 1
+COLUMNS = ('title', 'description')
+
+HEADER = struct.Struct('>8sH')
+BLOCK_ENTRY = struct.Struct('>QIIII')  # offset, stored length, raw length, rows, crc32
+FOOTER = struct.Struct('>QI8s')        # index offset, metadata length, magic
+
+# binary COPY 的檔頭 (簽章 + flags + 擴充區長度) 與結尾 (欄位數 -1)
+COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+COPY_TRAILER = struct.pack('>h', -1)
+FIELD_COUNT = struct.pack('>h', len(COLUMNS))
+NULL_FIELD = struct.pack('>i', -1)
+INT16 = struct.Struct('>h')
+INT32 = struct.Struct('>i')
+
+CODECS = ('zlib', 'none')
+DEFAULT_BLOCK_ROWS = 16384
+
+# 與 seed.py insert_books_to_db 相同的 trigram 索引
+TRIGRAM_INDEXES = {
+    'idx_title_trgm': 'CREATE INDEX idx_title_trgm ON worlds USING gin (title gin_trgm_ops)',
+    'idx_desc_trgm': 'CREATE INDEX idx_desc_trgm ON worlds USING gin (description gin_trgm_ops)',
+}
+
+COPY_IN_SQL = f"COPY worlds ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT binary)"
+COPY_OUT_SQL = f"COPY (SELECT {', '.join(COLUMNS)} FROM worlds ORDER BY id) TO STDOUT WITH (FORMAT binary)"
+
+class SnapshotError(Exception):
+    pass
+
+def encode_row(row):
+    """把 (title, description) 編碼成一筆 binary COPY tuple"""
+    parts = [FIELD_COUNT]
+    for value in row:
+        if value is None:
+            parts.append(NULL_FIELD)
+        else:
+            data = value.encode('utf-8')
+            parts.append(INT32.pack(len(data)))
+            parts.append(data)
+    return b''.join(parts)
+
+def tuple_end(buf, pos, end):
+    """
+    回傳從 pos 開始的 tuple 結束位置;資料不完整時回傳 None,遇到 COPY 結尾 (-1) 回傳 -1
+    """
+    if pos + 2 > end:
+        return None
+    fields = INT16.unpack_from(buf, pos)[0]
+    if fields == -1:
+        return -1
+    pos += 2
+    for _ in range(fields):
+        if pos + 4 > end:
+            return None
+        length = INT32.unpack_from(buf, pos)[0]
+        pos += 4 + max(length, 0)
+        if pos > end:
+            return None
+    return pos
+
+# ============================================================================
+# 寫入
+# ============================================================================
+
+class SnapshotWriter:
+    """
+    逐筆 (add_rows) 或直接接收 COPY TO STDOUT 的 binary 串流 (write) 寫成快照。
+    先寫到 path.tmp,close() 寫完索引與 metadata 後才改名,中斷時不會留下半個快照。
+    """
+
+    def __init__(self, path, codec='zlib', level=6, block_rows=DEFAULT_BLOCK_ROWS, metadata=None):
+        if codec not in CODECS:
+            raise SnapshotError(f'不支援的壓縮方式: {codec}')
+        self.path = path
+        self.codec = codec
+        self.level = level
+        self.block_rows = block_rows
+        self.metadata = dict(metadata or {})
+        self.blocks = []
+        self.rows = 0
+        self.raw_bytes = 0
+        self.pending = []
+        self.pending_rows = 0
+        self.stream = bytearray()
+        self.stream_started = False
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.file = open(path + '.tmp', 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _flush_block(self):
+        if not self.pending_rows:
+            return
+        raw = b''.join(self.pending)
+        stored = zlib.compress(raw, self.level) if self.codec == 'zlib' else raw
+        self.blocks.append((self.file.tell(), len(stored), len(raw), self.pending_rows, zlib.crc32(raw)))
+        self.file.write(stored)
+        self.rows += self.pending_rows
+        self.raw_bytes += len(raw)
+        self.pending = []
+        self.pending_rows = 0
+
+    def _add_tuple(self, data):
+        self.pending.append(data)
+        self.pending_rows += 1
+        if self.pending_rows >= self.block_rows:
+            self._flush_block()
+
+    def add_rows(self, rows):
+        """rows: (title, description) 的序列"""
+        for row in rows:
+            self._add_tuple(encode_row(row))
+
+    def write(self, data):
+        """copy_expert 的 COPY TO STDOUT 目的地: 跳過檔頭,依 tuple 邊界切成區塊"""
+        self.stream += data
+        pos = 0
+        if not self.stream_started:
+            if len(self.stream) < len(COPY_HEADER):
+                return
+            if not self.stream.startswith(COPY_HEADER[:11]):
+                raise SnapshotError('COPY 串流不是 binary 格式')
+            extension = INT32.unpack_from(self.stream, 15)[0]
+            pos = len(COPY_HEADER) + extension
+            self.stream_started = True
+        end = len(self.stream)
+        while True:
+            next_pos = tuple_end(self.stream, pos, end)
+            if next_pos is None:
+                break
+            if next_pos == -1:
+                pos = end
+                break
+            self._add_tuple(bytes(self.stream[pos:next_pos]))
+            pos = next_pos
+        del self.stream[:pos]
+
+    def close(self):
+        self._flush_block()
+        index_offset = self.file.tell()
+        for entry in self.blocks:
+            self.file.write(BLOCK_ENTRY.pack(*entry))
+        self.metadata.update({
+            'version': VERSION,
+            'columns': list(COLUMNS),
+            'rows': self.rows,
+            'blocks': len(self.blocks),
+            'block_rows': self.block_rows,
+            'codec': self.codec,
+            'raw_bytes': self.raw_bytes,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        })
+        meta = json.dumps(self.metadata, ensure_ascii=False).encode('utf-8')
+        self.file.write(meta)
+        self.file.write(FOOTER.pack(index_offset, len(meta), MAGIC))
+        self.file.close()
+        os.replace(self.path + '.tmp', self.path)
+        return self.metadata
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.path + '.tmp')
+
+def write_snapshot(path, rows, metadata=None, **options):
+    """把 (title, description) 序列寫成快照,回傳 metadata"""
+    with SnapshotWriter(path, metadata=metadata, **options) as writer:
+        writer.add_rows(rows)
+    return writer.metadata
+
+def export_table(path, conn=None, metadata=None, **options):
+    """以 COPY ... TO STDOUT (FORMAT binary) 把目前的 worlds (依 id 排序) 匯出成快照"""
+    own_conn = conn is None
+    conn = conn or connect()
+    metadata = {'source': f"{DB_CONFIG['database']}.worlds", **(metadata or {})}
+    try:
+        with SnapshotWriter(path, metadata=metadata, **options) as writer:
+            cur = conn.cursor()
+            cur.copy_expert(COPY_OUT_SQL, writer, size=1 << 20)
+            cur.close()
+        conn.rollback()
+    finally:
+        if own_conn:
+            conn.close()
+    return writer.metadata
+
+# ============================================================================
+# 讀取
+# ============================================================================
+
+class Snapshot:
+    """以 mmap 開啟的快照;blocks 為區塊索引,metadata 為寫入時的 JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mm)
+        if len(self.mm) < HEADER.size + FOOTER.size:
+            raise SnapshotError(f'{path}: 檔案太小,不是快照')
+        magic, version = HEADER.unpack_from(self.mm, 0)
+        index_offset, meta_length, tail_magic = FOOTER.unpack_from(self.mm, len(self.mm) - FOOTER.size)
+        if magic != MAGIC or tail_magic != MAGIC:
+            raise SnapshotError(f'{path}: 不是快照檔 (或寫入未完成)')
+        if version != VERSION:
+            raise SnapshotError(f'{path}: 不支援的快照版本 {version}')
+        meta_offset = len(self.mm) - FOOTER.size - meta_length
+        self.metadata = json.loads(bytes(self.view[meta_offset:meta_offset + meta_length]))
+        self.blocks = [BLOCK_ENTRY.unpack_from(self.mm, offset)
+                       for offset in range(index_offset, meta_offset, BLOCK_ENTRY.size)]
+        self.codec = self.metadata['codec']
+        self.rows = sum(entry[3] for entry in self.blocks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.view.release()
+        self.mm.close()
+
+    def block_data(self, index):
+        """解壓第 index 個區塊並檢查 crc32 (zlib 解壓與 crc32 都會釋放 GIL)"""
+        offset, stored_length, raw_length, rows, crc = self.blocks[index]
+        stored = self.view[offset:offset + stored_length]
+        raw = zlib.decompress(stored, bufsize=raw_length) if self.codec == 'zlib' else bytes(stored)
+        if len(raw) != raw_length or zlib.crc32(raw) != crc:
+            raise SnapshotError(f'{self.path}: 區塊 {index} 損毀 (crc32 不符)')
+        return raw
+
+    def iter_tuple_data(self, skip=0, limit=None, workers=4, prefetch=8):
+        """
+        依序產生第 skip 筆起 (最多 limit 筆) 的 tuple 資料 (bytes),可直接接在 COPY 檔頭之後。
+        最多同時有 prefetch 個區塊在 worker 中解壓,與 COPY 傳送重疊。
+        """
+        stop = self.rows if limit is None else min(self.rows, skip + limit)
+        wanted = []
+        first_row = 0
+        for index, entry in enumerate(self.blocks):
+            rows = entry[3]
+            if first_row + rows > skip and first_row < stop:
+                wanted.append((index, max(skip - first_row, 0), min(stop - first_row, rows)))
+            first_row += rows
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            queue = iter(wanted)
+            pending = deque()
+
+            def submit_next():
+                for index, start, end in queue:
+                    pending.append((executor.submit(self.block_data, index), start, end, self.blocks[index][3]))
+                    return
+
+            for _ in range(prefetch):
+                submit_next()
+            while pending:
+                future, start, end, rows = pending.popleft()
+                submit_next()
+                raw = future.result()
+                yield raw if start == 0 and end == rows else slice_tuples(raw, start, end)
+
+def slice_tuples(raw, start, end):
+    """取出一個區塊中第 start..end-1 筆 tuple (只在區塊邊界不對齊時使用)"""
+    pos = 0
+    begin = 0 if start == 0 else None
+    for row in range(end):
+        if row == start:
+            begin = pos
+        pos = tuple_end(raw, pos, len(raw))
+        if pos is None or pos == -1:
+            raise SnapshotError('區塊內容與筆數不符')
+    return raw[begin:pos]
+
+class CopyStream:
+    """把 bytes 產生器包成 copy_expert 需要的 read(size) 檔案介面,前後加上 binary COPY 檔頭與結尾"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = memoryview(COPY_HEADER)
+        self.finished = False
+        self.bytes_sent = 0
+
+    def read(self, size=-1):
+        while not self.buffer:
+            if self.finished:
+                return b''
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                chunk = COPY_TRAILER
+                self.finished = True
+            self.buffer = memoryview(chunk)
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data = self.buffer[:size].tobytes()
+        self.buffer = self.buffer[size:]
+        self.bytes_sent += len(data)
+        return data
+
+# ============================================================================
+# 載入
+# ============================================================================
+
+def _build_index(statement, maintenance_work_mem, overrides):
+    conn = connect(autocommit=True, **overrides)
+    try:
+        cur = conn.cursor()
+        cur.execute(f"SET maintenance_work_mem = '{maintenance_work_mem}'")
+        cur.execute(statement)
+        cur.close()
+    finally:
+        conn.close()
+
+def build_trigram_indexes(database=None, maintenance_work_mem='256MB', names=None):
+    """以每個索引一個連線同時建立 TRIGRAM_INDEXES (或其中的 names;索引需已移除),回傳耗時秒數"""
+    overrides = {'database': database} if database else {}
+    statements = [TRIGRAM_INDEXES[name] for name in (names or TRIGRAM_INDEXES)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(statements)) as executor:
+        list(executor.map(lambda statement: _build_index(statement, maintenance_work_mem, overrides),
+                          statements))
+    return time.perf_counter() - start
+
+def load_snapshot(path, limit=None, append=False, rebuild_indexes=True, workers=4,
+                  maintenance_work_mem='256MB', database=None, log=print):
+    """
+    載入快照到 worlds,回傳各步驟耗時。
+
+    預設 (append=False): TRUNCATE ... RESTART IDENTITY、移除 trigram 索引、COPY 前 limit 筆
+    (未指定則全部),之後以兩個連線同時重建兩個索引並 ANALYZE;id 依快照順序為 1..n。
+    append=True: 保留現有資料與索引,從快照第 COUNT(*) 筆開始補到 limit 筆 (漸進式成長)。
+    database: 載入到其他資料庫 (預設為 DB_CONFIG 的資料庫)。
+    """
+    timings = {}
+    with Snapshot(path) as snapshot:
+        conn = connect(**({'database': database} if database else {}))
+        try:
+            cur = conn.cursor()
+            start = time.perf_counter()
+            if append:
+                cur.execute('SELECT COUNT(*) FROM worlds')
+                skip = cur.fetchone()[0]
+            else:
+                skip = 0
+                cur.execute('TRUNCATE worlds RESTART IDENTITY')
+                if rebuild_indexes:
+                    for name in TRIGRAM_INDEXES:
+                        cur.execute(f'DROP INDEX IF EXISTS {name}')
+            count = None if limit is None else max(limit - skip, 0)
+            stream = CopyStream(snapshot.iter_tuple_data(skip, count, workers=workers))
+            cur.copy_expert(COPY_IN_SQL, stream, size=1 << 20)
+            loaded = cur.rowcount
+            conn.commit()
+            timings['copy_s'] = time.perf_counter() - start
+            log(f"  📥 COPY {loaded:,} 筆 ({stream.bytes_sent / 1024 / 1024:.1f} MB) "
+                f"{timings['copy_s']:.2f}s")
+
+            if rebuild_indexes and not append:
+                timings['index_s'] = build_trigram_indexes(database, maintenance_work_mem)
+                log(f"  🔧 重建 trigram 索引 {timings['index_s']:.2f}s")
+
+            start = time.perf_counter()
+            conn.autocommit = True
+            cur.execute('ANALYZE worlds')
+            cur.execute('SELECT COUNT(*) FROM worlds')
+            total = cur.fetchone()[0]
+            cur.close()
+            timings['analyze_s'] = time.perf_counter() - start
+        finally:
+            conn.close()
+    timings.update({'loaded': loaded, 'total': total,
+                    'elapsed_s': sum(v for k, v in timings.items() if k.endswith('_s'))})
+    return timings
+
+def print_info(path):
+    with Snapshot(path) as snapshot:
+        meta = snapshot.metadata
+        size = os.path.getsize(path)
+        print(f"📦 {path}")
+        print(f"  筆數:       {snapshot.rows:,} ({len(snapshot.blocks)} 個區塊,每區塊 {meta['block_rows']:,} 筆)")
+        print(f"  欄位:       {', '.join(meta['columns'])}")
+        print(f"  壓縮:       {meta['codec']}  {meta['raw_bytes'] / 1024 / 1024:.1f} MB → {size / 1024 / 1024:.1f} MB "
+              f"({meta['raw_bytes'] / max(size, 1):.1f}x)")
+        print(f"  建立時間:   {meta['created_at']}")
+        extra = {k: v for k, v in meta.items()
+                 if k not in ('version', 'columns', 'rows', 'blocks', 'block_rows', 'codec', 'raw_bytes', 'created_at')}
+        for key, value in extra.items():
+            print(f"  {key}: {json.dumps(value, ensure_ascii=False)}")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='worlds 語料快照: 匯出成區塊壓縮的 binary COPY 檔,以 mmap 串流快速載入')
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--export', metavar='PATH', help='把目前的 worlds 匯出成快照')
+    action.add_argument('--load', metavar='PATH', help='清空 worlds 後載入快照 (搭配 --append 則追加)')
+    action.add_argument('--info', metavar='PATH', help='顯示快照資訊')
+    parser.add_argument('--limit', type=int, help='只載入前 N 筆')
+    parser.add_argument('--append', action='store_true',
+                        help='保留現有資料與索引,從快照第 COUNT(*) 筆開始補到 --limit 筆')
+    parser.add_argument('--no-indexes', action='store_true', help='載入時不移除、不重建 trigram 索引')
+    parser.add_argument('--workers', type=int, default=4, help='解壓 worker 數 (預設: 4)')
+    parser.add_argument('--codec', choices=CODECS, default='zlib', help='匯出時的壓縮方式 (預設: zlib)')
+    parser.add_argument('--level', type=int, default=6, help='zlib 壓縮等級 (預設: 6)')
+    parser.add_argument('--block-rows', type=int, default=DEFAULT_BLOCK_ROWS,
+                        help=f'每個區塊的筆數 (預設: {DEFAULT_BLOCK_ROWS})')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    try:
+        if args.info:
+            print_info(args.info)
+        elif args.export:
+            print(f"📤 匯出 worlds → {args.export}")
+            start = time.perf_counter()
+            meta = export_table(args.export, codec=args.codec, level=args.level, block_rows=args.block_rows)
+            print(f"  ✓ {meta['rows']:,} 筆,{os.path.getsize(args.export) / 1024 / 1024:.1f} MB,"
+                  f"{time.perf_counter() - start:.2f}s")
+        else:
+            print(f"📥 載入 {args.load} → worlds{' (追加)' if args.append else ''}")
+            timings = load_snapshot(args.load, limit=args.limit, append=args.append,
+                                    rebuild_indexes=not args.no_indexes, workers=args.workers)
+            print(f"  ✓ worlds 共 {timings['total']:,} 筆,總耗時 {timings['elapsed_s']:.2f}s")
+    except (SnapshotError, OSError) as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+以 PostgreSQL template database 管理各資料量的測試資料集
+
+run-performance-tests.sh 每換一個資料量都要清空、generate_test_data、重建索引,
+比較 10 個資料量時大部分時間花在重新產生資料。這裡每個 (資料來源, 筆數) 只建一次:
+
+- 建立: 從 trgm_tpl_base (執行過 init.sql 的空資料庫) 複製,填入資料、建立 trigram 索引、
+  VACUUM ANALYZE,標記為 IS_TEMPLATE 並禁止連線 → 例如 trgm_tpl_generated_100000
+- 使用: CREATE DATABASE ... TEMPLATE 複製出新資料庫,再把它改名為 DB_CONFIG 的資料庫 (testdb),
+  原本的 testdb 改名後刪除。backend 連線設定不用改,斷線重連後就會連到新資料。
+  資料庫層級的設定 (ALTER DATABASE ... SET pg_trgm.*_threshold) 不會隨 TEMPLATE 複製,
+  複製後依 template 上的設定重新套用 (backend-go 的新連線依賴這些設定)。
+- 清理: 依最後使用時間只保留最近的 N 個,或移除超過 D 天未使用、init.sql 已變更的 template
+
+template 的筆數、來源、建立耗時、最後使用時間以 JSON 存在 COMMENT ON DATABASE。
+
+用法:
+    python3 scripts/dataset_manager.py --build 1000 10000 100000      # 預先建立
+    python3 scripts/dataset_manager.py --use 100000                    # 切換 (不存在則先建立)
+    python3 scripts/dataset_manager.py --use 50000 --snapshot snapshots/wiki_1m.snap
+    python3 scripts/dataset_manager.py --list
+    python3 scripts/dataset_manager.py --gc --keep 5
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+import psycopg2
+
+from corpus_snapshot import TRIGRAM_INDEXES, build_trigram_indexes, load_snapshot
+from db import DB_CONFIG, connect
+
+TEMPLATE_PREFIX = 'trgm_tpl_'
+BASE_TEMPLATE = f'{TEMPLATE_PREFIX}base'
+INIT_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'init.sql')
+
+# 複製 / 改名過程中的暫時資料庫,中斷時留下的由 --gc 清除
+BUILDING_SUFFIX = '__building'
+NEXT_SUFFIX = '__next'
+OLD_SUFFIX = '__old'
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def schema_hash():
+    """init.sql 的雜湊;template 建立時記錄下來,init.sql 變更後舊 template 視為過期"""
+    with open(INIT_SQL, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+def source_slug(snapshot):
+    if not snapshot:
+        return 'generated'
+    stem = os.path.splitext(os.path.basename(snapshot))[0]
+    return re.sub(r'[^a-z0-9]+', '_', stem.lower()).strip('_')[:30] or 'snapshot'
+
+def template_name(rows, snapshot=None):
+    return f'{TEMPLATE_PREFIX}{source_slug(snapshot)}_{rows}'
+
+class DatasetManager:
+    """所有操作都透過連到 postgres 資料庫的 autocommit 連線執行 (CREATE / DROP DATABASE 不能在交易中)"""
+
+    def __init__(self, target=None, log=print):
+        self.target = target or DB_CONFIG['database']
+        self.log = log
+        self.conn = connect(autocommit=True, database='postgres')
+        cur = self.conn.cursor()
+        cur.execute('SHOW server_version_num')
+        # PG 15 起 CREATE DATABASE 預設以 WAL_LOG 逐頁複製;FILE_COPY 直接複製檔案,大資料庫快得多
+        self.strategy = ' STRATEGY = FILE_COPY' if int(cur.fetchone()[0]) >= 150000 else ''
+        cur.close()
+
+    def close(self):
+        self.conn.close()
+
+    def execute(self, sql, params=None):
+        cur = self.conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall() if cur.description else None
+        cur.close()
+        return rows
+
+    # ------------------------------------------------------------------
+    # 資料庫資訊
+    # ------------------------------------------------------------------
+
+    def exists(self, name):
+        return bool(self.execute('SELECT 1 FROM pg_database WHERE datname = %s', (name,)))
+
+    def databases(self, pattern):
+        return [row[0] for row in self.execute(
+            'SELECT datname FROM pg_database WHERE datname LIKE %s ORDER BY datname', (pattern,))]
+
+    def metadata(self, name):
+        rows = self.execute(
+            "SELECT shobj_description(oid, 'pg_database') FROM pg_database WHERE datname = %s", (name,))
+        if not rows or not rows[0][0]:
+            return {}
+        try:
+            return json.loads(rows[0][0])
+        except ValueError:
+            return {}
+
+    def set_metadata(self, name, metadata):
+        self.execute(f'COMMENT ON DATABASE {quote_ident(name)} IS %s', (json.dumps(metadata, ensure_ascii=False),))
+
+    def settings(self, name):
+        """資料庫層級的設定 (ALTER DATABASE ... SET),回傳 [(key, value)]"""
+        rows = self.execute("""
+            SELECT unnest(s.setconfig)
+            FROM pg_db_role_setting s JOIN pg_database d ON d.oid = s.setdatabase
+            WHERE d.datname = %s AND s.setrole = 0
+        """, (name,))
+        return [tuple(row[0].split('=', 1)) for row in rows]
+
+    def apply_settings(self, name, settings):
+        for key, value in settings:
+            self.execute(f'ALTER DATABASE {quote_ident(name)} SET {key} = %s', (value,))
+
+    def templates(self):
+        """所有資料集 template (不含 base) 與其 metadata,依最後使用時間由新到舊"""
+        names = [name for name in self.databases(f'{TEMPLATE_PREFIX}%')
+                 if name != BASE_TEMPLATE and not name.endswith(BUILDING_SUFFIX)]
+        entries = [(name, self.metadata(name)) for name in names]
+        return sorted(entries, key=lambda entry: entry[1].get('last_used', ''), reverse=True)
+
+    def drop(self, name):
+        if self.exists(name):
+            self.execute(f'ALTER DATABASE {quote_ident(name)} IS_TEMPLATE false')
+            self.execute(f'DROP DATABASE {quote_ident(name)} WITH (FORCE)')
+
+    def clone(self, source, name):
+        self.execute(f'CREATE DATABASE {quote_ident(name)} TEMPLATE {quote_ident(source)}{self.strategy}')
+        self.apply_settings(name, self.settings(source))
+
+    def seal(self, name, metadata):
+        """標記為 template 並禁止連線 (避免 backend 誤連,也讓 CREATE DATABASE ... TEMPLATE 不會因連線失敗)"""
+        self.execute(f'ALTER DATABASE {quote_ident(name)} IS_TEMPLATE true ALLOW_CONNECTIONS false')
+        self.set_metadata(name, metadata)
+
+    # ------------------------------------------------------------------
+    # 建立 template
+    # ------------------------------------------------------------------
+
+    def ensure_base(self):
+        """執行過 init.sql 的空資料庫;init.sql 變更時重建"""
+        current = schema_hash()
+        if self.exists(BASE_TEMPLATE) and self.metadata(BASE_TEMPLATE).get('schema') == current:
+            return BASE_TEMPLATE
+        self.log(f"🔧 建立 {BASE_TEMPLATE} (init.sql {current})...")
+        self.drop(BASE_TEMPLATE)
+        self.execute(f'CREATE DATABASE {quote_ident(BASE_TEMPLATE)}')
+        with open(INIT_SQL, 'r') as f:
+            # init.sql 的 ALTER DATABASE testdb SET ... 改為套用到 base,複製時再轉給各資料庫
+            sql = f.read().replace('ALTER DATABASE testdb ', f'ALTER DATABASE {BASE_TEMPLATE} ')
+        conn = connect(database=BASE_TEMPLATE)
+        try:
+            cur = conn.cursor()
+            cur.execute(sql)
+            conn.commit()
+            cur.close()
+        finally:
+            conn.close()
+        self.seal(BASE_TEMPLATE, {'schema': current, 'built_at': time.strftime('%Y-%m-%dT%H:%M:%S')})
+        return BASE_TEMPLATE
+
+    def build(self, rows, snapshot=None, force=False):
+        """建立 rows 筆資料的 template (已存在且 init.sql 未變更時直接回傳),回傳 template 名稱"""
+        name = template_name(rows, snapshot)
+        current = schema_hash()
+        if self.exists(name) and not force and self.metadata(name).get('schema') == current:
+            return name
+
+        base = self.ensure_base()
+        building = name + BUILDING_SUFFIX
+        self.log(f"🏗️  建立 {name} ({rows:,} 筆,{'snapshot ' + snapshot if snapshot else 'generate_test_data'})...")
+        start = time.perf_counter()
+        self.drop(building)
+        self.clone(base, building)
+
+        if snapshot:
+            load_snapshot(snapshot, limit=rows, database=building, log=lambda message: self.log(message))
+        else:
+            conn = connect(autocommit=True, database=building)
+            try:
+                cur = conn.cursor()
+                for index in TRIGRAM_INDEXES:
+                    cur.execute(f'DROP INDEX IF EXISTS {index}')
+                cur.execute('SELECT * FROM generate_test_data(%s)', (rows,))
+                cur.close()
+            finally:
+                conn.close()
+            self.log(f"  🔧 重建 trigram 索引 {build_trigram_indexes(building):.2f}s")
+
+        conn = connect(autocommit=True, database=building)
+        try:
+            cur = conn.cursor()
+            cur.execute('VACUUM ANALYZE worlds')
+            cur.execute('SELECT COUNT(*) FROM worlds')
+            actual = cur.fetchone()[0]
+            cur.close()
+        finally:
+            conn.close()
+
+        build_s = time.perf_counter() - start
+        self.drop(name)
+        self.execute(f'ALTER DATABASE {quote_ident(building)} RENAME TO {quote_ident(name)}')
+        self.seal(name, {
+            'rows': actual,
+            'source': snapshot or 'generate_test_data',
+            'schema': current,
+            'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'build_s': round(build_s, 2),
+            'last_used': '',
+        })
+        self.log(f"  ✓ {name}: {actual:,} 筆,{build_s:.2f}s")
+        return name
+
+    # ------------------------------------------------------------------
+    # 切換
+    # ------------------------------------------------------------------
+
+    def use(self, rows, snapshot=None, retries=5):
+        """
+        以 template 複製出新的 target 資料庫並換上,回傳 (template 名稱, 複製秒數, 切換秒數)
+
+        切換時先禁止新連線、中斷既有連線,再改名;backend 的連線池會在下一次查詢時重新連線。
+        """
+        name = self.build(rows, snapshot)
+        target = self.target
+        next_name = target + NEXT_SUFFIX
+        old_name = target + OLD_SUFFIX
+
+        start = time.perf_counter()
+        self.drop(next_name)
+        self.clone(name, next_name)
+        clone_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.drop(old_name)
+        if self.exists(target):
+            self.execute(f'ALTER DATABASE {quote_ident(target)} ALLOW_CONNECTIONS false')
+            for attempt in range(retries):
+                self.execute('SELECT pg_terminate_backend(pid) FROM pg_stat_activity '
+                             'WHERE datname = %s AND pid <> pg_backend_pid()', (target,))
+                try:
+                    self.execute(f'ALTER DATABASE {quote_ident(target)} RENAME TO {quote_ident(old_name)}')
+                    break
+                except psycopg2.errors.ObjectInUse:
+                    if attempt == retries - 1:
+                        self.execute(f'ALTER DATABASE {quote_ident(target)} ALLOW_CONNECTIONS true')
+                        raise
+                    time.sleep(0.2)
+        self.execute(f'ALTER DATABASE {quote_ident(next_name)} RENAME TO {quote_ident(target)}')
+        swap_s = time.perf_counter() - start
+        self.drop(old_name)
+
+        metadata = self.metadata(name)
+        metadata['last_used'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.set_metadata(name, metadata)
+        return name, clone_s, swap_s
+
+    # ------------------------------------------------------------------
+    # 清理
+    # ------------------------------------------------------------------
+
+    def gc(self, keep=None, max_age_days=None):
+        """移除中斷留下的暫時資料庫、init.sql 已變更的 template,以及超出 keep 個或超過 max_age_days 天未使用的"""
+        dropped = []
+        for pattern in (f'%{BUILDING_SUFFIX}', f'%{NEXT_SUFFIX}', f'%{OLD_SUFFIX}'):
+            for name in self.databases(pattern):
+                self.drop(name)
+                dropped.append(name)
+
+        current = schema_hash()
+        cutoff = None
+        if max_age_days is not None:
+            cutoff = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(time.time() - max_age_days * 86400))
+        kept = 0
+        for name, metadata in self.templates():
+            last_used = metadata.get('last_used') or metadata.get('built_at', '')
+            stale = metadata.get('schema') != current
+            expired = cutoff is not None and last_used < cutoff
+            if stale or expired or (keep is not None and kept >= keep):
+                self.drop(name)
+                dropped.append(name)
+            else:
+                kept += 1
+        if self.exists(BASE_TEMPLATE) and self.metadata(BASE_TEMPLATE).get('schema') != current:
+            self.drop(BASE_TEMPLATE)
+            dropped.append(BASE_TEMPLATE)
+        return dropped
+
+    def print_list(self):
+        templates = self.templates()
+        if not templates:
+            print("(尚無資料集 template)")
+            return
+        current = schema_hash()
+        print(f"{'template':<40} {'筆數':>10} {'大小':>10} {'建立 s':>8}  {'最後使用':<19}  來源")
+        print('-' * 110)
+        for name, metadata in templates:
+            size = self.execute('SELECT pg_size_pretty(pg_database_size(%s))', (name,))[0][0]
+            stale = '' if metadata.get('schema') == current else ' (init.sql 已變更)'
+            print(f"{name:<40} {metadata.get('rows', 0):>10,} {size:>10} {metadata.get('build_s', 0):>8.1f}  "
+                  f"{metadata.get('last_used') or '-':<19}  {metadata.get('source', '')}{stale}")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='以 template database 管理各資料量的測試資料集 (建一次,之後以 CREATE DATABASE ... TEMPLATE 秒級切換)')
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--build', type=int, nargs='+', metavar='ROWS', help='預先建立這些資料量的 template')
+    action.add_argument('--use', type=int, metavar='ROWS',
+                        help='把目標資料庫換成此資料量的複本 (template 不存在時先建立)')
+    action.add_argument('--list', action='store_true', help='列出所有資料集 template')
+    action.add_argument('--gc', action='store_true', help='清除暫時資料庫與過期的 template')
+    parser.add_argument('--snapshot', metavar='PATH',
+                        help='資料來源改為語料快照的前 ROWS 筆 (scripts/corpus_snapshot.py),預設為 generate_test_data()')
+    parser.add_argument('--rebuild', action='store_true', help='--build 時即使 template 已存在也重新建立')
+    parser.add_argument('--target', default=DB_CONFIG['database'],
+                        help=f"--use 要換上的資料庫名稱 (預設: {DB_CONFIG['database']},即 backend 連線的資料庫)")
+    parser.add_argument('--keep', type=int, help='--gc 時只保留最近使用的 N 個 template')
+    parser.add_argument('--max-age-days', type=float, help='--gc 時移除超過 D 天未使用的 template')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    manager = DatasetManager(target=args.target)
+    try:
+        if args.build:
+            for rows in args.build:
+                manager.build(rows, args.snapshot, force=args.rebuild)
+        elif args.use is not None:
+            name, clone_s, swap_s = manager.use(args.use, args.snapshot)
+            print(f"✓ {args.target} ← {name} (複製 {clone_s:.2f}s,切換 {swap_s:.2f}s)")
+        elif args.list:
+            manager.print_list()
+        else:
+            dropped = manager.gc(keep=args.keep, max_age_days=args.max_age_days)
+            for name in dropped:
+                print(f"🗑️  {name}")
+            print(f"✓ 清除 {len(dropped)} 個資料庫")
+    except (psycopg2.Error, OSError) as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    finally:
+        manager.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+scripts/ 下所有工具共用的資料庫存取層
+
+- 連線設定讀取與 backend (server.js / backend-go) 相同的環境變數:
+  DB_HOST / DB_PORT / DB_NAME / DB_USER / DB_PASSWORD,未設定時連到本機 testdb
+- get_pool() / pooled_connection(): 執行緒安全的連線池 (大小由 DB_POOL_MAX 決定)
+- Connection.execute_prepared(): 伺服器端 PREPARE / EXECUTE,同一條 SQL 每個連線只解析一次
+- insert_values(): 以 execute_values 把多筆資料合成一條多列 INSERT 批次送出
+- add_timing_hook(): 每條 SQL 執行後呼叫 hook(label, elapsed_ms, rowcount);
+  設定 DB_TIMING=1 時自動統計並在程式結束時列出
+"""
+
+import atexit
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
+
+# 資料庫連線設定 (與 docker-compose.yml 中 backend 的環境變數相同)
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'port': int(os.environ.get('DB_PORT', 5432)),
+    'database': os.environ.get('DB_NAME', 'testdb'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', 'password'),
+}
+
+POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+
+# ============================================================================
+# 每條 SQL 的計時 hook
+# ============================================================================
+
+_timing_hooks = []
+
+def add_timing_hook(hook):
+    """註冊 hook(label, elapsed_ms, rowcount),所有經由本模組建立的 cursor 都會呼叫"""
+    _timing_hooks.append(hook)
+    return hook
+
+def remove_timing_hook(hook):
+    if hook in _timing_hooks:
+        _timing_hooks.remove(hook)
+
+def _label(query):
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    elif not isinstance(query, str):
+        query = query.as_string(None) if hasattr(query, 'as_string') else str(query)
+    return ' '.join(query.split())
+
+class _TimingMixin:
+    """execute / executemany 前後計時;timing_label 可覆寫統計用的 SQL 文字 (批次或 EXECUTE 時)"""
+
+    timing_label = None
+
+    def _timed(self, method, query, vars):
+        if not _timing_hooks:
+            return method(query, vars)
+        start = time.perf_counter()
+        try:
+            return method(query, vars)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            label = self.timing_label or _label(query)
+            for hook in list(_timing_hooks):
+                hook(label, elapsed_ms, self.rowcount)
+
+    def execute(self, query, vars=None):
+        return self._timed(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._timed(super().executemany, query, vars_list)
+
+@contextmanager
+def timing_label(cur, sql):
+    """區塊內 cur 執行的 SQL 都以 sql 的文字計入統計 (非本模組的 cursor 則不做任何事)"""
+    if not isinstance(cur, _TimingMixin):
+        yield
+        return
+    previous_label = cur.timing_label
+    cur.timing_label = _label(sql)
+    try:
+        yield
+    finally:
+        cur.timing_label = previous_label
+
+class TimedCursor(_TimingMixin, psycopg2.extensions.cursor):
+    pass
+
+class TimedDictCursor(_TimingMixin, psycopg2.extras.RealDictCursor):
+    """回傳 dict 的 cursor (取代 psycopg2.extras.RealDictCursor)"""
+
+class StatementStats:
+    """統計每條 SQL 的執行次數與耗時,可直接當作 timing hook"""
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, label, elapsed_ms, rowcount):
+        with self.lock:
+            entry = self.stats.setdefault(label, {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0})
+            entry['calls'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['rows'] += max(rowcount, 0)
+
+    def report(self, limit=15):
+        if not self.stats:
+            return
+        print(f"\n⏱️  SQL 耗時統計 (前 {limit} 條,依總耗時排序)")
+        print(f"{'calls':>7} {'total ms':>11} {'avg ms':>9} {'max ms':>9} {'rows':>9}  SQL")
+        print('-' * 100)
+        ranked = sorted(self.stats.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        for label, entry in ranked[:limit]:
+            print(f"{entry['calls']:>7,} {entry['total_ms']:>11.1f} {entry['total_ms'] / entry['calls']:>9.2f} "
+                  f"{entry['max_ms']:>9.2f} {entry['rows']:>9,}  {label[:60]}")
+
+if os.environ.get('DB_TIMING') == '1':
+    atexit.register(add_timing_hook(StatementStats()).report)
+
+# ============================================================================
+# 連線與伺服器端 prepared statement
+# ============================================================================
+
+_PLACEHOLDER = re.compile(r'%%|%s|%\((\w+)\)s')
+
+def to_positional(sql):
+    """
+    把 psycopg2 的佔位符換成 PREPARE 用的 $1..$n,回傳 (sql, 參數鍵)
+
+    %s 依出現順序對應 0, 1, 2...;%(name)s 相同名稱共用一個 $n,鍵為名稱。
+    """
+    keys = []
+
+    def replace(match):
+        if match.group(0) == '%%':
+            return '%'
+        key = match.group(1) if match.group(1) else len(keys)
+        if key not in keys:
+            keys.append(key)
+        return f'${keys.index(key) + 1}'
+
+    text = _PLACEHOLDER.sub(replace, sql)
+    if len({type(key) for key in keys}) > 1:
+        raise ValueError('不能混用 %s 與 %(name)s 佔位符')
+    return text, keys
+
+class Connection(psycopg2.extensions.connection):
+    """預設使用 TimedCursor,並記錄此連線上已 PREPARE 的 SQL"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = TimedCursor
+        self.prepared = {}
+
+    def execute_prepared(self, cur, sql, params=None):
+        """
+        以伺服器端 prepared statement 執行 sql (佔位符與 cur.execute 相同,字面的 % 一律寫成 %%)
+
+        第一次執行時 PREPARE,之後只送 EXECUTE 與參數,省去每次的解析與分析。
+        計畫快取依伺服器的 plan_cache_mode 決定 (預設前 5 次使用 custom plan)。
+        """
+        if sql not in self.prepared:
+            text, keys = to_positional(sql)
+            name = f'tool_stmt_{len(self.prepared) + 1}'
+            cur.execute(f'PREPARE {name} AS {text}')
+            self.prepared[sql] = (name, keys)
+        name, keys = self.prepared[sql]
+        values = [params[key] for key in keys] if keys else None
+        with timing_label(cur, sql):
+            cur.execute(f"EXECUTE {name}({', '.join(['%s'] * len(values))})" if values else f'EXECUTE {name}', values)
+
+    def forget_prepared(self):
+        """DISCARD ALL / DEALLOCATE ALL 之後呼叫,讓下次執行時重新 PREPARE"""
+        self.prepared.clear()
+
+def connect(autocommit=False, retry_timeout=0, **overrides):
+    """
+    以 DB_CONFIG (可用 overrides 覆寫,例如 database='postgres') 建立連線
+
+    retry_timeout > 0 時,資料庫尚未就緒 (例如剛重啟) 會持續重試直到逾時。
+    """
+    params = {**DB_CONFIG, **overrides}
+    deadline = time.time() + retry_timeout
+    while True:
+        try:
+            conn = psycopg2.connect(connection_factory=Connection, **params)
+            break
+        except psycopg2.OperationalError:
+            if time.time() >= deadline:
+                raise
+            time.sleep(0.5)
+    conn.autocommit = autocommit
+    return conn
+
+# ============================================================================
+# 執行緒安全的連線池
+# ============================================================================
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool(maxconn=None):
+    """程序內共用的 ThreadedConnectionPool (第一次呼叫時建立)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = psycopg2.pool.ThreadedConnectionPool(
+                1, maxconn or POOL_MAX, connection_factory=Connection, **DB_CONFIG)
+        return _pool
+
+@contextmanager
+def pooled_connection():
+    """
+    從連線池借出一個連線;正常結束時 commit,發生例外時 rollback,最後歸還
+
+    用法:
+        with pooled_connection() as conn:
+            insert_values(conn.cursor(), 'INSERT INTO worlds (title, description) VALUES %s', rows)
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+        if not conn.autocommit:
+            conn.commit()
+    except Exception:
+        if conn.closed:
+            broken = True
+        else:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=broken)
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+# ============================================================================
+# 批次寫入
+# ============================================================================
+
+def insert_values(cur, sql, rows, page_size=1000, template=None):
+    """
+    以 execute_values 批次寫入: 每 page_size 筆合成一條 INSERT ... VALUES (...), (...) 送出,
+    取代逐筆 execute 的來回延遲。sql 中以單一 %s 代表 VALUES 清單。
+    """
+    with timing_label(cur, sql):
+        psycopg2.extras.execute_values(cur, sql, rows, template=template, page_size=page_size)
+    return len(rows)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+seed.py 各資料來源共用的去重索引
+
+每個爬蟲原本各自維護 seen_titles,main() 最後再依 title 去重一次,
+被別的來源搶先提供的資料照樣抓取、解析、計入目標數,最後才被丟掉。
+DedupIndex 由所有爬蟲在抓取當下共用 (執行緒安全):
+
+- Bloom filter: 每筆約 1.2 bytes (誤判率 1%),不在 filter 中的 title 一定是新的,不必查確認表
+- 確認用的 fingerprint 表: title 的 64 位元雜湊 (不存字串本身),存在排序好的 array('Q') 中
+  (每筆 8 bytes),以 bisect 查詢;新登記的先放在最多 PENDING_LIMIT 筆的小 set,滿了再整批合併。
+  filter 判斷「可能見過」時以此確認,排除 Bloom filter 的誤判
+- 超過容量時加上一層容量加倍、誤判率減半的 filter (scalable Bloom filter)
+
+合計每筆約 9~10 bytes;若直接用 Python set 存 int,每筆約 70~100 bytes。
+
+title 的比對規則與 main() 原本的去重相同: 去除前後空白後不分大小寫。
+"""
+
+import bisect
+import hashlib
+import math
+import sys
+import threading
+from array import array
+
+# 新登記的 fingerprint 先放在 set,累積到此筆數再合併進排序陣列
+PENDING_LIMIT = 4096
+
+class BloomFilter:
+    """固定容量的 Bloom filter,位置以 double hashing (h1 + i * h2) 產生"""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, h1, h2):
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, h1, h2):
+        for pos in self._positions(h1, h2):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def contains(self, h1, h2):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(h1, h2))
+
+class FingerprintTable:
+    """64 位元 fingerprint 的精簡集合: 排序的 array('Q') + 小的待合併 set"""
+
+    def __init__(self):
+        self.sorted = array('Q')
+        self.pending = set()
+
+    def __contains__(self, fingerprint):
+        if fingerprint in self.pending:
+            return True
+        index = bisect.bisect_left(self.sorted, fingerprint)
+        return index < len(self.sorted) and self.sorted[index] == fingerprint
+
+    def add(self, fingerprint):
+        self.pending.add(fingerprint)
+        if len(self.pending) >= PENDING_LIMIT:
+            self._merge()
+
+    def _merge(self):
+        # 兩段都已排序,Timsort 合併相鄰的 run 為線性時間
+        merged = array('Q', self.sorted)
+        merged.extend(sorted(self.pending))
+        self.sorted = array('Q', sorted(merged))
+        self.pending = set()
+
+    def __len__(self):
+        return len(self.sorted) + len(self.pending)
+
+    def memory_bytes(self):
+        return (self.sorted.buffer_info()[1] * self.sorted.itemsize
+                + sys.getsizeof(self.pending) + len(self.pending) * sys.getsizeof(1 << 63))
+
+class DedupIndex:
+    """跨來源共用、執行緒安全的 title 去重索引"""
+
+    def __init__(self, capacity=100_000, error_rate=0.01):
+        self.lock = threading.Lock()
+        self.filters = [BloomFilter(capacity, error_rate)]
+        self.fingerprints = FingerprintTable()
+        self.checked = 0
+        self.duplicates = 0
+        self.false_positives = 0
+        self.by_source = {}
+
+    @staticmethod
+    def _hashes(title):
+        digest = hashlib.blake2b(title.strip().lower().encode('utf-8'), digest_size=16).digest()
+        return int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+
+    def _add_locked(self, h1, h2):
+        self.checked += 1
+        if any(bloom.contains(h1, h2) for bloom in self.filters):
+            if h1 in self.fingerprints:
+                self.duplicates += 1
+                return False
+            self.false_positives += 1
+        current = self.filters[-1]
+        if len(self.fingerprints) >= sum(bloom.capacity for bloom in self.filters):
+            current = BloomFilter(current.capacity * 2, current.error_rate / 2)
+            self.filters.append(current)
+        current.add(h1, h2)
+        self.fingerprints.add(h1)
+        return True
+
+    def add(self, title, source=None):
+        """title 是全域第一次出現時登記並回傳 True,已由任何來源提供過則回傳 False"""
+        hashes = self._hashes(title)
+        with self.lock:
+            is_new = self._add_locked(*hashes)
+            if source:
+                counts = self.by_source.setdefault(source, [0, 0])
+                counts[0 if is_new else 1] += 1
+            return is_new
+
+    def seen(self, title):
+        """只查詢不登記 (例如抓取內容前先略過已知的 title)"""
+        h1, h2 = self._hashes(title)
+        with self.lock:
+            return any(bloom.contains(h1, h2) for bloom in self.filters) and h1 in self.fingerprints
+
+    def filter_new(self, records, source=None, limit=None):
+        """
+        從 [(title, description)] 取出全域未出現過的資料並登記 (一次取得鎖)
+
+        limit 為此來源還需要的筆數,達到後其餘資料不登記,留給其他來源。
+        description 為空的資料不會寫入資料庫,直接略過且不登記,
+        避免佔住 title 而擋掉其他來源有內容的同名資料。
+        """
+        records = [(title, description) for title, description in records if description]
+        hashes = [self._hashes(title) for title, _ in records]
+        fresh = []
+        with self.lock:
+            counts = self.by_source.setdefault(source, [0, 0])
+            for record, (h1, h2) in zip(records, hashes):
+                if limit is not None and len(fresh) >= limit:
+                    break
+                if self._add_locked(h1, h2):
+                    fresh.append(record)
+                    counts[0] += 1
+                else:
+                    counts[1] += 1
+        return fresh
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def memory_bytes(self):
+        """Bloom filter 位元陣列加上 fingerprint 表的記憶體用量"""
+        bloom_bytes = sum(len(bloom.bits) for bloom in self.filters)
+        return bloom_bytes + self.fingerprints.memory_bytes()
+
+    def summary(self):
+        return {
+            'unique': len(self.fingerprints),
+            'checked': self.checked,
+            'duplicates': self.duplicates,
+            'bloom_false_positives': self.false_positives,
+            'bloom_layers': len(self.filters),
+            'memory_mb': round(self.memory_bytes() / 1024 / 1024, 2),
+            'by_source': {source: {'unique': new, 'duplicates': dup}
+                          for source, (new, dup) in self.by_source.items() if source},
+        }
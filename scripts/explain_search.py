@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+/search 查詢的 EXPLAIN ANALYZE 計畫擷取工具
+
+對完整查詢與四個 UNION ALL 分支 (exact_prefix / similarity / word_similarity / contains)
+分別執行 EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON),可在多個資料量下重複。
+原始計畫存成 JSON,並彙總各分支的執行時間、buffer 命中/讀取、recheck 移除的列數與使用的索引。
+
+用法:
+  # 使用目前資料庫中的資料
+  python3 scripts/explain_search.py
+
+  # 依序產生 1 萬、10 萬筆資料並擷取計畫 (會清空 worlds!)
+  python3 scripts/explain_search.py --volumes 10000 100000
+
+  # 自訂查詢
+  python3 scripts/explain_search.py --queries harry potter xyz
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+
+from db import connect
+from search_sql import (
+    BRANCHES, DEFAULT_QUERIES, apply_search_settings, branch_sql,
+    build_search_sql, explain, set_data_volume, summarize_plan,
+)
+
+TARGETS = ['full'] + list(BRANCHES)
+
+def capture_plans(conn, queries, repeat=1):
+    """對每個查詢擷取完整查詢與各分支的計畫,回傳 [{query, target, run, plan, summary}]"""
+    cur = conn.cursor()
+    apply_search_settings(cur)
+    records = []
+    for query in queries:
+        for target in TARGETS:
+            sql = build_search_sql() if target == 'full' else branch_sql(target)
+            for run in range(repeat):
+                plan = explain(cur, sql, {'q': query})
+                records.append({
+                    'query': query,
+                    'target': target,
+                    'run': run,
+                    'plan': plan,
+                    'summary': summarize_plan(plan),
+                })
+    conn.rollback()
+    cur.close()
+    return records
+
+def aggregate(records):
+    """依 target 彙總 (平均執行時間、buffers、recheck、索引使用次數)"""
+    grouped = defaultdict(list)
+    for record in records:
+        grouped[record['target']].append(record['summary'])
+
+    summary = {}
+    for target in TARGETS:
+        items = grouped.get(target, [])
+        if not items:
+            continue
+        index_usage = defaultdict(int)
+        for item in items:
+            for index in item['indexes']:
+                index_usage[index] += 1
+            for relation in item['seq_scans']:
+                index_usage[f'Seq Scan on {relation}'] += 1
+        summary[target] = {
+            'samples': len(items),
+            'avg_execution_ms': sum(i['execution_ms'] for i in items) / len(items),
+            'max_execution_ms': max(i['execution_ms'] for i in items),
+            'avg_shared_hit': sum(i['shared_hit'] for i in items) / len(items),
+            'avg_shared_read': sum(i['shared_read'] for i in items) / len(items),
+            'avg_rows_removed_by_recheck': sum(i['rows_removed_by_recheck'] for i in items) / len(items),
+            'lossy_runs': sum(1 for i in items if i['lossy_heap_blocks'] > 0),
+            'access_paths': dict(index_usage),
+        }
+    return summary
+
+def print_summary(volume, summary):
+    """顯示單一資料量的彙總表"""
+    print("=" * 100)
+    print(f"資料量: {volume if isinstance(volume, str) else f'{volume:,} 筆'}")
+    print(f"{'分支':<16} {'平均(ms)':>10} {'最大(ms)':>10} {'hit':>10} {'read':>8} {'recheck 移除':>12}  存取路徑")
+    print("-" * 100)
+    for target, item in summary.items():
+        paths = ', '.join(f'{k} x{v}' for k, v in sorted(item['access_paths'].items()))
+        print(f"{target:<16} {item['avg_execution_ms']:>10.2f} {item['max_execution_ms']:>10.2f} "
+              f"{item['avg_shared_hit']:>10.0f} {item['avg_shared_read']:>8.0f} "
+              f"{item['avg_rows_removed_by_recheck']:>12.0f}  {paths}")
+
+def print_slowest_nodes(records, top_n=5):
+    """列出自身時間最長的計畫節點 (協助找出成本集中處)"""
+    nodes = []
+    for record in records:
+        for node in record['summary']['nodes']:
+            nodes.append((node['self_ms'], record['query'], record['target'], node))
+    nodes.sort(key=lambda n: n[0], reverse=True)
+    print(f"\n自身時間最長的 {top_n} 個節點:")
+    for self_ms, query, target, node in nodes[:top_n]:
+        on = node['index'] or node['relation'] or ''
+        print(f"  {self_ms:>8.2f}ms  {target:<16} q={query!r:<14} {node['node_type']} {on} "
+              f"(rows={node['rows']:g}, recheck 移除={node['rows_removed_by_recheck']})")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='擷取 /search 查詢各分支的 EXPLAIN ANALYZE 計畫')
+    parser.add_argument('--volumes', type=int, nargs='+',
+                        help='要測試的資料量 (會清空並重新產生 worlds);未指定則使用目前資料')
+    parser.add_argument('--queries', nargs='+', default=DEFAULT_QUERIES, help='查詢字串 (預設與 k6 腳本相同)')
+    parser.add_argument('--repeat', type=int, default=3, help='每個查詢/分支重複次數 (預設: 3)')
+    parser.add_argument('--output-dir', default=None,
+                        help='輸出目錄 (預設: test-results/explain_<timestamp>)')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    output_dir = args.output_dir or os.path.join('test-results', f"explain_{time.strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    print("=" * 100)
+    print("/search EXPLAIN ANALYZE 計畫擷取")
+    print("=" * 100)
+
+    conn = connect()
+    all_summaries = {}
+    try:
+        for volume in args.volumes or [None]:
+            if volume is not None:
+                print(f"\n🔧 產生 {volume:,} 筆測試資料...", end=' ', flush=True)
+                inserted, elapsed_ms = set_data_volume(conn, volume)
+                print(f"✓ ({inserted:,} 筆, {elapsed_ms:.0f}ms)")
+                label = volume
+            else:
+                cur = conn.cursor()
+                cur.execute('SELECT COUNT(*) FROM worlds')
+                label = cur.fetchone()[0]
+                cur.close()
+                conn.rollback()
+
+            print(f"🔍 擷取 {len(args.queries)} 個查詢 x {len(TARGETS)} 個目標 x {args.repeat} 次...")
+            records = capture_plans(conn, args.queries, args.repeat)
+
+            plan_file = os.path.join(output_dir, f'plans_{label}.json')
+            with open(plan_file, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False, indent=2)
+
+            summary = aggregate(records)
+            all_summaries[label] = summary
+            print_summary(label, summary)
+            print_slowest_nodes(records)
+            print(f"\n✅ 計畫已儲存至: {plan_file}")
+    finally:
+        conn.close()
+
+    summary_file = os.path.join(output_dir, 'summary.json')
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        json.dump(all_summaries, f, ensure_ascii=False, indent=2)
+    print(f"✅ 彙總已儲存至: {summary_file}")
+
+if __name__ == '__main__':
+    main()
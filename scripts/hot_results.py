@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+熱門查詢結果表 (search_hot_results) 的更新與效益量測
+
+少數查詢佔了大部分的搜尋量,每次命中卻都重跑一次四分支 trigram 查詢。本工具:
+
+1. 從查詢記錄 (query_capture.py) 或工作負載 (build_workload.py) 取出依次數 x weight 排名的前 N 個查詢,
+   以 lower(查詢) 合併大小寫 (與 init.sql 的 search_hot_lookup() 相同)
+2. 在單一交易中: LOCK TABLE worlds IN SHARE MODE (等進行中的寫入 commit,更新期間擋住新的寫入)、
+   讀取目前的資料世代、每個查詢執行一次完整的 /search SQL,把排序後的結果 (與 API 回應的 results 相同)
+   寫入 search_hot_results,再刪除其他世代的舊結果,最後 COMMIT —— 新結果一次全部生效
+3. 比較同一批查詢走即時查詢與 search_hot_lookup() 的來回延遲,並以流量比例估算平均省下的時間
+
+worlds 任何 INSERT / UPDATE / DELETE / TRUNCATE 都會由 trigger 遞增資料世代 (dataset_generation_seq),
+舊世代的結果在資料異動 commit 的同時失效,不需要另外清除。
+重新灌資料後執行一次 (seed.py --hot-queries 會自動執行),
+或以 --watch 常駐: 資料世代改變且穩定一個輪詢週期後 (例如 /admin/data/generate 完成) 自動更新。
+
+用法:
+  # 以查詢記錄的前 100 個查詢更新並量測
+  python3 scripts/hot_results.py --queries test-results/query_log_20250115_102300.jsonl --top 100
+
+  # 常駐,每 5 秒檢查一次資料世代
+  python3 scripts/hot_results.py --queries test-results/workload_20250115.jsonl --watch 5
+
+  # 目前的資料世代與快取狀態
+  python3 scripts/hot_results.py --status
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from psycopg2.extras import Json
+
+from db import connect
+from search_sql import apply_search_settings, build_search_sql, load_workload
+
+LOOKUP_SQL = 'SELECT search_hot_lookup(%(q)s)'
+
+UPSERT_SQL = """
+    INSERT INTO search_hot_results (query_key, generation, results, result_count, search_ms)
+    VALUES (lower(%(q)s), %(generation)s, %(results)s, %(count)s, %(search_ms)s)
+    ON CONFLICT (query_key, generation) DO UPDATE
+    SET results = EXCLUDED.results,
+        result_count = EXCLUDED.result_count,
+        search_ms = EXCLUDED.search_ms,
+        refreshed_at = now()
+"""
+
+def current_generation(cur):
+    cur.execute('SELECT last_value FROM dataset_generation_seq')
+    return cur.fetchone()[0]
+
+def cached_generation(cur):
+    """search_hot_results 中最新的世代 (沒有任何結果時為 None)"""
+    cur.execute('SELECT MAX(generation) FROM search_hot_results')
+    return cur.fetchone()[0]
+
+def top_queries(cur, filename, top):
+    """
+    依 (出現次數 x weight) 取前 top 個查詢,回傳 ([{query, key, weight, share}], 前 top 個的流量佔比)
+
+    大小寫不同的查詢以資料庫的 lower() 合併 (與 search_hot_lookup() 相同),保留權重最高的原始寫法。
+    """
+    weights = {}
+    for item in load_workload(filename):
+        if item['query'].strip():
+            weights[item['query']] = weights.get(item['query'], 0.0) + float(item['weight'])
+    if not weights:
+        return [], 0.0
+    queries = list(weights)
+    cur.execute('SELECT q, lower(q) FROM unnest(%s::text[]) AS q', (queries,))
+    groups = {}
+    for query, key in cur.fetchall():
+        group = groups.setdefault(key, {'key': key, 'query': query, 'weight': 0.0, 'best': 0.0})
+        group['weight'] += weights[query]
+        if weights[query] > group['best']:
+            group['query'], group['best'] = query, weights[query]
+    total = sum(weights.values())
+    ranked = sorted(groups.values(), key=lambda group: group['weight'], reverse=True)[:top]
+    hot = [{'query': group['query'], 'key': group['key'], 'weight': group['weight'],
+            'share': group['weight'] / total} for group in ranked]
+    return hot, sum(item['share'] for item in hot)
+
+def format_results(rows):
+    """與 backend 相同的回應格式: 相似度取 3 位小數後由高到低排序 (同分維持 SQL 的 id 順序)"""
+    results = [{
+        'title': title,
+        'description': description or '',
+        'similarity': round(float(sim), 3),
+        'matchType': match_type,
+    } for _, title, description, sim, match_type in rows]
+    results.sort(key=lambda result: result['similarity'], reverse=True)
+    return results
+
+def refresh(conn, hot):
+    """
+    在單一交易中重算所有熱門查詢並換掉舊世代的結果,回傳 (資料世代, [每個查詢的即時查詢 ms])
+
+    SHARE 鎖讓進行中的寫入先 commit、更新期間的新寫入等待,因此讀到的資料世代與查詢看到的資料一致。
+    """
+    sql = build_search_sql()
+    timings = []
+    with conn:
+        cur = conn.cursor()
+        cur.execute('LOCK TABLE worlds IN SHARE MODE')
+        generation = current_generation(cur)
+        apply_search_settings(cur)
+        for item in hot:
+            start = time.perf_counter()
+            cur.execute(sql, {'q': item['query']})
+            rows = cur.fetchall()
+            search_ms = (time.perf_counter() - start) * 1000
+            timings.append(search_ms)
+            results = format_results(rows)
+            cur.execute(UPSERT_SQL, {
+                'q': item['query'],
+                'generation': generation,
+                'results': Json(results),
+                'count': len(results),
+                'search_ms': round(search_ms, 3),
+            })
+        cur.execute('DELETE FROM search_hot_results WHERE generation <> %s', (generation,))
+        cur.close()
+    return generation, timings
+
+def refresh_from_file(filename, top, log=print):
+    """從查詢記錄取熱門查詢並更新 (供 seed.py 在灌完資料後呼叫),回傳 (資料世代, 查詢數, 流量佔比)"""
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        hot, coverage = top_queries(cur, filename, top)
+        conn.rollback()
+        start = time.perf_counter()
+        generation, _ = refresh(conn, hot)
+        log(f"  🔥 search_hot_results: 世代 {generation}, {len(hot)} 個熱門查詢 (佔流量 {coverage:.1%}), "
+            f"{time.perf_counter() - start:.2f}s")
+        return generation, len(hot), coverage
+    finally:
+        conn.close()
+
+def _round_trip_ms(cur, sql, query):
+    start = time.perf_counter()
+    cur.execute(sql, {'q': query})
+    row = cur.fetchall()
+    return (time.perf_counter() - start) * 1000, row
+
+def measure(conn, hot, repeat):
+    """每個熱門查詢交錯量測即時查詢與查表的來回延遲 (中位數),並確認查表命中"""
+    conn.autocommit = True
+    cur = conn.cursor()
+    apply_search_settings(cur)
+    sql = build_search_sql()
+    rows = []
+    for item in hot:
+        live, lookup, hit = [], [], True
+        for _ in range(repeat):
+            live.append(_round_trip_ms(cur, sql, item['query'])[0])
+            elapsed, result = _round_trip_ms(cur, LOOKUP_SQL, item['query'])
+            lookup.append(elapsed)
+            hit = hit and result[0][0] is not None
+        rows.append(dict(item, live_ms=statistics.median(live), lookup_ms=statistics.median(lookup), hit=hit))
+    cur.close()
+    return rows
+
+def print_report(rows, coverage, show=20):
+    print("\n" + "=" * 100)
+    print("熱門查詢: 即時查詢 vs search_hot_lookup() (來回延遲中位數, ms)")
+    print("=" * 100)
+    print(f"{'#':>4} {'查詢':<30} {'流量':>7} {'即時':>10} {'查表':>10} {'加速':>8}  命中")
+    print("-" * 100)
+    for rank, row in enumerate(rows[:show], 1):
+        speedup = row['live_ms'] / row['lookup_ms'] if row['lookup_ms'] > 0 else float('inf')
+        print(f"{rank:>4} {row['query'][:30]:<30} {row['share']:>7.2%} {row['live_ms']:>10.2f}"
+              f" {row['lookup_ms']:>10.2f} {speedup:>7.1f}x  {'✓' if row['hit'] else '✗'}")
+    if len(rows) > show:
+        print(f"     ... 另外 {len(rows) - show} 個查詢 (完整結果見 JSON)")
+
+    weight = sum(row['share'] for row in rows)
+    live = sum(row['share'] * row['live_ms'] for row in rows) / weight
+    lookup = sum(row['share'] * row['lookup_ms'] for row in rows) / weight
+    print(f"\n熱門查詢佔流量 {coverage:.1%},依流量加權的平均延遲: 即時 {live:.2f}ms → 查表 {lookup:.2f}ms")
+    print(f"換算到全部流量,平均每個請求省下約 {(live - lookup) * coverage:.2f}ms (其餘查詢維持即時查詢)")
+    misses = sum(1 for row in rows if not row['hit'])
+    if misses:
+        print(f"⚠️  {misses} 個查詢未命中 (量測期間資料異動?)")
+    return {'coverage': coverage, 'weighted_live_ms': live, 'weighted_lookup_ms': lookup,
+            'saved_ms_per_request': (live - lookup) * coverage, 'misses': misses}
+
+def print_status(cur):
+    generation = current_generation(cur)
+    cur.execute("""
+        SELECT generation, COUNT(*), SUM(result_count), MAX(refreshed_at)
+        FROM search_hot_results GROUP BY generation ORDER BY generation DESC
+    """)
+    rows = cur.fetchall()
+    print(f"目前資料世代: {generation}")
+    if not rows:
+        print("search_hot_results 沒有任何結果")
+    for row_generation, queries, results, refreshed_at in rows:
+        state = '有效' if row_generation == generation else '已失效'
+        print(f"  世代 {row_generation}: {queries} 個查詢, {results} 筆結果, "
+              f"更新於 {refreshed_at:%Y-%m-%d %H:%M:%S} ({state})")
+
+def watch(conn, filename, top, interval):
+    """輪詢資料世代;與快取不同且連續兩次讀到相同值 (寫入已告一段落) 時更新"""
+    conn.autocommit = True
+    cur = conn.cursor()
+    previous = None
+    warned = None
+    print(f"👀 每 {interval:g} 秒檢查資料世代 (Ctrl+C 結束)")
+    while True:
+        generation = current_generation(cur)
+        cached = cached_generation(cur)
+        if generation != cached and generation == previous:
+            hot, coverage = top_queries(cur, filename, top)
+            if hot:
+                conn.autocommit = False
+                start = time.perf_counter()
+                refreshed, _ = refresh(conn, hot)
+                conn.autocommit = True
+                print(f"  🔥 {time.strftime('%H:%M:%S')} 世代 {cached} → {refreshed}: "
+                      f"{len(hot)} 個查詢 (佔流量 {coverage:.1%}), {time.perf_counter() - start:.2f}s", flush=True)
+            elif warned != generation:
+                # 查詢記錄還沒有資料: 更新會清空現有結果,且快取世代不變而每次輪詢都重做
+                print(f"  ⚠️  {time.strftime('%H:%M:%S')} {filename} 沒有可用的查詢,保留現有結果", flush=True)
+                warned = generation
+        previous = generation
+        time.sleep(interval)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='更新熱門查詢結果表 search_hot_results 並量測查表的效益')
+    parser.add_argument('--queries', help='查詢記錄 (query_capture.py) 或工作負載 (build_workload.py)')
+    parser.add_argument('--top', type=int, default=100, help='熱門查詢數 (預設: 100)')
+    parser.add_argument('--repeat', type=int, default=5, help='量測時每個查詢重複次數 (預設: 5)')
+    parser.add_argument('--no-measure', action='store_true', help='只更新,不量測延遲')
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help='常駐,資料世代改變後自動更新')
+    parser.add_argument('--status', action='store_true', help='只顯示資料世代與快取狀態')
+    parser.add_argument('--output', default=None,
+                        help='輸出 JSON (預設: test-results/hot_results_<timestamp>.json)')
+    args = parser.parse_args()
+    if not args.status and not args.queries:
+        parser.error('需要 --queries (或使用 --status)')
+    return args
+
+def main():
+    args = parse_arguments()
+    conn = connect()
+    try:
+        if args.status:
+            print_status(conn.cursor())
+            return
+        if args.watch:
+            try:
+                watch(conn, args.queries, args.top, args.watch)
+            except KeyboardInterrupt:
+                print("\n👋 結束")
+            return
+
+        cur = conn.cursor()
+        hot, coverage = top_queries(cur, args.queries, args.top)
+        conn.rollback()
+        if not hot:
+            print(f"❌ {args.queries} 中沒有任何查詢")
+            return
+        print(f"🔥 {len(hot)} 個熱門查詢,佔流量 {coverage:.1%}")
+        start = time.perf_counter()
+        generation, timings = refresh(conn, hot)
+        print(f"✓ 已寫入資料世代 {generation} 的結果 ({time.perf_counter() - start:.2f}s, "
+              f"單一查詢中位數 {statistics.median(timings):.2f}ms)")
+        if args.no_measure:
+            return
+
+        rows = measure(conn, hot, args.repeat)
+        summary = print_report(rows, coverage)
+        output_file = args.output or os.path.join(
+            'test-results', f"hot_results_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump({'queries_file': args.queries, 'generation': generation, 'top': args.top,
+                       'summary': summary, 'queries': rows}, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 結果已儲存至: {output_file}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
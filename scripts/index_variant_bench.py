@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Trigram 索引變體基準測試: GIN vs GiST (siglen) vs fastupdate 設定
+
+在獨立的暫存表 (worlds_idxbench) 上,對每個資料量依序建立各種 title 索引變體,記錄:
+- 建立時間與磁碟大小
+- 索引存在時的插入吞吐量 (分批 INSERT + COMMIT,再加上清空 GIN pending list 的耗時,測完後刪除並 VACUUM)
+- 目前 /search 查詢完整 SQL 與各分支的延遲 (EXPLAIN ANALYZE 的 Execution Time) 及實際使用的存取路徑
+- GiST 變體另外量測 KNN 查詢 (ORDER BY title <-> q LIMIT 20),GIN 不支援距離排序
+
+worlds 與原有索引不會被修改。暫存表只有 title 索引 (/search 只查 title),
+資料以與 generate_test_data() 相同的 md5 運算式產生,並以 setseed() 固定,讓各資料量可重現。
+
+用法:
+  # 預設 1 萬、10 萬筆,所有變體
+  python3 scripts/index_variant_bench.py
+
+  # 只比較部分變體
+  python3 scripts/index_variant_bench.py --variants gin_default gist_siglen_12 gist_siglen_256
+
+  # 加大插入測試量
+  python3 scripts/index_variant_bench.py --insert-rows 50000 --insert-batch 500
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from db import connect
+from search_sql import (
+    BRANCHES, DEFAULT_QUERIES, apply_search_settings, branch_sql,
+    build_search_sql, explain, summarize_plan,
+)
+
+SCRATCH_TABLE = 'worlds_idxbench'
+SCRATCH_INDEX = 'idx_idxbench_title'
+
+# 索引變體: 名稱 -> CREATE INDEX 的 USING ... [WITH (...)] 子句
+VARIANTS = {
+    'gin_default': 'USING gin (title gin_trgm_ops)',
+    'gin_fastupdate_off': 'USING gin (title gin_trgm_ops) WITH (fastupdate = off)',
+    'gin_pending_64kb': 'USING gin (title gin_trgm_ops) WITH (fastupdate = on, gin_pending_list_limit = 64)',
+    'gin_pending_16mb': 'USING gin (title gin_trgm_ops) WITH (fastupdate = on, gin_pending_list_limit = 16384)',
+    'gist_siglen_12': 'USING gist (title gist_trgm_ops(siglen = 12))',
+    'gist_siglen_64': 'USING gist (title gist_trgm_ops(siglen = 64))',
+    'gist_siglen_256': 'USING gist (title gist_trgm_ops(siglen = 256))',
+}
+
+DEFAULT_VOLUMES = [10000, 100000]
+TARGETS = ['full'] + list(BRANCHES) + ['knn']
+
+# GiST 的 KNN 掃描: 依 trigram 距離 (1 - similarity) 取最近的 20 列
+KNN_SQL = f"""
+    SELECT id, title, similarity(title, %(q)s) AS sim
+    FROM {SCRATCH_TABLE}
+    ORDER BY title <-> %(q)s
+    LIMIT 20
+"""
+
+def is_gin(variant):
+    return VARIANTS[variant].startswith('USING gin')
+
+# 與 generate_test_data() 相同的資料運算式
+FILL_SQL = f"""
+    INSERT INTO {SCRATCH_TABLE} (title, description)
+    SELECT
+        md5(random()::text) AS title,
+        md5(random()::text) || ' ' || md5(random()::text) AS description
+    FROM generate_series(1, %s)
+"""
+
+def create_scratch_table(cur, volume, seed=0.42):
+    """重建暫存表並填入 volume 筆資料 (不含 trigram 索引)"""
+    cur.execute(f'DROP TABLE IF EXISTS {SCRATCH_TABLE}')
+    cur.execute(f"""
+        CREATE TABLE {SCRATCH_TABLE} (
+            id SERIAL PRIMARY KEY,
+            title TEXT NOT NULL,
+            description TEXT
+        )
+    """)
+    cur.execute('SELECT setseed(%s)', (seed,))
+    cur.execute(FILL_SQL, (volume,))
+    cur.execute(f'VACUUM ANALYZE {SCRATCH_TABLE}')
+
+def build_index(cur, variant):
+    """建立索引變體,回傳 (建立耗時 ms, 索引大小 bytes)"""
+    cur.execute(f'DROP INDEX IF EXISTS {SCRATCH_INDEX}')
+    start = time.perf_counter()
+    cur.execute(f'CREATE INDEX {SCRATCH_INDEX} ON {SCRATCH_TABLE} {VARIANTS[variant]}')
+    build_ms = (time.perf_counter() - start) * 1000
+    cur.execute(f'VACUUM ANALYZE {SCRATCH_TABLE}')
+    cur.execute('SELECT pg_relation_size(%s)', (SCRATCH_INDEX,))
+    return build_ms, cur.fetchone()[0]
+
+def measure_inserts(cur, rows, batch, gin=True):
+    """
+    索引存在時分批插入 rows 筆 (每批各自 COMMIT),回傳每秒插入筆數
+
+    fastupdate 開啟時插入先寫入 pending list,pending list 未超過 gin_pending_list_limit 時
+    清空的成本不會出現在任何一批,而是留給之後的 VACUUM。因此插入後以 gin_clean_pending_list()
+    計時清空 (cleanup_ms),rows_per_sec 包含這段時間,rows_per_sec_deferred 則只算 INSERT。
+    同時回報最慢一批的耗時。測完後刪除新增的資料並 VACUUM,不影響後續的搜尋量測。
+    """
+    cur.execute(f'SELECT COALESCE(MAX(id), 0) FROM {SCRATCH_TABLE}')
+    max_id = cur.fetchone()[0]
+    batch_ms = []
+    for offset in range(0, rows, batch):
+        start = time.perf_counter()
+        cur.execute(FILL_SQL, (min(batch, rows - offset),))
+        batch_ms.append((time.perf_counter() - start) * 1000)
+    cleanup_ms = 0.0
+    if gin:
+        start = time.perf_counter()
+        cur.execute('SELECT gin_clean_pending_list(%s::regclass)', (SCRATCH_INDEX,))
+        cleanup_ms = (time.perf_counter() - start) * 1000
+    cur.execute(f'DELETE FROM {SCRATCH_TABLE} WHERE id > %s', (max_id,))
+    cur.execute(f'VACUUM ANALYZE {SCRATCH_TABLE}')
+    insert_s = sum(batch_ms) / 1000
+    total_s = insert_s + cleanup_ms / 1000
+    return {
+        'rows_per_sec': rows / total_s if total_s > 0 else 0.0,
+        'rows_per_sec_deferred': rows / insert_s if insert_s > 0 else 0.0,
+        'cleanup_ms': cleanup_ms,
+        'max_batch_ms': max(batch_ms),
+        'median_batch_ms': statistics.median(batch_ms),
+    }
+
+def target_sql(target):
+    if target == 'full':
+        return build_search_sql(SCRATCH_TABLE)
+    if target == 'knn':
+        return KNN_SQL
+    return branch_sql(target, SCRATCH_TABLE)
+
+def measure_search(cur, queries, repeat, gin=True):
+    """對完整查詢與各分支 (GiST 另含 KNN) 執行 EXPLAIN ANALYZE,回傳 {target: {median_ms, access_paths}}"""
+    apply_search_settings(cur)
+    results = {}
+    for target in TARGETS:
+        if target == 'knn' and gin:
+            continue
+        sql = target_sql(target)
+        timings = []
+        paths = set()
+        for query in queries:
+            for _ in range(repeat):
+                summary = summarize_plan(explain(cur, sql, {'q': query}))
+                timings.append(summary['execution_ms'])
+                paths.update(summary['indexes'])
+                paths.update(f'Seq Scan on {relation}' for relation in summary['seq_scans'])
+        results[target] = {
+            'median_ms': statistics.median(timings),
+            'max_ms': max(timings),
+            'access_paths': sorted(paths),
+        }
+    return results
+
+def print_comparison(rows):
+    """輸出單一比較表 (每列為一個資料量 x 變體)"""
+    print("\n" + "=" * 130)
+    print("索引變體比較 (搜尋延遲為 EXPLAIN ANALYZE 中位數, ms)")
+    print("=" * 130)
+    header = f"{'資料量':>10} {'變體':<20} {'建立(ms)':>10} {'大小':>10} {'插入(筆/s)':>11} {'清空(ms)':>9}"
+    header += ''.join(f' {target[:12]:>12}' for target in TARGETS)
+    print(header)
+    print("-" * 130)
+    for row in rows:
+        line = (f"{row['volume']:>10,} {row['variant']:<20} {row['build_ms']:>10.0f} "
+                f"{row['size_bytes'] / 1024 / 1024:>8.1f}MB {row['insert']['rows_per_sec']:>11.0f} "
+                f"{row['insert']['cleanup_ms']:>9.0f}")
+        for target in TARGETS:
+            item = row['search'].get(target)
+            if item is None:
+                line += f" {'-':>11} "
+                continue
+            marker = '' if SCRATCH_INDEX in item['access_paths'] else '*'
+            line += f" {item['median_ms']:>11.2f}{marker or ' '}"
+        print(line)
+    print("\n插入 = 含清空 GIN pending list 的吞吐量;清空 = gin_clean_pending_list() 耗時;knn 只適用 GiST")
+    print("* = 該分支未使用被測索引 (planner 選了 Seq Scan 或其他路徑)")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='比較 GIN / GiST trigram 索引變體的建立、寫入與搜尋成本')
+    parser.add_argument('--volumes', type=int, nargs='+', default=DEFAULT_VOLUMES,
+                        help='資料量 (預設: 10000 100000)')
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=list(VARIANTS),
+                        help='要測試的索引變體 (預設: 全部)')
+    parser.add_argument('--queries', nargs='+', default=DEFAULT_QUERIES, help='查詢字串 (預設與 k6 腳本相同)')
+    parser.add_argument('--repeat', type=int, default=3, help='每個查詢/分支重複次數 (預設: 3)')
+    parser.add_argument('--insert-rows', type=int, default=10000, help='插入測試筆數 (預設: 10000)')
+    parser.add_argument('--insert-batch', type=int, default=1000, help='每批插入筆數 (預設: 1000)')
+    parser.add_argument('--keep', action='store_true', help='測試結束後保留暫存表')
+    parser.add_argument('--output', default=None,
+                        help='輸出 JSON (預設: test-results/index_variants_<timestamp>.json)')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+
+    print("=" * 130)
+    print("Trigram 索引變體基準測試")
+    print("=" * 130)
+    print(f"資料量: {', '.join(f'{v:,}' for v in args.volumes)}")
+    print(f"變體: {', '.join(args.variants)}")
+
+    conn = connect(autocommit=True)
+    cur = conn.cursor()
+    rows = []
+    try:
+        for volume in args.volumes:
+            print(f"\n🔧 建立暫存表 {SCRATCH_TABLE} ({volume:,} 筆)...", end=' ', flush=True)
+            create_scratch_table(cur, volume)
+            print("✓")
+            for variant in args.variants:
+                print(f"  🏗️  {variant:<20}", end=' ', flush=True)
+                build_ms, size_bytes = build_index(cur, variant)
+                insert = measure_inserts(cur, args.insert_rows, args.insert_batch, is_gin(variant))
+                search = measure_search(cur, args.queries, args.repeat, is_gin(variant))
+                rows.append({
+                    'volume': volume,
+                    'variant': variant,
+                    'definition': VARIANTS[variant],
+                    'build_ms': build_ms,
+                    'size_bytes': size_bytes,
+                    'insert': insert,
+                    'search': search,
+                })
+                knn = f" knn={search['knn']['median_ms']:.2f}ms" if 'knn' in search else ''
+                print(f"build={build_ms:.0f}ms size={size_bytes / 1024 / 1024:.1f}MB "
+                      f"insert={insert['rows_per_sec']:.0f}/s cleanup={insert['cleanup_ms']:.0f}ms "
+                      f"full={search['full']['median_ms']:.2f}ms{knn}")
+    finally:
+        if not args.keep:
+            cur.execute(f'DROP TABLE IF EXISTS {SCRATCH_TABLE}')
+        cur.close()
+        conn.close()
+
+    print_comparison(rows)
+
+    output_file = args.output or os.path.join(
+        'test-results', f"index_variants_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果已儲存至: {output_file}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+開放模型 (open-model) 負載產生器,含 coordinated omission 修正
+
+k6 腳本的場景是封閉模型: 每個 VU 等上一個請求回來 (再 sleep) 才送下一個,
+伺服器變慢時送出的請求也跟著變少,尾端延遲因此被低估 (coordinated omission)。
+本工具依預先排定的到達時間送出 /search 請求,不論前一個請求是否完成:
+
+- constant: 固定到達率 (--rate 每秒請求數,持續 --duration 秒)
+- ramping:  分段線性變化的到達率 (--stages 30s:10,2m:50,30s:0,與 k6 ramping-arrival-rate 相同)
+- --scenario smoke/load/stress/spike: 與 k6 場景對應的 ramping 預設值
+  (k6 的 VU 數除以平均 think time 1.25 秒換算為到達率)
+
+延遲從「排定的送出時間」開始計算,因此用戶端積壓的等待也會計入。
+負載平均分給多個 worker process (每個各自跑 asyncio 事件迴圈與 HTTP/1.1 keep-alive 連線池),
+各 worker 以 HDR 式對數-線性直方圖記錄延遲,最後合併。
+
+輸出為與 k6 --out json 相同的 JSONL (Point 行,含 query / query_class / backend tag 與延遲拆解指標),
+檔名 k6_<資料量>_<timestamp>.json,可直接交給 visualize_k6_results.py 分析。
+開放模型中等待排程 (用戶端積壓) 的時間記在 http_req_blocked。
+
+用法:
+  # 每秒 50 個請求,持續 60 秒,4 個 worker
+  python3 scripts/loadgen.py --rate 50 --duration 60 --workers 4
+
+  # 分段到達率
+  python3 scripts/loadgen.py --stages 30s:10,1m:100,30s:0
+
+  # 與 k6 相同的場景名稱
+  python3 scripts/loadgen.py --scenario stress --base-url http://localhost:3001
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+
+from search_sql import DEFAULT_QUERIES, classify_query, load_workload
+
+# 與 k6 場景對應的到達率 (每秒請求數) 階段: [(秒數, 目標到達率)]
+SCENARIOS = {
+    'smoke': [(0, 1), (30, 1)],
+    'load': [(30, 8), (120, 8), (30, 0)],
+    'stress': [(60, 16), (120, 40), (60, 0)],
+    'spike': [(10, 80), (30, 80), (10, 0)],
+}
+
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+# ============================================================================
+# HDR 式延遲直方圖
+# ============================================================================
+
+class LatencyHistogram:
+    """
+    對數-線性直方圖 (與 HdrHistogram 相同的 bucket 配置),數值以微秒記錄
+
+    每個 2 的次方區間再切成 SUB_BUCKETS / 2 個線性子 bucket,相對誤差約 0.1%。
+    以稀疏 dict 儲存,可以 JSON 傳回主程序並合併。
+    """
+
+    SUB_BUCKET_BITS = 11
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    HALF = SUB_BUCKETS >> 1
+
+    def __init__(self, counts=None):
+        self.counts = {int(k): v for k, v in (counts or {}).items()}
+
+    def _index(self, value):
+        magnitude = max(value.bit_length() - self.SUB_BUCKET_BITS, 0)
+        sub = value >> magnitude
+        if magnitude == 0:
+            return sub
+        return self.SUB_BUCKETS + (magnitude - 1) * self.HALF + (sub - self.HALF)
+
+    def _value(self, index):
+        """bucket 的代表值 (區間中點)"""
+        if index < self.SUB_BUCKETS:
+            return index
+        magnitude = (index - self.SUB_BUCKETS) // self.HALF + 1
+        sub = (index - self.SUB_BUCKETS) % self.HALF + self.HALF
+        return (sub << magnitude) + ((1 << magnitude) - 1) / 2
+
+    def record(self, value_ms):
+        index = self._index(max(int(value_ms * 1000), 0))
+        self.counts[index] = self.counts.get(index, 0) + 1
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def percentile(self, pct):
+        """回傳第 pct 百分位數 (ms)"""
+        total = self.total
+        if total == 0:
+            return None
+        target = max(math.ceil(total * pct / 100), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return self._value(index) / 1000
+        return self._value(max(self.counts)) / 1000
+
+    def to_dict(self):
+        return self.counts
+
+# ============================================================================
+# 排程
+# ============================================================================
+
+def parse_duration(text):
+    """'30s' / '2m' / '500ms' / '90' → 秒"""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)(ms|s|m|h)?', text.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f'無法解析時間: {text}')
+    return float(match.group(1)) * DURATION_UNITS[match.group(2) or 's']
+
+def parse_stages(text):
+    """'30s:10,2m:50' → [(30, 10), (120, 50)]"""
+    stages = []
+    for part in text.split(','):
+        duration, target = part.split(':')
+        stages.append((parse_duration(duration), float(target)))
+    return stages
+
+def arrival_times(stages, start_rate=0.0):
+    """
+    依分段線性到達率計算每個請求的排定時間 (秒,相對於開始)
+
+    每段內到達率從 r0 線性變到 r1,累計請求數 N(t) = r0*t + (r1-r0)*t²/(2D);
+    第 n 個請求的時間為 N(t) = n 的解。持續時間為 0 的段只用來設定之後的起始到達率。
+    """
+    times = []
+    offset = 0.0
+    cumulative = 0.0
+    rate = start_rate
+    for duration, target in stages:
+        if duration <= 0:
+            rate = target
+            continue
+        slope = (target - rate) / duration
+        stage_total = rate * duration + slope * duration ** 2 / 2
+        n = math.floor(cumulative) + 1
+        while n <= cumulative + stage_total + 1e-9:
+            need = n - cumulative
+            if abs(slope) < 1e-12:
+                t = need / rate
+            else:
+                t = (-rate + math.sqrt(max(rate ** 2 + 2 * slope * need, 0))) / slope
+            times.append(offset + min(t, duration))
+            n += 1
+        cumulative += stage_total
+        offset += duration
+        rate = target
+    return times
+
+def build_stages(args):
+    if args.stages:
+        return parse_stages(args.stages)
+    if args.rate is not None:
+        return [(0, args.rate), (args.duration, args.rate)]
+    return SCENARIOS[args.scenario]
+
+# ============================================================================
+# HTTP/1.1 用戶端 (asyncio streams,keep-alive 連線池)
+# ============================================================================
+
+class ConnectionPool:
+    """每個 worker 一個連線池;超過上限的請求等待空閒連線"""
+
+    def __init__(self, host, port, size):
+        self.host = host
+        self.port = port
+        self.idle = []
+        self.slots = asyncio.Semaphore(size)
+
+    async def acquire(self):
+        """回傳 (reader, writer, 建立連線耗時 ms)"""
+        await self.slots.acquire()
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, 0.0
+            writer.close()
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except BaseException:
+            # 包含 CancelledError (wait_for 逾時取消): 沒歸還名額會讓連線池永久少一個位置
+            self.slots.release()
+            raise
+        return reader, writer, (time.perf_counter() - start) * 1000
+
+    def release(self, reader, writer, reusable):
+        if reusable:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+        self.slots.release()
+
+async def _read_body(reader, headers):
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+            if size == 0:
+                await reader.readline()
+                return b''.join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+    length = int(headers.get('content-length', 0))
+    return await reader.readexactly(length) if length else b''
+
+async def http_get(pool, host_header, path):
+    """送出 GET,回傳 (status, body, timings {blocked, connecting, sending, waiting, receiving}) 或拋出例外"""
+    acquire_start = time.perf_counter()
+    reader, writer, connecting = await pool.acquire()
+    blocked = (time.perf_counter() - acquire_start) * 1000 - connecting
+    reusable = False
+    try:
+        t0 = time.perf_counter()
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {host_header}\r\nConnection: keep-alive\r\n\r\n'.encode())
+        await writer.drain()
+        t1 = time.perf_counter()
+        status_line = await reader.readline()
+        t2 = time.perf_counter()
+        if not status_line:
+            raise ConnectionError('連線被關閉')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        body = await _read_body(reader, headers)
+        t3 = time.perf_counter()
+        reusable = headers.get('connection', '').lower() != 'close'
+        return status, body, {
+            'blocked': blocked,
+            'connecting': connecting,
+            'sending': (t1 - t0) * 1000,
+            'waiting': (t2 - t1) * 1000,
+            'receiving': (t3 - t2) * 1000,
+        }
+    finally:
+        pool.release(reader, writer, reusable)
+
+# ============================================================================
+# Worker
+# ============================================================================
+
+def _rfc3339(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+def _point(metric, value, epoch, tags):
+    return json.dumps({'type': 'Point', 'metric': metric,
+                       'data': {'time': _rfc3339(epoch), 'value': value, 'tags': tags}})
+
+async def _worker_main(worker_id, schedule, start_epoch, config, part_file):
+    parsed = urllib.parse.urlsplit(config['base_url'])
+    host = parsed.hostname
+    port = parsed.port or 80
+    host_header = parsed.netloc
+    pool = ConnectionPool(host, port, config['connections'])
+    rng = random.Random(config['seed'] + worker_id)
+    corrected = LatencyHistogram()
+    service = LatencyHistogram()
+    counters = {'requests': 0, 'errors': 0}
+
+    out = open(part_file, 'w', encoding='utf-8')
+
+    items = config['workload']
+    cum_weights = list(itertools.accumulate(item['weight'] for item in items))
+
+    async def one_request(scheduled_offset):
+        item = rng.choices(items, cum_weights=cum_weights)[0]
+        query = item['query']
+        scheduled = start_epoch + scheduled_offset
+        tags = {
+            'name': 'search',
+            'query': query,
+            'query_class': classify_query(query),
+            'backend': config['backend'],
+            'group': '',
+            'scenario': config['scenario'],
+            'method': 'GET',
+        }
+        if 'kind' in item:
+            tags['query_kind'] = item['kind']
+        send_epoch = time.time()
+        search_ms = None
+        failed = True
+        try:
+            status, body, timings = await asyncio.wait_for(
+                http_get(pool, host_header, f"/search?q={urllib.parse.quote(query)}"), config['timeout'])
+            tags['status'] = str(status)
+            failed = status != 200
+            if not failed:
+                meta = json.loads(body).get('meta') or {}
+                if isinstance(meta.get('queryTimeMs'), (int, float)):
+                    search_ms = meta['queryTimeMs']
+        except (asyncio.TimeoutError, OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            tags['status'] = '0'
+            timings = {'blocked': 0.0, 'connecting': 0.0, 'sending': 0.0, 'waiting': 0.0, 'receiving': 0.0}
+        end_epoch = time.time()
+
+        total_ms = (end_epoch - scheduled) * 1000
+        lag_ms = max((send_epoch - scheduled) * 1000, 0.0)
+        corrected.record(total_ms)
+        service.record((end_epoch - send_epoch) * 1000)
+        counters['requests'] += 1
+        counters['errors'] += int(failed)
+
+        lines = [
+            _point('http_reqs', 1, end_epoch, tags),
+            _point('http_req_duration', total_ms, end_epoch, tags),
+            _point('http_req_blocked', lag_ms + timings['blocked'], end_epoch, tags),
+            _point('http_req_connecting', timings['connecting'], end_epoch, tags),
+            _point('http_req_tls_handshaking', 0.0, end_epoch, tags),
+            _point('http_req_sending', timings['sending'], end_epoch, tags),
+            _point('http_req_waiting', timings['waiting'], end_epoch, tags),
+            _point('http_req_receiving', timings['receiving'], end_epoch, tags),
+            _point('http_req_failed', int(failed), end_epoch, tags),
+            _point('errors', int(failed), end_epoch, tags),
+        ]
+        if search_ms is not None:
+            network_ms = lag_ms + sum(timings[name] for name in ('blocked', 'connecting', 'sending', 'receiving'))
+            lines += [
+                _point('search_duration', search_ms, end_epoch, tags),
+                _point('backend_overhead', max(timings['waiting'] - search_ms, 0.0), end_epoch, tags),
+                _point('network_time', network_ms, end_epoch, tags),
+            ]
+        out.write('\n'.join(lines) + '\n')
+
+    tasks = []
+    try:
+        for _, offset in schedule:
+            delay = start_epoch + offset - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(one_request(offset)))
+        await asyncio.gather(*tasks)
+    finally:
+        out.close()
+    return {'corrected': corrected.to_dict(), 'service': service.to_dict(), **counters}
+
+def run_worker(worker_id, schedule, start_epoch, config, part_file):
+    """multiprocessing 的進入點 (每個 process 一個事件迴圈)"""
+    return asyncio.run(_worker_main(worker_id, schedule, start_epoch, config, part_file))
+
+# ============================================================================
+# 主程式
+# ============================================================================
+
+def fetch_record_count(base_url):
+    """從 /health 取得目前資料筆數 (與 k6 setup() 相同)"""
+    with urllib.request.urlopen(f'{base_url}/health', timeout=10) as response:
+        return json.loads(response.read()).get('records')
+
+def print_summary(result, elapsed):
+    corrected = LatencyHistogram(result['corrected'])
+    service = LatencyHistogram(result['service'])
+    print("\n" + "=" * 80)
+    print("負載測試結果")
+    print("=" * 80)
+    print(f"請求數: {result['requests']:,}  錯誤: {result['errors']:,}  "
+          f"實際到達率: {result['requests'] / elapsed:.1f} req/s")
+    print(f"\n{'百分位':<10} {'修正後 (自排定時間)':>20} {'服務時間 (自實際送出)':>22}")
+    for pct in (50, 90, 95, 99, 99.9, 100):
+        print(f"{f'p{pct:g}':<10} {corrected.percentile(pct):>18.2f}ms {service.percentile(pct):>20.2f}ms")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='開放模型 /search 負載產生器 (輸出 k6 相容 JSON)')
+    parser.add_argument('--base-url', default=os.environ.get('BASE_URL', 'http://[::1]:3000'),
+                        help='backend 位址 (預設: BASE_URL 環境變數或 http://[::1]:3000)')
+    parser.add_argument('--backend', default=os.environ.get('BACKEND'),
+                        help='backend 名稱 tag (預設依 port 判斷: 3001 → go,其餘 → node)')
+    profile = parser.add_mutually_exclusive_group()
+    profile.add_argument('--rate', type=float, help='固定到達率 (每秒請求數)')
+    profile.add_argument('--stages', help='分段到達率,例如 30s:10,2m:50,30s:0')
+    profile.add_argument('--scenario', choices=list(SCENARIOS), default=os.environ.get('SCENARIO', 'load'),
+                         help='與 k6 場景對應的預設到達率 (預設: load)')
+    parser.add_argument('--duration', type=parse_duration, default=60.0, help='--rate 的持續時間 (預設: 60s)')
+    parser.add_argument('--workers', type=int, default=max(os.cpu_count() or 1, 1),
+                        help='worker process 數 (預設: CPU 核心數)')
+    parser.add_argument('--connections', type=int, default=64, help='每個 worker 的最大連線數 (預設: 64)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='單一請求逾時秒數 (預設: 30)')
+    parser.add_argument('--queries-file', '--workload', dest='queries_file',
+                        help='build_workload.py 產生的工作負載 (依 weight 抽樣) 或每行一個查詢的檔案')
+    parser.add_argument('--seed', type=int, default=42, help='查詢抽樣的亂數種子')
+    parser.add_argument('--output', default=None,
+                        help='輸出 JSON (預設: test-results/k6_<資料量>_<timestamp>.json)')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    base_url = args.base_url.rstrip('/')
+    backend = args.backend or ('go' if ':3001' in base_url else 'node')
+    stages = build_stages(args)
+    scenario = args.scenario if args.rate is None and not args.stages else 'open_model'
+    times = arrival_times(stages)
+    if not times:
+        print("❌ 排程沒有任何請求 (到達率為 0?)")
+        return
+
+    records = fetch_record_count(base_url)
+    output_file = args.output or os.path.join(
+        'test-results', f"k6_{records}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+
+    print("=" * 80)
+    print("開放模型負載產生器")
+    print("=" * 80)
+    print(f"📍 目標: {base_url} ({backend}), 資料筆數: {records}")
+    print(f"📊 階段: {', '.join(f'{d:g}s→{r:g}/s' for d, r in stages)} ({len(times):,} 個請求, {times[-1]:.0f}s)")
+    print(f"⚙️  {args.workers} 個 worker, 每個最多 {args.connections} 條連線")
+
+    config = {
+        'base_url': base_url,
+        'backend': backend,
+        'scenario': scenario,
+        'workload': (load_workload(args.queries_file) if args.queries_file
+                     else [{'query': query, 'weight': 1.0} for query in DEFAULT_QUERIES]),
+        'connections': args.connections,
+        'timeout': args.timeout,
+        'seed': args.seed,
+    }
+    # 交錯分配: 第 i 個請求給 worker i % N,每個 worker 的到達率都是總量的 1/N
+    schedules = [[(i, t) for i, t in enumerate(times) if i % args.workers == w] for w in range(args.workers)]
+    part_dir = tempfile.mkdtemp(prefix='loadgen_')
+    part_files = [os.path.join(part_dir, f'worker_{w}.jsonl') for w in range(args.workers)]
+    start_epoch = time.time() + 1.0  # 給 worker 啟動的時間
+
+    try:
+        with multiprocessing.Pool(args.workers) as pool:
+            results = pool.starmap(run_worker, [
+                (w, schedules[w], start_epoch, config, part_files[w]) for w in range(args.workers)
+            ])
+        elapsed = time.time() - start_epoch
+
+        merged = {'corrected': LatencyHistogram(), 'service': LatencyHistogram(), 'requests': 0, 'errors': 0}
+        for result in results:
+            merged['corrected'].merge(LatencyHistogram(result['corrected']))
+            merged['service'].merge(LatencyHistogram(result['service']))
+            merged['requests'] += result['requests']
+            merged['errors'] += result['errors']
+        merged['corrected'] = merged['corrected'].to_dict()
+        merged['service'] = merged['service'].to_dict()
+
+        with open(output_file, 'w', encoding='utf-8') as out:
+            for part_file in part_files:
+                with open(part_file, 'r', encoding='utf-8') as part:
+                    shutil.copyfileobj(part, out)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+    print_summary(merged, elapsed)
+    print(f"\n✅ 結果已儲存至: {output_file}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,565 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+seed.py 上游 API 的本機模擬伺服器 (完全離線的資料匯入基準測試)
+
+seed.py 的爬蟲只能連到真實的 Wikipedia / ArXiv / Google Books / Quotable / UselessFacts /
+ZenQuotes / OpenLibrary,網路延遲與對方的限流每次都不同,匯入效能無法重現。
+本工具以 asyncio 實作一個 HTTP/1.1 伺服器,依請求參數產生與各 API 相同格式的回應:
+
+  /wikipedia/wiki/List_of_best-selling_books   HTML 清單頁 (wikitable)
+  /wikipedia/w/api.php                         list=random / titles= / pageids= (prop=extracts)
+  /arxiv/api/query                             Atom XML
+  /google_books/books/v1/volumes               volumes JSON
+  /quotable/random                             單一名言 JSON
+  /facts/random.json                           單一冷知識 JSON
+  /zenquotes/api/random                        [{"q", "a", "h"}]
+  /openlibrary/search.json                     docs JSON
+  /_stats                                      各來源的請求數與狀態碼統計
+
+相同的請求 (例如同一個 category + start) 永遠回傳相同內容;random 類端點從大小為 --corpus-size
+的語料中以 --seed 決定的順序抽樣,因此會像真實 API 一樣出現重複資料。
+
+可設定 (皆可用 來源=值 指定單一來源,不加來源則套用到全部):
+- --latency:    延遲分佈 fixed:20 / uniform:10:80 / normal:50:10 / lognormal:40:0.6 / exp:30 (毫秒)
+- --rate-limit: token bucket 限流,超過時回 429 + Retry-After,例如 zenquotes=5/30s
+- --error-rate: 隨機回 500 / 502 / 503 的比例
+- --reset-rate: 不回應直接關閉連線的比例
+- --junk-rate:  回傳會被 seed.py 過濾掉的資料 (過短的摘要、消歧義頁) 的比例
+
+用法:
+  # 啟動 (預設 127.0.0.1:8765,無延遲)
+  python3 scripts/mock_upstream.py
+
+  # 模擬真實網路: 對數常態延遲、ZenQuotes 限流、1% 錯誤
+  python3 scripts/mock_upstream.py --latency lognormal:80:0.5 --latency arxiv=lognormal:400:0.4 \\
+      --rate-limit zenquotes=5/30s --error-rate 0.01
+
+  # seed.py 指向模擬伺服器 (離線,禮貌性等待預設關閉)
+  python3 scripts/seed.py --mock-upstream http://127.0.0.1:8765 --wikipedia 100000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import signal
+import time
+import urllib.parse
+from collections import defaultdict
+from xml.sax.saxutils import escape
+
+SOURCES = ('wikipedia', 'arxiv', 'google_books', 'quotable', 'facts', 'zenquotes', 'openlibrary')
+
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 429: 'Too Many Requests',
+    500: 'Internal Server Error', 502: 'Bad Gateway', 503: 'Service Unavailable',
+}
+
+# ============================================================================
+# 假資料產生
+# ============================================================================
+
+ADJECTIVES = (
+    'silent', 'hidden', 'quantum', 'broken', 'golden', 'endless', 'fragile', 'northern', 'secret',
+    'distant', 'ancient', 'electric', 'hollow', 'crimson', 'restless', 'invisible', 'stochastic',
+    'sparse', 'adaptive', 'recursive', 'emergent', 'latent', 'robust', 'nonlinear', 'wandering',
+    'forgotten', 'burning', 'gentle', 'bitter', 'luminous', 'frozen', 'scattered', 'curious',
+)
+NOUNS = (
+    'river', 'garden', 'empire', 'lattice', 'network', 'mirror', 'harbor', 'kingdom', 'signal',
+    'archive', 'engine', 'forest', 'machine', 'theorem', 'island', 'frontier', 'symphony', 'cipher',
+    'galaxy', 'manifold', 'protocol', 'lantern', 'compass', 'citadel', 'horizon', 'orchard', 'tide',
+    'graph', 'model', 'memory', 'shadow', 'voyage', 'atlas', 'spectrum', 'paradox', 'tensor',
+)
+FIELDS = (
+    'learning', 'optimization', 'inference', 'topology', 'thermodynamics', 'genomics', 'economics',
+    'linguistics', 'cosmology', 'cryptography', 'robotics', 'ecology', 'philosophy', 'history',
+    'neuroscience', 'algebra', 'architecture', 'music', 'medicine', 'navigation', 'poetry',
+)
+PLACES = (
+    'Avalon', 'Kyoto', 'Lisbon', 'Patagonia', 'Samarkand', 'Zanzibar', 'Reykjavik', 'Tangier',
+    'Valparaiso', 'Ithaca', 'Carthage', 'Byzantium', 'Timbuktu', 'Andalusia', 'Manchuria', 'Yukon',
+)
+FIRST_NAMES = (
+    'Ada', 'Alan', 'Grace', 'Marie', 'Nikola', 'Emmy', 'Leo', 'Mira', 'Hugo', 'Iris', 'Omar',
+    'Sofia', 'Tomas', 'Yuki', 'Chen', 'Priya', 'Lars', 'Amara', 'Elena', 'Kofi', 'Noor', 'Ravi',
+)
+LAST_NAMES = (
+    'Lovelace', 'Turing', 'Hopper', 'Curie', 'Tesla', 'Noether', 'Tolstoy', 'Okafor', 'Nakamura',
+    'Lindqvist', 'Haddad', 'Moreau', 'Kowalski', 'Fernandes', 'Wei', 'Sharma', 'Mensah', 'Petrov',
+)
+VERBS = (
+    'explores', 'reveals', 'describes', 'examines', 'follows', 'reconstructs', 'questions',
+    'traces', 'challenges', 'illuminates', 'measures', 'predicts', 'connects', 'transforms',
+)
+
+def _rng(seed, *key):
+    """由 (seed, key...) 決定的亂數產生器,相同的 key 永遠產生相同內容"""
+    digest = hashlib.blake2b(':'.join(map(str, (seed,) + key)).encode(), digest_size=8).digest()
+    return random.Random(int.from_bytes(digest, 'big'))
+
+def _base_title(rng):
+    pattern = rng.randrange(5)
+    adj, noun = rng.choice(ADJECTIVES).title(), rng.choice(NOUNS).title()
+    if pattern == 0:
+        return f"The {adj} {noun} of {rng.choice(PLACES)}"
+    if pattern == 1:
+        return f"{adj} {noun}s: {rng.choice(ADJECTIVES).title()} {rng.choice(FIELDS).title()}"
+    if pattern == 2:
+        return f"{rng.choice(FIELDS).title()} and the {adj} {noun}"
+    if pattern == 3:
+        return f"{adj} {rng.choice(FIELDS).title()} for {rng.choice(ADJECTIVES).title()} {noun}s"
+    return f"A {adj} {noun} in {rng.choice(PLACES)}"
+
+def fake_title(rng):
+    """大多數 title 加上副標題,100k 筆以上時重複率仍只有幾個百分點"""
+    title = _base_title(rng)
+    if ':' not in title and rng.random() < 0.7:
+        title += f": {rng.choice(('A', 'The', 'On'))} {rng.choice(ADJECTIVES).title()} {rng.choice(FIELDS).title()} of {rng.choice(NOUNS).title()}s"
+    return title
+
+def fake_author(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+def fake_sentence(rng):
+    return (f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice(VERBS)} "
+            f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}s in {rng.choice(FIELDS)}"
+            f"{' near ' + rng.choice(PLACES) if rng.random() < 0.3 else ''}.")
+
+def fake_paragraph(rng, sentences):
+    return ' '.join(fake_sentence(rng) for _ in range(sentences))
+
+def fake_text(rng, sentences, junk_rate, title=''):
+    """大多數為正常段落;junk_rate 比例回傳 seed.py 會過濾掉的短文或消歧義頁"""
+    if rng.random() < junk_rate:
+        return f"{title} may refer to:" if title and rng.random() < 0.5 else fake_sentence(rng)[:30]
+    return fake_paragraph(rng, sentences)
+
+# ============================================================================
+# 各 API 的回應
+# ============================================================================
+
+def _int_param(params, name, default, low=0, high=None):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        value = default
+    value = max(value, low)
+    return min(value, high) if high is not None else value
+
+def _json(payload):
+    return 200, 'application/json; charset=utf-8', json.dumps(payload).encode()
+
+def _wikipedia_page(ctx, page_id, title=None):
+    rng = _rng(ctx.seed, 'wikipedia', page_id)
+    title = title or fake_title(rng)
+    return {'pageid': page_id, 'ns': 0, 'title': title,
+            'extract': fake_text(rng, rng.randint(2, 5), ctx.junk_rate['wikipedia'], title)}
+
+def render_wikipedia(ctx, path, params):
+    if path.startswith('/wiki/'):
+        rng = _rng(ctx.seed, 'bestsellers')
+        rows = []
+        for table in range(3):
+            cells = ''.join(
+                f'<tr><td><i><a href="/wiki/Book_{table}_{i}">{escape(fake_title(rng))}</a></i></td>'
+                f'<td>{fake_author(rng)}</td><td>English</td><td>{rng.randint(1850, 2020)}</td></tr>'
+                for i in range(30))
+            rows.append('<table class="wikitable sortable"><tr><th>Book</th><th>Author(s)</th>'
+                        f'<th>Original language</th><th>First published</th></tr>{cells}</table>')
+        html = (f'<!DOCTYPE html><html><head><title>List of best-selling books</title></head>'
+                f'<body>{"".join(rows)}</body></html>')
+        return 200, 'text/html; charset=UTF-8', html.encode()
+    if path != '/w/api.php':
+        return 404, 'text/plain', b'not found'
+
+    if params.get('list') == 'random':
+        limit = _int_param(params, 'rnlimit', 1, 1, 500)
+        rng = ctx.stream_rng('wikipedia')
+        ids = [rng.randrange(ctx.corpus_size['wikipedia']) + 1 for _ in range(limit)]
+        random_pages = [{'id': page_id, 'ns': 0, 'title': _wikipedia_page(ctx, page_id)['title']} for page_id in ids]
+        return _json({'batchcomplete': '', 'continue': {'rncontinue': f'0.{rng.randrange(10**9)}|0', 'continue': '-||'},
+                      'query': {'random': random_pages}})
+
+    pages = {}
+    if params.get('pageids'):
+        for page_id in params['pageids'].split('|')[:50]:
+            if page_id.isdigit():
+                pages[page_id] = _wikipedia_page(ctx, int(page_id))
+    elif params.get('titles'):
+        for title in params['titles'].split('|')[:50]:
+            page_id = int.from_bytes(hashlib.blake2b(title.encode(), digest_size=4).digest(), 'big')
+            pages[str(page_id)] = _wikipedia_page(ctx, page_id, title)
+    return _json({'batchcomplete': '', 'query': {'pages': pages}})
+
+def render_arxiv(ctx, path, params):
+    if path != '/api/query':
+        return 404, 'text/plain', b'not found'
+    category = params.get('search_query', 'all').removeprefix('cat:')
+    start = _int_param(params, 'start', 0)
+    max_results = _int_param(params, 'max_results', 10, 0, 2000)
+    total = ctx.corpus_size['arxiv']
+    entries = []
+    for index in range(start, min(start + max_results, total)):
+        rng = _rng(ctx.seed, 'arxiv', category, index)
+        title = fake_title(rng)
+        # 與真實 ArXiv 相同: title / summary 內含換行與縮排
+        summary = fake_text(rng, rng.randint(4, 8), ctx.junk_rate['arxiv'])
+        summary = '\n  '.join(re.findall(r'.{1,70}(?:\s|$)', summary))
+        authors = ''.join(f'<author><name>{fake_author(rng)}</name></author>' for _ in range(rng.randint(1, 4)))
+        entries.append(
+            f'<entry><id>http://arxiv.org/abs/{2000 + index % 25}{index:05d}v1</id>'
+            f'<published>2024-01-01T00:00:00Z</published>'
+            f'<title>{escape(title)}</title><summary>  {escape(summary)}\n</summary>{authors}'
+            f'<category term="{escape(category)}" scheme="http://arxiv.org/schemas/atom"/></entry>')
+    xml = ('<?xml version="1.0" encoding="UTF-8"?>'
+           '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+           f'<title type="html">ArXiv Query: search_query=cat:{escape(category)}</title>'
+           f'<opensearch:totalResults>{total}</opensearch:totalResults>'
+           f'<opensearch:startIndex>{start}</opensearch:startIndex>'
+           f'<opensearch:itemsPerPage>{max_results}</opensearch:itemsPerPage>{"".join(entries)}</feed>')
+    return 200, 'application/atom+xml; charset=utf-8', xml.encode()
+
+def render_google_books(ctx, path, params):
+    if path != '/books/v1/volumes':
+        return 404, 'text/plain', b'not found'
+    query = params.get('q', '')
+    start = _int_param(params, 'startIndex', 0)
+    max_results = _int_param(params, 'maxResults', 10, 1, 40)
+    total = ctx.corpus_size['google_books']
+    items = []
+    for index in range(start, min(start + max_results, total)):
+        rng = _rng(ctx.seed, 'google_books', query, index)
+        info = {'title': fake_title(rng), 'authors': [fake_author(rng)],
+                'publishedDate': str(rng.randint(1900, 2024)), 'language': 'en',
+                'pageCount': rng.randint(80, 900)}
+        # 真實 API 有不少書沒有 description
+        if rng.random() > ctx.junk_rate['google_books']:
+            info['description'] = fake_paragraph(rng, rng.randint(2, 6))
+        items.append({'kind': 'books#volume', 'id': f'{rng.getrandbits(48):012x}', 'volumeInfo': info})
+    payload = {'kind': 'books#volumes', 'totalItems': total}
+    if items:
+        payload['items'] = items
+    return _json(payload)
+
+def render_quotable(ctx, path, params):
+    if path != '/random':
+        return 404, 'text/plain', b'not found'
+    index = ctx.stream_rng('quotable').randrange(ctx.corpus_size['quotable'])
+    rng = _rng(ctx.seed, 'quotable', index)
+    author = fake_author(rng)
+    content = fake_text(rng, rng.randint(1, 2), ctx.junk_rate['quotable'])
+    return _json({'_id': f'{index:012x}', 'content': content, 'author': author,
+                  'tags': [rng.choice(FIELDS)], 'authorSlug': author.lower().replace(' ', '-'),
+                  'length': len(content), 'dateAdded': '2023-04-14', 'dateModified': '2023-04-14'})
+
+def render_facts(ctx, path, params):
+    if path != '/random.json':
+        return 404, 'text/plain', b'not found'
+    index = ctx.stream_rng('facts').randrange(ctx.corpus_size['facts'])
+    rng = _rng(ctx.seed, 'facts', index)
+    fact_id = f'{index:032x}'
+    return _json({'id': fact_id, 'text': fake_text(rng, rng.randint(1, 2), ctx.junk_rate['facts']),
+                  'source': 'djtech.net', 'source_url': 'http://www.djtech.net/humor/useless_facts.htm',
+                  'language': params.get('language', 'en'),
+                  'permalink': f'https://uselessfacts.jsph.pl/api/v2/facts/{fact_id}'})
+
+def render_zenquotes(ctx, path, params):
+    if path != '/api/random':
+        return 404, 'text/plain', b'not found'
+    index = ctx.stream_rng('zenquotes').randrange(ctx.corpus_size['zenquotes'])
+    rng = _rng(ctx.seed, 'zenquotes', index)
+    quote, author = fake_text(rng, 1, ctx.junk_rate['zenquotes']), fake_author(rng)
+    return _json([{'q': quote, 'a': author,
+                   'h': f'<blockquote>&ldquo;{escape(quote)}&rdquo; &mdash; <footer>{author}</footer></blockquote>'}])
+
+def render_openlibrary(ctx, path, params):
+    if path != '/search.json':
+        return 404, 'text/plain', b'not found'
+    key = '|'.join(f'{name}={params[name]}' for name in ('q', 'author', 'publish_year') if name in params)
+    offset = _int_param(params, 'offset', 0)
+    limit = _int_param(params, 'limit', 100, 1, 1000)
+    total = ctx.corpus_size['openlibrary']
+    docs = []
+    for index in range(offset, min(offset + limit, total)):
+        rng = _rng(ctx.seed, 'openlibrary', key, index)
+        doc = {'key': f'/works/OL{rng.randrange(10**7)}W', 'title': fake_title(rng),
+               'author_name': [fake_author(rng) for _ in range(rng.randint(1, 3))],
+               'first_publish_year': rng.randint(1850, 2024)}
+        if rng.random() < 0.3:
+            doc['first_sentence'] = [fake_sentence(rng)]
+        docs.append(doc)
+    return _json({'numFound': total, 'start': offset, 'numFoundExact': True, 'docs': docs})
+
+RENDERERS = {
+    'wikipedia': render_wikipedia,
+    'arxiv': render_arxiv,
+    'google_books': render_google_books,
+    'quotable': render_quotable,
+    'facts': render_facts,
+    'zenquotes': render_zenquotes,
+    'openlibrary': render_openlibrary,
+}
+
+# ============================================================================
+# 延遲、限流、錯誤注入
+# ============================================================================
+
+def parse_latency(text):
+    """'lognormal:40:0.6' → 回傳 rng → 秒 的函數 (參數單位為毫秒)"""
+    kind, *args = text.split(':')
+    try:
+        args = [float(a) for a in args]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'無法解析延遲: {text}')
+    distributions = {
+        'none': (0, lambda rng: 0.0),
+        'fixed': (1, lambda rng: args[0]),
+        'uniform': (2, lambda rng: rng.uniform(args[0], args[1])),
+        'normal': (2, lambda rng: max(rng.gauss(args[0], args[1]), 0.0)),
+        'lognormal': (2, lambda rng: args[0] * math.exp(rng.gauss(0, args[1]))),
+        'exp': (1, lambda rng: rng.expovariate(1 / args[0]) if args[0] > 0 else 0.0),
+    }
+    if kind not in distributions or len(args) != distributions[kind][0]:
+        raise argparse.ArgumentTypeError(
+            f'無法解析延遲: {text} (可用: none, fixed:MS, uniform:LO:HI, normal:MEAN:SD, lognormal:MEDIAN:SIGMA, exp:MEAN)')
+    sample = distributions[kind][1]
+    return lambda rng: sample(rng) / 1000
+
+def parse_rate_limit(text):
+    """'5/30s' → (5 個請求, 30 秒)"""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)/(\d+(?:\.\d+)?)?(ms|s|m|h)', text.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f'無法解析限流: {text} (例如 5/30s, 100/s)')
+    return float(match.group(1)), float(match.group(2) or 1) * DURATION_UNITS[match.group(3)]
+
+def per_source(parse_value):
+    """'zenquotes=5/30s' → ('zenquotes', 值); 不指定來源時為 (None, 值),套用到全部來源"""
+    def parse(text):
+        name, sep, value = text.partition('=')
+        if not sep:
+            return None, parse_value(text)
+        if name not in SOURCES:
+            raise argparse.ArgumentTypeError(f'未知的來源: {name} (可用: {", ".join(SOURCES)})')
+        return name, parse_value(value)
+    return parse
+
+def resolve_per_source(values, default):
+    """先套用不指定來源的值,再以指定來源的值覆蓋"""
+    resolved = dict.fromkeys(SOURCES, default)
+    for name, value in sorted(values or [], key=lambda item: item[0] is not None):
+        if name is None:
+            resolved = dict.fromkeys(SOURCES, value)
+        else:
+            resolved[name] = value
+    return resolved
+
+class TokenBucket:
+    """容量 N、每 period 秒補滿 N 個 token;取不到時回傳需要等待的秒數"""
+
+    def __init__(self, requests, period):
+        self.capacity = requests
+        self.refill_rate = requests / period
+        self.tokens = requests
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.refill_rate
+
+class MockContext:
+    """伺服器設定與執行期狀態 (單一事件迴圈,不需要鎖)"""
+
+    def __init__(self, args):
+        self.seed = args.seed
+        self.latency = resolve_per_source(args.latency, parse_latency('none'))
+        self.error_rate = resolve_per_source(args.error_rate, 0.0)
+        self.reset_rate = resolve_per_source(args.reset_rate, 0.0)
+        self.junk_rate = resolve_per_source(args.junk_rate, 0.05)
+        self.corpus_size = resolve_per_source(args.corpus_size, 1_000_000)
+        limits = resolve_per_source(args.rate_limit, None)
+        self.buckets = {name: TokenBucket(*limit) for name, limit in limits.items() if limit}
+        self.rng = random.Random(args.seed)
+        self.streams = {}
+        self.stats = defaultdict(lambda: defaultdict(int))
+        self.started = time.time()
+
+    def stream_rng(self, source):
+        """random 類端點的抽樣序列: 以請求順序決定,同樣的請求順序得到同樣的資料"""
+        if source not in self.streams:
+            self.streams[source] = _rng(self.seed, 'stream', source)
+        return self.streams[source]
+
+    def stats_payload(self):
+        elapsed = time.time() - self.started
+        return {
+            'uptime_s': round(elapsed, 1),
+            'sources': {
+                source: {'requests': sum(counts.values()),
+                         'rps': round(sum(counts.values()) / elapsed, 1) if elapsed else 0,
+                         'status': {str(k): v for k, v in sorted(counts.items()) if isinstance(k, int)},
+                         'resets': counts.get('reset', 0)}
+                for source, counts in sorted(self.stats.items())
+            },
+        }
+
+# ============================================================================
+# HTTP 伺服器
+# ============================================================================
+
+def _response(status, content_type, body, keep_alive, extra_headers=()):
+    headers = [f'HTTP/1.1 {status} {REASONS.get(status, "")}',
+               f'Content-Type: {content_type}',
+               f'Content-Length: {len(body)}',
+               f'Connection: {"keep-alive" if keep_alive else "close"}',
+               *extra_headers]
+    return ('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body
+
+async def handle_request(ctx, target):
+    """回傳 (來源, status, content_type, body, 額外 header);來源為 None 表示不計入統計"""
+    parsed = urllib.parse.urlsplit(target)
+    params = dict(urllib.parse.parse_qsl(parsed.query, keep_blank_values=True))
+    if parsed.path == '/_stats':
+        return (None,) + _json(ctx.stats_payload()) + ((),)
+    source, _, rest = parsed.path.lstrip('/').partition('/')
+    if source not in RENDERERS:
+        return None, 404, 'text/plain', f'unknown source: {source}'.encode(), ()
+
+    bucket = ctx.buckets.get(source)
+    if bucket:
+        wait = bucket.take()
+        if wait:
+            body = json.dumps({'statusCode': 429, 'statusMessage': 'Too Many Requests'}).encode()
+            return source, 429, 'application/json', body, (f'Retry-After: {math.ceil(wait)}',)
+
+    delay = ctx.latency[source](ctx.rng)
+    if delay:
+        await asyncio.sleep(delay)
+    if ctx.rng.random() < ctx.reset_rate[source]:
+        return source, None, None, None, ()
+    if ctx.rng.random() < ctx.error_rate[source]:
+        status = ctx.rng.choice((500, 502, 503))
+        return source, status, 'text/plain', REASONS[status].encode(), ()
+    return (source,) + RENDERERS[source](ctx, '/' + rest, params) + ((),)
+
+async def serve_connection(ctx, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0) or 0)
+            if length:
+                await reader.readexactly(length)
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) != 3:
+                writer.write(_response(400, 'text/plain', b'bad request', False))
+                break
+            method, target, version = parts
+            keep_alive = (headers.get('connection', '').lower() != 'close'
+                          if version == 'HTTP/1.1' else headers.get('connection', '').lower() == 'keep-alive')
+
+            source, status, content_type, body, extra = await handle_request(ctx, target)
+            if source:
+                ctx.stats[source][status if status else 'reset'] += 1
+            if status is None:
+                # 注入的連線中斷: 不回應直接關閉
+                writer.transport.abort()
+                return
+            if method == 'HEAD':
+                body = b''
+            writer.write(_response(status, content_type, body, keep_alive, extra))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+def print_stats(ctx):
+    payload = ctx.stats_payload()
+    print(f"\n📊 模擬上游統計 (執行 {payload['uptime_s']} 秒)")
+    print(f"{'來源':<14} {'請求數':>9} {'req/s':>8}  狀態碼")
+    print('-' * 60)
+    for source, info in payload['sources'].items():
+        statuses = ', '.join(f'{code}×{count:,}' for code, count in info['status'].items())
+        if info['resets']:
+            statuses += f", reset×{info['resets']:,}"
+        print(f"{source:<14} {info['requests']:>9,} {info['rps']:>8.1f}  {statuses}")
+
+async def run_server(ctx, host, port):
+    server = await asyncio.start_server(lambda r, w: serve_connection(ctx, r, w), host, port,
+                                        backlog=1024, reuse_address=True)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    base_url = f"http://{f'[{host}]' if ':' in host else host}:{port}"
+    print(f"🚀 模擬上游已啟動: {base_url}")
+    print(f"   seed.py: python3 scripts/seed.py --mock-upstream {base_url}")
+    print(f"   統計:    curl {base_url}/_stats")
+    for source in SOURCES:
+        notes = []
+        if source in ctx.buckets:
+            bucket = ctx.buckets[source]
+            notes.append(f'限流 {bucket.capacity:g} 個/{bucket.capacity / bucket.refill_rate:g}s')
+        if ctx.error_rate[source]:
+            notes.append(f'錯誤 {ctx.error_rate[source]:.1%}')
+        if ctx.reset_rate[source]:
+            notes.append(f'斷線 {ctx.reset_rate[source]:.1%}')
+        if notes:
+            print(f"   {source:<14} {', '.join(notes)}")
+    async with server:
+        await stop.wait()
+    print_stats(ctx)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='seed.py 上游 API 的本機模擬伺服器',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f'來源名稱: {", ".join(SOURCES)}')
+    parser.add_argument('--host', default='127.0.0.1', help='監聽位址 (預設: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='監聽 port (預設: 8765)')
+    parser.add_argument('--seed', type=int, default=42, help='亂數種子 (決定所有產生的資料)')
+    parser.add_argument('--latency', action='append', type=per_source(parse_latency),
+                        help='[來源=]延遲分佈,單位毫秒 (例如 lognormal:40:0.6、arxiv=uniform:200:600),可重複')
+    parser.add_argument('--rate-limit', action='append', type=per_source(parse_rate_limit),
+                        help='[來源=]N/期間,超過回 429 (例如 zenquotes=5/30s),可重複')
+    parser.add_argument('--error-rate', action='append', type=per_source(float),
+                        help='[來源=]回 5xx 的比例 (例如 0.01),可重複')
+    parser.add_argument('--reset-rate', action='append', type=per_source(float),
+                        help='[來源=]直接關閉連線的比例,可重複')
+    parser.add_argument('--junk-rate', action='append', type=per_source(float),
+                        help='[來源=]回傳會被過濾的短文/消歧義頁的比例 (預設: 0.05),可重複')
+    parser.add_argument('--corpus-size', action='append', type=per_source(int),
+                        help='[來源=]語料大小;random 類端點從中抽樣,分頁端點的總筆數 (預設: 1000000),可重複')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    ctx = MockContext(args)
+    asyncio.run(run_server(ctx, args.host, args.port))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+backend 與 PostgreSQL 之間的故障 / 延遲注入代理 (asyncio TCP)
+
+Node 連線池 (max: 20, connectionTimeoutMillis: 2000) 與 Go 的 database/sql 連線池
+(SetMaxOpenConns(20),見 backend-go/config/database.go) 從沒在資料庫變慢或不穩時測過。
+把 backend 的 DB_HOST / DB_PORT 指向本代理 (預設 127.0.0.1:6432),依排程注入:
+
+- latency=200ms   每個 Postgres → backend 的封包延後送出 (保持順序)
+- jitter=50ms     再加上 0~50ms 的隨機延遲
+- bandwidth=64k   兩個方向各自的總頻寬上限 (bytes/s,可用 k / m)
+- stall           暫停所有轉送 (連線保持開啟,資料積在代理中,結束後一次送出)
+- reset           階段開始時中斷所有現有連線
+- drop=0.3        新連線有 30% 機率被立即中斷
+- cap=5           最多 5 條連線,超過的新連線收到與 PostgreSQL 相同的
+                  FATAL 53300 "sorry, too many clients already"
+- ok              不注入任何故障
+
+排程格式與 loadgen.py 的 --stages 相同: 逗號分隔的 <持續時間>:<故障>[+<故障>...],例如
+  20s:ok,30s:latency=200ms+jitter=100ms,10s:stall,20s:ok,1s:reset,30s:cap=4,20s:ok
+
+加上 --backends 時,對每個 backend 依序跑完整排程,同時以固定到達率 (開放模型,與 loadgen.py 相同的
+HTTP 用戶端) 送出 /search,並依階段回報:
+- p50 / p95 / p99 延遲與錯誤率
+- 錯誤分類 (依 500 回應的 message): pool_timeout (Node 連線池等待逾時)、too_many_clients、
+  connect_timeout、connection_lost、refused、client_timeout (本工具的請求逾時) 等
+- 恢復時間: 故障階段結束後,到連續 --recovery-window 秒都沒有錯誤且 p95 回到基準
+  (第一個 ok 階段 p95 的 2 倍,至少多 20ms) 以內所需的秒數
+不加 --backends 時只執行代理與排程 (可搭配 loadgen.py / k6),並輸出每秒的代理統計。
+
+用法:
+  # backend 改連代理 (Node: DB_PORT=6432 node server.js;docker compose 則設定 DB_HOST / DB_PORT)
+  python3 scripts/pg_fault_proxy.py --upstream localhost:5432 --listen 0.0.0.0:6432 \\
+      --backends node=http://localhost:3000 go=http://localhost:3001 --scenario mixed
+
+  # 自訂排程,只跑代理 (另外用 loadgen.py 送負載)
+  python3 scripts/pg_fault_proxy.py --schedule 30s:ok,60s:latency=100ms+jitter=50ms,30s:ok
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import struct
+import time
+import urllib.parse
+
+from loadgen import ConnectionPool, LatencyHistogram, http_get, parse_duration
+from search_sql import DEFAULT_QUERIES, load_workload
+
+# 預設情境 (排程字串)
+SCENARIOS = {
+    'latency': '20s:ok,30s:latency=50ms,30s:latency=200ms+jitter=100ms,30s:ok',
+    'bandwidth': '20s:ok,30s:bandwidth=32k,30s:ok',
+    'stall': '20s:ok,10s:stall,30s:ok',
+    'flaky': '20s:ok,1s:reset,20s:drop=0.3,30s:ok',
+    'exhaust': '20s:ok,30s:cap=5,30s:ok',
+    'mixed': ('15s:ok,20s:latency=100ms+jitter=50ms,15s:ok,5s:stall,15s:ok,'
+              '1s:reset,10s:drop=0.5,15s:ok,20s:cap=4,15s:ok'),
+}
+
+# PostgreSQL 協定: SSLRequest / GSSENCRequest 的 request code
+SSL_REQUEST_CODES = (80877103, 80877104)
+
+# 500 回應 message 的錯誤分類 (依序比對,Node pg 與 Go pgx / lib/pq 的訊息)
+ERROR_PATTERNS = [
+    ('pool_timeout', ('timeout exceeded when trying to connect',)),
+    ('too_many_clients', ('too many clients',)),
+    ('connect_timeout', ('connection timeout', 'i/o timeout', 'context deadline exceeded', 'timeout expired')),
+    ('connection_lost', ('terminated unexpectedly', 'econnreset', 'connection reset', 'broken pipe',
+                         'bad connection', 'unexpected eof', 'server closed the connection', 'conn closed')),
+    ('refused', ('econnrefused', 'connection refused')),
+]
+POOL_ERRORS = ('pool_timeout', 'too_many_clients')
+
+def parse_size(text):
+    """'64k' / '1m' / '4096' → bytes"""
+    units = {'': 1, 'k': 1024, 'm': 1024 * 1024}
+    text = text.strip().lower().rstrip('b')
+    return float(text[:-1]) * units[text[-1]] if text[-1:] in units and text[-1:].isalpha() else float(text)
+
+def parse_faults(text):
+    """'latency=200ms+jitter=50ms' → {'latency': 0.2, 'jitter': 0.05}"""
+    faults = {}
+    for part in text.split('+'):
+        name, _, value = part.strip().partition('=')
+        if name == 'ok':
+            continue
+        if name in ('stall', 'reset'):
+            faults[name] = True
+        elif name in ('latency', 'jitter'):
+            faults[name] = parse_duration(value)
+        elif name == 'bandwidth':
+            faults[name] = parse_size(value)
+        elif name == 'drop':
+            faults[name] = float(value)
+        elif name == 'cap':
+            faults[name] = int(value)
+        else:
+            raise argparse.ArgumentTypeError(f'未知的故障: {name}')
+    return faults
+
+def parse_schedule(text):
+    """'20s:ok,30s:latency=200ms' → [{'name', 'duration', 'faults', 'start'}]"""
+    phases = []
+    start = 0.0
+    for part in text.split(','):
+        duration, _, spec = part.strip().partition(':')
+        seconds = parse_duration(duration)
+        phases.append({'name': spec or 'ok', 'duration': seconds, 'faults': parse_faults(spec or 'ok'),
+                       'start': start})
+        start += seconds
+    return phases
+
+# ============================================================================
+# 代理
+# ============================================================================
+
+class Throttle:
+    """單一方向的總頻寬限制 (虛擬時鐘: 每筆資料佔用 n / rate 秒)"""
+
+    def __init__(self):
+        self.next_free = 0.0
+
+    async def consume(self, size, rate):
+        if not rate:
+            return
+        loop = asyncio.get_running_loop()
+        start = max(loop.time(), self.next_free)
+        self.next_free = start + size / rate
+        await asyncio.sleep(self.next_free - loop.time())
+
+class FaultProxy:
+    """把每條 backend 連線轉送到 upstream,依目前的故障設定延遲、限速、暫停或中斷"""
+
+    def __init__(self, upstream_host, upstream_port, seed=42):
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.rng = random.Random(seed)
+        self.faults = {}
+        self.flowing = asyncio.Event()
+        self.flowing.set()
+        self.connections = set()
+        self.throttles = {'up': Throttle(), 'down': Throttle()}
+        self.counters = {'accepted': 0, 'refused': 0, 'dropped': 0, 'reset': 0,
+                         'bytes_up': 0, 'bytes_down': 0}
+
+    def apply(self, faults):
+        """切換到新階段的故障設定"""
+        self.faults = faults
+        if faults.get('stall'):
+            self.flowing.clear()
+        else:
+            self.flowing.set()
+        if faults.get('reset'):
+            self.counters['reset'] += len(self.connections)
+            self.abort_all()
+
+    def abort_all(self):
+        for writers in list(self.connections):
+            for writer in writers:
+                writer.transport.abort()
+
+    def snapshot(self):
+        return dict(self.counters, active=len(self.connections))
+
+    async def _refuse(self, reader, writer):
+        """以 PostgreSQL 的 too many clients 錯誤回應 startup 訊息 (SSL 請求先回 'N')"""
+        try:
+            while True:
+                length, code = struct.unpack('!II', await asyncio.wait_for(reader.readexactly(8), 5))
+                await reader.readexactly(length - 8)
+                if code not in SSL_REQUEST_CODES:
+                    break
+                writer.write(b'N')
+                await writer.drain()
+            fields = b''.join(kind + value.encode() + b'\0' for kind, value in (
+                (b'S', 'FATAL'), (b'V', 'FATAL'), (b'C', '53300'),
+                (b'M', 'sorry, too many clients already (pg_fault_proxy)')))
+            message = fields + b'\0'
+            writer.write(b'E' + struct.pack('!I', len(message) + 4) + message)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, OSError, struct.error):
+            pass
+        finally:
+            writer.close()
+
+    async def _pump(self, reader, writer, direction):
+        """讀取一個方向的資料,依延遲排入佇列後由 deliver() 依序送出"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        last_due = 0.0
+
+        async def deliver():
+            while True:
+                due, data = await queue.get()
+                if data is None:
+                    break
+                await self.flowing.wait()
+                if due > loop.time():
+                    await asyncio.sleep(due - loop.time())
+                await self.flowing.wait()
+                await self.throttles[direction].consume(len(data), self.faults.get('bandwidth'))
+                writer.write(data)
+                await writer.drain()
+                self.counters[f'bytes_{direction}'] += len(data)
+
+        delivering = asyncio.ensure_future(deliver())
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                delay = 0.0
+                if direction == 'down':
+                    delay = self.faults.get('latency', 0.0) + self.rng.uniform(0, self.faults.get('jitter', 0.0))
+                last_due = max(loop.time() + delay, last_due)
+                queue.put_nowait((last_due, data))
+            queue.put_nowait((0.0, None))
+            await delivering
+        finally:
+            delivering.cancel()
+            writer.close()
+
+    async def handle(self, client_reader, client_writer):
+        cap = self.faults.get('cap')
+        if cap is not None and len(self.connections) >= cap:
+            self.counters['refused'] += 1
+            await self._refuse(client_reader, client_writer)
+            return
+        if self.rng.random() < self.faults.get('drop', 0.0):
+            self.counters['dropped'] += 1
+            client_writer.transport.abort()
+            return
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(self.upstream_host, self.upstream_port)
+        except OSError:
+            client_writer.close()
+            return
+        self.counters['accepted'] += 1
+        writers = (client_writer, upstream_writer)
+        self.connections.add(writers)
+        try:
+            await asyncio.gather(
+                self._pump(client_reader, upstream_writer, 'up'),
+                self._pump(upstream_reader, client_writer, 'down'),
+                return_exceptions=True,
+            )
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.connections.discard(writers)
+            for writer in writers:
+                writer.close()
+
+async def run_schedule(proxy, phases, log=print):
+    """依序套用各階段的故障設定,回傳每秒的代理統計 [{t, phase, active, ...}]"""
+    timeline = []
+    start = time.time()
+    for phase in phases:
+        proxy.apply(phase['faults'])
+        log(f"  ⏱️  {time.time() - start:6.1f}s  {phase['name']} ({phase['duration']:g}s)")
+        phase_end = start + phase['start'] + phase['duration']
+        while time.time() < phase_end:
+            await asyncio.sleep(min(1.0, max(phase_end - time.time(), 0)))
+            timeline.append(dict(proxy.snapshot(), t=round(time.time() - start, 3), phase=phase['name']))
+    proxy.apply({})
+    return timeline
+
+# ============================================================================
+# 負載與報告
+# ============================================================================
+
+def classify_error(status, body):
+    """依回應分類錯誤 (status 0 為用戶端逾時或連線失敗)"""
+    if status == 0:
+        return body or 'client_error'
+    try:
+        message = str(json.loads(body).get('message', '')).lower()
+    except (ValueError, AttributeError):
+        message = ''
+    for category, patterns in ERROR_PATTERNS:
+        if any(pattern in message for pattern in patterns):
+            return category
+    return f'http_{status}' if status != 500 else 'other'
+
+async def drive_load(base_url, rate, duration, queries, timeout, connections):
+    """開放模型: 每 1/rate 秒送出一個 /search,不等前一個完成;回傳 [{offset, latency_ms, error}]"""
+    parsed = urllib.parse.urlsplit(base_url)
+    pool = ConnectionPool(parsed.hostname, parsed.port or 80, connections)
+    samples = []
+    start = time.time()
+    query_cycle = itertools.cycle(queries)
+
+    async def one_request(offset, query):
+        scheduled = start + offset
+        error = None
+        try:
+            status, body, _ = await asyncio.wait_for(
+                http_get(pool, parsed.netloc, f"/search?q={urllib.parse.quote(query)}"), timeout)
+            if status != 200:
+                error = classify_error(status, body)
+        except asyncio.TimeoutError:
+            error = 'client_timeout'
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            error = classify_error(0, 'http_connection')
+        samples.append({'offset': offset, 'latency_ms': (time.time() - scheduled) * 1000, 'error': error})
+
+    tasks = []
+    for n in range(int(duration * rate)):
+        offset = n / rate
+        delay = start + offset - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one_request(offset, next(query_cycle))))
+    await asyncio.gather(*tasks)
+    return samples
+
+def summarize_samples(samples):
+    histogram = LatencyHistogram()
+    errors = {}
+    for sample in samples:
+        histogram.record(sample['latency_ms'])
+        if sample['error']:
+            errors[sample['error']] = errors.get(sample['error'], 0) + 1
+    return {
+        'requests': len(samples),
+        'p50_ms': histogram.percentile(50),
+        'p95_ms': histogram.percentile(95),
+        'p99_ms': histogram.percentile(99),
+        'error_rate': sum(errors.values()) / len(samples) if samples else 0.0,
+        'pool_errors': sum(errors.get(category, 0) for category in POOL_ERRORS),
+        'errors': errors,
+    }
+
+def recovery_seconds(samples, fault_end, horizon, threshold_ms, window):
+    """故障結束後,到連續 window 秒健康 (無錯誤且 p95 <= threshold_ms) 的起點所需秒數;未恢復回傳 None"""
+    seconds = {}
+    for sample in samples:
+        if fault_end <= sample['offset'] < fault_end + horizon:
+            seconds.setdefault(int(sample['offset'] - fault_end), []).append(sample)
+    healthy_run = 0
+    for second in range(int(horizon)):
+        bucket = seconds.get(second, [])
+        latencies = sorted(sample['latency_ms'] for sample in bucket)
+        healthy = bool(bucket) and not any(sample['error'] for sample in bucket) and (
+            threshold_ms is None or latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] <= threshold_ms)
+        healthy_run = healthy_run + 1 if healthy else 0
+        if healthy_run >= window:
+            return float(second - window + 1)
+    return None
+
+def analyze_backend(samples, phases, recovery_window):
+    """依階段彙總,並計算每個故障階段的恢復時間 (觀察到下一個故障階段開始為止,不足一個觀察窗則不計)"""
+    by_phase = []
+    for phase in phases:
+        end = phase['start'] + phase['duration']
+        by_phase.append(dict(summarize_samples([s for s in samples if phase['start'] <= s['offset'] < end]),
+                             phase=phase['name'], start=phase['start'], duration=phase['duration']))
+    baseline = next((row for phase, row in zip(phases, by_phase) if not phase['faults'] and row['requests']), None)
+    threshold = None
+    if baseline and baseline['p95_ms'] is not None:
+        threshold = max(baseline['p95_ms'] * 2, baseline['p95_ms'] + 20)
+    for index, (phase, row) in enumerate(zip(phases, by_phase)):
+        if not phase['faults']:
+            continue
+        fault_end = phase['start'] + phase['duration']
+        following = [p for p in phases[index + 1:] if p['faults']]
+        horizon = (following[0]['start'] if following else phases[-1]['start'] + phases[-1]['duration']) - fault_end
+        if horizon >= recovery_window:
+            row['recovery_s'] = recovery_seconds(samples, fault_end, horizon, threshold, recovery_window)
+    return by_phase, threshold
+
+def _ms(value):
+    return '-' if value is None else f'{value:.1f}'
+
+def print_backend_report(name, rows, threshold):
+    print(f"\n{'=' * 120}")
+    print(f"{name}: 各階段結果 (延遲含排程積壓, ms;健康門檻 p95 <= {_ms(threshold)}ms)")
+    print('=' * 120)
+    print(f"{'階段':<36} {'請求':>6} {'p50':>8} {'p95':>8} {'p99':>9} {'錯誤率':>7} {'池耗盡':>6} {'恢復(s)':>8}  錯誤分類")
+    print('-' * 120)
+    for row in rows:
+        recovery = '-' if 'recovery_s' not in row else ('未恢復' if row['recovery_s'] is None
+                                                         else f"{row['recovery_s']:.0f}")
+        errors = ', '.join(f'{category}={count}' for category, count in sorted(row['errors'].items()))
+        print(f"{row['phase'][:36]:<36} {row['requests']:>6,} {_ms(row['p50_ms']):>8} {_ms(row['p95_ms']):>8}"
+              f" {_ms(row['p99_ms']):>9} {row['error_rate']:>7.1%} {row['pool_errors']:>6,} {recovery:>8}  {errors}")
+
+def print_comparison(results, phases):
+    fault_phases = [index for index, phase in enumerate(phases) if phase['faults']]
+    if len(results) < 2 or not fault_phases:
+        return
+    print(f"\n{'=' * 120}")
+    print("backend 比較 (故障階段 p99 / 池耗盡錯誤 / 恢復秒數)")
+    print('=' * 120)
+    names = list(results)
+    print(f"{'階段':<36}" + ''.join(f" {name:>26}" for name in names))
+    for index in fault_phases:
+        line = f"{phases[index]['name'][:36]:<36}"
+        for name in names:
+            row = results[name]['phases'][index]
+            recovery = '-' if 'recovery_s' not in row else ('未恢復' if row['recovery_s'] is None
+                                                             else f"{row['recovery_s']:.0f}s")
+            line += f" {_ms(row['p99_ms']) + 'ms / ' + str(row['pool_errors']) + ' / ' + recovery:>26}"
+        print(line)
+
+# ============================================================================
+# 主程式
+# ============================================================================
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='PostgreSQL 故障 / 延遲注入代理,搭配負載回報各 backend 的尾端延遲與恢復時間')
+    parser.add_argument('--listen', default='127.0.0.1:6432', help='代理監聽位址 (預設: 127.0.0.1:6432)')
+    parser.add_argument('--upstream', default='localhost:5432', help='PostgreSQL 位址 (預設: localhost:5432)')
+    schedule = parser.add_mutually_exclusive_group()
+    schedule.add_argument('--scenario', choices=list(SCENARIOS), default='mixed', help='預設排程 (預設: mixed)')
+    schedule.add_argument('--schedule', help='自訂排程,例如 20s:ok,30s:latency=200ms+jitter=50ms,20s:ok')
+    parser.add_argument('--backends', nargs='+', metavar='NAME=URL',
+                        help='依序測試的 backend,例如 node=http://localhost:3000 go=http://localhost:3001')
+    parser.add_argument('--rate', type=float, default=30.0, help='每個 backend 的到達率 (每秒請求數,預設: 30)')
+    parser.add_argument('--queries-file', '--workload', dest='queries_file',
+                        help='查詢集或工作負載 (預設: 與 k6 腳本相同的 10 個查詢)')
+    parser.add_argument('--timeout', type=float, default=10.0, help='單一請求逾時秒數 (預設: 10)')
+    parser.add_argument('--connections', type=int, default=256, help='HTTP 用戶端最大連線數 (預設: 256)')
+    parser.add_argument('--recovery-window', type=int, default=3,
+                        help='連續幾秒健康才算恢復 (預設: 3)')
+    parser.add_argument('--settle', type=parse_duration, default=5.0,
+                        help='每個 backend 開始前的無故障暖身時間 (預設: 5s)')
+    parser.add_argument('--seed', type=int, default=42, help='jitter / drop 的亂數種子')
+    parser.add_argument('--output', default=None,
+                        help='輸出 JSON (預設: test-results/pg_fault_<timestamp>.json)')
+    return parser.parse_args()
+
+async def async_main(args):
+    phases = parse_schedule(args.schedule or SCENARIOS[args.scenario])
+    total = phases[-1]['start'] + phases[-1]['duration']
+    upstream_host, _, upstream_port = args.upstream.rpartition(':')
+    listen_host, _, listen_port = args.listen.rpartition(':')
+    proxy = FaultProxy(upstream_host.strip('[]'), int(upstream_port), args.seed)
+    server = await asyncio.start_server(proxy.handle, listen_host.strip('[]') or '127.0.0.1', int(listen_port))
+
+    print("=" * 120)
+    print("PostgreSQL 故障注入代理")
+    print("=" * 120)
+    print(f"🔌 {args.listen} → {args.upstream}")
+    plan = ', '.join(f"{phase['duration']:g}s {phase['name']}" for phase in phases)
+    print(f"📋 排程 ({total:g}s): {plan}")
+
+    report = {'listen': args.listen, 'upstream': args.upstream, 'phases': phases, 'backends': {}}
+    async with server:
+        if not args.backends:
+            print("\n(未指定 --backends: 只執行代理與排程,請另外送負載)")
+            report['timeline'] = await run_schedule(proxy, phases)
+            proxy.abort_all()
+            return report
+
+        queries = ([item['query'] for item in load_workload(args.queries_file)]
+                   if args.queries_file else DEFAULT_QUERIES)
+        for spec in args.backends:
+            name, _, base_url = spec.partition('=')
+            base_url = base_url.rstrip('/')
+            print(f"\n🚀 {name} ({base_url}): 暖身 {args.settle:g}s 後開始排程,{args.rate:g} req/s")
+            await drive_load(base_url, args.rate, args.settle, queries, args.timeout, args.connections)
+            load = asyncio.ensure_future(
+                drive_load(base_url, args.rate, total, queries, args.timeout, args.connections))
+            timeline = await run_schedule(proxy, phases)
+            samples = await load
+            rows, threshold = analyze_backend(samples, phases, args.recovery_window)
+            report['backends'][name] = {'base_url': base_url, 'threshold_ms': threshold,
+                                        'phases': rows, 'timeline': timeline}
+            print_backend_report(name, rows, threshold)
+        print_comparison(report['backends'], phases)
+        proxy.abort_all()
+    return report
+
+def main():
+    args = parse_arguments()
+    output_file = args.output or os.path.join(
+        'test-results', f"pg_fault_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    try:
+        report = asyncio.run(async_main(args))
+    except KeyboardInterrupt:
+        print("\n👋 中斷")
+        return
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果已儲存至: {output_file}")
+
+if __name__ == '__main__':
+    main()
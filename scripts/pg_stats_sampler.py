@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PostgreSQL 統計取樣工具 (與 k6 負載測試同步執行)
+
+每隔固定時間輪詢:
+- pg_stat_statements: /search 查詢的 calls / exec time / buffers / temp I/O
+- pg_statio_user_tables / pg_statio_user_indexes: worlds、idx_title_trgm、idx_desc_trgm 的 hit / read
+- pg_stat_activity: 各狀態連線數與等待中的 session (依 wait_event_type)
+- pg_stat_database: 目前資料庫的 blks_hit / blks_read / temp_bytes / xact_commit
+
+累計型計數器會轉成與上一個樣本的差值,每個樣本一行寫入 JSONL,
+計數器被重設 (dataset_manager 換表 / 重建後 OID 改變、pg_stat_reset()、pg_stat_statements_reset())
+時以目前值為新基準,該樣本差值記為 0 並在 resets 列出受影響的群組,不會出現負值;
+時間戳記與 k6 JSON 輸出同為 RFC3339,visualize_k6_results.py 可以對齊到同一條時間軸。
+
+pg_stat_statements 需要在 shared_preload_libraries 中載入 (見 docker-compose.yml),
+未載入時會略過該部分並繼續取樣。
+
+用法:
+  # 取樣直到 Ctrl+C / SIGTERM
+  python3 scripts/pg_stats_sampler.py --output test-results/pgstats_10000_20250101_000000.jsonl
+
+  # 每 0.5 秒取樣一次,持續 120 秒
+  python3 scripts/pg_stats_sampler.py --interval 0.5 --duration 120
+"""
+
+import argparse
+import json
+import os
+import signal
+import time
+from datetime import datetime, timezone
+
+import psycopg2
+
+from db import TimedDictCursor, connect
+
+TABLES = ('worlds',)
+INDEXES = ('idx_title_trgm', 'idx_desc_trgm')
+
+# /search 查詢在 pg_stat_statements 中的辨識字串
+SEARCH_QUERY_PATTERN = '%search_results%'
+
+STATEMENTS_SQL = """
+    SELECT
+        COALESCE(SUM(calls), 0) AS calls,
+        COALESCE(SUM(total_exec_time), 0) AS total_exec_time,
+        COALESCE(SUM(rows), 0) AS rows,
+        COALESCE(SUM(shared_blks_hit), 0) AS shared_blks_hit,
+        COALESCE(SUM(shared_blks_read), 0) AS shared_blks_read,
+        COALESCE(SUM(temp_blks_read), 0) AS temp_blks_read,
+        COALESCE(SUM(temp_blks_written), 0) AS temp_blks_written
+    FROM pg_stat_statements
+    WHERE query ILIKE %s
+"""
+
+TABLE_IO_SQL = """
+    SELECT relname, relid, heap_blks_read, heap_blks_hit, idx_blks_read, idx_blks_hit
+    FROM pg_statio_user_tables
+    WHERE relname = ANY(%s)
+"""
+
+INDEX_IO_SQL = """
+    SELECT indexrelname, indexrelid, idx_blks_read, idx_blks_hit
+    FROM pg_statio_user_indexes
+    WHERE indexrelname = ANY(%s)
+"""
+
+ACTIVITY_SQL = """
+    SELECT
+        COALESCE(state, 'unknown') AS state,
+        wait_event_type,
+        COUNT(*) AS sessions
+    FROM pg_stat_activity
+    WHERE datname = current_database() AND pid <> pg_backend_pid()
+    GROUP BY 1, 2
+"""
+
+DATABASE_SQL = """
+    SELECT datid, stats_reset, xact_commit, xact_rollback, blks_read, blks_hit, temp_files, temp_bytes, deadlocks
+    FROM pg_stat_database
+    WHERE datname = current_database()
+"""
+
+def _delta(current, previous):
+    """兩組累計計數器的差值 (第一個樣本沒有前值時為 0)"""
+    if previous is None:
+        return {key: 0 for key in current}
+    return {key: float(current[key]) - float(previous.get(key, 0)) for key in current}
+
+def _was_reset(current, previous):
+    """累計計數器只會增加,任何一個變小表示被重設過"""
+    return any(float(current[key]) < float(previous.get(key, 0)) for key in current)
+
+def _hit_ratio(hit, read):
+    return hit / (hit + read) if (hit + read) > 0 else None
+
+class PgStatsSampler:
+    """輪詢 PostgreSQL 統計 view 並計算相鄰樣本的差值"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.previous = {}
+        self.identities = {}
+        self.statements_available = True
+
+    def _fetch(self, sql, params=None):
+        # 每個取樣週期執行相同的 SQL,以 prepared statement 省去重複解析
+        cur = self.conn.cursor(cursor_factory=TimedDictCursor)
+        try:
+            self.conn.execute_prepared(cur, sql, params)
+            return cur.fetchall()
+        finally:
+            cur.close()
+
+    def _counters(self):
+        """讀取所有累計計數器,回傳 ({群組: {欄位: 值}}, {群組: 物件識別})"""
+        counters = {}
+        identities = {}
+        if self.statements_available:
+            try:
+                counters['statements'] = dict(self._fetch(STATEMENTS_SQL, (SEARCH_QUERY_PATTERN,))[0])
+            except psycopg2.Error as e:
+                print(f"⚠️  pg_stat_statements 無法使用,略過: {e.pgerror or e}".strip())
+                self.statements_available = False
+        for row in self._fetch(TABLE_IO_SQL, (list(TABLES),)):
+            name = row.pop('relname')
+            identities[f'table:{name}'] = row.pop('relid')
+            counters[f'table:{name}'] = dict(row)
+        for row in self._fetch(INDEX_IO_SQL, (list(INDEXES),)):
+            name = row.pop('indexrelname')
+            identities[f'index:{name}'] = row.pop('indexrelid')
+            counters[f'index:{name}'] = dict(row)
+        rows = self._fetch(DATABASE_SQL)
+        if rows:
+            database = dict(rows[0])
+            identities['database'] = (database.pop('datid'), database.pop('stats_reset'))
+            counters['database'] = database
+        return counters, identities
+
+    def sample(self):
+        """取一個樣本: 計數器差值 + 當下的連線狀態"""
+        now = time.time()
+        counters, identities = self._counters()
+        deltas = {}
+        resets = []
+        for group, values in counters.items():
+            previous = self.previous.get(group)
+            if previous is not None and (identities.get(group) != self.identities.get(group)
+                                         or _was_reset(values, previous)):
+                # 表被換掉 / 統計被重設: 以目前值為新基準
+                resets.append(group)
+                previous = None
+            deltas[group] = _delta(values, previous)
+        self.previous = counters
+        self.identities = identities
+
+        sessions = {}
+        waiting = {}
+        for row in self._fetch(ACTIVITY_SQL):
+            sessions[row['state']] = sessions.get(row['state'], 0) + row['sessions']
+            if row['state'] == 'active' and row['wait_event_type']:
+                waiting[row['wait_event_type']] = waiting.get(row['wait_event_type'], 0) + row['sessions']
+
+        record = {
+            'time': datetime.fromtimestamp(now, timezone.utc).astimezone().isoformat(),
+            'epoch': now,
+            'deltas': deltas,
+            'sessions': sessions,
+            'waiting': waiting,
+        }
+        if resets:
+            record['resets'] = resets
+
+        # 衍生指標
+        database = deltas.get('database')
+        if database:
+            record['buffer_hit_ratio'] = _hit_ratio(database['blks_hit'], database['blks_read'])
+            record['temp_bytes'] = database['temp_bytes']
+        statements = deltas.get('statements')
+        if statements:
+            record['search_calls'] = statements['calls']
+            record['mean_exec_ms'] = (statements['total_exec_time'] / statements['calls']
+                                      if statements['calls'] > 0 else None)
+            record['temp_blks'] = statements['temp_blks_read'] + statements['temp_blks_written']
+        for index in INDEXES:
+            io = deltas.get(f'index:{index}')
+            if io:
+                record[f'{index}_hit_ratio'] = _hit_ratio(io['idx_blks_hit'], io['idx_blks_read'])
+        record['waiting_sessions'] = sum(waiting.values())
+        return record
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='與 k6 負載測試同步取樣 PostgreSQL 統計')
+    parser.add_argument('--interval', type=float, default=1.0, help='取樣間隔秒數 (預設: 1)')
+    parser.add_argument('--duration', type=float, default=None, help='取樣總秒數 (預設: 直到中斷)')
+    parser.add_argument('--output', default=None,
+                        help='輸出 JSONL (預設: test-results/pgstats_<timestamp>.jsonl)')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    output_file = args.output or os.path.join(
+        'test-results', f"pgstats_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+
+    stop = {'requested': False}
+
+    def request_stop(signum, frame):
+        stop['requested'] = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    conn = connect(autocommit=True)
+    sampler = PgStatsSampler(conn)
+
+    print(f"📡 PostgreSQL 統計取樣中 (每 {args.interval}s) → {output_file}")
+    start = time.time()
+    samples = 0
+    try:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            next_tick = start
+            while not stop['requested']:
+                if args.duration is not None and time.time() - start >= args.duration:
+                    break
+                f.write(json.dumps(sampler.sample(), ensure_ascii=False) + '\n')
+                f.flush()
+                samples += 1
+                next_tick += args.interval
+                time.sleep(max(next_tick - time.time(), 0))
+    finally:
+        conn.close()
+    print(f"✅ 已記錄 {samples} 個樣本")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Planner 計畫切換 (plan flip) 偵測工具
+
+從空表開始,以 generate_test_data() 逐步把 worlds 加大 (只插入差額),每一步執行 ANALYZE,
+再對每個查詢類別的完整查詢與各分支執行 EXPLAIN (ANALYZE, FORMAT JSON),記錄計畫形狀。
+相鄰兩個資料量之間計畫形狀改變 (例如 Bitmap Index Scan ↔ Seq Scan、bitmap 開始 lossy)
+即視為一次 plan flip,並回報切換點與延遲變化。
+
+切換點的精確度等於步距;預設使用 1-2-5 序列 (100, 200, 500, ..., 1,000,000)。
+
+用法:
+  # 預設步距 (會清空 worlds!)
+  python3 scripts/plan_flip_sweep.py
+
+  # 自訂步距與上限
+  python3 scripts/plan_flip_sweep.py --steps 1000 2000 5000 10000 20000 50000
+
+  # 每個資料量重複 5 次取中位數
+  python3 scripts/plan_flip_sweep.py --repeat 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from collections import Counter, defaultdict
+
+from db import connect
+from search_sql import (
+    BRANCHES, DEFAULT_QUERIES, apply_search_settings, branch_sql, build_search_sql,
+    classify_query, explain, grow_data_volume, plan_shape, set_data_volume,
+)
+
+DEFAULT_STEPS = [100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000,
+                 100000, 200000, 500000, 1000000]
+TARGETS = ['full'] + list(BRANCHES)
+
+def observe(conn, queries_by_class, repeat):
+    """
+    對目前資料量擷取每個 (類別, 目標) 的計畫形狀與延遲
+
+    同一類別有多個查詢時,形狀取最常見者,延遲取所有執行時間的中位數。
+    """
+    cur = conn.cursor()
+    apply_search_settings(cur)
+    observation = {}
+    for query_class, queries in queries_by_class.items():
+        for target in TARGETS:
+            sql = build_search_sql() if target == 'full' else branch_sql(target)
+            shapes = Counter()
+            timings = []
+            for query in queries:
+                for _ in range(repeat):
+                    plan = explain(cur, sql, {'q': query}, buffers=False)
+                    shapes[plan_shape(plan)] += 1
+                    timings.append(plan.get('Execution Time', 0.0))
+            shape, count = shapes.most_common(1)[0]
+            observation[f'{query_class}/{target}'] = {
+                'shape': shape,
+                'shape_agreement': count / sum(shapes.values()),
+                'median_ms': statistics.median(timings),
+            }
+    conn.rollback()
+    cur.close()
+    return observation
+
+def detect_flips(timeline):
+    """比較相鄰資料量的計畫形狀,回傳所有切換點"""
+    flips = []
+    for (prev_volume, prev_obs), (volume, obs) in zip(timeline, timeline[1:]):
+        for key, current in obs.items():
+            previous = prev_obs.get(key)
+            if previous and previous['shape'] != current['shape']:
+                flips.append({
+                    'key': key,
+                    'from_volume': prev_volume,
+                    'to_volume': volume,
+                    'from_shape': previous['shape'],
+                    'to_shape': current['shape'],
+                    'from_ms': previous['median_ms'],
+                    'to_ms': current['median_ms'],
+                    'delta_ms': current['median_ms'] - previous['median_ms'],
+                })
+    return flips
+
+def print_flips(flips):
+    """顯示切換點"""
+    print("\n" + "=" * 100)
+    print(f"偵測到 {len(flips)} 次計畫切換")
+    print("=" * 100)
+    for flip in flips:
+        print(f"\n🔀 {flip['key']}: {flip['from_volume']:,} → {flip['to_volume']:,} 筆")
+        print(f"   前: {flip['from_shape']}")
+        print(f"   後: {flip['to_shape']}")
+        print(f"   延遲: {flip['from_ms']:.2f}ms → {flip['to_ms']:.2f}ms ({flip['delta_ms']:+.2f}ms)")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='偵測資料量成長時 /search 各分支的計畫切換')
+    parser.add_argument('--steps', type=int, nargs='+', default=DEFAULT_STEPS,
+                        help='資料量步距 (遞增,預設 100 ~ 1,000,000 的 1-2-5 序列)')
+    parser.add_argument('--queries', nargs='+', default=DEFAULT_QUERIES, help='查詢字串 (預設與 k6 腳本相同)')
+    parser.add_argument('--repeat', type=int, default=3, help='每個查詢重複次數 (預設: 3)')
+    parser.add_argument('--output', default=None,
+                        help='輸出 JSON (預設: test-results/plan_flips_<timestamp>.json)')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    steps = sorted(set(args.steps))
+    queries_by_class = defaultdict(list)
+    for query in args.queries:
+        queries_by_class[classify_query(query)].append(query)
+
+    print("=" * 100)
+    print("Planner 計畫切換偵測")
+    print("=" * 100)
+    print(f"步距: {', '.join(f'{s:,}' for s in steps)}")
+    print(f"查詢類別: {', '.join(f'{k} ({len(v)})' for k, v in queries_by_class.items())}")
+
+    conn = connect()
+    timeline = []
+    try:
+        print("\n🔧 清空 worlds...", end=' ', flush=True)
+        set_data_volume(conn, 0)
+        print("✓")
+        for volume in steps:
+            print(f"\n📈 成長到 {volume:,} 筆...", end=' ', flush=True)
+            inserted, elapsed_ms = grow_data_volume(conn, volume)
+            print(f"✓ (+{inserted:,} 筆, {elapsed_ms:.0f}ms, 已 ANALYZE)")
+            observation = observe(conn, queries_by_class, args.repeat)
+            for key, item in observation.items():
+                if key.endswith('/full'):
+                    print(f"   {key:<22} {item['median_ms']:>9.2f}ms")
+            timeline.append((volume, observation))
+    finally:
+        conn.close()
+
+    flips = detect_flips(timeline)
+    print_flips(flips)
+
+    output_file = args.output or os.path.join(
+        'test-results', f"plan_flips_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'steps': steps,
+            'timeline': [{'volume': v, 'observation': obs} for v, obs in timeline],
+            'flips': flips,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果已儲存至: {output_file}")
+
+if __name__ == '__main__':
+    main()
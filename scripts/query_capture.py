@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+擷取 /search 查詢記錄 (供 replay.py 依原始節奏重播)
+
+兩種來源,輸出相同格式的 JSONL (依時間排序):
+  {"ts": 1736936625.123, "query": "harri", "status": 200, "duration_ms": 12.4,
+   "search_ms": 9, "client": "10.0.0.7", "backend": "node", "source": "proxy"}
+
+- proxy: 在 backend 前面放一個輕量 HTTP/1.1 反向代理,所有請求原樣轉送,
+         /search 記錄收到請求的時間、狀態碼、代理量到的回應時間與回應 meta.queryTimeMs (search_ms)
+- 解析存取日誌 (--parse-log):
+  - gin:      Go backend (gin.Default()) 的 [GIN] 日誌,含回應時間
+  - combined: nginx / Apache combined 格式 (結尾若有 $request_time 秒數會一併讀取)
+  日誌時間只到秒,同一秒內的多筆請求平均分散在該秒內 (原始順序不變)
+
+記錄檔同時也是 load_workload() 可讀的工作負載 (每行一個 query,權重相同 = 依實際出現次數抽樣),
+可直接交給 loadgen.py --workload 使用。
+
+用法:
+  # 代理模式: 前端 / 負載改連 3100,轉送到 Node backend
+  python3 scripts/query_capture.py --listen 127.0.0.1:3100 --upstream http://localhost:3000
+
+  # 解析 Go backend 的容器日誌
+  docker logs pg_trgm_backend_go 2>&1 | python3 scripts/query_capture.py --parse-log - --log-format gin
+
+  # 解析 nginx 存取日誌
+  python3 scripts/query_capture.py --parse-log /var/log/nginx/access.log --output test-results/prod.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+import urllib.parse
+from datetime import datetime
+
+from loadgen import _read_body
+
+# ============================================================================
+# 代理模式
+# ============================================================================
+
+async def _read_head(reader):
+    """讀取 request / response 的起始行與標頭,回傳 (起始行, [(name, value)]);連線關閉時回傳 (None, None)"""
+    start_line = await reader.readline()
+    if not start_line.strip():
+        return None, None
+    headers = []
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers.append((name.strip(), value.strip()))
+    return start_line.decode('latin-1').rstrip('\r\n'), headers
+
+def _encode_head(start_line, headers, body):
+    """重新組出標頭 (body 已解開 chunked,一律改用 Content-Length)"""
+    lines = [start_line]
+    lines += [f'{name}: {value}' for name, value in headers
+              if name.lower() not in ('content-length', 'transfer-encoding')]
+    if body or start_line.startswith('HTTP/') or any(name.lower() == 'content-length' for name, _ in headers):
+        lines.append(f'Content-Length: {len(body)}')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+class CaptureProxy:
+    """每條用戶端連線對應一條 upstream keep-alive 連線,依序轉送請求"""
+
+    def __init__(self, upstream, log_file, backend):
+        parsed = urllib.parse.urlsplit(upstream)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.backend = backend
+        self.out = open(log_file, 'a', encoding='utf-8', buffering=1)
+        self.captured = 0
+        self.forwarded = 0
+
+    def close(self):
+        self.out.close()
+
+    def record(self, received, target, status, duration_ms, body, client):
+        parsed = urllib.parse.urlsplit(target)
+        if parsed.path != '/search':
+            return
+        query = urllib.parse.parse_qs(parsed.query).get('q', [''])[0]
+        if not query.strip():
+            return
+        search_ms = None
+        if status == 200:
+            try:
+                meta = json.loads(body).get('meta') or {}
+                search_ms = meta.get('queryTimeMs')
+            except (ValueError, AttributeError):
+                pass
+        self.out.write(json.dumps({
+            'ts': round(received, 6),
+            'query': query,
+            'status': status,
+            'duration_ms': round(duration_ms, 3),
+            'search_ms': search_ms,
+            'client': client,
+            'backend': self.backend,
+            'source': 'proxy',
+        }, ensure_ascii=False) + '\n')
+        self.captured += 1
+
+    async def handle(self, client_reader, client_writer):
+        client = (client_writer.get_extra_info('peername') or ('?',))[0]
+        upstream_reader = upstream_writer = None
+        try:
+            while True:
+                request_line, headers = await _read_head(client_reader)
+                if request_line is None:
+                    break
+                received = time.time()
+                body = await _read_body(client_reader, {name.lower(): value for name, value in headers})
+                if upstream_writer is None or upstream_writer.is_closing():
+                    upstream_reader, upstream_writer = await asyncio.open_connection(self.host, self.port)
+
+                start = time.perf_counter()
+                upstream_writer.write(_encode_head(request_line, headers, body) + body)
+                await upstream_writer.drain()
+                status_line, response_headers = await _read_head(upstream_reader)
+                if status_line is None:
+                    raise ConnectionError('upstream 關閉連線')
+                header_map = {name.lower(): value for name, value in response_headers}
+                response_body = (b'' if request_line.startswith('HEAD ')
+                                 else await _read_body(upstream_reader, header_map))
+                duration_ms = (time.perf_counter() - start) * 1000
+
+                client_writer.write(_encode_head(status_line, response_headers, response_body) + response_body)
+                await client_writer.drain()
+                self.forwarded += 1
+                self.record(received, request_line.split()[1], int(status_line.split()[1]),
+                            duration_ms, response_body, client)
+                if header_map.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            pass
+        finally:
+            for writer in (client_writer, upstream_writer):
+                if writer is not None:
+                    writer.close()
+
+async def run_proxy(listen, upstream, log_file, backend):
+    host, _, port = listen.rpartition(':')
+    proxy = CaptureProxy(upstream, log_file, backend)
+    server = await asyncio.start_server(proxy.handle, host.strip('[]') or '127.0.0.1', int(port))
+    print(f"🎙️  代理 {listen} → {upstream} ({backend}),/search 記錄寫入 {log_file}")
+    print("   Ctrl+C 結束")
+    try:
+        async with server:
+            while True:
+                await asyncio.sleep(10)
+                print(f"  📝 已轉送 {proxy.forwarded:,} 個請求,記錄 {proxy.captured:,} 筆 /search", flush=True)
+    finally:
+        proxy.close()
+
+# ============================================================================
+# 存取日誌解析
+# ============================================================================
+
+ANSI_RE = re.compile(r'\x1b\[[0-9;]*m')
+
+# [GIN] 2025/01/15 - 10:23:45 | 200 |    1.234567ms |             ::1 | GET      "/search?q=test"
+GIN_RE = re.compile(
+    r'\[GIN\] (?P<time>\d{4}/\d{2}/\d{2} - \d{2}:\d{2}:\d{2}) \|\s*(?P<status>\d{3}) \|'
+    r'\s*(?P<duration>\S+) \|\s*(?P<client>\S+) \|\s*(?P<method>[A-Z]+)\s+"(?P<target>[^"]+)"')
+
+# 10.0.0.7 - - [15/Jan/2025:10:23:45 +0800] "GET /search?q=test HTTP/1.1" 200 512 "-" "k6/0.49" 0.012
+COMBINED_RE = re.compile(
+    r'(?P<client>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<target>\S+)[^"]*" '
+    r'(?P<status>\d{3}) \S+(?: "[^"]*" "[^"]*")?(?: (?P<request_time>\d+(?:\.\d+)?))?')
+
+# Go time.Duration.String(): 123ns / 12.3µs / 1.2ms / 1.5s / 1m2.5s
+GO_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ns|µs|us|ms|s|m|h)')
+GO_DURATION_UNITS = {'ns': 1e-6, 'µs': 1e-3, 'us': 1e-3, 'ms': 1.0, 's': 1e3, 'm': 6e4, 'h': 3.6e6}
+
+def parse_go_duration(text):
+    """Go 的 Duration 字串 → ms"""
+    return sum(float(value) * GO_DURATION_UNITS[unit] for value, unit in GO_DURATION_RE.findall(text))
+
+def parse_log_line(line, log_format):
+    """解析一行存取日誌,不是 /search 請求則回傳 None"""
+    line = ANSI_RE.sub('', line)
+    if log_format in ('gin', 'auto'):
+        match = GIN_RE.search(line)
+        if match:
+            ts = time.mktime(time.strptime(match['time'], '%Y/%m/%d - %H:%M:%S'))
+            duration_ms = parse_go_duration(match['duration'])
+            return _log_entry(ts, match, duration_ms, 'gin')
+    if log_format in ('combined', 'auto'):
+        match = COMBINED_RE.search(line)
+        if match:
+            ts = datetime.strptime(match['time'], '%d/%b/%Y:%H:%M:%S %z').timestamp()
+            duration_ms = float(match['request_time']) * 1000 if match['request_time'] else None
+            return _log_entry(ts, match, duration_ms, 'combined')
+    return None
+
+def _log_entry(ts, match, duration_ms, source):
+    if match['method'] != 'GET':
+        return None
+    parsed = urllib.parse.urlsplit(match['target'])
+    if parsed.path != '/search':
+        return None
+    query = urllib.parse.parse_qs(parsed.query).get('q', [''])[0]
+    if not query.strip():
+        return None
+    return {
+        'ts': ts,
+        'query': query,
+        'status': int(match['status']),
+        'duration_ms': duration_ms,
+        'search_ms': None,
+        'client': match['client'],
+        'backend': 'go' if source == 'gin' else None,
+        'source': source,
+    }
+
+def spread_within_second(entries):
+    """日誌時間只到秒: 同一秒的 n 筆請求依原始順序放在 (i + 0.5) / n 秒處"""
+    groups = {}
+    for entry in entries:
+        groups.setdefault(entry['ts'], []).append(entry)
+    for second, group in groups.items():
+        for i, entry in enumerate(group):
+            entry['ts'] = round(second + (i + 0.5) / len(group), 6)
+    return entries
+
+def parse_logs(filenames, log_format):
+    entries = []
+    skipped = 0
+    for filename in filenames:
+        f = sys.stdin if filename == '-' else open(filename, 'r', encoding='utf-8', errors='replace')
+        try:
+            for line in f:
+                entry = parse_log_line(line, log_format)
+                if entry is None:
+                    skipped += 1
+                else:
+                    entries.append(entry)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    entries.sort(key=lambda entry: entry['ts'])
+    return spread_within_second(entries), skipped
+
+# ============================================================================
+# 主程式
+# ============================================================================
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='擷取 /search 查詢記錄 (反向代理或解析存取日誌)')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--listen', help='代理模式的監聽位址,例如 127.0.0.1:3100')
+    mode.add_argument('--parse-log', nargs='+', metavar='FILE', help='要解析的存取日誌 (- 代表 stdin)')
+    parser.add_argument('--upstream', default='http://localhost:3000',
+                        help='代理模式轉送的 backend (預設: http://localhost:3000)')
+    parser.add_argument('--backend', default=None,
+                        help='代理模式記錄的 backend 名稱 (預設依 port 判斷: 3001 → go,其餘 → node)')
+    parser.add_argument('--log-format', choices=['auto', 'gin', 'combined'], default='auto',
+                        help='存取日誌格式 (預設: auto,逐行判斷)')
+    parser.add_argument('--output', default=None,
+                        help='輸出 JSONL (預設: test-results/query_log_<timestamp>.jsonl;代理模式為附加寫入)')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    output_file = args.output or os.path.join(
+        'test-results', f"query_log_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+
+    if args.listen:
+        backend = args.backend or ('go' if ':3001' in args.upstream else 'node')
+        try:
+            asyncio.run(run_proxy(args.listen, args.upstream, output_file, backend))
+        except KeyboardInterrupt:
+            print(f"\n✅ 記錄已儲存至: {output_file}")
+        return
+
+    entries, skipped = parse_logs(args.parse_log, args.log_format)
+    if not entries:
+        print(f"❌ 沒有解析到任何 /search 請求 (略過 {skipped:,} 行)")
+        return
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    span = entries[-1]['ts'] - entries[0]['ts']
+    print(f"✓ 解析 {len(entries):,} 筆 /search 請求 (略過 {skipped:,} 行),"
+          f"涵蓋 {span:.0f} 秒,平均 {len(entries) / max(span, 1):.1f} req/s")
+    print(f"✅ 記錄已儲存至: {output_file}")
+
+if __name__ == '__main__':
+    main()
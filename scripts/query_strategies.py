@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+/search 查詢寫法比較工具 (含結果一致性檢查)
+
+目前的 /search SQL 透過 NOT (...) 排除條件,每列最多重複計算三次 ILIKE / % / <<%,
+最後的 DISTINCT ON (id) ... ORDER BY id, sim DESC LIMIT 20 保留的是 id 最小的 20 筆,
+而不是分數最高的 20 筆 (backend 只在這 20 筆裡排序)。本工具並列比較多種寫法:
+
+- current:          目前的四分支 UNION ALL (與 backend 相同)
+- current_topk:     同樣的四分支,但去重後依分數取前 20 筆
+- single_pass:      單次掃描 + CASE 計分,語意與 current 相同 (依 id 取 20 筆)
+- single_pass_topk: 單次掃描 + CASE 計分,依分數取前 20 筆
+- gist_knn:         ORDER BY title <-> q (需要 GiST 索引才能走 KNN 掃描)
+
+參考排名為「所有符合條件的列依 CASE 分數排序的前 20 筆」,以停用索引的循序掃描計算,
+與索引無關。每種寫法回報與參考排名的 overlap@20、完全同序比例 (結果依 sim DESC, id 排序後比較,
+等同 backend 的 JS 排序),以及 EXPLAIN (ANALYZE, BUFFERS) 的延遲、buffers 與 plan cost。
+
+用法:
+  # 使用目前資料
+  python3 scripts/query_strategies.py
+
+  # 在多個資料量下比較,並暫時建立 GiST 索引讓 gist_knn 走 KNN 掃描 (會清空 worlds!)
+  python3 scripts/query_strategies.py --volumes 10000 100000 --create-gist
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from collections import defaultdict
+
+from db import connect
+from search_sql import (
+    BRANCHES, DEFAULT_QUERIES, apply_search_settings, branch_sql, build_search_sql, classify_query,
+    explain, load_queries, set_data_volume, summarize_plan,
+)
+
+TOP_K = 20
+GIST_INDEX = 'idx_title_trgm_gist'
+
+# 任一分支成立即為候選 (exact_prefix 已包含在 contains 內)
+MATCH_CONDITION = """
+    title ILIKE '%%' || %(q)s || '%%'
+    OR title %% %(q)s
+    OR %(q)s <<%% title
+"""
+
+# 與四分支優先順序相同的計分 (每列只落在第一個成立的分支)
+SCORE_SELECT = """
+    SELECT
+      id,
+      title,
+      description,
+      CASE
+        WHEN title ILIKE %(q)s || '%%' THEN similarity(title, %(q)s) + 0.5
+        WHEN title %% %(q)s THEN similarity(title, %(q)s) + 0.3
+        WHEN %(q)s <<%% title THEN word_similarity(%(q)s, title) + 0.2
+        ELSE similarity(title, %(q)s) + 0.1
+      END AS sim,
+      CASE
+        WHEN title ILIKE %(q)s || '%%' THEN 'exact_prefix'
+        WHEN title %% %(q)s THEN 'similarity'
+        WHEN %(q)s <<%% title THEN 'word_similarity'
+        ELSE 'contains'
+      END AS match_type
+    FROM {table}
+    WHERE {condition}
+"""
+
+SINGLE_PASS_SQL = """
+    SELECT id, title, description, sim, match_type
+    FROM ({scored}) scored
+    WHERE sim > 0.2
+    ORDER BY {order}
+    LIMIT 20
+"""
+
+CURRENT_TOPK_SQL = """
+    WITH search_results AS (
+      {branches}
+    )
+    SELECT id, title, description, sim, match_type
+    FROM (
+      SELECT DISTINCT ON (id)
+        id, title, description, sim, match_type
+      FROM search_results
+      WHERE sim > 0.2
+      ORDER BY id, sim DESC
+    ) deduped
+    ORDER BY sim DESC, id
+    LIMIT 20
+"""
+
+# KNN 掃描依 title <-> q (1 - similarity) 取最近的 200 列,再以 CASE 分數重新排序
+GIST_KNN_SQL = """
+    SELECT id, title, description, sim, match_type
+    FROM (
+      {scored}
+      ORDER BY title <-> %(q)s
+      LIMIT 200
+    ) nearest
+    WHERE sim > 0.2
+    ORDER BY sim DESC, id
+    LIMIT 20
+"""
+
+def _scored(table='worlds'):
+    return SCORE_SELECT.format(table=table, condition=MATCH_CONDITION)
+
+def strategy_sql(name, table='worlds'):
+    """取得指定寫法的 SQL"""
+    if name == 'current':
+        return build_search_sql(table)
+    if name == 'current_topk':
+        branches = '\n      UNION ALL\n'.join(branch_sql(b, table) for b in BRANCHES)
+        return CURRENT_TOPK_SQL.format(branches=branches)
+    if name == 'single_pass':
+        return SINGLE_PASS_SQL.format(scored=_scored(table), order='id')
+    if name == 'single_pass_topk':
+        return SINGLE_PASS_SQL.format(scored=_scored(table), order='sim DESC, id')
+    if name == 'gist_knn':
+        return GIST_KNN_SQL.format(scored=_scored(table))
+    raise ValueError(f'未知的寫法: {name}')
+
+STRATEGIES = ['current', 'current_topk', 'single_pass', 'single_pass_topk', 'gist_knn']
+
+def _ranked(rows):
+    """依 sim DESC, id 排序 (與 backend 的 JS 排序相同,同分以 id 決定)"""
+    return [row[0] for row in sorted(rows, key=lambda r: (-float(r[3]), r[0]))]
+
+def reference_ranking(cur, query):
+    """停用索引,以循序掃描計算所有符合列的真正前 20 名"""
+    cur.execute('SET LOCAL enable_indexscan = off')
+    cur.execute('SET LOCAL enable_bitmapscan = off')
+    cur.execute(strategy_sql('single_pass_topk'), {'q': query})
+    rows = cur.fetchall()
+    cur.execute('RESET enable_indexscan')
+    cur.execute('RESET enable_bitmapscan')
+    return _ranked(rows)
+
+def evaluate(conn, queries, repeat):
+    """回傳 [{query, query_class, strategy, overlap, same_order, execution_ms, ...}]"""
+    cur = conn.cursor()
+    apply_search_settings(cur)
+    records = []
+    for query in queries:
+        reference = reference_ranking(cur, query)
+        for strategy in STRATEGIES:
+            sql = strategy_sql(strategy)
+            cur.execute(sql, {'q': query})
+            result = _ranked(cur.fetchall())
+            summaries = [summarize_plan(explain(cur, sql, {'q': query})) for _ in range(repeat)]
+            overlap = len(set(result) & set(reference)) / len(reference) if reference else 1.0
+            records.append({
+                'query': query,
+                'query_class': classify_query(query),
+                'strategy': strategy,
+                'overlap': overlap,
+                'same_order': result == reference,
+                'returned': len(result),
+                'execution_ms': statistics.median(s['execution_ms'] for s in summaries),
+                'shared_blocks': statistics.median(s['shared_hit'] + s['shared_read'] for s in summaries),
+                'total_cost': summaries[0]['total_cost'],
+                'indexes': summaries[0]['indexes'],
+            })
+    conn.rollback()
+    cur.close()
+    return records
+
+def aggregate(records):
+    """依 (查詢類別, 寫法) 彙總;另以 'all' 彙總所有類別"""
+    grouped = defaultdict(list)
+    for record in records:
+        grouped[(record['query_class'], record['strategy'])].append(record)
+        grouped[('all', record['strategy'])].append(record)
+
+    summary = {}
+    for (query_class, strategy), items in grouped.items():
+        summary.setdefault(query_class, {})[strategy] = {
+            'queries': len(items),
+            'overlap': statistics.mean(i['overlap'] for i in items),
+            'same_order': sum(1 for i in items if i['same_order']) / len(items),
+            'median_ms': statistics.median(i['execution_ms'] for i in items),
+            'max_ms': max(i['execution_ms'] for i in items),
+            'shared_blocks': statistics.mean(i['shared_blocks'] for i in items),
+            'total_cost': statistics.mean(i['total_cost'] for i in items),
+        }
+    return summary
+
+def print_summary(label, summary):
+    """每個查詢類別一張表"""
+    print("\n" + "=" * 100)
+    print(f"資料量: {label:,} 筆 (參考排名 = 依分數排序的真正前 {TOP_K} 筆)")
+    print("=" * 100)
+    for query_class in sorted(summary, key=lambda c: (c != 'all', c)):
+        print(f"\n[{query_class}]")
+        print(f"{'寫法':<18} {f'overlap@{TOP_K}':>11} {'同序':>7} {'中位(ms)':>10} {'最大(ms)':>10} "
+              f"{'buffers':>9} {'cost':>10}")
+        for strategy in STRATEGIES:
+            item = summary[query_class].get(strategy)
+            if item:
+                print(f"{strategy:<18} {item['overlap']:>11.2f} {item['same_order']:>7.0%} "
+                      f"{item['median_ms']:>10.2f} {item['max_ms']:>10.2f} "
+                      f"{item['shared_blocks']:>9.0f} {item['total_cost']:>10.0f}")
+
+def has_gist_index(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT 1 FROM pg_indexes
+        WHERE tablename = 'worlds' AND indexdef ILIKE '%gist%' AND indexdef ILIKE '%(title%'
+    """)
+    found = cur.fetchone() is not None
+    cur.close()
+    conn.rollback()
+    return found
+
+def set_gist_index(conn, create):
+    """建立或刪除 title 的 GiST 索引 (只在 --create-gist 時使用)"""
+    previous_autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        cur = conn.cursor()
+        if create:
+            cur.execute(f'CREATE INDEX IF NOT EXISTS {GIST_INDEX} ON worlds USING gist (title gist_trgm_ops)')
+            cur.execute('ANALYZE worlds')
+        else:
+            cur.execute(f'DROP INDEX IF EXISTS {GIST_INDEX}')
+        cur.close()
+    finally:
+        conn.autocommit = previous_autocommit
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='比較 /search 的不同 SQL 寫法 (結果一致性、延遲、buffers、cost)')
+    parser.add_argument('--volumes', type=int, nargs='+',
+                        help='要測試的資料量 (會清空並重新產生 worlds);未指定則使用目前資料')
+    parser.add_argument('--queries', nargs='+', default=DEFAULT_QUERIES, help='查詢字串 (預設與 k6 腳本相同)')
+    parser.add_argument('--queries-file', '--workload', dest='queries_file',
+                        help='查詢集檔案 (build_workload.py 的 JSONL 或每行一個查詢)')
+    parser.add_argument('--repeat', type=int, default=3, help='每個查詢/寫法重複次數 (預設: 3)')
+    parser.add_argument('--create-gist', action='store_true',
+                        help=f'暫時在 worlds.title 建立 GiST 索引 ({GIST_INDEX}),結束後刪除')
+    parser.add_argument('--output', default=None,
+                        help='輸出 JSON (預設: test-results/query_strategies_<timestamp>.json)')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    queries = load_queries(args.queries_file) if args.queries_file else args.queries
+
+    print("=" * 100)
+    print("/search 查詢寫法比較")
+    print("=" * 100)
+    print(f"寫法: {', '.join(STRATEGIES)}")
+    print(f"查詢: {len(queries)} 個")
+
+    conn = connect()
+    report = {}
+    try:
+        for volume in args.volumes or [None]:
+            if volume is not None:
+                print(f"\n🔧 產生 {volume:,} 筆測試資料...", end=' ', flush=True)
+                set_data_volume(conn, volume)
+                print("✓")
+            if args.create_gist:
+                print("🏗️  建立 GiST 索引...", end=' ', flush=True)
+                set_gist_index(conn, True)
+                print("✓")
+            elif not has_gist_index(conn):
+                print("⚠️  worlds.title 沒有 GiST 索引,gist_knn 會以排序代替 KNN 掃描 (可加 --create-gist)")
+
+            cur = conn.cursor()
+            cur.execute('SELECT COUNT(*) FROM worlds')
+            label = cur.fetchone()[0]
+            cur.close()
+            conn.rollback()
+
+            records = evaluate(conn, queries, args.repeat)
+            summary = aggregate(records)
+            print_summary(label, summary)
+            report[label] = {'summary': summary, 'records': records}
+    finally:
+        if args.create_gist:
+            set_gist_index(conn, False)
+        conn.close()
+
+    output_file = args.output or os.path.join(
+        'test-results', f"query_strategies_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果已儲存至: {output_file}")
+
+if __name__ == '__main__':
+    main()
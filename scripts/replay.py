@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+依原始時間節奏重播 /search 查詢記錄 (query_capture.py 的輸出)
+
+每個請求在「原始時間差 / --speed」送出,不等前一個請求完成 (與 loadgen.py 相同的開放模型),
+所以原本同時在飛的請求重播時也會同時在飛,突發流量的形狀不變。
+延遲從排定的送出時間開始計算 (含用戶端積壓),以原始時間切成 --window 秒的時段回報:
+請求數、原始到達率、重播 p50 / p95 / p99、錯誤數,以及記錄中的原始回應時間 p95 (若有),
+用來在改過 SQL、索引或設定後重現正式環境的事故時段。
+
+輸出:
+- k6 相容的 JSONL (與 loadgen.py 相同,檔名 k6_<資料量>_<timestamp>.json,可交給 visualize_k6_results.py)
+- 時段報告 JSON (test-results/replay_<timestamp>.json)
+
+用法:
+  # 原速重播到 Node backend
+  python3 scripts/replay.py test-results/query_log_20250115_102300.jsonl
+
+  # 只重播事故前後 10 分鐘 (記錄開始後第 50 分鐘起),以 2 倍速打 Go backend
+  python3 scripts/replay.py prod.jsonl --start 50m --duration 10m --speed 2 --base-url http://localhost:3001
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import urllib.parse
+from datetime import datetime
+
+from loadgen import (
+    ConnectionPool, LatencyHistogram, _point, fetch_record_count, http_get, parse_duration,
+)
+from search_sql import classify_query
+
+def load_log(filename, start=0.0, duration=None):
+    """讀取查詢記錄,回傳 (記錄開始的 epoch, [entry]);entry['offset'] 為相對記錄開始的秒數"""
+    entries = []
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    entries.sort(key=lambda entry: entry['ts'])
+    if not entries:
+        return None, []
+    origin = entries[0]['ts']
+    selected = []
+    for entry in entries:
+        offset = entry['ts'] - origin
+        if offset < start or (duration is not None and offset >= start + duration):
+            continue
+        selected.append(dict(entry, offset=offset))
+    return origin, selected
+
+# ============================================================================
+# Worker
+# ============================================================================
+
+async def _worker_main(worker_id, schedule, start_epoch, config, part_file):
+    parsed = urllib.parse.urlsplit(config['base_url'])
+    pool = ConnectionPool(parsed.hostname, parsed.port or 80, config['connections'])
+    windows = {}
+    out = open(part_file, 'w', encoding='utf-8')
+
+    async def one_request(entry):
+        scheduled = start_epoch + (entry['offset'] - config['start']) / config['speed']
+        window = int(entry['offset'] // config['window'])
+        query = entry['query']
+        tags = {
+            'name': 'search',
+            'query': query,
+            'query_class': classify_query(query),
+            'backend': config['backend'],
+            'group': '',
+            'scenario': 'replay',
+            'method': 'GET',
+        }
+        send_epoch = time.time()
+        search_ms = None
+        failed = True
+        try:
+            status, body, timings = await asyncio.wait_for(
+                http_get(pool, parsed.netloc, f"/search?q={urllib.parse.quote(query)}"), config['timeout'])
+            tags['status'] = str(status)
+            failed = status != 200
+            if not failed:
+                meta = json.loads(body).get('meta') or {}
+                if isinstance(meta.get('queryTimeMs'), (int, float)):
+                    search_ms = meta['queryTimeMs']
+        except (asyncio.TimeoutError, OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            tags['status'] = '0'
+            timings = {'blocked': 0.0, 'connecting': 0.0, 'sending': 0.0, 'waiting': 0.0, 'receiving': 0.0}
+        end_epoch = time.time()
+
+        total_ms = (end_epoch - scheduled) * 1000
+        lag_ms = max((send_epoch - scheduled) * 1000, 0.0)
+        stats = windows.setdefault(window, {'latency': LatencyHistogram(), 'requests': 0, 'errors': 0,
+                                            'max_lag_ms': 0.0})
+        stats['latency'].record(total_ms)
+        stats['requests'] += 1
+        stats['errors'] += int(failed)
+        stats['max_lag_ms'] = max(stats['max_lag_ms'], lag_ms)
+
+        lines = [
+            _point('http_reqs', 1, end_epoch, tags),
+            _point('http_req_duration', total_ms, end_epoch, tags),
+            _point('http_req_blocked', lag_ms + timings['blocked'], end_epoch, tags),
+            _point('http_req_connecting', timings['connecting'], end_epoch, tags),
+            _point('http_req_tls_handshaking', 0.0, end_epoch, tags),
+            _point('http_req_sending', timings['sending'], end_epoch, tags),
+            _point('http_req_waiting', timings['waiting'], end_epoch, tags),
+            _point('http_req_receiving', timings['receiving'], end_epoch, tags),
+            _point('http_req_failed', int(failed), end_epoch, tags),
+            _point('errors', int(failed), end_epoch, tags),
+        ]
+        if search_ms is not None:
+            network_ms = lag_ms + sum(timings[name] for name in ('blocked', 'connecting', 'sending', 'receiving'))
+            lines += [
+                _point('search_duration', search_ms, end_epoch, tags),
+                _point('backend_overhead', max(timings['waiting'] - search_ms, 0.0), end_epoch, tags),
+                _point('network_time', network_ms, end_epoch, tags),
+            ]
+        out.write('\n'.join(lines) + '\n')
+
+    tasks = []
+    try:
+        for _, entry in schedule:
+            delay = start_epoch + (entry['offset'] - config['start']) / config['speed'] - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(one_request(entry)))
+        await asyncio.gather(*tasks)
+    finally:
+        out.close()
+    return {window: dict(stats, latency=stats['latency'].to_dict()) for window, stats in windows.items()}
+
+def run_worker(worker_id, schedule, start_epoch, config, part_file):
+    """multiprocessing 的進入點 (每個 process 一個事件迴圈)"""
+    return asyncio.run(_worker_main(worker_id, schedule, start_epoch, config, part_file))
+
+# ============================================================================
+# 時段報告
+# ============================================================================
+
+def merge_windows(results):
+    """合併各 worker 的時段統計"""
+    merged = {}
+    for result in results:
+        for window, stats in result.items():
+            item = merged.setdefault(window, {'latency': LatencyHistogram(), 'requests': 0, 'errors': 0,
+                                              'max_lag_ms': 0.0})
+            item['latency'].merge(LatencyHistogram(stats['latency']))
+            item['requests'] += stats['requests']
+            item['errors'] += stats['errors']
+            item['max_lag_ms'] = max(item['max_lag_ms'], stats['max_lag_ms'])
+    return merged
+
+def build_report(entries, merged, origin, window):
+    """依原始時段整理重播與原始記錄的延遲"""
+    captured = {}
+    for entry in entries:
+        bucket = captured.setdefault(int(entry['offset'] // window), {'latency': LatencyHistogram(), 'errors': 0})
+        if entry.get('duration_ms') is not None:
+            bucket['latency'].record(entry['duration_ms'])
+        bucket['errors'] += int(entry.get('status', 200) != 200)
+
+    rows = []
+    for index in sorted(captured):
+        stats = merged.get(index)
+        original = captured[index]
+        latency = stats['latency'] if stats else LatencyHistogram()
+        requests = stats['requests'] if stats else 0
+        rows.append({
+            'window_start': origin + index * window,
+            'offset_s': index * window,
+            'requests': requests,
+            'rate': requests / window,
+            'p50_ms': latency.percentile(50),
+            'p95_ms': latency.percentile(95),
+            'p99_ms': latency.percentile(99),
+            'errors': stats['errors'] if stats else 0,
+            'max_lag_ms': stats['max_lag_ms'] if stats else 0.0,
+            'captured_p95_ms': original['latency'].percentile(95),
+            'captured_errors': original['errors'],
+        })
+    return rows
+
+def _ms(value):
+    return '-' if value is None else f'{value:.1f}'
+
+def print_report(rows, window):
+    print("\n" + "=" * 110)
+    print(f"重播結果 (依原始時間每 {window:g} 秒一個時段,延遲 ms)")
+    print("=" * 110)
+    print(f"{'原始時段':<20} {'請求':>7} {'req/s':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'錯誤':>6}"
+          f" {'原始 p95':>9} {'原始錯誤':>8} {'最大積壓':>9}")
+    print("-" * 110)
+    worst = max(rows, key=lambda row: row['p99_ms'] or 0.0)
+    for row in rows:
+        started = datetime.fromtimestamp(row['window_start']).strftime('%m-%d %H:%M:%S')
+        marker = '  ◀ 最慢' if row is worst else ''
+        print(f"{started:<20} {row['requests']:>7,} {row['rate']:>7.1f} {_ms(row['p50_ms']):>9}"
+              f" {_ms(row['p95_ms']):>9} {_ms(row['p99_ms']):>9} {row['errors']:>6,}"
+              f" {_ms(row['captured_p95_ms']):>9} {row['captured_errors']:>8,} {row['max_lag_ms']:>9.1f}{marker}")
+    print("\n最大積壓 = 請求實際送出比排定時間晚的最大值;持續偏高代表重播端跟不上,請加 --workers")
+
+# ============================================================================
+# 主程式
+# ============================================================================
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='依原始時間節奏重播 /search 查詢記錄,依時段回報延遲')
+    parser.add_argument('log', help='query_capture.py 產生的查詢記錄 (JSONL)')
+    parser.add_argument('--base-url', default=os.environ.get('BASE_URL', 'http://[::1]:3000'),
+                        help='backend 位址 (預設: BASE_URL 環境變數或 http://[::1]:3000)')
+    parser.add_argument('--backend', default=os.environ.get('BACKEND'),
+                        help='backend 名稱 tag (預設依 port 判斷: 3001 → go,其餘 → node)')
+    parser.add_argument('--speed', type=float, default=1.0, help='重播速度倍數 (預設: 1 = 原速,2 = 兩倍速)')
+    parser.add_argument('--start', type=parse_duration, default=0.0, help='從記錄開始後多久開始重播 (例如 50m)')
+    parser.add_argument('--duration', type=parse_duration, default=None, help='只重播這段原始時間 (例如 10m)')
+    parser.add_argument('--window', type=parse_duration, default=10.0, help='報告時段長度,以原始時間計 (預設: 10s)')
+    parser.add_argument('--workers', type=int, default=1, help='worker process 數 (預設: 1)')
+    parser.add_argument('--connections', type=int, default=256, help='每個 worker 的最大連線數 (預設: 256)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='單一請求逾時秒數 (預設: 30)')
+    parser.add_argument('--output', default=None,
+                        help='k6 相容 JSONL (預設: test-results/k6_<資料量>_<timestamp>.json)')
+    parser.add_argument('--report', default=None,
+                        help='時段報告 JSON (預設: test-results/replay_<timestamp>.json)')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    if args.speed <= 0:
+        print("❌ --speed 必須大於 0")
+        return
+    base_url = args.base_url.rstrip('/')
+    backend = args.backend or ('go' if ':3001' in base_url else 'node')
+    origin, entries = load_log(args.log, args.start, args.duration)
+    if not entries:
+        print("❌ 記錄中沒有可重播的請求 (檢查 --start / --duration)")
+        return
+
+    records = fetch_record_count(base_url)
+    stamp = time.strftime('%Y%m%d_%H%M%S')
+    output_file = args.output or os.path.join('test-results', f"k6_{records}_{stamp}.json")
+    report_file = args.report or os.path.join('test-results', f"replay_{stamp}.json")
+    for path in (output_file, report_file):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    span = entries[-1]['offset'] - entries[0]['offset']
+    print("=" * 110)
+    print("查詢記錄重播")
+    print("=" * 110)
+    print(f"📍 目標: {base_url} ({backend}), 資料筆數: {records}")
+    print(f"📼 {args.log}: {len(entries):,} 個請求,原始長度 {span:.0f}s,"
+          f"{args.speed:g} 倍速 → 約 {span / args.speed:.0f}s")
+
+    config = {
+        'base_url': base_url,
+        'backend': backend,
+        'speed': args.speed,
+        'start': args.start,
+        'window': args.window,
+        'connections': args.connections,
+        'timeout': args.timeout,
+    }
+    # 交錯分配,每個 worker 的請求仍依原始時間排序
+    schedules = [[(i, entry) for i, entry in enumerate(entries) if i % args.workers == w]
+                 for w in range(args.workers)]
+    part_dir = tempfile.mkdtemp(prefix='replay_')
+    part_files = [os.path.join(part_dir, f'worker_{w}.jsonl') for w in range(args.workers)]
+    start_epoch = time.time() + 1.0  # 給 worker 啟動的時間
+
+    try:
+        with multiprocessing.Pool(args.workers) as pool:
+            results = pool.starmap(run_worker, [
+                (w, schedules[w], start_epoch, config, part_files[w]) for w in range(args.workers)
+            ])
+        with open(output_file, 'w', encoding='utf-8') as out:
+            for part_file in part_files:
+                with open(part_file, 'r', encoding='utf-8') as part:
+                    shutil.copyfileobj(part, out)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+    merged = merge_windows(results)
+    rows = build_report(entries, merged, origin, args.window)
+    print_report(rows, args.window)
+
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'log': args.log,
+            'base_url': base_url,
+            'backend': backend,
+            'records': records,
+            'speed': args.speed,
+            'start_s': args.start,
+            'duration_s': args.duration,
+            'window_s': args.window,
+            'requests': len(entries),
+            'errors': sum(row['errors'] for row in rows),
+            'windows': rows,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果已儲存至: {output_file}")
+    print(f"✅ 時段報告已儲存至: {report_file}")
+
+if __name__ == '__main__':
+    main()
@@ -17,6 +17,8 @@ NC='\033[0m' # No Color
 # 配置
 # 使用 IPv6 地址避免連到本機的其他服務
 BASE_URL="${BASE_URL:-http://[::1]:3000}"
+# 後端名稱 (node / go),留空時由 k6 腳本依 port 判斷
+BACKEND="${BACKEND:-}"
 RESULTS_DIR="./test-results"
 TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
 REPORT_FILE="${RESULTS_DIR}/performance_report_${TIMESTAMP}.md"
@@ -27,6 +29,22 @@ DATA_VOLUMES=(100 500 1000 5000 10000 50000 100000 200000 500000 1000000)
 # k6 測試場景
 K6_SCENARIO="${K6_SCENARIO:-load}"
 
+# 查詢工作負載 (scripts/build_workload.py 產生的 JSONL),留空時使用 k6 腳本內建的查詢
+WORKLOAD="${WORKLOAD:-}"
+
+# 負載產生器: k6 (封閉模型 VU) 或 python (scripts/loadgen.py 開放模型,不需要 k6)
+LOAD_GENERATOR="${LOAD_GENERATOR:-k6}"
+
+# 是否在 k6 測試期間同步取樣 PostgreSQL 統計 (需要 python3 + psycopg2)
+PG_STATS="${PG_STATS:-1}"
+PG_STATS_INTERVAL="${PG_STATS_INTERVAL:-1}"
+
+# 資料集準備方式: generate (每個資料量清空後重新產生) 或 template
+# (scripts/dataset_manager.py: 每個資料量只建一次 template database,之後以 CREATE DATABASE ... TEMPLATE 秒級切換)
+DATASETS="${DATASETS:-generate}"
+# DATASETS=template 時改用語料快照的前 N 筆,而不是 generate_test_data() 的亂數資料
+DATASET_SNAPSHOT="${DATASET_SNAPSHOT:-}"
+
 # ============================================================================
 # 函數定義
 # ============================================================================
@@ -114,6 +132,27 @@ generate_data() {
     fi
 }
 
+# 換上預先建立的資料集 (template database 不存在時先建立)
+use_dataset() {
+    local count=$1
+    print_info "切換至 ${count} 筆資料集 (template database)..."
+    
+    if ! python3 scripts/dataset_manager.py --use "${count}" ${DATASET_SNAPSHOT:+--snapshot "${DATASET_SNAPSHOT}"}; then
+        print_error "切換資料集失敗"
+        exit 1
+    fi
+}
+
+# 預先建立所有資料量的 template (已存在的會直接略過)
+build_datasets() {
+    print_info "準備資料集 template..."
+    
+    if ! python3 scripts/dataset_manager.py --build "${DATA_VOLUMES[@]}" ${DATASET_SNAPSHOT:+--snapshot "${DATASET_SNAPSHOT}"}; then
+        print_error "建立資料集 template 失敗"
+        exit 1
+    fi
+}
+
 # 取得資料統計
 get_stats() {
     RESPONSE=$(curl -s "${BASE_URL}/admin/data/stats")
@@ -133,13 +172,52 @@ run_k6_test() {
     local data_count=$1
     local output_file="${RESULTS_DIR}/k6_${data_count}_${TIMESTAMP}.json"
     
-    print_info "執行 k6 測試 (${K6_SCENARIO} 場景)..."
+    local stats_file="${RESULTS_DIR}/pgstats_${data_count}_${TIMESTAMP}.jsonl"
+    local sampler_pid=""
+    local rc=0
+    
+    # 同步啟動 PostgreSQL 統計取樣 (失敗不影響 k6 測試)
+    if [ "${PG_STATS}" = "1" ]; then
+        print_info "啟動 PostgreSQL 統計取樣..."
+        python3 scripts/pg_stats_sampler.py --interval "${PG_STATS_INTERVAL}" --output "${stats_file}" &
+        sampler_pid=$!
+        # 中斷 (Ctrl+C) 或 set -e 提前結束時也要停止取樣
+        trap "kill -TERM ${sampler_pid} 2>/dev/null || true" EXIT
+    fi
+    
+    if [ "${LOAD_GENERATOR}" = "python" ]; then
+        print_info "執行開放模型負載測試 (${K6_SCENARIO} 場景)..."
+        
+        python3 scripts/loadgen.py \
+            --scenario "${K6_SCENARIO}" \
+            --base-url "${BASE_URL}" \
+            ${BACKEND:+--backend "${BACKEND}"} \
+            ${WORKLOAD:+--workload "${WORKLOAD}"} \
+            --output "${output_file}" || rc=$?
+    else
+        print_info "執行 k6 測試 (${K6_SCENARIO} 場景)..."
+        
+        k6 run \
+            -e SCENARIO="${K6_SCENARIO}" \
+            -e BASE_URL="${BASE_URL}" \
+            ${BACKEND:+-e BACKEND="${BACKEND}"} \
+            ${WORKLOAD:+-e WORKLOAD="$(realpath "${WORKLOAD}")"} \
+            --out "json=${output_file}" \
+            k6-tests/search-performance.js || rc=$?
+    fi
+    
+    if [ -n "${sampler_pid}" ]; then
+        kill -TERM "${sampler_pid}" 2>/dev/null || true
+        wait "${sampler_pid}" 2>/dev/null || true
+        trap - EXIT
+        print_success "PostgreSQL 統計已儲存至: ${stats_file}"
+    fi
     
-    k6 run \
-        -e SCENARIO="${K6_SCENARIO}" \
-        -e BASE_URL="${BASE_URL}" \
-        --out "json=${output_file}" \
-        k6-tests/search-performance.js
+    # 負載測試失敗 (例如 k6 threshold 未通過時結束碼 99) 時,停止取樣後才以相同結束碼結束
+    if [ "${rc}" -ne 0 ]; then
+        print_error "負載測試失敗 (結束碼 ${rc})"
+        exit "${rc}"
+    fi
     
     print_success "k6 測試完成，結果已儲存至: ${output_file}"
 }
@@ -159,7 +237,8 @@ init_report() {
 
 - **資料量級別:** ${DATA_VOLUMES[@]}
 - **k6 場景:** ${K6_SCENARIO}
-- **測試工具:** k6
+- **測試工具:** ${LOAD_GENERATOR}
+- **資料集準備:** ${DATASETS}${DATASET_SNAPSHOT:+ (${DATASET_SNAPSHOT})}
 
 ## 測試結果
 
@@ -224,27 +303,40 @@ main() {
     
     # 前置檢查
     check_service
-    check_k6
+    if [ "${LOAD_GENERATOR}" != "python" ]; then
+        check_k6
+    fi
     
     # 初始化報告
     init_report
     
+    if [ "${DATASETS}" = "template" ]; then
+        build_datasets
+    fi
+    
     # 對每個資料量級別執行測試
     for count in "${DATA_VOLUMES[@]}"; do
         print_header "測試資料量: ${count} 筆"
         
-        # 清空並產生新資料
-        clear_data
-        generate_data $count
+        if [ "${DATASETS}" = "template" ]; then
+            # template 已建好索引並 VACUUM ANALYZE,不需要等待
+            use_dataset $count
+        else
+            # 清空並產生新資料
+            clear_data
+            generate_data $count
+        fi
         
         # 顯示統計資訊
         print_info "資料統計:"
         STATS=$(get_stats)
         echo "$STATS"
         
-        # 等待索引穩定
-        print_info "等待 10 秒讓索引穩定..."
-        sleep 10
+        if [ "${DATASETS}" != "template" ]; then
+            # 等待索引穩定
+            print_info "等待 10 秒讓索引穩定..."
+            sleep 10
+        fi
         
         # 驗證服務可用
         print_info "驗證服務狀態..."
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+/search 查詢的 SQL 與 EXPLAIN 計畫分析共用函數
+
+SQL 內容與 backend/server.js、backend-go/handlers/search.go 保持一致,
+供 scripts/ 下的效能分析工具使用 (參數以 psycopg2 的 %(q)s 傳入)。
+"""
+
+import json
+import time
+
+# 與 init.sql / server.js 相同的 pg_trgm 閾值
+SIMILARITY_THRESHOLD = 0.3
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+# 與 k6-tests/search-performance.js 相同的預設查詢
+DEFAULT_QUERIES = [
+    'a1b2c3', 'abc123def', 'test', 'xyz', 'random',
+    '12345', 'abcdefgh', 'md5', 'data', 'search',
+]
+
+# 查詢類別 (與 k6 腳本的 classifyQuery 相同)
+QUERY_CLASSES = ('short_hex', 'long_hex', 'short_word', 'long_word')
+
+# 四個 UNION ALL 分支 (含 NOT (...) 排除條件)
+BRANCHES = {
+    'exact_prefix': """
+        SELECT
+          id,
+          title,
+          description,
+          similarity(title, %(q)s) + 0.5 AS sim,
+          'exact_prefix' AS match_type
+        FROM {table}
+        WHERE title ILIKE %(q)s || '%%'
+    """,
+    'similarity': """
+        SELECT
+          id,
+          title,
+          description,
+          similarity(title, %(q)s) + 0.3 AS sim,
+          'similarity' AS match_type
+        FROM {table}
+        WHERE title %% %(q)s
+          AND NOT (title ILIKE %(q)s || '%%')
+    """,
+    'word_similarity': """
+        SELECT
+          id,
+          title,
+          description,
+          word_similarity(%(q)s, title) + 0.2 AS sim,
+          'word_similarity' AS match_type
+        FROM {table}
+        WHERE %(q)s <<%% title
+          AND NOT (title ILIKE %(q)s || '%%')
+          AND NOT (title %% %(q)s)
+    """,
+    'contains': """
+        SELECT
+          id,
+          title,
+          description,
+          similarity(title, %(q)s) + 0.1 AS sim,
+          'contains' AS match_type
+        FROM {table}
+        WHERE title ILIKE '%%' || %(q)s || '%%'
+          AND NOT (title ILIKE %(q)s || '%%')
+          AND NOT (title %% %(q)s)
+          AND NOT (%(q)s <<%% title)
+    """,
+}
+
+SEARCH_SQL_TEMPLATE = """
+    WITH search_results AS (
+      {branches}
+    )
+    SELECT DISTINCT ON (id)
+      id, title, description, sim, match_type
+    FROM search_results
+    WHERE sim > 0.2
+    ORDER BY id, sim DESC
+    LIMIT 20
+"""
+
+def classify_query(query):
+    """
+    查詢分類 (與 k6-tests/search-performance.js 的 classifyQuery 相同)
+
+    測試資料的 title 是 md5 十六進位字串,只含 [0-9a-f] 的查詢會大量命中;
+    長度 <= 3 的查詢可用的 trigram 很少。
+    """
+    length = 'short' if len(query) <= 3 else 'long'
+    kind = 'hex' if query and all(c in '0123456789abcdefABCDEF' for c in query) else 'word'
+    return f'{length}_{kind}'
+
+def load_queries(filename):
+    """讀取查詢集 (每行一個 JSON,取 query 欄位;或每行一個純文字查詢)"""
+    queries = []
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            queries.append(json.loads(line)['query'] if line.startswith('{') else line)
+    return queries
+
+def load_workload(filename):
+    """
+    讀取 build_workload.py 產生的工作負載,回傳 [{query, weight, kind, ...}]
+
+    純文字或沒有 weight 的查詢集視為權重相同。
+    """
+    items = []
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line) if line.startswith('{') else {'query': line}
+            item.setdefault('weight', 1.0)
+            items.append(item)
+    return items
+
+def branch_sql(name, table='worlds'):
+    """取得單一分支的 SQL"""
+    return BRANCHES[name].format(table=table)
+
+def build_search_sql(table='worlds'):
+    """取得完整的 /search SQL (四個分支 UNION ALL)"""
+    branches = '\n      UNION ALL\n'.join(branch_sql(name, table) for name in BRANCHES)
+    return SEARCH_SQL_TEMPLATE.format(branches=branches)
+
+def apply_search_settings(cur, similarity=SIMILARITY_THRESHOLD, word_similarity=WORD_SIMILARITY_THRESHOLD):
+    """設定會話級別的 pg_trgm 閾值 (與 backend 的 pool.on('connect') 相同)"""
+    cur.execute('SELECT set_config(%s, %s, false), set_config(%s, %s, false)', (
+        'pg_trgm.similarity_threshold', str(similarity),
+        'pg_trgm.word_similarity_threshold', str(word_similarity),
+    ))
+
+def set_data_volume(conn, count):
+    """
+    清空 worlds 並產生指定筆數的測試資料 (使用 init.sql 的管理函數),
+    之後執行 VACUUM ANALYZE 讓統計資訊與實際資料一致。
+    """
+    previous_autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT * FROM clear_all_data()')
+        cur.execute('SELECT * FROM generate_test_data(%s)', (count,))
+        inserted, elapsed_ms = cur.fetchone()
+        cur.execute('VACUUM ANALYZE worlds')
+        cur.close()
+    finally:
+        conn.autocommit = previous_autocommit
+    return inserted, float(elapsed_ms)
+
+def grow_data_volume(conn, target, vacuum=False):
+    """
+    只插入與目前筆數的差額,讓 worlds 成長到 target 筆,之後執行 ANALYZE
+    (vacuum=True 時改為 VACUUM ANALYZE)。回傳 (插入筆數, 插入耗時 ms)。
+    """
+    previous_autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT COUNT(*) FROM worlds')
+        delta = target - cur.fetchone()[0]
+        inserted, elapsed_ms = 0, 0.0
+        if delta > 0:
+            cur.execute('SELECT * FROM generate_test_data(%s)', (delta,))
+            inserted, elapsed_ms = cur.fetchone()
+        cur.execute('VACUUM ANALYZE worlds' if vacuum else 'ANALYZE worlds')
+        cur.close()
+    finally:
+        conn.autocommit = previous_autocommit
+    return inserted, float(elapsed_ms)
+
+# ============================================================================
+# CJK 二字詞 (bigram) 路徑 (seed.py --cjk-bigrams, cjk_bigram_bench.py)
+# ============================================================================
+
+CJK_BIGRAM_COLUMN = 'title_cjk_bigrams'
+CJK_BIGRAM_INDEX = 'idx_title_cjk_bigrams'
+
+# GIN 索引找出包含所有查詢二字詞的候選,再把真正包含整個查詢字串的排在前面,
+# 其次是查詢二字詞佔標題二字詞比例高 (較短、較貼近) 的標題
+CJK_BIGRAM_SQL = """
+        SELECT
+          id,
+          title,
+          description,
+          (strpos(lower(normalize(title, NFKC)), lower(normalize(%(q)s, NFKC))) > 0)::int * 0.5
+            + cardinality(cjk_bigrams(%(q)s, true))::float / cardinality({column}) AS sim,
+          'cjk_bigram' AS match_type
+        FROM {table}
+        WHERE {column} @> cjk_bigrams(%(q)s, true)
+        ORDER BY sim DESC, id
+        LIMIT 20
+"""
+
+def cjk_bigram_sql(table='worlds', column=CJK_BIGRAM_COLUMN):
+    """取得 CJK 二字詞路徑的 SQL"""
+    return CJK_BIGRAM_SQL.format(table=table, column=column)
+
+def add_cjk_bigram_column(cur, table='worlds', column=CJK_BIGRAM_COLUMN, index=CJK_BIGRAM_INDEX):
+    """
+    新增由 cjk_bigrams(title) 產生的 stored generated column 與其 GIN 索引 (已存在則略過)。
+
+    欄位由 PostgreSQL 在寫入時計算,之後 generate_test_data()、快照 COPY 載入、seed.py
+    等所有寫入路徑都會自動維護,不需要各自斷詞。回傳 (新增欄位耗時 ms, 建立索引耗時 ms)。
+    """
+    start = time.perf_counter()
+    cur.execute(f"""
+        ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} TEXT[]
+        GENERATED ALWAYS AS (cjk_bigrams(title)) STORED
+    """)
+    column_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    cur.execute(f'CREATE INDEX IF NOT EXISTS {index} ON {table} USING gin ({column})')
+    return column_ms, (time.perf_counter() - start) * 1000
+
+# ============================================================================
+# EXPLAIN (FORMAT JSON) 計畫分析
+# ============================================================================
+
+def explain(cur, sql, params, analyze=True, buffers=True):
+    """執行 EXPLAIN (FORMAT JSON) 並回傳最上層的計畫 dict"""
+    options = ['FORMAT JSON']
+    if analyze:
+        options.insert(0, 'ANALYZE')
+    if buffers:
+        options.insert(1 if analyze else 0, 'BUFFERS')
+    cur.execute(f"EXPLAIN ({', '.join(options)}) {sql}", params)
+    return cur.fetchone()[0][0]
+
+def walk_plan(node, depth=0):
+    """深度優先走訪計畫樹,產生 (depth, node)"""
+    yield depth, node
+    for child in node.get('Plans', []):
+        yield from walk_plan(child, depth + 1)
+
+def _node_total_ms(node):
+    return node.get('Actual Total Time', 0.0) * node.get('Actual Loops', 1)
+
+def summarize_node(node):
+    """擷取單一節點的關鍵指標 (自身時間 = 總時間扣除子節點)"""
+    children_ms = sum(_node_total_ms(child) for child in node.get('Plans', []))
+    return {
+        'node_type': node.get('Node Type'),
+        'relation': node.get('Relation Name'),
+        'index': node.get('Index Name'),
+        'total_ms': _node_total_ms(node),
+        'self_ms': max(_node_total_ms(node) - children_ms, 0.0),
+        'rows': node.get('Actual Rows', 0) * node.get('Actual Loops', 1),
+        'loops': node.get('Actual Loops', 1),
+        'shared_hit': node.get('Shared Hit Blocks', 0),
+        'shared_read': node.get('Shared Read Blocks', 0),
+        'rows_removed_by_recheck': node.get('Rows Removed by Index Recheck', 0),
+        'rows_removed_by_filter': node.get('Rows Removed by Filter', 0),
+        'lossy_heap_blocks': node.get('Lossy Heap Blocks', 0),
+        'exact_heap_blocks': node.get('Exact Heap Blocks', 0),
+    }
+
+def plan_shape(explained):
+    """
+    計畫形狀簽章: 節點類型 + 使用的索引,lossy bitmap 以 [lossy] 標記
+
+    例如 "Bitmap Heap Scan[lossy] > Bitmap Index Scan(idx_title_trgm)" (依前序走訪順序)。
+    用來比較不同資料量下 planner 是否換了計畫。
+    """
+    parts = []
+    for _, node in walk_plan(explained['Plan']):
+        label = node.get('Node Type', '?')
+        if node.get('Index Name'):
+            label += f"({node['Index Name']})"
+        if node.get('Lossy Heap Blocks', 0) > 0:
+            label += '[lossy]'
+        parts.append(label)
+    return ' > '.join(parts)
+
+def summarize_plan(explained):
+    """
+    彙總一個 EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) 結果
+
+    buffers 取最上層節點 (已包含子節點),recheck / lossy 與使用的索引則加總所有節點。
+    """
+    root = explained['Plan']
+    nodes = [dict(summarize_node(node), depth=depth) for depth, node in walk_plan(root)]
+    return {
+        'execution_ms': explained.get('Execution Time', 0.0),
+        'planning_ms': explained.get('Planning Time', 0.0),
+        'total_cost': root.get('Total Cost', 0.0),
+        'rows': root.get('Actual Rows', 0),
+        'shared_hit': root.get('Shared Hit Blocks', 0),
+        'shared_read': root.get('Shared Read Blocks', 0),
+        'rows_removed_by_recheck': sum(n['rows_removed_by_recheck'] for n in nodes),
+        'lossy_heap_blocks': sum(n['lossy_heap_blocks'] for n in nodes),
+        'indexes': sorted({n['index'] for n in nodes if n['index']}),
+        'seq_scans': sorted({n['relation'] for n in nodes if n['node_type'] == 'Seq Scan'}),
+        'nodes': nodes,
+    }
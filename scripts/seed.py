@@ -6,34 +6,75 @@ Scrapes data from Wikipedia and OpenLibrary API, then inserts into PostgreSQL.
 
 import requests
 from bs4 import BeautifulSoup
-import psycopg2
 import time
 import re
 import xml.etree.ElementTree as ET
 import argparse
+import os
 import sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+import itertools
 import threading
 import urllib3
 
+from corpus_snapshot import load_snapshot, write_snapshot
+from db import DB_CONFIG, POOL_MAX, close_pool, connect, insert_values, pooled_connection
+from dedup import DedupIndex
+from hot_results import refresh_from_file
+from search_sql import add_cjk_bigram_column
+from source_scheduler import SourceFeed, SourceScheduler
+from stage_profiler import StageProfiler, profile_stage, profiled
+
 # Disable SSL warnings for APIs with certificate issues
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# Database connection parameters
-DB_PARAMS = {
-    'host': 'localhost',
-    'port': 5432,
-    'database': 'testdb',
-    'user': 'postgres',
-    'password': 'password'
+
+# Upstream API base URLs. Override one source with its environment variable
+# (e.g. ARXIV_BASE_URL=http://localhost:8765/arxiv) or all of them with
+# --mock-upstream, which points every source at scripts/mock_upstream.py
+SOURCE_BASE_URLS = {
+    'wikipedia': os.environ.get('WIKIPEDIA_BASE_URL', 'https://en.wikipedia.org'),
+    'arxiv': os.environ.get('ARXIV_BASE_URL', 'http://export.arxiv.org'),
+    'google_books': os.environ.get('GOOGLE_BOOKS_BASE_URL', 'https://www.googleapis.com'),
+    'quotable': os.environ.get('QUOTABLE_BASE_URL', 'https://api.quotable.io'),
+    'facts': os.environ.get('FACTS_BASE_URL', 'https://uselessfacts.jsph.pl'),
+    'zenquotes': os.environ.get('ZENQUOTES_BASE_URL', 'https://zenquotes.io'),
+    'openlibrary': os.environ.get('OPENLIBRARY_BASE_URL', 'https://openlibrary.org'),
+}
+
+# Multiplier for the pauses between requests (set to 0 when talking to the mock upstream)
+REQUEST_DELAY_SCALE = 1.0
+
+def polite_sleep(seconds):
+    """Pause between requests to respect upstream rate limits"""
+    if REQUEST_DELAY_SCALE > 0:
+        time.sleep(seconds * REQUEST_DELAY_SCALE)
+
+# Paged sources stop paging a category/subject once fewer than this share of a page is new
+MIN_PAGE_YIELD = 0.1
+
+# Random-endpoint sources give up after this many consecutive duplicates (source exhausted)
+MAX_DUPLICATE_STREAK = 50
+
+# Share of --total each source starts with (the dynamic scheduler moves it around by live yield)
+SOURCE_SHARES = {
+    'arxiv': 0.25,
+    'wikipedia': 0.25,
+    'books': 0.20,
+    'quotable': 0.15,
+    'facts': 0.10,
+    'zenquotes': 0.05,
 }
 
-def scrape_wikipedia_books():
+def scrape_wikipedia_books(dedup=None):
     """Scrape best-selling books from Wikipedia using batch API (optimized)"""
+    if dedup is None:
+        dedup = DedupIndex()
     start_time = time.time()
     print("\nScraping Wikipedia best-selling books...")
     print("  → Fetching list page...", end=' ', flush=True)
-    url = "https://en.wikipedia.org/wiki/List_of_best-selling_books"
+    url = f"{SOURCE_BASE_URLS['wikipedia']}/wiki/List_of_best-selling_books"
     headers = {
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'
     }
@@ -77,6 +118,9 @@ def scrape_wikipedia_books():
         
         print(f"Found {len(titles)} titles")
         
+        # Skip titles another source already supplied before fetching their descriptions
+        titles = [title for title in titles if not dedup.seen(title)]
+        
         # Second pass: batch fetch descriptions using Wikipedia API
         # This is MUCH faster - only 1 request instead of 50!
         print(f"  → Batch fetching descriptions (1 request for all {len(titles)} books)...", end=' ', flush=True)
@@ -87,7 +131,7 @@ def scrape_wikipedia_books():
         for i in range(0, len(titles), batch_size):
             batch_titles = titles[i:i+batch_size]
             
-            api_url = "https://en.wikipedia.org/w/api.php"
+            api_url = f"{SOURCE_BASE_URLS['wikipedia']}/w/api.php"
             params = {
                 'action': 'query',
                 'format': 'json',
@@ -112,6 +156,7 @@ def scrape_wikipedia_books():
                         # Limit description length
                         books.append((title, extract[:500]))
         
+        books = dedup.filter_new(books, 'wiki_books')
         print(f"✓ Got {len(books)} descriptions")
         elapsed_time = time.time() - start_time
         print(f"✓ Total: {len(books)} books from Wikipedia (optimized: 2 requests vs 51 before)")
@@ -122,54 +167,199 @@ def scrape_wikipedia_books():
         print(f"\n✗ Error scraping Wikipedia: {e}")
         return []
 
-def scrape_arxiv_papers(target_count=4000, max_workers=5):
+API_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+}
+
+# ArXiv categories - diverse fields
+ARXIV_CATEGORIES = [
+    'cs.AI', 'cs.LG', 'cs.CL', 'cs.CV', 'cs.NE', 'cs.RO',  # Computer Science
+    'physics:cond-mat', 'physics:astro-ph', 'physics:hep-th',  # Physics
+    'math.CO', 'math.AG', 'math.NT',  # Mathematics
+    'q-bio.GN', 'q-bio.NC',  # Quantitative Biology
+    'stat.ML', 'econ.EM'  # Statistics & Economics
+]
+ARXIV_PAGE_STARTS = range(0, 500, 100)  # 5 pages of 100 per category
+
+# Expanded list of subjects for more diversity
+GOOGLE_BOOKS_SUBJECTS = [
+    'fiction', 'history', 'science', 'programming', 'art', 'cooking', 'travel',
+    'fantasy', 'mystery', 'philosophy', 'psychology', 'business', 'economics',
+    'medicine', 'biology', 'chemistry', 'physics', 'mathematics', 'engineering',
+    'literature', 'poetry', 'drama', 'music', 'architecture', 'photography',
+    'religion', 'sociology', 'anthropology', 'education', 'law'
+]
+GOOGLE_BOOKS_PAGE_STARTS = range(0, 200, 40)  # 5 pages of 40 per subject
+
+# The fetch_* functions below fetch one unit of work (a page, a super-batch or a
+# single random record) and raise on HTTP errors, so callers can tell a failed
+# request from an empty one. The scrape_* functions loop over them for a fixed
+# target; source_scheduler.SourceScheduler drives them with live reallocation.
+
+def fetch_arxiv_page(category, start):
+    """Fetch one page (up to 100 papers) of an ArXiv category"""
+    url = f'{SOURCE_BASE_URLS["arxiv"]}/api/query?search_query=cat:{category}&start={start}&max_results=100'
+    response = requests.get(url, timeout=15)
+    response.raise_for_status()
+    
+    # Parse XML response
+    root = ET.fromstring(response.content)
+    ns = {'atom': 'http://www.w3.org/2005/Atom'}
+    entries = root.findall('atom:entry', ns)
+    
+    batch_papers = []
+    for entry in entries:
+        title_elem = entry.find('atom:title', ns)
+        summary_elem = entry.find('atom:summary', ns)
+        
+        if title_elem is not None and summary_elem is not None:
+            title = title_elem.text.replace('\n', ' ').strip()
+            summary = summary_elem.text.replace('\n', ' ').strip()
+            
+            if len(summary) > 100:
+                batch_papers.append((title, summary))
+    
+    return batch_papers
+
+def fetch_wikipedia_super_batch(dedup):
+    """
+    Optimized: Fetch 500 random page IDs, then batch query content.
+    Returns ~400-450 articles per call (vs ~15-18 before).
+    """
+    # Step 1: Get 500 random page IDs
+    url = f"{SOURCE_BASE_URLS['wikipedia']}/w/api.php"
+    params = {
+        'action': 'query',
+        'format': 'json',
+        'list': 'random',
+        'rnnamespace': 0,
+        'rnlimit': 500  # Max 500 random pages
+    }
+    
+    response = requests.get(url, params=params, headers=API_HEADERS, timeout=15)
+    response.raise_for_status()
+    
+    data = response.json()
+    random_pages = data.get('query', {}).get('random', [])
+    # list=random already returns titles: don't fetch content for known ones
+    page_ids = [str(page['id']) for page in random_pages if not dedup.seen(page['title'])]
+    
+    # Step 2: Batch fetch content (50 pages per request, max limit)
+    batch_articles = []
+    for i in range(0, len(page_ids), 50):
+        batch_ids = page_ids[i:i+50]
+        
+        content_params = {
+            'action': 'query',
+            'format': 'json',
+            'pageids': '|'.join(batch_ids),
+            'prop': 'extracts',
+            'exintro': True,
+            'explaintext': True,
+            'exsentences': 5
+        }
+        
+        content_response = requests.get(url, params=content_params, headers=API_HEADERS, timeout=15)
+        if content_response.status_code != 200:
+            continue
+        
+        content_data = content_response.json()
+        pages = content_data.get('query', {}).get('pages', {})
+        
+        for page_id, page_data in pages.items():
+            title = page_data.get('title', '')
+            extract = page_data.get('extract', '')
+            
+            # Relaxed filter: 50 chars (was 100)
+            if (title and extract and
+                len(extract) > 50 and
+                'may refer to' not in extract):
+                batch_articles.append((title, extract))
+    
+    return batch_articles
+
+def fetch_google_books_page(subject, start_index):
+    """Fetch a single page of Google Books results"""
+    url = f"{SOURCE_BASE_URLS['google_books']}/books/v1/volumes?q=subject:{subject}&startIndex={start_index}&maxResults=40&langRestrict=en"
+    response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    
+    data = response.json()
+    items = data.get('items', [])
+    
+    page_books = []
+    for item in items:
+        info = item.get('volumeInfo', {})
+        title = info.get('title')
+        description = info.get('description')
+        
+        if title and description and len(description) > 50:
+            page_books.append((title, description))
+    
+    return page_books
+
+def fetch_quotable_quote():
+    """Fetch one random quote from Quotable.io (empty list if it is too short)"""
+    url = f"{SOURCE_BASE_URLS['quotable']}/random"
+    # Use verify=False to bypass SSL certificate verification
+    response = requests.get(url, headers=API_HEADERS, timeout=10, verify=False)
+    response.raise_for_status()
+    
+    data = response.json()
+    author = data.get('author', 'Unknown')
+    content = data.get('content', '')
+    if content and len(content) > 20:
+        return [(f"Quote by {author}", f'"{content}" - {author}')]
+    return []
+
+def fetch_random_fact():
+    """Fetch one random fact from UselessFacts, titled by its first 8 words"""
+    url = f"{SOURCE_BASE_URLS['facts']}/random.json?language=en"
+    response = requests.get(url, headers=API_HEADERS, timeout=10)
+    response.raise_for_status()
+    
+    fact = response.json().get('text', '')
+    if fact and len(fact) > 20:
+        # Generate title from first few words
+        title_words = fact.split()[:8]
+        title = ' '.join(title_words)
+        if len(fact.split()) > 8:
+            title += '...'
+        return [(title, fact)]
+    return []
+
+def fetch_zenquote():
+    """Fetch one random quote from ZenQuotes"""
+    url = f"{SOURCE_BASE_URLS['zenquotes']}/api/random"
+    response = requests.get(url, headers=API_HEADERS, timeout=10)
+    response.raise_for_status()
+    
+    data = response.json()
+    if data and len(data) > 0:
+        quote = data[0]
+        author = quote.get('a', 'Unknown')
+        content = quote.get('q', '')
+        if content and len(content) > 20:
+            return [(f"Quote by {author}", f'"{content}" - {author}')]
+    return []
+
+def scrape_arxiv_papers(target_count=4000, max_workers=5, dedup=None):
     """
     Scrape academic papers from ArXiv API with parallel processing.
     Returns papers with title and abstract (description).
     """
     start_time = time.time()
     print(f"\nScraping ArXiv papers (Target: {target_count}, Parallel workers: {max_workers})...")
+    if dedup is None:
+        dedup = DedupIndex()
     papers = []
-    seen_titles = set()
     lock = threading.Lock()  # Thread-safe operations
-    
-    # ArXiv categories - diverse fields
-    categories = [
-        'cs.AI', 'cs.LG', 'cs.CL', 'cs.CV', 'cs.NE', 'cs.RO',  # Computer Science
-        'physics:cond-mat', 'physics:astro-ph', 'physics:hep-th',  # Physics
-        'math.CO', 'math.AG', 'math.NT',  # Mathematics
-        'q-bio.GN', 'q-bio.NC',  # Quantitative Biology
-        'stat.ML', 'econ.EM'  # Statistics & Economics
-    ]
+    categories = ARXIV_CATEGORIES
     
     def fetch_arxiv_batch(category, start, batch_num):
         """Fetch a single batch from ArXiv"""
         try:
-            url = f'http://export.arxiv.org/api/query?search_query=cat:{category}&start={start}&max_results=100'
-            response = requests.get(url, timeout=15)
-            
-            if response.status_code != 200:
-                return []
-            
-            # Parse XML response
-            root = ET.fromstring(response.content)
-            ns = {'atom': 'http://www.w3.org/2005/Atom'}
-            entries = root.findall('atom:entry', ns)
-            
-            batch_papers = []
-            for entry in entries:
-                title_elem = entry.find('atom:title', ns)
-                summary_elem = entry.find('atom:summary', ns)
-                
-                if title_elem is not None and summary_elem is not None:
-                    title = title_elem.text.replace('\n', ' ').strip()
-                    summary = summary_elem.text.replace('\n', ' ').strip()
-                    
-                    if len(summary) > 100:
-                        batch_papers.append((title, summary))
-            
-            return batch_papers
-            
+            return fetch_arxiv_page(category, start)
         except Exception as e:
             print(f"\n    ✗ Error in batch {batch_num}: {e}")
             return []
@@ -187,7 +377,7 @@ def scrape_arxiv_papers(target_count=4000, max_workers=5):
         # Create tasks for parallel execution
         tasks = []
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            for batch_num, start in enumerate(range(0, 500, 100), 1):
+            for batch_num, start in enumerate(ARXIV_PAGE_STARTS, 1):
                 if len(papers) >= target_count:
                     break
                 future = executor.submit(fetch_arxiv_batch, category, start, batch_num)
@@ -195,30 +385,31 @@ def scrape_arxiv_papers(target_count=4000, max_workers=5):
             
             # Collect results as they complete
             for future in as_completed(tasks):
+                if future.cancelled():
+                    continue
                 batch_papers = future.result()
                 
                 with lock:
-                    for title, summary in batch_papers:
-                        title_lower = title.lower()
-                        if title_lower not in seen_titles:
-                            seen_titles.add(title_lower)
-                            papers.append((title, summary))
-                            
-                            if len(papers) >= target_count:
-                                break
+                    fresh = dedup.filter_new(batch_papers, 'arxiv', limit=target_count - len(papers))
+                    papers.extend(fresh)
+                    
+                    # Stop paging this category once the target is met or pages are mostly duplicates
+                    if len(papers) >= target_count or len(fresh) < len(batch_papers) * MIN_PAGE_YIELD:
+                        for pending in tasks:
+                            pending.cancel()
         
         category_added = len(papers) - category_start
         print(f"✓ Added {category_added}, Total: {len(papers)}/{target_count}")
         
         # Brief pause between categories
-        time.sleep(0.5)
+        polite_sleep(0.5)
     
     elapsed_time = time.time() - start_time
     print(f"✓ Total ArXiv papers collected: {len(papers)}")
     print(f"⏱️  Time taken: {elapsed_time:.2f} seconds")
     return papers
 
-def scrape_wikipedia_bulk(target_count=4000, max_workers=30):
+def scrape_wikipedia_bulk(target_count=4000, max_workers=30, dedup=None):
     """
     Scrape random Wikipedia articles using optimized batch API.
     Uses list=random (500 IDs) + batch content fetch (50 per request).
@@ -226,75 +417,14 @@ def scrape_wikipedia_bulk(target_count=4000, max_workers=30):
     """
     start_time = time.time()
     print(f"\nScraping Wikipedia articles (Target: {target_count}, Parallel workers: {max_workers})...")
+    if dedup is None:
+        dedup = DedupIndex()
     articles = []
-    seen_titles = set()
     lock = threading.Lock()
     
     def fetch_wikipedia_batch_optimized():
-        """
-        Optimized: Fetch 500 random page IDs, then batch query content.
-        Returns ~400-450 articles per call (vs ~15-18 before).
-        """
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-            }
-            
-            # Step 1: Get 500 random page IDs
-            url = "https://en.wikipedia.org/w/api.php"
-            params = {
-                'action': 'query',
-                'format': 'json',
-                'list': 'random',
-                'rnnamespace': 0,
-                'rnlimit': 500  # Max 500 random pages
-            }
-            
-            response = requests.get(url, params=params, headers=headers, timeout=15)
-            if response.status_code != 200:
-                return []
-            
-            data = response.json()
-            random_pages = data.get('query', {}).get('random', [])
-            page_ids = [str(page['id']) for page in random_pages]
-            
-            if not page_ids:
-                return []
-            
-            # Step 2: Batch fetch content (50 pages per request, max limit)
-            batch_articles = []
-            for i in range(0, len(page_ids), 50):
-                batch_ids = page_ids[i:i+50]
-                
-                content_params = {
-                    'action': 'query',
-                    'format': 'json',
-                    'pageids': '|'.join(batch_ids),
-                    'prop': 'extracts',
-                    'exintro': True,
-                    'explaintext': True,
-                    'exsentences': 5
-                }
-                
-                content_response = requests.get(url, params=content_params, headers=headers, timeout=15)
-                if content_response.status_code != 200:
-                    continue
-                
-                content_data = content_response.json()
-                pages = content_data.get('query', {}).get('pages', {})
-                
-                for page_id, page_data in pages.items():
-                    title = page_data.get('title', '')
-                    extract = page_data.get('extract', '')
-                    
-                    # Relaxed filter: 50 chars (was 100)
-                    if (title and extract and 
-                        len(extract) > 50 and
-                        'may refer to' not in extract):
-                        batch_articles.append((title, extract))
-            
-            return batch_articles
-            
+            return fetch_wikipedia_super_batch(dedup)
         except Exception as e:
             return []
     
@@ -311,24 +441,22 @@ def scrape_wikipedia_bulk(target_count=4000, max_workers=30):
         # Collect results as they complete
         completed = 0
         for future in as_completed(futures):
+            if future.cancelled():
+                continue
             batch_articles = future.result()
             completed += 1
             
             with lock:
-                for title, extract in batch_articles:
-                    title_lower = title.lower()
-                    if title_lower not in seen_titles:
-                        seen_titles.add(title_lower)
-                        articles.append((title, extract))
-                        
-                        if len(articles) >= target_count:
-                            break
+                articles.extend(dedup.filter_new(batch_articles, 'wikipedia', limit=target_count - len(articles)))
                 
                 # Show progress
                 progress_pct = (len(articles) / target_count) * 100
                 print(f"  📊 Super-batch {completed}/{batches_needed} complete, Articles: {len(articles)}/{target_count} ({progress_pct:.1f}%)")
                 
                 if len(articles) >= target_count:
+                    # Drop the super-batches still queued instead of fetching them for nothing
+                    for pending in futures:
+                        pending.cancel()
                     break
     
     elapsed_time = time.time() - start_time
@@ -336,49 +464,22 @@ def scrape_wikipedia_bulk(target_count=4000, max_workers=30):
     print(f"⏱️  Time taken: {elapsed_time:.2f} seconds")
     return articles[:target_count]  # Ensure we don't exceed target
 
-def scrape_google_books_free(target_count=2000, max_workers=5):
+def scrape_google_books_free(target_count=2000, max_workers=5, dedup=None):
     """
     Use Google Books public API to scrape book descriptions with parallel processing.
     Free and no API key required.
     """
     start_time = time.time()
     print(f"\nScraping Google Books (Target: {target_count}, Parallel workers: {max_workers})...")
+    if dedup is None:
+        dedup = DedupIndex()
     books = []
-    seen_titles = set()
     lock = threading.Lock()
+    subjects = GOOGLE_BOOKS_SUBJECTS
     
-    # Expanded list of subjects for more diversity
-    subjects = [
-        'fiction', 'history', 'science', 'programming', 'art', 'cooking', 'travel', 
-        'fantasy', 'mystery', 'philosophy', 'psychology', 'business', 'economics',
-        'medicine', 'biology', 'chemistry', 'physics', 'mathematics', 'engineering',
-        'literature', 'poetry', 'drama', 'music', 'architecture', 'photography',
-        'religion', 'sociology', 'anthropology', 'education', 'law'
-    ]
-    
-    def fetch_google_books_page(subject, start_index):
-        """Fetch a single page of Google Books results"""
+    def fetch_page(subject, start_index):
         try:
-            url = f"https://www.googleapis.com/books/v1/volumes?q=subject:{subject}&startIndex={start_index}&maxResults=40&langRestrict=en"
-            response = requests.get(url, timeout=10)
-            
-            if response.status_code != 200:
-                return []
-            
-            data = response.json()
-            items = data.get('items', [])
-            
-            page_books = []
-            for item in items:
-                info = item.get('volumeInfo', {})
-                title = info.get('title')
-                description = info.get('description')
-                
-                if title and description and len(description) > 50:
-                    page_books.append((title, description))
-            
-            return page_books
-            
+            return fetch_google_books_page(subject, start_index)
         except Exception as e:
             return []
     
@@ -394,212 +495,173 @@ def scrape_google_books_free(target_count=2000, max_workers=5):
         # Create tasks for parallel execution (fetch multiple pages at once)
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             futures = []
-            for start_index in range(0, 200, 40):  # 5 pages per subject
+            for start_index in GOOGLE_BOOKS_PAGE_STARTS:
                 if len(books) >= target_count:
                     break
-                future = executor.submit(fetch_google_books_page, subject, start_index)
+                future = executor.submit(fetch_page, subject, start_index)
                 futures.append(future)
             
             # Collect results
             for future in as_completed(futures):
+                if future.cancelled():
+                    continue
                 page_books = future.result()
                 
                 with lock:
-                    for title, description in page_books:
-                        title_lower = title.lower()
-                        if title_lower not in seen_titles:
-                            seen_titles.add(title_lower)
-                            books.append((title, description))
-                            
-                            if len(books) >= target_count:
-                                break
+                    fresh = dedup.filter_new(page_books, 'google_books', limit=target_count - len(books))
+                    books.extend(fresh)
+                    
+                    # Stop paging this subject once the target is met or pages are mostly duplicates
+                    if len(books) >= target_count or len(fresh) < len(page_books) * MIN_PAGE_YIELD:
+                        for pending in futures:
+                            pending.cancel()
         
         subject_added = len(books) - subject_start
         print(f"✓ +{subject_added} (Total: {len(books)}/{target_count})")
         
         # Brief pause between subjects to avoid rate limiting
-        time.sleep(0.3)
+        polite_sleep(0.3)
     
     elapsed_time = time.time() - start_time
     print(f"✓ Total Google Books collected: {len(books)}")
     print(f"⏱️  Time taken: {elapsed_time:.2f} seconds")
     return books
 
-def scrape_quotable_quotes(target_count=1500):
+def scrape_random_records(fetch, source, target_count, pause, progress_every, dedup=None):
     """
-    Scrape inspirational quotes from Quotable.io API.
-    Free API, no key required (SSL certificate bypass needed).
+    Call a single-record endpoint until target_count globally unique records are collected.
+    Gives up after target_count * 2 attempts or MAX_DUPLICATE_STREAK duplicates in a row.
+    pause(request_count) returns the seconds to wait after each request.
     """
-    start_time = time.time()
-    print(f"\nScraping quotes from Quotable.io (Target: {target_count})...")
-    quotes = []
-    seen_quotes = set()
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-    }
+    if dedup is None:
+        dedup = DedupIndex()
+    records = []
+    duplicate_streak = 0
     
     attempts = 0
     max_attempts = target_count * 2  # Allow retries
     
-    while len(quotes) < target_count and attempts < max_attempts:
+    while len(records) < target_count and attempts < max_attempts:
         attempts += 1
         
         try:
-            url = "https://api.quotable.io/random"
-            # Use verify=False to bypass SSL certificate verification
-            response = requests.get(url, headers=headers, timeout=10, verify=False)
-            
-            if response.status_code == 200:
-                data = response.json()
-                author = data.get('author', 'Unknown')
-                content = data.get('content', '')
-                
-                # Check for duplicates and minimum length
-                if content and content not in seen_quotes and len(content) > 20:
-                    seen_quotes.add(content)
-                    title = f"Quote by {author}"
-                    description = f'"{content}" - {author}'
-                    quotes.append((title, description))
-                    
-                    if len(quotes) % 100 == 0:
-                        print(f"  Progress: {len(quotes)}/{target_count}")
-            
-            # Rate limiting
-            time.sleep(0.2)
-            
+            fetched = fetch()
         except Exception as e:
             # Silent fail, continue to next
-            continue
+            fetched = []
+        
+        for title, description in fetched:
+            if not description:
+                # Never stored, so don't claim the title in the dedup index
+                continue
+            if dedup.add(title, source):
+                duplicate_streak = 0
+                records.append((title, description))
+                
+                if len(records) % progress_every == 0:
+                    print(f"  Progress: {len(records)}/{target_count}")
+            else:
+                duplicate_streak += 1
+        
+        if duplicate_streak >= MAX_DUPLICATE_STREAK:
+            print(f"  ⚠️  {MAX_DUPLICATE_STREAK} duplicates in a row, source exhausted")
+            break
+        
+        # Rate limiting
+        polite_sleep(pause(attempts))
+    
+    return records
+
+def scrape_quotable_quotes(target_count=1500, dedup=None):
+    """
+    Scrape inspirational quotes from Quotable.io API.
+    Free API, no key required (SSL certificate bypass needed).
+    """
+    start_time = time.time()
+    print(f"\nScraping quotes from Quotable.io (Target: {target_count})...")
+    quotes = scrape_random_records(fetch_quotable_quote, 'quotable', target_count,
+                                   pause=lambda n: 0.2, progress_every=100, dedup=dedup)
     
     elapsed_time = time.time() - start_time
     print(f"✓ Total quotes collected: {len(quotes)}")
     print(f"⏱️  Time taken: {elapsed_time:.2f} seconds")
     return quotes
 
-def scrape_random_facts(target_count=1000):
+def scrape_random_facts(target_count=1000, dedup=None):
     """
     Scrape random interesting facts from UselessFacts API.
     Free API, no key required.
     """
     start_time = time.time()
     print(f"\nScraping random facts from UselessFacts (Target: {target_count})...")
-    facts = []
-    seen_facts = set()
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-    }
-    
-    attempts = 0
-    max_attempts = target_count * 2
-    
-    while len(facts) < target_count and attempts < max_attempts:
-        attempts += 1
-        
-        try:
-            url = "https://uselessfacts.jsph.pl/random.json?language=en"
-            response = requests.get(url, headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                fact = data.get('text', '')
-                
-                # Check for duplicates and minimum length
-                if fact and fact not in seen_facts and len(fact) > 20:
-                    seen_facts.add(fact)
-                    
-                    # Generate title from first few words
-                    title_words = fact.split()[:8]
-                    title = ' '.join(title_words)
-                    if len(fact.split()) > 8:
-                        title += '...'
-                    
-                    facts.append((title, fact))
-                    
-                    if len(facts) % 100 == 0:
-                        print(f"  Progress: {len(facts)}/{target_count}")
-            
-            # Rate limiting
-            time.sleep(0.2)
-            
-        except Exception as e:
-            continue
+    facts = scrape_random_records(fetch_random_fact, 'facts', target_count,
+                                  pause=lambda n: 0.2, progress_every=100, dedup=dedup)
     
     elapsed_time = time.time() - start_time
     print(f"✓ Total facts collected: {len(facts)}")
     print(f"⏱️  Time taken: {elapsed_time:.2f} seconds")
     return facts
 
-def scrape_zenquotes(target_count=500):
+def scrape_zenquotes(target_count=500, dedup=None):
     """
     Scrape quotes from ZenQuotes API (alternative quote source).
     Free API, no key required, but has strict rate limit (5 requests per 30 seconds).
     """
     start_time = time.time()
     print(f"\nScraping quotes from ZenQuotes (Target: {target_count})...")
-    quotes = []
-    seen_quotes = set()
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-    }
-    
-    attempts = 0
-    max_attempts = target_count * 2
-    request_count = 0
-    
-    while len(quotes) < target_count and attempts < max_attempts:
-        attempts += 1
-        
-        try:
-            url = "https://zenquotes.io/api/random"
-            response = requests.get(url, headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data and len(data) > 0:
-                    quote = data[0]
-                    author = quote.get('a', 'Unknown')
-                    content = quote.get('q', '')
-                    
-                    # Check for duplicates and minimum length
-                    if content and content not in seen_quotes and len(content) > 20:
-                        seen_quotes.add(content)
-                        title = f"Quote by {author}"
-                        description = f'"{content}" - {author}'
-                        quotes.append((title, description))
-                        
-                        if len(quotes) % 50 == 0:
-                            print(f"  Progress: {len(quotes)}/{target_count}")
-            
-            # ZenQuotes rate limit: 5 requests per 30 seconds
-            request_count += 1
-            if request_count % 5 == 0:
-                time.sleep(6)  # Wait 6 seconds every 5 requests
-            else:
-                time.sleep(0.5)
-            
-        except Exception as e:
-            continue
+    # ZenQuotes rate limit: 5 requests per 30 seconds -> wait 6 seconds every 5 requests
+    quotes = scrape_random_records(fetch_zenquote, 'zenquotes', target_count,
+                                   pause=lambda n: 6 if n % 5 == 0 else 0.5, progress_every=50, dedup=dedup)
     
     elapsed_time = time.time() - start_time
     print(f"✓ Total ZenQuotes collected: {len(quotes)}")
     print(f"⏱️  Time taken: {elapsed_time:.2f} seconds")
     return quotes
 
-def scrape_openlibrary_books():
+def paged_units(fetch, keys, starts, low_yield_keys):
+    """Yield (key, unit) for every page of every key, skipping the rest of a key once it turns low-yield"""
+    for key in keys:
+        for start in starts:
+            if key in low_yield_keys:
+                break
+            yield key, partial(fetch, key, start)
+
+def build_source_feeds(config, dedup):
+    """One SourceFeed per source with a non-zero target, for the dynamic scheduler"""
+    scale = REQUEST_DELAY_SCALE
+    arxiv_low_yield = set()
+    books_low_yield = set()
+    feeds = [
+        SourceFeed('arxiv', config['arxiv'],
+                   paged_units(fetch_arxiv_page, ARXIV_CATEGORIES, ARXIV_PAGE_STARTS, arxiv_low_yield),
+                   max_concurrency=5, low_yield_keys=arxiv_low_yield),
+        SourceFeed('wikipedia', config['wikipedia'],
+                   itertools.repeat((None, partial(fetch_wikipedia_super_batch, dedup))),
+                   max_concurrency=30),
+        SourceFeed('google_books', config['books'],
+                   paged_units(fetch_google_books_page, GOOGLE_BOOKS_SUBJECTS, GOOGLE_BOOKS_PAGE_STARTS, books_low_yield),
+                   max_concurrency=5, low_yield_keys=books_low_yield),
+        SourceFeed('quotable', config['quotable'], itertools.repeat((None, fetch_quotable_quote)),
+                   max_concurrency=4, min_interval=0.2 * scale),
+        SourceFeed('facts', config['facts'], itertools.repeat((None, fetch_random_fact)),
+                   max_concurrency=4, min_interval=0.2 * scale),
+        # ZenQuotes rate limit: 5 requests per 30 seconds
+        SourceFeed('zenquotes', config['zenquotes'], itertools.repeat((None, fetch_zenquote)),
+                   max_concurrency=1, min_interval=6 * scale),
+    ]
+    return [feed for feed in feeds if feed.target > 0]
+
+def scrape_openlibrary_books(dedup=None):
     """Scrape books from OpenLibrary API with multiple strategies to get 10,000+ books"""
     print("\nScraping OpenLibrary books (targeting 10,000+ books)...")
     
+    if dedup is None:
+        dedup = DedupIndex()
     books = []
-    seen_titles = set()  # Track titles to avoid duplicates during scraping
     
     def add_book(title, description):
         """Helper to add unique books"""
-        title_lower = title.lower().strip()
-        if title_lower and len(title) >= 2 and title_lower not in seen_titles:
-            seen_titles.add(title_lower)
+        if len(title.strip()) >= 2 and description and dedup.add(title, 'openlibrary'):
             books.append((title, description))
             if len(books) % 100 == 0:  # Progress update every 100 books
                 print(f"  Progress: {len(books)} books collected...")
@@ -635,7 +697,7 @@ def scrape_openlibrary_books():
                 break
                 
             try:
-                url = f"https://openlibrary.org/search.json?q={subject}&limit=100&offset={offset}"
+                url = f"{SOURCE_BASE_URLS['openlibrary']}/search.json?q={subject}&limit=100&offset={offset}"
                 response = requests.get(url, timeout=10)
                 response.raise_for_status()
                 data = response.json()
@@ -662,7 +724,7 @@ def scrape_openlibrary_books():
                     if len(books) >= 10000:
                         break
                 
-                time.sleep(0.3)  # Be polite to API
+                polite_sleep(0.3)  # Be polite to API
                 
             except Exception as e:
                 print(f"  Error on {subject} (offset {offset}): {e}")
@@ -688,7 +750,7 @@ def scrape_openlibrary_books():
                 break
                 
             try:
-                url = f"https://openlibrary.org/search.json?author={author}&limit=100"
+                url = f"{SOURCE_BASE_URLS['openlibrary']}/search.json?author={author}&limit=100"
                 response = requests.get(url, timeout=10)
                 response.raise_for_status()
                 data = response.json()
@@ -707,7 +769,7 @@ def scrape_openlibrary_books():
                     if len(books) >= 10000:
                         break
                 
-                time.sleep(0.3)
+                polite_sleep(0.3)
                 
             except Exception as e:
                 print(f"  Error for author {author}: {e}")
@@ -725,7 +787,7 @@ def scrape_openlibrary_books():
                 break
                 
             try:
-                url = f"https://openlibrary.org/search.json?q=*&publish_year={decade}&limit=100"
+                url = f"{SOURCE_BASE_URLS['openlibrary']}/search.json?q=*&publish_year={decade}&limit=100"
                 response = requests.get(url, timeout=10)
                 response.raise_for_status()
                 data = response.json()
@@ -747,7 +809,7 @@ def scrape_openlibrary_books():
                     if len(books) >= 10000:
                         break
                 
-                time.sleep(0.3)
+                polite_sleep(0.3)
                 
             except Exception as e:
                 print(f"  Error for decade {decade}: {e}")
@@ -759,26 +821,22 @@ def scrape_openlibrary_books():
 def create_database_if_not_exists():
     """Create the database and table if they don't exist"""
     print("Checking database...")
-    sys_params = DB_PARAMS.copy()
-    sys_params['database'] = 'postgres'
-    
     try:
         # Connect to default postgres database
-        conn = psycopg2.connect(**sys_params)
-        conn.autocommit = True
+        conn = connect(autocommit=True, database='postgres')
         cur = conn.cursor()
         
         # Check if testdb exists
-        cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (DB_PARAMS['database'],))
+        cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (DB_CONFIG['database'],))
         if not cur.fetchone():
-            print(f"Creating database {DB_PARAMS['database']}...")
-            cur.execute(f"CREATE DATABASE {DB_PARAMS['database']}")
+            print(f"Creating database {DB_CONFIG['database']}...")
+            cur.execute(f"CREATE DATABASE {DB_CONFIG['database']}")
         
         cur.close()
         conn.close()
         
         # Now connect to testdb and create schema
-        conn = psycopg2.connect(**DB_PARAMS)
+        conn = connect()
         cur = conn.cursor()
         
         # Read init.sql
@@ -815,7 +873,7 @@ def insert_books_to_db(books):
     
     try:
         print("→ Connecting to PostgreSQL...", end=' ', flush=True)
-        conn = psycopg2.connect(**DB_PARAMS)
+        conn = connect()
         cur = conn.cursor()
         print("✓")
         
@@ -825,18 +883,25 @@ def insert_books_to_db(books):
         print("✓")
         
         print(f"→ Inserting {len(books)} records...")
-        batch_size = 100
-        for i in range(0, len(books), batch_size):
-            batch = books[i:i+batch_size]
-            for title, description in batch:
-                cur.execute(
-                    "INSERT INTO worlds (title, description) VALUES (%s, %s)",
-                    (title, description)
-                )
-            conn.commit()
-            progress = min(i + batch_size, len(books))
-            progress_pct = (progress / len(books)) * 100
-            print(f"  Progress: {progress}/{len(books)} ({progress_pct:.1f}%)")
+        # Chunks are inserted concurrently over pooled connections; each chunk
+        # goes out as multi-row INSERTs of 1000 rows instead of one round trip per row
+        chunk_size = 5000
+        chunks = [books[i:i+chunk_size] for i in range(0, len(books), chunk_size)]
+        
+        def insert_chunk(chunk):
+            with pooled_connection() as pool_conn:
+                pool_cur = pool_conn.cursor()
+                insert_values(pool_cur, "INSERT INTO worlds (title, description) VALUES %s", chunk)
+                pool_cur.close()
+            return len(chunk)
+        
+        progress = 0
+        with ThreadPoolExecutor(max_workers=max(1, min(POOL_MAX, len(chunks)))) as executor:
+            for future in as_completed([executor.submit(insert_chunk, chunk) for chunk in chunks]):
+                progress += future.result()
+                progress_pct = (progress / len(books)) * 100
+                print(f"  Progress: {progress}/{len(books)} ({progress_pct:.1f}%)")
+        close_pool()
         
         # Get count
         cur.execute("SELECT COUNT(*) FROM worlds")
@@ -844,21 +909,22 @@ def insert_books_to_db(books):
         print(f"✓ Successfully inserted {count} records")
         
         # Create trigram indexes
-        print("\n→ Creating trigram indexes (this may take a moment)...")
-        print("  Dropping old indexes...", end=' ', flush=True)
-        cur.execute("DROP INDEX IF EXISTS idx_title_trgm")
-        cur.execute("DROP INDEX IF EXISTS idx_desc_trgm")
-        print("✓")
-        
-        print("  Creating title index...", end=' ', flush=True)
-        cur.execute("CREATE INDEX idx_title_trgm ON worlds USING gin (title gin_trgm_ops)")
-        print("✓")
-        
-        print("  Creating description index...", end=' ', flush=True)
-        cur.execute("CREATE INDEX idx_desc_trgm ON worlds USING gin (description gin_trgm_ops)")
-        print("✓")
-        
-        conn.commit()
+        with profile_stage('build_indexes'):
+            print("\n→ Creating trigram indexes (this may take a moment)...")
+            print("  Dropping old indexes...", end=' ', flush=True)
+            cur.execute("DROP INDEX IF EXISTS idx_title_trgm")
+            cur.execute("DROP INDEX IF EXISTS idx_desc_trgm")
+            print("✓")
+            
+            print("  Creating title index...", end=' ', flush=True)
+            cur.execute("CREATE INDEX idx_title_trgm ON worlds USING gin (title gin_trgm_ops)")
+            print("✓")
+            
+            print("  Creating description index...", end=' ', flush=True)
+            cur.execute("CREATE INDEX idx_desc_trgm ON worlds USING gin (description gin_trgm_ops)")
+            print("✓")
+            
+            conn.commit()
         print("\n✓ Indexes created successfully")
         
         cur.close()
@@ -874,6 +940,30 @@ def insert_books_to_db(books):
             conn.rollback()
             conn.close()
 
+def build_cjk_bigram_index():
+    """Add the generated CJK bigram column and its GIN index (see cjk_bigrams() in init.sql)"""
+    print("\n→ Building CJK bigram column and index...", end=' ', flush=True)
+    try:
+        conn = connect(autocommit=True)
+        cur = conn.cursor()
+        column_ms, index_ms = add_cjk_bigram_column(cur)
+        cur.execute("ANALYZE worlds")
+        cur.execute("SELECT COUNT(*) FROM worlds WHERE title_cjk_bigrams IS NOT NULL")
+        cjk_count = cur.fetchone()[0]
+        cur.close()
+        conn.close()
+        print(f"✓ ({cjk_count} titles with CJK text, column {column_ms:.0f}ms, index {index_ms:.0f}ms)")
+    except Exception as e:
+        print(f"\n✗ CJK bigram index error: {e}")
+
+def refresh_hot_results(queries_file):
+    """Recompute search_hot_results for the new data (see scripts/hot_results.py)"""
+    print("\n→ Refreshing hot-query results...")
+    try:
+        refresh_from_file(queries_file, top=100)
+    except Exception as e:
+        print(f"✗ Hot-query refresh error: {e}")
+
 def parse_arguments():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(
@@ -908,8 +998,30 @@ Examples:
   # 快速測試 (100 筆，自動分配)
   python seed.py --total 100
   
+  # 依 --total 抓取時預設為動態排程：慢、被限流或耗盡的來源把剩餘目標讓給產出快的來源
+  python seed.py --total 20000 --max-workers 60
+  
+  # 維持固定比例（每個來源一條執行緒，各自抓到目標為止）
+  python seed.py --total 1000 --schedule static
+  
   # 跳過 Wikipedia 暢銷書
   python seed.py --skip-wiki-bestsellers
+  
+  # 離線基準測試：所有來源改連本機模擬伺服器 (scripts/mock_upstream.py)
+  python seed.py --mock-upstream http://127.0.0.1:8765 --wikipedia 100000
+  
+  # 分階段剖析 (HTTP 等待、解析、去重、寫入、建索引各花多少時間與記憶體)
+  python seed.py --total 1000 --profile
+  
+  # 抓取後另存語料快照，之後可在數秒內切換回這份資料 (scripts/corpus_snapshot.py)
+  python seed.py --total 100000 --export-snapshot snapshots/mixed_100k.snap
+  python seed.py --load-snapshot snapshots/mixed_100k.snap
+  
+  # 另建中日韓二字詞欄位與索引 (中文查詢改走 bigram 路徑，比較見 scripts/cjk_bigram_bench.py)
+  python seed.py --load-snapshot snapshots/mixed_100k.snap --cjk-bigrams
+  
+  # 灌完資料後重算熱門查詢的結果表 (舊結果在資料異動時已自動失效)
+  python seed.py --total 10000 --hot-queries test-results/query_log_20250115_102300.jsonl
         '''
     )
     
@@ -968,11 +1080,71 @@ Examples:
         help='停用並行模式，依序抓取各來源（較慢但更穩定）'
     )
     
+    parser.add_argument(
+        '--schedule',
+        choices=['dynamic', 'static'],
+        help='並行模式的排程方式 (預設: 使用 --total 時為 dynamic，指定各來源數量時為 static)。'
+             'dynamic 依各來源即時產出重新分配目標與 workers'
+    )
+    
+    parser.add_argument(
+        '--max-workers',
+        type=int,
+        default=40,
+        help='動態排程共用的 worker 數量上限 (預設: 40)'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const='',
+        metavar='DIR',
+        help='分階段剖析: 各階段的 cProfile (.pstats)、collapsed stack (火焰圖輸入) 與 tracemalloc 記憶體峰值 '
+             '(預設輸出到 test-results/seed_profile_<timestamp>/)'
+    )
+    
+    parser.add_argument(
+        '--export-snapshot',
+        metavar='PATH',
+        help='去重後的語料另存為快照 (區塊壓縮的 binary COPY 格式，見 scripts/corpus_snapshot.py)'
+    )
+    
+    parser.add_argument(
+        '--load-snapshot',
+        metavar='PATH',
+        help='不抓取任何來源，直接以 COPY 載入快照並重建索引'
+    )
+    
+    parser.add_argument(
+        '--cjk-bigrams',
+        action='store_true',
+        help='寫入後新增 title_cjk_bigrams 欄位 (標題正規化後的中日韓二字詞) 與 GIN 索引，讓中文短查詢不必循序掃描'
+    )
+    
+    parser.add_argument(
+        '--hot-queries',
+        metavar='PATH',
+        help='寫入後以查詢記錄或工作負載的前 100 個熱門查詢重建 search_hot_results (scripts/hot_results.py)'
+    )
+    
+    parser.add_argument(
+        '--mock-upstream',
+        metavar='URL',
+        help='所有來源改連到 scripts/mock_upstream.py 模擬伺服器 (例如 http://127.0.0.1:8765)'
+    )
+    
+    parser.add_argument(
+        '--delay-scale',
+        type=float,
+        help='請求間等待時間的倍數 (預設: 1，使用 --mock-upstream 時為 0)'
+    )
+    
     args = parser.parse_args()
     
     # 如果使用者指定了個別來源數量，則使用指定值
-    if (args.arxiv is not None or args.wikipedia is not None or args.books is not None or
-        args.quotable is not None or args.facts is not None or args.zenquotes is not None):
+    explicit_counts = (args.arxiv is not None or args.wikipedia is not None or args.books is not None or
+                       args.quotable is not None or args.facts is not None or args.zenquotes is not None)
+    if explicit_counts:
         arxiv_count = args.arxiv if args.arxiv is not None else 0
         wiki_count = args.wikipedia if args.wikipedia is not None else 0
         books_count = args.books if args.books is not None else 0
@@ -980,14 +1152,14 @@ Examples:
         facts_count = args.facts if args.facts is not None else 0
         zenquotes_count = args.zenquotes if args.zenquotes is not None else 0
     else:
-        # 否則根據 total 自動分配
+        # 否則根據 total 自動分配 (動態排程時只是初始分配)
         # 25% ArXiv, 25% Wikipedia, 20% Books, 15% Quotable, 10% Facts, 5% ZenQuotes
-        arxiv_count = int(args.total * 0.25)
-        wiki_count = int(args.total * 0.25)
-        books_count = int(args.total * 0.20)
-        quotable_count = int(args.total * 0.15)
-        facts_count = int(args.total * 0.10)
-        zenquotes_count = int(args.total * 0.05)
+        arxiv_count = int(args.total * SOURCE_SHARES['arxiv'])
+        wiki_count = int(args.total * SOURCE_SHARES['wikipedia'])
+        books_count = int(args.total * SOURCE_SHARES['books'])
+        quotable_count = int(args.total * SOURCE_SHARES['quotable'])
+        facts_count = int(args.total * SOURCE_SHARES['facts'])
+        zenquotes_count = int(args.total * SOURCE_SHARES['zenquotes'])
     
     return {
         'arxiv': arxiv_count,
@@ -998,16 +1170,50 @@ Examples:
         'zenquotes': zenquotes_count,
         'skip_bestsellers': args.skip_wiki_bestsellers,
         'parallel': not args.no_parallel,
+        'schedule': args.schedule or ('static' if explicit_counts else 'dynamic'),
+        'max_workers': args.max_workers,
+        'profile': args.profile,
+        'export_snapshot': args.export_snapshot,
+        'load_snapshot': args.load_snapshot,
+        'cjk_bigrams': args.cjk_bigrams,
+        'hot_queries': args.hot_queries,
+        'mock_upstream': args.mock_upstream,
+        'delay_scale': args.delay_scale,
         'total_target': args.total
     }
 
-def main():
-    # Parse command line arguments
-    config = parse_arguments()
+def run_seed(config):
+    global REQUEST_DELAY_SCALE
+    if config['mock_upstream']:
+        mock_url = config['mock_upstream'].rstrip('/')
+        for source in SOURCE_BASE_URLS:
+            SOURCE_BASE_URLS[source] = f"{mock_url}/{source}"
+        REQUEST_DELAY_SCALE = 0.0
+    if config['delay_scale'] is not None:
+        REQUEST_DELAY_SCALE = config['delay_scale']
     
     # Record total start time
     total_start_time = time.time()
     
+    if config['load_snapshot']:
+        # Skip scraping: stream a saved corpus snapshot straight into COPY
+        print("=" * 60)
+        print("pg_trgm Fuzzy Search Demo - Load Snapshot")
+        print("=" * 60)
+        print(f"  Snapshot: {config['load_snapshot']}")
+        with profile_stage('create_database_if_not_exists'):
+            create_database_if_not_exists()
+        with profile_stage('load_snapshot'):
+            timings = load_snapshot(config['load_snapshot'])
+        if config['cjk_bigrams']:
+            with profile_stage('build_cjk_bigrams'):
+                build_cjk_bigram_index()
+        if config['hot_queries']:
+            with profile_stage('refresh_hot_results'):
+                refresh_hot_results(config['hot_queries'])
+        print(f"\n✓ Loaded {timings['loaded']} records in {time.time() - total_start_time:.2f} seconds")
+        return
+    
     print("=" * 60)
     print("pg_trgm Fuzzy Search Demo - Data Seeding")
     print("=" * 60)
@@ -1019,15 +1225,24 @@ def main():
     print(f"  Random Facts: {config['facts']}")
     print(f"  ZenQuotes: {config['zenquotes']}")
     print(f"  Wikipedia Bestsellers: {'No' if config['skip_bestsellers'] else 'Yes (~50)'}")
-    print(f"  Execution Mode: {'PARALLEL' if config['parallel'] else 'SEQUENTIAL'}")
+    if config['parallel']:
+        print(f"  Execution Mode: PARALLEL ({config['schedule']} schedule)")
+    else:
+        print(f"  Execution Mode: SEQUENTIAL")
+    if config['mock_upstream']:
+        print(f"  Upstream: MOCK ({config['mock_upstream']}, delay scale {REQUEST_DELAY_SCALE:g})")
     print(f"  Total Target: ~{config['total_target']}")
     print("=" * 60)
     
-    if config['parallel']:
+    if config['parallel'] and config['schedule'] == 'dynamic':
+        print(f"\n🚀 PARALLEL MODE: {config['max_workers']} shared workers, targets follow live yield!\n")
+    elif config['parallel']:
         print("\n🚀 PARALLEL MODE: All sources fetching simultaneously!\n")
     else:
         print("\n⏳ SEQUENTIAL MODE: Fetching sources one by one...\n")
     
+    # Shared by every scraper: only globally unique titles count toward a source's target
+    dedup = DedupIndex(capacity=max(config['total_target'], 10000))
     all_data = []
     arxiv_papers = []
     wiki_articles = []
@@ -1037,7 +1252,38 @@ def main():
     zen_quotes = []
     wiki_books = []
     
-    if config['parallel']:
+    if config['parallel'] and config['schedule'] == 'dynamic':
+        # ========== 動態排程模式 ==========
+        # All sources share one worker pool; every few seconds the remaining target and
+        # concurrency move from slow, rate-limited or exhausted sources to productive ones
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            bestsellers = None if config['skip_bestsellers'] else executor.submit(
+                profiled('scrape_wiki_bestsellers', scrape_wikipedia_books), dedup=dedup)
+            
+            scheduler = SourceScheduler(
+                build_source_feeds(config, dedup), dedup,
+                max_workers=config['max_workers'],
+                min_page_yield=MIN_PAGE_YIELD,
+                max_duplicate_streak=MAX_DUPLICATE_STREAK,
+            )
+            with profile_stage('scrape_scheduler'):
+                results = scheduler.run()
+            scheduler.report()
+            
+            if bestsellers is not None:
+                try:
+                    wiki_books = bestsellers.result()
+                except Exception as e:
+                    print(f"\n✗ Error fetching wiki_books: {e}")
+        
+        arxiv_papers = results.get('arxiv', [])
+        wiki_articles = results.get('wikipedia', [])
+        google_books = results.get('google_books', [])
+        quotable_quotes = results.get('quotable', [])
+        random_facts = results.get('facts', [])
+        zen_quotes = results.get('zenquotes', [])
+    
+    elif config['parallel']:
         # ========== 並行模式 ==========
         # Use ThreadPoolExecutor to fetch from all sources in parallel
         # Increased max_workers to 7 to handle all sources simultaneously
@@ -1046,25 +1292,25 @@ def main():
             
             # Submit tasks for each data source
             if config['arxiv'] > 0:
-                futures['arxiv'] = executor.submit(scrape_arxiv_papers, config['arxiv'])
+                futures['arxiv'] = executor.submit(profiled('scrape_arxiv', scrape_arxiv_papers), config['arxiv'], dedup=dedup)
             
             if config['wikipedia'] > 0:
-                futures['wikipedia'] = executor.submit(scrape_wikipedia_bulk, config['wikipedia'])
+                futures['wikipedia'] = executor.submit(profiled('scrape_wikipedia', scrape_wikipedia_bulk), config['wikipedia'], dedup=dedup)
             
             if config['books'] > 0:
-                futures['google_books'] = executor.submit(scrape_google_books_free, config['books'])
+                futures['google_books'] = executor.submit(profiled('scrape_google_books', scrape_google_books_free), config['books'], dedup=dedup)
             
             if config['quotable'] > 0:
-                futures['quotable'] = executor.submit(scrape_quotable_quotes, config['quotable'])
+                futures['quotable'] = executor.submit(profiled('scrape_quotable', scrape_quotable_quotes), config['quotable'], dedup=dedup)
             
             if config['facts'] > 0:
-                futures['facts'] = executor.submit(scrape_random_facts, config['facts'])
+                futures['facts'] = executor.submit(profiled('scrape_facts', scrape_random_facts), config['facts'], dedup=dedup)
             
             if config['zenquotes'] > 0:
-                futures['zenquotes'] = executor.submit(scrape_zenquotes, config['zenquotes'])
+                futures['zenquotes'] = executor.submit(profiled('scrape_zenquotes', scrape_zenquotes), config['zenquotes'], dedup=dedup)
             
             if not config['skip_bestsellers']:
-                futures['wiki_books'] = executor.submit(scrape_wikipedia_books)
+                futures['wiki_books'] = executor.submit(profiled('scrape_wiki_bestsellers', scrape_wikipedia_books), dedup=dedup)
             
             # Collect results as they complete
             for source, future in futures.items():
@@ -1091,25 +1337,25 @@ def main():
         # ========== 非並行模式（依序執行）==========
         try:
             if config['arxiv'] > 0:
-                arxiv_papers = scrape_arxiv_papers(config['arxiv'])
+                arxiv_papers = profiled('scrape_arxiv', scrape_arxiv_papers)(config['arxiv'], dedup=dedup)
             
             if config['wikipedia'] > 0:
-                wiki_articles = scrape_wikipedia_bulk(config['wikipedia'])
+                wiki_articles = profiled('scrape_wikipedia', scrape_wikipedia_bulk)(config['wikipedia'], dedup=dedup)
             
             if config['books'] > 0:
-                google_books = scrape_google_books_free(config['books'])
+                google_books = profiled('scrape_google_books', scrape_google_books_free)(config['books'], dedup=dedup)
             
             if config['quotable'] > 0:
-                quotable_quotes = scrape_quotable_quotes(config['quotable'])
+                quotable_quotes = profiled('scrape_quotable', scrape_quotable_quotes)(config['quotable'], dedup=dedup)
             
             if config['facts'] > 0:
-                random_facts = scrape_random_facts(config['facts'])
+                random_facts = profiled('scrape_facts', scrape_random_facts)(config['facts'], dedup=dedup)
             
             if config['zenquotes'] > 0:
-                zen_quotes = scrape_zenquotes(config['zenquotes'])
+                zen_quotes = profiled('scrape_zenquotes', scrape_zenquotes)(config['zenquotes'], dedup=dedup)
             
             if not config['skip_bestsellers']:
-                wiki_books = scrape_wikipedia_books()
+                wiki_books = profiled('scrape_wiki_bestsellers', scrape_wikipedia_books)(dedup=dedup)
                 
         except Exception as e:
             print(f"\n✗ Error during sequential fetching: {e}")
@@ -1139,26 +1385,62 @@ def main():
     print(f"  ⏱️  Total data collection time: {data_collection_time:.2f} seconds ({data_collection_time/60:.2f} minutes)")
     print(f"{'='*60}\n")
     
-    # Remove duplicates based on title (case-insensitive)
-    seen = set()
-    unique_books = []
-    for title, desc in all_data:
-        title_lower = title.lower()
-        if title_lower not in seen and desc:  # Ensure description exists
-            seen.add(title_lower)
-            unique_books.append((title, desc))
+    # Titles were already deduplicated across sources while fetching
+    with profile_stage('dedup'):
+        unique_books = [(title, desc) for title, desc in all_data if desc]  # Ensure description exists
+        dedup_stats = dedup.summary()
+    print(f"Dedup index: {dedup_stats['checked']} checked, {dedup_stats['duplicates']} duplicates skipped at fetch time, "
+          f"{dedup_stats['bloom_false_positives']} Bloom false positives, ~{dedup_stats['memory_mb']} MB")
+    for source, counts in dedup_stats['by_source'].items():
+        print(f"  {source}: {counts['unique']} unique, {counts['duplicates']} duplicates")
     
     print(f"Total unique entries after deduplication: {len(unique_books)}")
     
+    if config['export_snapshot']:
+        with profile_stage('export_snapshot'):
+            snapshot = write_snapshot(config['export_snapshot'], unique_books, metadata={
+                'source': 'seed.py',
+                'sources': {source: counts['unique'] for source, counts in dedup_stats['by_source'].items()},
+                'mock_upstream': config['mock_upstream'],
+            })
+        print(f"Snapshot saved: {config['export_snapshot']} ({snapshot['rows']} records, "
+              f"{os.path.getsize(config['export_snapshot']) / 1024 / 1024:.1f} MB)")
+    
     if len(unique_books) < 10:
         print("Warning: Less than 10 entries scraped. Please check your internet connection.")
         return
     
     # Setup database
-    create_database_if_not_exists()
+    with profile_stage('create_database_if_not_exists'):
+        create_database_if_not_exists()
     
     # Insert into database
-    insert_books_to_db(unique_books)
+    with profile_stage('insert_books_to_db'):
+        insert_books_to_db(unique_books)
+    
+    if config['cjk_bigrams']:
+        with profile_stage('build_cjk_bigrams'):
+            build_cjk_bigram_index()
+    
+    if config['hot_queries']:
+        with profile_stage('refresh_hot_results'):
+            refresh_hot_results(config['hot_queries'])
+
+def main():
+    # Parse command line arguments
+    config = parse_arguments()
+    
+    profiler = None
+    if config['profile'] is not None:
+        profile_dir = config['profile'] or os.path.join(
+            'test-results', f"seed_profile_{time.strftime('%Y%m%d_%H%M%S')}")
+        profiler = StageProfiler(profile_dir).start()
+    
+    try:
+        run_seed(config)
+    finally:
+        if profiler is not None:
+            profiler.finish()
 
 if __name__ == "__main__":
     main()
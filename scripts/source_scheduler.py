@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+seed.py 的動態來源排程器: 依即時產出重新分配目標數與並行度
+
+原本各來源的目標是固定比例 (ArXiv 25%、Wikipedia 25%...),每個來源各開一條執行緒,
+慢的來源 (ZenQuotes 每 30 秒 5 次、被限流或大量重複的來源) 決定了整體完成時間,
+快的來源卻早早達標閒置。SourceScheduler 改成:
+
+- 所有來源共用一個 ThreadPoolExecutor (--max-workers),以「工作單位」為排程粒度
+  (ArXiv / Google Books 的一頁、Wikipedia 的一個 super-batch、random API 的一次請求)
+- 每個來源的並行度依「剩餘目標」比例分配,並受 max_concurrency 與最小請求間隔限制
+- 每隔 rebalance_interval 秒以 EWMA 估計各來源的「新的唯一資料筆數/秒」,
+  預估剩餘時間 T = 剩餘總數 / 總速率;剩餘目標超過 rate × T 太多的來源,
+  把多出的目標移給速率較高的來源 (依速率比例)
+- 來源耗盡 (工作單位用完、連續重複過多) 或失效 (連續錯誤過多) 時,剩餘目標全部釋出
+- 收到 HTTP 429 時拉長該來源的請求間隔 (有 Retry-After 時依其等待)
+- 總數達標即結束: 取消尚未開始的工作,不等待進行中的請求
+
+每筆結果都經過共用的 DedupIndex.filter_new(),只有全域唯一的資料計入來源目標。
+"""
+
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+class SourceFeed:
+    """
+    一個資料來源的排程狀態
+
+    units: 產生 (key, callable) 的 iterable,callable() 回傳 [(title, description)],
+           HTTP 錯誤時丟出例外。key 為分頁來源的類別 (例如 ArXiv category),
+           random 類來源為 None
+    low_yield_keys: 與 units 共用的 set;某一頁新資料比例過低時,排程器把 key 加入,
+                    units 應略過該 key 剩下的頁面
+    min_interval: 同一來源兩次請求開始的最小間隔 (秒)
+    """
+
+    def __init__(self, name, target, units, max_concurrency=4, min_interval=0.0, low_yield_keys=None):
+        self.name = name
+        self.planned_target = target
+        self.target = target
+        self.units = iter(units)
+        self.max_concurrency = max_concurrency
+        self.base_interval = min_interval
+        self.min_interval = min_interval
+        self.low_yield_keys = low_yield_keys if low_yield_keys is not None else set()
+
+        self.records = []
+        self.status = 'running'  # running / exhausted / dead
+        self.concurrency = 1
+        self.in_flight = 0
+        self.next_start = 0.0
+        self.units_done = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.consecutive_errors = 0
+        self.duplicate_streak = 0
+        self.rate = None  # EWMA 唯一筆數/秒
+        self.window_start_count = 0
+        self.active_in_window = False
+
+    @property
+    def collected(self):
+        return len(self.records)
+
+    @property
+    def remaining(self):
+        return max(0, self.target - self.collected)
+
+    @property
+    def running(self):
+        return self.status == 'running'
+
+    def wants_work(self):
+        return self.running and self.collected < self.target
+
+def _http_status(exc):
+    response = getattr(exc, 'response', None)
+    return getattr(response, 'status_code', None)
+
+def _retry_after(exc):
+    response = getattr(exc, 'response', None)
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+class SourceScheduler:
+    """依即時產出動態分配目標與並行度,直到總目標達成或所有來源都無法再產出"""
+
+    def __init__(self, feeds, dedup, total_target=None, max_workers=40,
+                 rebalance_interval=2.0, ewma_alpha=0.5, slack=1.2,
+                 min_samples=3, min_page_yield=0.1, max_duplicate_streak=50,
+                 max_consecutive_errors=10, max_backoff=60.0):
+        self.feeds = {feed.name: feed for feed in feeds}
+        self.dedup = dedup
+        self.total_target = total_target if total_target is not None else sum(feed.target for feed in feeds)
+        self.max_workers = max_workers
+        self.rebalance_interval = rebalance_interval
+        self.ewma_alpha = ewma_alpha
+        self.slack = slack
+        self.min_samples = min_samples
+        self.min_page_yield = min_page_yield
+        self.max_duplicate_streak = max_duplicate_streak
+        self.max_consecutive_errors = max_consecutive_errors
+        self.max_backoff = max_backoff
+        self.moves = []  # (秒數, 來源, 目的地, 筆數) 的重新分配紀錄
+
+    @property
+    def collected(self):
+        return sum(feed.collected for feed in self.feeds.values())
+
+    # ------------------------------------------------------------------
+    # 並行度與目標分配
+    # ------------------------------------------------------------------
+
+    def _allocate_concurrency(self):
+        """依剩餘目標比例分配 max_workers,每個仍需資料的來源至少 1 個"""
+        wanting = [feed for feed in self.feeds.values() if feed.wants_work()]
+        total_remaining = sum(feed.remaining for feed in wanting) or 1
+        for feed in wanting:
+            share = self.max_workers * feed.remaining / total_remaining
+            feed.concurrency = max(1, min(feed.max_concurrency, round(share)))
+
+    def _update_rates(self, elapsed):
+        for feed in self.feeds.values():
+            if feed.active_in_window and feed.units_done > 0:
+                instant = (feed.collected - feed.window_start_count) / elapsed
+                if feed.rate is None:
+                    feed.rate = instant
+                else:
+                    feed.rate = self.ewma_alpha * instant + (1 - self.ewma_alpha) * feed.rate
+            feed.window_start_count = feed.collected
+            feed.active_in_window = feed.wants_work() or feed.in_flight > 0
+
+    def _rebalance(self, now):
+        """把慢來源、耗盡或失效來源的剩餘目標移給速率較高的來源"""
+        freed = {}
+        for feed in self.feeds.values():
+            if not feed.running and feed.remaining > 0:
+                freed[feed.name] = feed.remaining
+                feed.target = feed.collected
+
+        # 完成 min_samples 個工作單位之前速率不可靠 (例如 super-batch 還在進行),不參與分配
+        live = [feed for feed in self.feeds.values()
+                if feed.running and feed.rate is not None and feed.units_done >= self.min_samples]
+        total_rate = sum(feed.rate for feed in live)
+        remaining_total = self.total_target - self.collected
+        if total_rate > 0 and remaining_total > 0:
+            horizon = remaining_total / total_rate
+            for feed in live:
+                expected = feed.rate * horizon * self.slack
+                if feed.remaining > expected + 1:
+                    excess = int(feed.remaining - expected)
+                    feed.target -= excess
+                    freed[feed.name] = freed.get(feed.name, 0) + excess
+
+        pool = sum(freed.values())
+        receivers = [feed for feed in live if feed.rate > 0 and feed.name not in freed]
+        if not pool or not receivers:
+            return
+        receiver_rate = sum(feed.rate for feed in receivers)
+        given = 0
+        for index, feed in enumerate(receivers):
+            share = pool - given if index == len(receivers) - 1 else int(pool * feed.rate / receiver_rate)
+            feed.target += share
+            given += share
+        donors = ', '.join(f"{name} -{count}" for name, count in freed.items() if count)
+        takers = ', '.join(f"{feed.name} ({feed.rate:.0f}/s)" for feed in receivers)
+        self.moves.append((now, donors, takers, pool))
+        print(f"  🔀 重新分配 {pool} 筆: {donors} → {takers}")
+
+    # ------------------------------------------------------------------
+    # 結果處理
+    # ------------------------------------------------------------------
+
+    def _handle_result(self, feed, key, future, now):
+        feed.in_flight -= 1
+        feed.units_done += 1
+        try:
+            records = future.result()
+        except Exception as exc:
+            feed.errors += 1
+            feed.consecutive_errors += 1
+            if _http_status(exc) == 429:
+                # 被限流: 拉長請求間隔,有 Retry-After 時至少等到那之後
+                feed.rate_limited += 1
+                feed.min_interval = min(self.max_backoff, max(feed.min_interval * 2, 0.5))
+                feed.next_start = max(feed.next_start, now + (_retry_after(exc) or feed.min_interval))
+            if feed.consecutive_errors >= self.max_consecutive_errors and feed.running:
+                feed.status = 'dead'
+                print(f"  ✗ {feed.name}: 連續 {feed.consecutive_errors} 次錯誤,停用 ({exc})")
+            return
+
+        feed.consecutive_errors = 0
+        if feed.min_interval > feed.base_interval:
+            feed.min_interval = max(feed.base_interval, feed.min_interval * 0.8)
+
+        need = math.ceil(feed.target - feed.collected)
+        if need <= 0:
+            # 目標已被移走或已達成: 不登記,留給其他來源
+            return
+        fresh = self.dedup.filter_new(records, feed.name, limit=need)
+        feed.records.extend(fresh)
+
+        if records and not fresh:
+            feed.duplicate_streak += 1
+            if feed.duplicate_streak >= self.max_duplicate_streak and feed.running:
+                feed.status = 'exhausted'
+                print(f"  ⚠️  {feed.name}: 連續 {feed.duplicate_streak} 次全部重複,視為耗盡")
+        elif fresh:
+            feed.duplicate_streak = 0
+
+        # 分頁來源: 新資料比例過低 (且不是因為達到目標而截斷) 時略過此類別剩下的頁面
+        if key is not None and len(fresh) < need and len(fresh) < max(len(records), 1) * self.min_page_yield:
+            feed.low_yield_keys.add(key)
+
+    # ------------------------------------------------------------------
+    # 主迴圈
+    # ------------------------------------------------------------------
+
+    def _dispatch(self, executor, pending, now):
+        """為每個仍需資料的來源補上工作,直到達到其並行度或請求間隔"""
+        for feed in self.feeds.values():
+            while (feed.wants_work() and feed.in_flight < feed.concurrency
+                   and len(pending) < self.max_workers and now >= feed.next_start):
+                try:
+                    key, unit = next(feed.units)
+                except StopIteration:
+                    if feed.in_flight == 0:
+                        feed.status = 'exhausted'
+                        print(f"  ⚠️  {feed.name}: 已無可抓取的頁面,視為耗盡")
+                    break
+                future = executor.submit(unit)
+                pending[future] = (feed, key)
+                feed.in_flight += 1
+                feed.active_in_window = True
+                feed.next_start = now + feed.min_interval
+                if feed.min_interval > 0:
+                    break
+
+    def _next_wakeup(self, now):
+        waits = [feed.next_start - now for feed in self.feeds.values()
+                 if feed.wants_work() and feed.in_flight < feed.concurrency and feed.next_start > now]
+        return min(waits + [self.rebalance_interval])
+
+    def _progress(self, elapsed):
+        parts = ' '.join(f"{feed.name} {feed.collected}/{feed.target}" for feed in self.feeds.values())
+        pct = self.collected / self.total_target * 100 if self.total_target else 100.0
+        print(f"  📊 {elapsed:5.1f}s {self.collected:,}/{self.total_target:,} ({pct:.1f}%)  {parts}")
+
+    def run(self):
+        """執行排程,回傳 {來源名稱: [(title, description)]}"""
+        start = time.time()
+        print(f"\n🧭 動態排程: 總目標 {self.total_target:,},共用 {self.max_workers} 個 workers,"
+              f"每 {self.rebalance_interval:g} 秒依產出重新分配")
+        self._allocate_concurrency()
+        for feed in self.feeds.values():
+            feed.active_in_window = feed.wants_work()
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = {}
+        last_rebalance = start
+        try:
+            while self.collected < self.total_target:
+                now = time.time()
+                self._dispatch(executor, pending, now)
+                if not pending and not any(feed.wants_work() for feed in self.feeds.values()):
+                    # 沒有進行中的工作,也沒有來源需要資料: 先嘗試把目標移給仍可產出的來源
+                    self._update_rates(max(now - last_rebalance, 1e-6))
+                    last_rebalance = now
+                    self._rebalance(now - start)
+                    self._allocate_concurrency()
+                    if not any(feed.wants_work() for feed in self.feeds.values()):
+                        break
+                    continue
+
+                done, _ = wait(list(pending), timeout=max(0.01, self._next_wakeup(now)),
+                               return_when=FIRST_COMPLETED)
+                now = time.time()
+                for future in done:
+                    feed, key = pending.pop(future)
+                    self._handle_result(feed, key, future, now)
+
+                if now - last_rebalance >= self.rebalance_interval:
+                    self._update_rates(now - last_rebalance)
+                    last_rebalance = now
+                    self._rebalance(now - start)
+                    self._allocate_concurrency()
+                    self._progress(now - start)
+        finally:
+            # 達標後不等待進行中的請求 (結果直接丟棄),尚未開始的工作全部取消
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self.elapsed = time.time() - start
+        self._progress(self.elapsed)
+        return {name: feed.records for name, feed in self.feeds.items()}
+
+    def report(self):
+        print(f"\n{'來源':<14}{'計畫':>8}{'最終目標':>10}{'取得':>8}{'工作單位':>10}{'錯誤':>6}{'429':>6}{'筆/秒':>8}  狀態")
+        print('-' * 84)
+        for feed in self.feeds.values():
+            rate = f"{feed.rate:.1f}" if feed.rate is not None else '-'
+            status = 'done' if feed.running and feed.collected >= feed.target else feed.status
+            print(f"{feed.name:<14}{feed.planned_target:>8,}{feed.target:>10,}{feed.collected:>8,}"
+                  f"{feed.units_done:>10,}{feed.errors:>6}{feed.rate_limited:>6}{rate:>8}  {status}")
+        print(f"重新分配 {len(self.moves)} 次,共 {self.collected:,}/{self.total_target:,} 筆,"
+              f"耗時 {self.elapsed:.1f} 秒")
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+seed.py 的分階段效能剖析 (--profile)
+
+seed.py 變慢時分不出時間花在 HTTP 等待、XML/HTML 解析、去重還是資料庫寫入。
+StageProfiler 把每個階段 (各爬蟲、去重、建立 schema、寫入、建立索引) 包起來:
+
+- cProfile: 每個 (階段, 執行緒) 各一個 Profile,結束後合併成該階段的 .pstats,
+  另外依執行緒群組 (MainThread / ThreadPoolExecutor-N) 各存一份
+- 執行緒歸屬: 剖析期間 ThreadPoolExecutor.submit 會記住送出工作的執行緒目前所在的階段,
+  worker 執行該工作時歸入同一階段 (爬蟲內部的 executor、排程器、寫入用的 executor 都適用)
+- 取樣: 背景執行緒每 interval 秒讀取所有執行緒的 stack (sys._current_frames),
+  輸出 collapsed stack (「階段;執行緒群組;frame;frame... 次數」),可直接交給
+  flamegraph.pl 或 speedscope 繪製火焰圖
+- tracemalloc: 各階段期間的記憶體峰值 (同時進行的階段各自計入期間內的整體峰值)、
+  階段前後的淨增量與前幾名配置位置,另輸出記憶體時間線
+
+巢狀階段 (例如寫入中的建立索引) 的 cProfile 為互斥計算: 內層進行時外層暫停。
+Python 3.12 起 cProfile 改用 sys.monitoring,同一時間只能有一個 Profile 啟用,
+同時進行的其他執行緒無法再啟用時只計入取樣資料 (報表中標示)。
+
+用法:
+    profiler = StageProfiler('test-results/seed_profile_xxx')
+    profiler.start()
+    with profile_stage('insert_books_to_db'):
+        ...
+    executor.submit(profiled('scrape_arxiv', scrape_arxiv_papers), 1000)
+    profiler.finish()
+
+未啟動 profiler 時 profile_stage() / profiled() 不做任何事。
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+_active = None  # 目前啟動中的 StageProfiler
+
+def _thread_group(name):
+    """ThreadPoolExecutor-3_12 → ThreadPoolExecutor-3 (同一個 executor 的 worker 合併)"""
+    return re.sub(r'_\d+$', '', name)
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+def _safe_name(name):
+    return re.sub(r'[^\w.-]+', '_', name)
+
+class _Stage:
+    def __init__(self, name, index):
+        self.name = name
+        self.index = index
+        self.wall = 0.0
+        self.entries = 0
+        self.active = 0
+        self.peak = 0
+        self.start_memory = None
+        self.end_memory = None
+        self.start_snapshot = None
+        self.top_allocations = []
+        self.profiles = []  # [(執行緒群組, cProfile.Profile)]
+        self.thread_idents = set()
+        self.cprofile_skipped = 0
+        self.samples = 0
+        self.cpu = 0.0
+        self.threads = 0
+
+class StageProfiler:
+    """分階段的 cProfile + 取樣 + tracemalloc,結果寫到 output_dir"""
+
+    def __init__(self, output_dir, interval=0.005, memory_every=20, tracemalloc_frames=1):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.memory_every = memory_every
+        self.tracemalloc_frames = tracemalloc_frames
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.thread_stage = {}  # thread ident → 目前階段 (供取樣使用)
+        self.stacks = {}
+        self.memory_timeline = []
+        self.stop_event = threading.Event()
+        self.sampler = None
+        self.start_time = None
+        self._original_submit = None
+
+    # ------------------------------------------------------------------
+    # 啟動 / 結束
+    # ------------------------------------------------------------------
+
+    def start(self):
+        global _active
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.start_time = time.perf_counter()
+        tracemalloc.start(self.tracemalloc_frames)
+
+        # 讓 executor 的 worker 繼承送出工作那個執行緒的階段
+        original_submit = self._original_submit = ThreadPoolExecutor.submit
+        profiler = self
+
+        def submit(executor, fn, /, *args, **kwargs):
+            stage = profiler._current_stage()
+            if stage is not None:
+                fn = profiler._bind(stage, fn)
+            return original_submit(executor, fn, *args, **kwargs)
+
+        ThreadPoolExecutor.submit = submit
+        self.sampler = threading.Thread(target=self._sample_loop, name='stage-profiler-sampler', daemon=True)
+        self.sampler.start()
+        _active = self
+        return self
+
+    def finish(self):
+        """停止取樣與 tracemalloc,寫出所有檔案並印出報表"""
+        global _active
+        _active = None
+        self.stop_event.set()
+        self.sampler.join()
+        ThreadPoolExecutor.submit = self._original_submit
+        self._fold_peak()
+        tracemalloc.stop()
+        self._write_outputs()
+        self.report()
+
+    # ------------------------------------------------------------------
+    # 階段
+    # ------------------------------------------------------------------
+
+    def _get_stage(self, name):
+        with self.lock:
+            if name not in self.stages:
+                self.stages[name] = _Stage(name, len(self.stages) + 1)
+            return self.stages[name]
+
+    def _stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []  # [(stage, profile 或 None)]
+        return self.local.stack
+
+    def _current_stage(self):
+        stack = self._stack()
+        return stack[-1][0] if stack else None
+
+    def _fold_peak(self):
+        """把目前的 tracemalloc 峰值計入所有進行中的階段,再重設峰值"""
+        if not tracemalloc.is_tracing():
+            return
+        with self.lock:
+            current, peak = tracemalloc.get_traced_memory()
+            for stage in self.stages.values():
+                if stage.active:
+                    stage.peak = max(stage.peak, peak)
+            tracemalloc.reset_peak()
+            return current
+
+    def _enter(self, stage):
+        """在目前的執行緒進入 stage (巢狀時暫停外層階段的 Profile)"""
+        stack = self._stack()
+        if stack and stack[-1][1] is not None:
+            stack[-1][1].disable()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: 其他執行緒的 Profile 仍在啟用中
+            profile = None
+            with self.lock:
+                stage.cprofile_skipped += 1
+        if profile is not None:
+            with self.lock:
+                stage.profiles.append((_thread_group(threading.current_thread().name), profile))
+        with self.lock:
+            stage.thread_idents.add(threading.get_ident())
+        stack.append((stage, profile))
+        self.thread_stage[threading.get_ident()] = stage
+
+    def _exit(self):
+        stack = self._stack()
+        stage, profile = stack.pop()
+        if profile is not None:
+            profile.disable()
+        if stack:
+            self.thread_stage[threading.get_ident()] = stack[-1][0]
+            if stack[-1][1] is not None:
+                stack[-1][1].enable()
+        else:
+            self.thread_stage.pop(threading.get_ident(), None)
+        return stage
+
+    @contextmanager
+    def stage(self, name):
+        stage = self._get_stage(name)
+        current = self._fold_peak()
+        with self.lock:
+            stage.entries += 1
+            stage.active += 1
+            if stage.start_memory is None:
+                stage.start_memory = current
+                stage.start_snapshot = tracemalloc.take_snapshot()
+        started = time.perf_counter()
+        self._enter(stage)
+        try:
+            yield stage
+        finally:
+            self._exit()
+            elapsed = time.perf_counter() - started
+            current = self._fold_peak()
+            with self.lock:
+                stage.wall += elapsed
+                stage.active -= 1
+                stage.end_memory = current
+                if stage.active == 0 and stage.start_snapshot is not None:
+                    diff = tracemalloc.take_snapshot().compare_to(stage.start_snapshot, 'lineno')
+                    stage.top_allocations = [d for d in diff if d.size_diff > 0][:10]
+                    stage.start_snapshot = None
+
+    def _bind(self, stage, fn):
+        """executor worker 執行 fn 時歸入 stage (不重複計算牆上時間與記憶體)"""
+        def run(*args, **kwargs):
+            self._enter(stage)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._exit()
+        return run
+
+    # ------------------------------------------------------------------
+    # 取樣
+    # ------------------------------------------------------------------
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        tick = 0
+        while not self.stop_event.wait(self.interval):
+            tick += 1
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                stage = self.thread_stage.get(ident)
+                if ident == me or stage is None:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(_frame_label(frame))
+                    frame = frame.f_back
+                key = ';'.join([stage.name, _thread_group(names.get(ident, str(ident)))] + frames[::-1])
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                stage.samples += 1
+            if tick % self.memory_every == 0 and tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                active = '|'.join(s.name for s in list(self.stages.values()) if s.active)
+                self.memory_timeline.append((time.perf_counter() - self.start_time, current, peak, active))
+
+    # ------------------------------------------------------------------
+    # 輸出
+    # ------------------------------------------------------------------
+
+    def _stats(self, profiles):
+        profiles = list(profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def _write_outputs(self):
+        with open(os.path.join(self.output_dir, 'stacks.collapsed'), 'w', encoding='utf-8') as f:
+            for key, count in sorted(self.stacks.items()):
+                f.write(f"{key} {count}\n")
+
+        with open(os.path.join(self.output_dir, 'memory_timeline.csv'), 'w', encoding='utf-8') as f:
+            f.write('elapsed_s,current_mb,peak_mb,active_stages\n')
+            for elapsed, current, peak, active in self.memory_timeline:
+                f.write(f"{elapsed:.3f},{current / 1048576:.2f},{peak / 1048576:.2f},{active}\n")
+
+        threads_lines = []
+        top_lines = []
+        for stage in self.stages.values():
+            prefix = os.path.join(self.output_dir, f"{stage.index:02d}_{_safe_name(stage.name)}")
+            stats = self._stats(profile for _, profile in stage.profiles)
+            stage.cpu = stats.total_tt if stats else 0.0
+            stage.threads = len(stage.thread_idents)
+            if stats is None:
+                continue
+            stats.dump_stats(f"{prefix}.pstats")
+
+            groups = {}
+            for group, profile in stage.profiles:
+                groups.setdefault(group, []).append(profile)
+            threads_lines.append(f"[{stage.name}]")
+            for group, profiles in sorted(groups.items()):
+                group_stats = self._stats(profiles)
+                group_stats.dump_stats(f"{prefix}.{_safe_name(group)}.pstats")
+                threads_lines.append(f"  {group:<28} {len(profiles):>5} 次進入  {group_stats.total_tt:>10.3f} s")
+
+            buffer = io.StringIO()
+            stats.stream = buffer
+            stats.sort_stats('cumulative').print_stats(15)
+            top_lines.append(f"===== {stage.name} =====\n{buffer.getvalue()}")
+
+            if stage.top_allocations:
+                top_lines.append(f"----- {stage.name}: 階段內淨增加的記憶體配置 (前 10 名) -----")
+                top_lines.extend(str(d) for d in stage.top_allocations)
+                top_lines.append('')
+
+        with open(os.path.join(self.output_dir, 'threads.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(threads_lines) + '\n')
+        with open(os.path.join(self.output_dir, 'top.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(top_lines) + '\n')
+
+    def report(self):
+        print(f"\n{'=' * 60}")
+        print("🔬 分階段剖析 (--profile)")
+        print(f"{'=' * 60}")
+        print(f"{'階段':<28}{'牆上時間 s':>11}{'剖析時間 s':>11}{'執行緒':>7}{'取樣':>8}{'峰值 MB':>9}{'淨增 MB':>9}")
+        for stage in self.stages.values():
+            delta = ((stage.end_memory or 0) - (stage.start_memory or 0)) / 1048576
+            note = f"  (cProfile 略過 {stage.cprofile_skipped} 次)" if stage.cprofile_skipped else ''
+            print(f"{stage.name:<28}{stage.wall:>11.2f}{stage.cpu:>11.2f}{stage.threads:>7}{stage.samples:>8,}"
+                  f"{stage.peak / 1048576:>9.1f}{delta:>9.1f}{note}")
+        print("剖析時間為各執行緒在 cProfile 中的時間總和 (含 I/O 等待),並行階段可能大於牆上時間")
+        print(f"📁 {self.output_dir}")
+        print("   NN_<階段>.pstats: python3 -m pstats 或 snakeviz 開啟;NN_<階段>.<執行緒群組>.pstats: 各執行緒群組")
+        print("   stacks.collapsed: flamegraph.pl stacks.collapsed > flame.svg (或拖進 speedscope.app)")
+        print("   top.txt / threads.txt / memory_timeline.csv: 熱點函數、記憶體配置、執行緒歸屬、記憶體時間線")
+
+@contextmanager
+def profile_stage(name):
+    """profiler 啟動時把區塊計入 name 階段,否則不做任何事"""
+    if _active is None:
+        yield
+        return
+    with _active.stage(name):
+        yield
+
+def profiled(name, fn):
+    """回傳在 name 階段中執行 fn 的函數 (給 executor.submit 使用)"""
+    def run(*args, **kwargs):
+        with profile_stage(name):
+            return fn(*args, **kwargs)
+    return run
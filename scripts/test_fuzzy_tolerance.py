@@ -4,19 +4,11 @@
 測試容錯搜尋功能
 """
 
-import psycopg2
 import requests
 import json
 from typing import List, Dict
 
-# 資料庫連線設定
-DB_CONFIG = {
-    'host': 'localhost',
-    'port': 5432,
-    'database': 'testdb',
-    'user': 'postgres',
-    'password': 'password'
-}
+from db import connect, insert_values
 
 # API 端點
 API_URL = 'http://localhost:3000/search'
@@ -38,15 +30,14 @@ def insert_test_data():
         ('Harvey', 'Similar beginning'),
     ]
     
-    conn = psycopg2.connect(**DB_CONFIG)
+    conn = connect()
     cur = conn.cursor()
     
     # 先刪除舊的測試資料
     cur.execute("DELETE FROM worlds WHERE title IN ('Harry', 'Harold', 'Harriett', 'Harrison', 'Harris', 'Garry', 'Larry', 'Barry', 'Henry', 'Harvey')")
     
     # 插入新的測試資料
-    for title, description in test_data:
-        cur.execute("INSERT INTO worlds (title, description) VALUES (%s, %s)", (title, description))
+    insert_values(cur, "INSERT INTO worlds (title, description) VALUES %s", test_data)
     
     conn.commit()
     cur.close()
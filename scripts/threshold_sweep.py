@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pg_trgm 相似度閾值掃描: 延遲 vs recall 的 Pareto 前緣
+
+init.sql / server.js 固定使用 similarity_threshold = 0.3、word_similarity_threshold = 0.6。
+這兩個閾值決定 % 與 <<% 分支要 recheck 多少 GIN 候選,同時影響延遲與容錯能力。
+本工具在每個資料量下,以會話級別 SET 掃描兩個閾值的網格,對帶標籤的查詢集執行
+/search SQL,量測 recall@20 與延遲百分位數,並輸出 Pareto 前緣。
+
+/search SQL 以 DISTINCT ON (id) ORDER BY id 取前 20 筆,回傳的是 id 最小的 20 個候選而非最相似的 20 個,
+閾值越低候選越多,正解反而越容易被擠出前 20。因此本工具改用 query_strategies.py 的 current_topk
+寫法 (相同分支與去重,最後依 sim DESC 取前 20),recall 反映閾值本身而不是 id 順序。
+
+查詢集格式 (JSONL,每行一筆,build_workload.py 的輸出可直接使用):
+  {"query": "harri", "expected_ids": [42]}
+未指定 --queries-file 時,會從 worlds 隨機抽樣 title,取片段並加入一個字元的錯字作為查詢。
+
+用法:
+  # 使用目前資料
+  python3 scripts/threshold_sweep.py
+
+  # 在 1 萬、10 萬筆下掃描 (會清空 worlds!);每個資料量重新抽樣查詢,不能搭配 --queries-file
+  python3 scripts/threshold_sweep.py --volumes 10000 100000
+
+  # 自訂網格
+  python3 scripts/threshold_sweep.py --similarity 0.2 0.3 0.4 --word-similarity 0.5 0.6 0.7
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+import matplotlib.pyplot as plt
+import matplotlib
+matplotlib.use('Agg')  # 非互動式後端
+
+from build_workload import make_typo, sample_titles
+from db import connect
+from query_strategies import strategy_sql
+from search_sql import SIMILARITY_THRESHOLD, WORD_SIMILARITY_THRESHOLD, apply_search_settings, set_data_volume
+
+DEFAULT_SIMILARITY = [0.1, 0.2, 0.3, 0.4, 0.5]
+DEFAULT_WORD_SIMILARITY = [0.4, 0.5, 0.6, 0.7, 0.8]
+TOP_K = 20
+
+def _percentile(sorted_values, pct):
+    return sorted_values[min(int(len(sorted_values) * pct), len(sorted_values) - 1)]
+
+def sample_labeled_queries(conn, count, seed=42):
+    """從 worlds 抽樣 title,取片段加上錯字作為查詢,標籤為原本的 id"""
+    rng = random.Random(seed)
+    labeled = []
+    for world_id, title in sample_titles(conn, count, seed):
+        # 片段長度 6~12 字元,模擬使用者只輸入部分標題
+        length = min(len(title), rng.randint(6, 12))
+        start = rng.randrange(len(title) - length + 1)
+        query, _ = make_typo(title[start:start + length], rng)
+        labeled.append({'query': query, 'expected_ids': [world_id]})
+    return labeled
+
+def load_labeled_queries(filename):
+    """讀取 JSONL 查詢集 (需要 query 與 expected_ids 欄位)"""
+    with open(filename, 'r', encoding='utf-8') as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    return [item for item in items if item.get('query') and item.get('expected_ids')]
+
+def count_existing_ids(conn, labeled):
+    """查詢集的 expected_ids 中仍存在於 worlds 的筆數"""
+    cur = conn.cursor()
+    cur.execute('SELECT COUNT(*) FROM worlds WHERE id = ANY(%s)',
+                (sorted({world_id for item in labeled for world_id in item['expected_ids']}),))
+    count = cur.fetchone()[0]
+    cur.close()
+    conn.rollback()
+    return count
+
+def run_grid_point(conn, labeled, similarity, word_similarity, repeat):
+    """在單一閾值組合下執行查詢集 (依 sim 排序取前 20),回傳 recall@20 與延遲百分位數"""
+    cur = conn.cursor()
+    apply_search_settings(cur, similarity, word_similarity)
+    sql = strategy_sql('current_topk')
+    latencies = []
+    hits = 0
+    candidates = 0
+    for item in labeled:
+        expected = set(item['expected_ids'])
+        for run in range(repeat):
+            start = time.perf_counter()
+            cur.execute(sql, {'q': item['query']})
+            rows = cur.fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+        found = {row[0] for row in rows[:TOP_K]}
+        hits += len(expected & found)
+        candidates += len(expected)
+    conn.rollback()
+    cur.close()
+
+    latencies.sort()
+    return {
+        'similarity': similarity,
+        'word_similarity': word_similarity,
+        'recall': hits / candidates if candidates else 0.0,
+        'p50_ms': _percentile(latencies, 0.50),
+        'p95_ms': _percentile(latencies, 0.95),
+        'p99_ms': _percentile(latencies, 0.99),
+        'mean_ms': statistics.mean(latencies),
+    }
+
+def pareto_frontier(points, latency_key='p95_ms'):
+    """延遲越低越好、recall 越高越好;回傳不被任何點支配的點 (依延遲排序)"""
+    frontier = []
+    for point in points:
+        dominated = any(
+            other[latency_key] <= point[latency_key] and other['recall'] >= point['recall']
+            and (other[latency_key] < point[latency_key] or other['recall'] > point['recall'])
+            for other in points
+        )
+        if not dominated:
+            frontier.append(point)
+    return sorted(frontier, key=lambda p: p[latency_key])
+
+def create_pareto_chart(volume, points, frontier, output_file):
+    """延遲 (p95) vs recall 散佈圖,標出 Pareto 前緣與目前設定"""
+    fig, ax = plt.subplots(figsize=(10, 7))
+    ax.scatter([p['p95_ms'] for p in points], [p['recall'] for p in points], color='#999', alpha=0.6, label='網格')
+    ax.plot([p['p95_ms'] for p in frontier], [p['recall'] for p in frontier], 'o-', color='#667eea',
+            linewidth=2, label='Pareto 前緣')
+    for p in frontier:
+        ax.annotate(f"{p['similarity']}/{p['word_similarity']}", (p['p95_ms'], p['recall']),
+                    textcoords='offset points', xytext=(5, 5), fontsize=8)
+    current = [p for p in points if p['similarity'] == SIMILARITY_THRESHOLD
+               and p['word_similarity'] == WORD_SIMILARITY_THRESHOLD]
+    if current:
+        ax.scatter([current[0]['p95_ms']], [current[0]['recall']], color='#F44336', s=120, marker='*',
+                   label='目前設定 (0.3 / 0.6)', zorder=5)
+    ax.set_xlabel('p95 延遲 (ms)', fontsize=12)
+    ax.set_ylabel(f'recall@{TOP_K}', fontsize=12)
+    ax.set_title(f'閾值掃描 - {volume:,} 筆', fontsize=14, fontweight='bold')
+    ax.grid(True, alpha=0.3)
+    ax.legend(fontsize=10)
+    plt.tight_layout()
+    plt.savefig(output_file, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='掃描 pg_trgm 閾值,輸出延遲 vs recall 的 Pareto 前緣')
+    parser.add_argument('--volumes', type=int, nargs='+',
+                        help='要測試的資料量 (會清空並重新產生 worlds);未指定則使用目前資料')
+    parser.add_argument('--similarity', type=float, nargs='+', default=DEFAULT_SIMILARITY,
+                        help='pg_trgm.similarity_threshold 網格')
+    parser.add_argument('--word-similarity', type=float, nargs='+', default=DEFAULT_WORD_SIMILARITY,
+                        help='pg_trgm.word_similarity_threshold 網格')
+    parser.add_argument('--queries-file', '--workload', dest='queries_file',
+                        help='帶標籤的查詢集 (JSONL: query, expected_ids,例如 build_workload.py 的輸出)')
+    parser.add_argument('--sample', type=int, default=100, help='未指定查詢集時抽樣的查詢數 (預設: 100)')
+    parser.add_argument('--repeat', type=int, default=2, help='每個查詢重複次數 (預設: 2)')
+    parser.add_argument('--output-dir', default=None,
+                        help='輸出目錄 (預設: test-results/threshold_sweep_<timestamp>)')
+    args = parser.parse_args()
+    if args.volumes and args.queries_file:
+        # clear_all_data() 重新產生資料後,查詢集的 expected_ids 已不存在
+        parser.error('--queries-file 的 expected_ids 只對產生它的資料有效,不能與 --volumes 一起使用')
+    return args
+
+def main():
+    args = parse_arguments()
+    output_dir = args.output_dir or os.path.join(
+        'test-results', f"threshold_sweep_{time.strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    print("=" * 80)
+    print("pg_trgm 閾值掃描 (延遲 vs recall)")
+    print("=" * 80)
+
+    conn = connect()
+    report = {}
+    try:
+        for volume in args.volumes or [None]:
+            if volume is not None:
+                print(f"\n🔧 產生 {volume:,} 筆測試資料...", end=' ', flush=True)
+                set_data_volume(conn, volume)
+                print("✓")
+            cur = conn.cursor()
+            cur.execute('SELECT COUNT(*) FROM worlds')
+            label = cur.fetchone()[0]
+            cur.close()
+            conn.rollback()
+
+            if args.queries_file:
+                labeled = load_labeled_queries(args.queries_file)
+                if labeled and count_existing_ids(conn, labeled) == 0:
+                    print("❌ 查詢集的 expected_ids 都不在 worlds 中 (資料已重新產生?)")
+                    break
+            else:
+                labeled = sample_labeled_queries(conn, args.sample)
+            if not labeled:
+                print("❌ 沒有可用的查詢 (worlds 是空的?)")
+                continue
+            print(f"\n📊 資料量 {label:,} 筆, {len(labeled)} 個查詢, "
+                  f"{len(args.similarity)} x {len(args.word_similarity)} 個閾值組合")
+
+            points = []
+            for similarity in args.similarity:
+                for word_similarity in args.word_similarity:
+                    point = run_grid_point(conn, labeled, similarity, word_similarity, args.repeat)
+                    points.append(point)
+                    print(f"  sim={similarity:<4} word={word_similarity:<4} recall@{TOP_K}={point['recall']:.3f} "
+                          f"p50={point['p50_ms']:.2f}ms p95={point['p95_ms']:.2f}ms")
+
+            frontier = pareto_frontier(points)
+            print(f"\n⭐ Pareto 前緣 ({label:,} 筆):")
+            print(f"{'similarity':>10} {'word_sim':>9} {'recall':>8} {'p50':>10} {'p95':>10} {'p99':>10}")
+            for p in frontier:
+                print(f"{p['similarity']:>10} {p['word_similarity']:>9} {p['recall']:>8.3f} "
+                      f"{p['p50_ms']:>8.2f}ms {p['p95_ms']:>8.2f}ms {p['p99_ms']:>8.2f}ms")
+
+            chart_file = os.path.join(output_dir, f'pareto_{label}.png')
+            create_pareto_chart(label, points, frontier, chart_file)
+            report[label] = {'queries': len(labeled), 'grid': points, 'frontier': frontier}
+            print(f"✅ 圖表已儲存至: {chart_file}")
+    finally:
+        conn.close()
+
+    output_file = os.path.join(output_dir, 'threshold_sweep.json')
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果已儲存至: {output_file}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+錯字容忍度矩陣基準測試: trigram 容錯在哪裡失效、代價多少
+
+test_fuzzy_tolerance.py 只插入 10 個手選名字 (Harry、Harold...) 測 4 個拼錯。
+本工具從 worlds 抽樣 N 個 title,為每個 title 產生所有類別的變體:
+
+- d0:exact                原字串 (對照組)
+- d1:<kind>               一個錯字: delete / insert / substitute / transpose
+                          (錯字函數與 build_workload.py 相同,鍵盤相鄰鍵)
+- d2:<kind>+<kind>        兩個錯字的所有組合 (位置至少間隔 2 個字元,避免互相抵銷)
+- swap                    相鄰兩個單字對調 (只有一個單字的 title 不產生)
+
+查詢字串的來源 (--bases):
+- title:  完整 title
+- prefix: title 開頭 4~12 個字元
+- word:   title 中最長的單字 (4 字元以上,只有一個單字的 title 不產生)
+
+所有變體打亂順序後以 asyncio 並行送到 backend /search (HTTP/1.1 keep-alive,與 loadgen.py 相同的連線池),
+以回傳結果中原本的 title 判斷是否找到 (排名依 similarity 由高到低計算,不依回應順序),統計:
+- recall@1 / @5 / @20、MRR、找到時的排名
+- 找到它的 matchType 分支 (exact_prefix / similarity / word_similarity / contains)
+- 用戶端延遲與 meta.queryTimeMs
+並依變體類別、查詢長度區間 × 編輯距離輸出矩陣,結果寫到 test-results/typo_matrix_<資料量>_<timestamp>.json。
+
+用法:
+  # 抽樣 200 個 title,並行 16 個請求
+  python3 scripts/typo_matrix_bench.py
+
+  # 較大的樣本,測 Go backend,並把變體存成 build_workload 格式供 k6 / loadgen 重播
+  python3 scripts/typo_matrix_bench.py --titles 1000 --base-url http://localhost:3001 \\
+                  --export-workload test-results/typo_workload.jsonl
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+import urllib.parse
+
+from build_workload import TYPO_KINDS, _words, make_typo, sample_titles
+from db import connect
+from loadgen import ConnectionPool, http_get
+from search_sql import classify_query
+
+MATCH_TYPES = ('exact_prefix', 'similarity', 'word_similarity', 'contains')
+BASES = ('title', 'prefix', 'word')
+LENGTH_BUCKETS = ((1, 4), (5, 8), (9, 16), (17, 32), (33, 64), (65, None))
+DISTANCE_GROUPS = ('d0', 'd1', 'd2', 'swap')
+
+# d1 每種錯字一類,d2 為兩種錯字的所有組合 (含相同種類兩次)
+VARIANT_CLASSES = (
+    ['d0:exact']
+    + [f'd1:{kind}' for kind in TYPO_KINDS]
+    + [f'd2:{a}+{b}' for a, b in itertools.combinations_with_replacement(TYPO_KINDS, 2)]
+    + ['swap']
+)
+
+def _percentile(sorted_values, pct):
+    return sorted_values[min(int(len(sorted_values) * pct), len(sorted_values) - 1)]
+
+def length_bucket(length):
+    for low, high in LENGTH_BUCKETS:
+        if high is None or length <= high:
+            return f'{low}+' if high is None else f'{low}-{high}'
+
+# ============================================================================
+# 變體產生
+# ============================================================================
+
+def _edit_positions(text, kind, used):
+    """可套用錯字的位置: 英數字元 (insert 可在任何位置),與已套用的錯字至少間隔 2"""
+    if kind == 'insert':
+        candidates = range(len(text))
+    elif kind == 'transpose':
+        candidates = [p for p in range(len(text) - 1) if text[p].isalnum() and text[p + 1].isalnum()
+                      and text[p] != text[p + 1]]
+    else:
+        candidates = [p for p in range(len(text)) if text[p].isalnum()]
+    return [p for p in candidates if all(abs(p - u) >= 2 for u in used)]
+
+def apply_edits(text, kinds, rng):
+    """依序套用 kinds 中的錯字,回傳新字串;找不到可用位置時回傳 None"""
+    used = []
+    for kind in kinds:
+        if len(text) < 2:
+            return None
+        positions = _edit_positions(text, kind, used)
+        if not positions:
+            return None
+        pos = rng.choice(positions)
+        text, applied = make_typo(text, rng, kind, pos)
+        if applied != kind:
+            return None
+        # 插入 / 刪除會讓後面已套用的位置位移
+        shift = 1 if kind == 'insert' else -1 if kind == 'delete' else 0
+        used = [u + shift if u > pos else u for u in used] + [pos]
+    return text
+
+def swap_words(text, rng):
+    """對調相鄰兩個單字 (以空白分隔);只有一個單字或對調後不變時回傳 None"""
+    words = text.split()
+    pairs = [i for i in range(len(words) - 1) if words[i].lower() != words[i + 1].lower()]
+    if not pairs:
+        return None
+    i = rng.choice(pairs)
+    words[i], words[i + 1] = words[i + 1], words[i]
+    return ' '.join(words)
+
+def derive_base(title, base, rng):
+    if base == 'title':
+        return title
+    if base == 'prefix':
+        return title[:rng.randint(4, 12)].rstrip() if len(title) > 4 else None
+    words = _words(title)
+    if len(words) < 2:
+        return None
+    longest = max(words, key=len)
+    return longest if len(longest) >= 4 else None
+
+def make_variant(text, variant_class, rng, attempts=5):
+    """產生一個屬於 variant_class 的變體,與原字串相同或無法產生時回傳 None"""
+    if variant_class == 'd0:exact':
+        return text
+    for _ in range(attempts):
+        if variant_class == 'swap':
+            variant = swap_words(text, rng)
+        else:
+            variant = apply_edits(text, variant_class.split(':', 1)[1].split('+'), rng)
+        if variant and variant.strip() and variant != text:
+            return variant
+    return None
+
+def generate_variants(titles, bases, seed=42):
+    """為每個 (title, base) 產生所有類別的變體,回傳 [{query, variant_class, ...}] 與略過數"""
+    rng = random.Random(seed)
+    variants = []
+    skipped = {}
+    for world_id, title in titles:
+        for base in bases:
+            text = derive_base(title, base, rng)
+            if not text:
+                continue
+            for variant_class in VARIANT_CLASSES:
+                query = make_variant(text, variant_class, rng)
+                if query is None:
+                    skipped[variant_class] = skipped.get(variant_class, 0) + 1
+                    continue
+                variants.append({
+                    'query': query,
+                    'variant_class': variant_class,
+                    'distance': variant_class.split(':', 1)[0],
+                    'base': base,
+                    'base_text': text,
+                    'length_bucket': length_bucket(len(text)),
+                    'source_id': world_id,
+                    'expected_title': title,
+                })
+    return variants, skipped
+
+# ============================================================================
+# 並行執行
+# ============================================================================
+
+async def run_variants(variants, base_url, concurrency, timeout, warmup):
+    parsed = urllib.parse.urlsplit(base_url)
+    pool = ConnectionPool(parsed.hostname, parsed.port or 80, concurrency)
+    # 封閉模型: 取得名額後才開始計時,延遲不含排隊等待
+    slots = asyncio.Semaphore(concurrency)
+
+    async def search(query):
+        async with slots:
+            start = time.perf_counter()
+            status, body, _ = await asyncio.wait_for(
+                http_get(pool, parsed.netloc, f"/search?q={urllib.parse.quote(query)}"), timeout)
+            client_ms = (time.perf_counter() - start) * 1000
+        if status != 200:
+            raise ValueError(f'HTTP {status}')
+        data = json.loads(body)
+        return data.get('results', []), (data.get('meta') or {}).get('queryTimeMs'), client_ms
+
+    async def one(variant):
+        try:
+            results, server_ms, client_ms = await search(variant['query'])
+        except (asyncio.TimeoutError, OSError, ValueError, IndexError, asyncio.IncompleteReadError) as e:
+            variant.update({'error': str(e) or type(e).__name__, 'rank': None, 'match_type': None})
+            return
+        # 排名一律依 similarity 由高到低 (同分保留回應順序): 有些後端 (如 Go 版) 最後以
+        # ORDER BY id 輸出,回應順序不代表相關度
+        results = sorted(results, key=lambda r: -(r.get('similarity') or 0))
+        rank = next((i for i, r in enumerate(results, 1) if r.get('title') == variant['expected_title']), None)
+        variant.update({
+            'rank': rank,
+            'match_type': results[rank - 1].get('matchType') if rank else None,
+            'similarity': results[rank - 1].get('similarity') if rank else None,
+            'result_count': len(results),
+            'client_ms': round(client_ms, 3),
+            'server_ms': server_ms,
+        })
+
+    # 暖機: 先跑幾個原字串查詢,讓連線與 shared buffers 就緒 (不計入結果)
+    exact = [v['query'] for v in variants if v['variant_class'] == 'd0:exact'][:warmup]
+    await asyncio.gather(*(search(query) for query in exact), return_exceptions=True)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(variant) for variant in variants))
+    return time.perf_counter() - start
+
+# ============================================================================
+# 統計
+# ============================================================================
+
+def summarize(rows):
+    done = [r for r in rows if 'error' not in r]
+    if not done:
+        return {'count': len(rows), 'errors': len(rows)}
+    found = [r for r in done if r['rank']]
+    client = sorted(r['client_ms'] for r in done)
+    server = sorted(r['server_ms'] for r in done if isinstance(r.get('server_ms'), (int, float)))
+    return {
+        'count': len(rows),
+        'errors': len(rows) - len(done),
+        'recall_at_1': sum(1 for r in found if r['rank'] <= 1) / len(done),
+        'recall_at_5': sum(1 for r in found if r['rank'] <= 5) / len(done),
+        'recall_at_20': len(found) / len(done),
+        'mrr': sum(1 / r['rank'] for r in found) / len(done),
+        'median_rank': _percentile(sorted(r['rank'] for r in found), 0.5) if found else None,
+        'match_types': {t: sum(1 for r in found if r['match_type'] == t) / len(found) for t in MATCH_TYPES} if found else {},
+        'avg_results': sum(r['result_count'] for r in done) / len(done),
+        'client_p50_ms': _percentile(client, 0.50),
+        'client_p95_ms': _percentile(client, 0.95),
+        'client_p99_ms': _percentile(client, 0.99),
+        'server_p50_ms': _percentile(server, 0.50) if server else None,
+        'server_p95_ms': _percentile(server, 0.95) if server else None,
+    }
+
+def group_by(rows, *keys):
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row[key] for key in keys), []).append(row)
+    return groups
+
+def print_class_table(by_class):
+    print(f"\n{'變體類別':<26}{'查詢數':>7}{'R@1':>7}{'R@5':>7}{'R@20':>7}{'MRR':>7}{'排名':>6}"
+          f"  {'prefix':>6}{'sim':>6}{'word':>6}{'cont':>6}{'p50ms':>8}{'p95ms':>8}{'結果數':>7}")
+    print('-' * 120)
+    for variant_class in VARIANT_CLASSES:
+        s = by_class.get(variant_class)
+        if not s or 'mrr' not in s:
+            continue
+        mt = s['match_types']
+        share = ''.join(f"{mt.get(t, 0):>6.0%}" for t in MATCH_TYPES)
+        rank = s['median_rank'] if s['median_rank'] is not None else '-'
+        print(f"{variant_class:<26}{s['count']:>7,}{s['recall_at_1']:>7.1%}{s['recall_at_5']:>7.1%}"
+              f"{s['recall_at_20']:>7.1%}{s['mrr']:>7.3f}{rank:>6}  {share}"
+              f"{s['client_p50_ms']:>8.1f}{s['client_p95_ms']:>8.1f}{s['avg_results']:>7.1f}")
+
+def print_length_matrix(by_length, metric, label, fmt):
+    print(f"\n{label} (查詢長度 × 編輯距離)")
+    print(f"{'長度':<10}" + ''.join(f"{group:>14}" for group in DISTANCE_GROUPS))
+    for low, high in LENGTH_BUCKETS:
+        bucket = f'{low}+' if high is None else f'{low}-{high}'
+        cells = []
+        for group in DISTANCE_GROUPS:
+            s = by_length.get(f'{bucket}|{group}')
+            cells.append(f"{format(s[metric], fmt)} ({s['count']})" if s and metric in s else '-')
+        if any(cell != '-' for cell in cells):
+            print(f"{bucket:<10}" + ''.join(f"{cell:>14}" for cell in cells))
+
+def fetch_record_count(conn):
+    cur = conn.cursor()
+    cur.execute('SELECT COUNT(*) FROM worlds')
+    records = cur.fetchone()[0]
+    cur.close()
+    return records
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='錯字容忍度矩陣: 各類編輯距離變體對 /search 的 recall、排名、分支與延遲')
+    parser.add_argument('--titles', type=int, default=200, help='抽樣的 title 數 (預設: 200)')
+    parser.add_argument('--bases', default='title,prefix,word',
+                        help='查詢字串來源,逗號分隔 (預設: title,prefix,word)')
+    parser.add_argument('--base-url', default=os.environ.get('BASE_URL', 'http://[::1]:3000'),
+                        help='backend 位址 (預設: BASE_URL 環境變數或 http://[::1]:3000)')
+    parser.add_argument('--concurrency', type=int, default=16, help='同時進行的請求數 (預設: 16)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='單一請求逾時秒數 (預設: 30)')
+    parser.add_argument('--warmup', type=int, default=20, help='正式量測前的暖機查詢數 (預設: 20)')
+    parser.add_argument('--seed', type=int, default=42, help='亂數種子')
+    parser.add_argument('--export-workload', metavar='FILE',
+                        help='另外把變體存成 build_workload.py 格式的 JSONL (可給 k6 / loadgen.py 重播)')
+    parser.add_argument('--output', default=None,
+                        help='輸出 JSON (預設: test-results/typo_matrix_<資料量>_<timestamp>.json)')
+    args = parser.parse_args()
+    args.bases = [base.strip() for base in args.bases.split(',') if base.strip()]
+    unknown = set(args.bases) - set(BASES)
+    if unknown:
+        parser.error(f'未知的 --bases: {", ".join(sorted(unknown))} (可用: {", ".join(BASES)})')
+    return args
+
+def main():
+    args = parse_arguments()
+    base_url = args.base_url.rstrip('/')
+
+    conn = connect()
+    try:
+        records = fetch_record_count(conn)
+        titles = sample_titles(conn, args.titles, args.seed)
+    finally:
+        conn.close()
+    if not titles:
+        print("❌ worlds 是空的,請先產生資料")
+        return
+
+    variants, skipped = generate_variants(titles, args.bases, args.seed)
+    random.Random(args.seed).shuffle(variants)
+
+    print("=" * 80)
+    print("錯字容忍度矩陣基準測試")
+    print("=" * 80)
+    print(f"📍 目標: {base_url}, 資料筆數: {records:,}")
+    print(f"📊 {len(titles):,} 個 title × {len(args.bases)} 種來源 ({', '.join(args.bases)}) "
+          f"→ {len(variants):,} 個變體, {len(VARIANT_CLASSES)} 個類別")
+    if skipped:
+        print(f"   無法產生而略過: {', '.join(f'{k} {v}' for k, v in sorted(skipped.items()))}")
+    print(f"⚙️  並行 {args.concurrency} 個請求")
+
+    if args.export_workload:
+        os.makedirs(os.path.dirname(args.export_workload) or '.', exist_ok=True)
+        with open(args.export_workload, 'w', encoding='utf-8') as f:
+            for v in variants:
+                f.write(json.dumps({
+                    'query': v['query'], 'kind': 'typo', 'typo': v['variant_class'],
+                    'query_class': classify_query(v['query']), 'source_id': v['source_id'],
+                    'expected_ids': [v['source_id']], 'weight': 1.0,
+                }, ensure_ascii=False) + '\n')
+        print(f"📄 變體工作負載: {args.export_workload}")
+
+    elapsed = asyncio.run(run_variants(variants, base_url, args.concurrency, args.timeout, args.warmup))
+    errors = sum(1 for v in variants if 'error' in v)
+    print(f"✓ 完成 {len(variants):,} 個查詢, {elapsed:.1f} 秒 ({len(variants) / elapsed:.0f} req/s), 錯誤 {errors:,}")
+    if errors == len(variants):
+        print(f"❌ 所有請求都失敗 ({variants[0]['error']}),請確認 backend 已啟動")
+        return
+
+    by_class = {key[0]: summarize(rows) for key, rows in group_by(variants, 'variant_class').items()}
+    by_length = {f'{bucket}|{group}': summarize(rows)
+                 for (bucket, group), rows in group_by(variants, 'length_bucket', 'distance').items()}
+    by_base = {f'{base}|{group}': summarize(rows)
+               for (base, group), rows in group_by(variants, 'base', 'distance').items()}
+
+    print_class_table(by_class)
+    print_length_matrix(by_length, 'recall_at_20', 'recall@20', '.0%')
+    print_length_matrix(by_length, 'client_p50_ms', 'p50 延遲 ms', '.1f')
+    print_length_matrix(by_length, 'client_p95_ms', 'p95 延遲 ms', '.1f')
+
+    print(f"\n{'來源':<10}" + ''.join(f"{group:>14}" for group in DISTANCE_GROUPS) + "   (recall@20)")
+    for base in args.bases:
+        cells = [by_base.get(f'{base}|{group}') for group in DISTANCE_GROUPS]
+        print(f"{base:<10}" + ''.join(f"{format(s['recall_at_20'], '.0%') if s and 'recall_at_20' in s else '-':>14}"
+                                       for s in cells))
+
+    output_file = args.output or os.path.join(
+        'test-results', f"typo_matrix_{records}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'base_url': base_url,
+            'records': records,
+            'titles': len(titles),
+            'bases': args.bases,
+            'concurrency': args.concurrency,
+            'elapsed_s': elapsed,
+            'skipped': skipped,
+            'by_class': by_class,
+            'by_length': by_length,
+            'by_base': by_base,
+            'queries': variants,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n📄 {output_file}")
+
+if __name__ == '__main__':
+    main()
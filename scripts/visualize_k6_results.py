@@ -6,15 +6,72 @@ k6 測試結果視覺化工具
 
 import json
 import glob
+import html as html_lib
+import math
 import re
 from collections import defaultdict
+from datetime import datetime
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('Agg')  # 非互動式後端
 
+# 需要依查詢拆解的 metrics 與 tag
+BREAKDOWN_METRICS = ('http_req_duration', 'search_duration')
+BREAKDOWN_TAGS = ('query', 'query_class', 'query_kind')
+
+# 延遲拆解: k6 腳本 / loadgen.py 逐一請求記錄的 metrics -> 組成部分
+DECOMPOSITION_METRICS = {
+    'search_duration': 'db',
+    'backend_overhead': 'backend',
+    'network_time': 'network',
+}
+LATENCY_COMPONENTS = (
+    ('db', '資料庫查詢'),
+    ('backend', '後端處理'),
+    ('network', '網路 / 連線'),
+)
+
+# 容量規劃: 要外推的資料量與擬合的指標
+EXTRAPOLATE_VOLUMES = (5_000_000, 10_000_000)
+SCALING_TARGETS = (
+    ('p50', 'http_req_duration', 'p50', 'p50 回應時間 (ms)'),
+    ('p95', 'http_req_duration', 'p95', 'p95 回應時間 (ms)'),
+    ('p99', 'http_req_duration', 'p99', 'p99 回應時間 (ms)'),
+    ('throughput', 'throughput', 'rps', '吞吐量 (req/s)'),
+)
+BOOTSTRAP_ROUNDS = 500
+
+def compute_stats(values):
+    """計算一組數值的統計值 (avg, min, max, p50, p95, p99, count)"""
+    values = [v for v in values if isinstance(v, (int, float))]
+    if not values:
+        return None
+    sorted_values = sorted(values)
+    return {
+        'avg': sum(values) / len(values),
+        'min': min(values),
+        'max': max(values),
+        'p50': sorted_values[len(sorted_values) // 2],
+        'p95': sorted_values[int(len(sorted_values) * 0.95)] if len(sorted_values) > 1 else sorted_values[0],
+        'p99': sorted_values[int(len(sorted_values) * 0.99)] if len(sorted_values) > 1 else sorted_values[0],
+        'count': len(values)
+    }
+
 def parse_k6_json(filename):
-    """解析 k6 JSON 輸出檔案"""
+    """
+    解析 k6 JSON 輸出檔案
+    
+    回傳 (data_volume, stats, tagged, components):
+    - stats: {metric: 統計值}
+    - tagged: {(tag, tag_value, metric): [values]},依 query / query_class 分組的原始數值
+    - components: {backend: {component: [values]}},延遲拆解的各組成部分
+    """
     metrics = defaultdict(list)
+    tagged = defaultdict(list)
+    components = defaultdict(lambda: defaultdict(list))
+    first_time = last_time = None
+    latency_buckets = defaultdict(lambda: [0.0, 0])  # {epoch 秒: [總和, 筆數]}
     data_volume = None
     
     # 從檔名提取資料量
@@ -37,27 +94,393 @@ def parse_k6_json(filename):
                         value = data.get('value')
                         if value is not None:
                             metrics[metric_name].append(value)
+                            if metric_name == 'http_reqs' and 'time' in data:
+                                point_time = parse_k6_time(data['time'])
+                                if first_time is None or point_time < first_time:
+                                    first_time = point_time
+                                if last_time is None or point_time > last_time:
+                                    last_time = point_time
+                            if metric_name == 'http_req_duration' and 'time' in data:
+                                second = int(parse_k6_time(data['time']).timestamp())
+                                latency_buckets[second][0] += value
+                                latency_buckets[second][1] += 1
+                            if metric_name in BREAKDOWN_METRICS:
+                                for tag in BREAKDOWN_TAGS:
+                                    if tag in tags:
+                                        tagged[(tag, tags[tag], metric_name)].append(value)
+                            if metric_name in DECOMPOSITION_METRICS:
+                                component = DECOMPOSITION_METRICS[metric_name]
+                                components[detect_backend(tags)][component].append(value)
             except json.JSONDecodeError:
                 continue
     
     # 計算統計值
     stats = {}
     for metric_name, values in metrics.items():
-        if values:
-            values = [v for v in values if isinstance(v, (int, float))]
-            if values:
-                sorted_values = sorted(values)
-                stats[metric_name] = {
-                    'avg': sum(values) / len(values),
-                    'min': min(values),
-                    'max': max(values),
-                    'p50': sorted_values[len(sorted_values) // 2],
-                    'p95': sorted_values[int(len(sorted_values) * 0.95)] if len(sorted_values) > 1 else sorted_values[0],
-                    'p99': sorted_values[int(len(sorted_values) * 0.99)] if len(sorted_values) > 1 else sorted_values[0],
-                    'count': len(values)
+        metric_stats = compute_stats(values)
+        if metric_stats:
+            stats[metric_name] = metric_stats
+    
+    # 吞吐量: 測試期間平均每秒完成的請求數
+    if 'http_reqs' in stats and first_time is not None and last_time > first_time:
+        duration = (last_time - first_time).total_seconds()
+        stats['throughput'] = {'rps': stats['http_reqs']['count'] / duration, 'duration_s': duration}
+    
+    # 每秒平均回應時間 (與 pg_stats_sampler 的樣本對齊用)
+    if latency_buckets:
+        stats['latency_timeline'] = {
+            'points': sorted((second, total / count) for second, (total, count) in latency_buckets.items())
+        }
+    
+    return data_volume, stats, tagged, components
+
+def parse_k6_time(value):
+    """解析 k6 的 RFC3339 時間 (小數秒可能超過 6 位,先截斷)"""
+    value = re.sub(r'(\.\d{6})\d+', r'\1', value)
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def parse_pgstats(k6_filename):
+    """
+    讀取與 k6 結果同名的 pg_stats_sampler 輸出 (k6_<vol>_<ts>.json → pgstats_<vol>_<ts>.jsonl)
+    
+    回傳 (samples, summary),找不到檔案時回傳 (None, None)
+    """
+    stats_file = re.sub(r'k6_(\d+_[^/]*)\.json$', r'pgstats_\1.jsonl', k6_filename)
+    if stats_file == k6_filename:
+        return None, None
+    try:
+        with open(stats_file, 'r', encoding='utf-8') as f:
+            samples = [json.loads(line) for line in f if line.strip()]
+    except (OSError, json.JSONDecodeError):
+        return None, None
+    if not samples:
+        return None, None
+    
+    totals = defaultdict(float)
+    for sample in samples:
+        deltas = sample.get('deltas', {})
+        database = deltas.get('database', {})
+        statements = deltas.get('statements', {})
+        title_index = deltas.get('index:idx_title_trgm', {})
+        totals['blks_hit'] += database.get('blks_hit', 0)
+        totals['blks_read'] += database.get('blks_read', 0)
+        totals['temp_bytes'] += database.get('temp_bytes', 0)
+        totals['calls'] += statements.get('calls', 0)
+        totals['exec_ms'] += statements.get('total_exec_time', 0)
+        totals['title_idx_hit'] += title_index.get('idx_blks_hit', 0)
+        totals['title_idx_read'] += title_index.get('idx_blks_read', 0)
+    
+    def ratio(hit, read):
+        return hit / (hit + read) if hit + read > 0 else None
+    
+    summary = {
+        'samples': len(samples),
+        'buffer_hit_ratio': ratio(totals['blks_hit'], totals['blks_read']),
+        'title_index_hit_ratio': ratio(totals['title_idx_hit'], totals['title_idx_read']),
+        'temp_bytes': totals['temp_bytes'],
+        'mean_exec_ms': totals['exec_ms'] / totals['calls'] if totals['calls'] else None,
+        'max_waiting_sessions': max(s.get('waiting_sessions', 0) for s in samples),
+    }
+    return samples, summary
+
+def detect_backend(tags):
+    """從 k6 tag 判斷後端 (舊版腳本沒有 backend tag 時依 URL port 判斷)"""
+    if tags.get('backend'):
+        return tags['backend']
+    return 'go' if ':3001' in tags.get('url', '') else 'node'
+
+def decompose_latency(components):
+    """
+    將端到端延遲拆成三段,並依後端彙總
+    
+    - db: API 回傳的 meta.queryTimeMs (search_duration,整數毫秒)
+    - backend: http_req_waiting - db (backend_overhead;JSON 格式化、server.js 的重新排序、Gin handler 等)
+    - network: blocked + connecting + tls_handshaking + sending + receiving (network_time)
+    
+    三項都由 k6 腳本 / loadgen.py 在同一個成功請求上計算並記錄,各自的平均值可以直接相加。
+    回傳 {backend: {'count', 'total': {'avg'}, component: 統計值, 'share': {component: 比例}}}
+    """
+    decomposition = {}
+    for backend_name, values in components.items():
+        if any(not values.get(name) for name, _ in LATENCY_COMPONENTS):
+            continue
+        summary = {name: compute_stats(values[name]) for name, _ in LATENCY_COMPONENTS}
+        total_avg = sum(summary[name]['avg'] for name, _ in LATENCY_COMPONENTS)
+        summary['total'] = {'avg': total_avg}
+        summary['share'] = {
+            name: (summary[name]['avg'] / total_avg if total_avg else 0.0)
+            for name, _ in LATENCY_COMPONENTS
+        }
+        summary['count'] = summary['db']['count']
+        decomposition[backend_name] = summary
+    return decomposition
+
+def breakdown_by_tag(tagged, tag, overall_p99):
+    """
+    依 tag (query / query_class / query_kind) 拆解延遲,並計算對 p99 尾端的貢獻
+    
+    tail_share: 全部超過整體 p99 的請求中,有多少比例來自這個 tag 值
+    回傳依 tail_share (其次為自身 p99) 由大到小排序的 list
+    """
+    rows = []
+    tail_total = 0
+    for (tag_name, tag_value, metric_name), values in tagged.items():
+        if tag_name == tag and metric_name == 'http_req_duration':
+            tail_total += sum(1 for v in values if v > overall_p99)
+    
+    for (tag_name, tag_value, metric_name), values in tagged.items():
+        if tag_name != tag or metric_name != 'http_req_duration':
+            continue
+        tail_count = sum(1 for v in values if v > overall_p99)
+        rows.append({
+            'value': tag_value,
+            'http_req_duration': compute_stats(values),
+            'search_duration': compute_stats(tagged.get((tag, tag_value, 'search_duration'), [])) or {},
+            'tail_count': tail_count,
+            'tail_share': tail_count / tail_total if tail_total else 0.0,
+        })
+    
+    rows.sort(key=lambda r: (r['tail_share'], r['http_req_duration']['p99']), reverse=True)
+    return rows
+
+def _design_matrix(model, n, breakpoint=None):
+    """各擴展模型的設計矩陣 (power / piecewise 在 log-log 空間擬合)"""
+    if model == 'linear':
+        return np.column_stack([np.ones_like(n), n])
+    if model == 'nlogn':
+        return np.column_stack([np.ones_like(n), n * np.log(n)])
+    x = np.log(n)
+    if model == 'power':
+        return np.column_stack([np.ones_like(x), x])
+    if model == 'piecewise':
+        return np.column_stack([np.ones_like(x), x, np.maximum(0.0, x - breakpoint)])
+    raise ValueError(f'unknown model: {model}')
+
+def _fit_once(model, n, y, breakpoint=None):
+    """
+    以最小平方法擬合單一模型,回傳 (coef, breakpoint)
+    
+    piecewise 為 log-log 空間的連續折線,斷點在觀測點中擇 SSE 最小者。
+    """
+    log_space = model in ('power', 'piecewise')
+    target = np.log(y) if log_space else y
+    if model == 'piecewise' and breakpoint is None:
+        best = None
+        for candidate in np.log(n)[1:-1]:
+            coef, _, _, _ = np.linalg.lstsq(_design_matrix(model, n, candidate), target, rcond=None)
+            sse = float(np.sum((_design_matrix(model, n, candidate) @ coef - target) ** 2))
+            if best is None or sse < best[0]:
+                best = (sse, coef, candidate)
+        return best[1], best[2]
+    coef, _, _, _ = np.linalg.lstsq(_design_matrix(model, n, breakpoint), target, rcond=None)
+    return coef, breakpoint
+
+def _predict(model, coef, n, breakpoint=None):
+    """以擬合係數預測 (log 空間的模型會轉回原尺度)"""
+    n = np.asarray(n, dtype=float)
+    prediction = _design_matrix(model, n, breakpoint) @ coef
+    return np.exp(prediction) if model in ('power', 'piecewise') else prediction
+
+def fit_scaling_models(volumes, values, rounds=BOOTSTRAP_ROUNDS, seed=42):
+    """
+    對 (資料量, 指標值) 擬合 linear / n log n / power law / piecewise 模型
+    
+    每個模型回傳 R²、RMSE、AICc,以及以殘差 bootstrap 估計的 95% 信賴帶
+    (外推到 EXTRAPOLATE_VOLUMES)。依 AICc 由小到大排序。
+    """
+    n = np.asarray(volumes, dtype=float)
+    y = np.asarray(values, dtype=float)
+    mask = y > 0
+    n, y = n[mask], y[mask]
+    rng = np.random.default_rng(seed)
+    
+    candidates = [('linear', 2), ('nlogn', 2), ('power', 2)]
+    if len(n) >= 5:
+        candidates.append(('piecewise', 4))  # 3 個係數 + 斷點
+    
+    fits = []
+    for model, k in candidates:
+        if len(n) <= k:
+            continue
+        coef, breakpoint = _fit_once(model, n, y)
+        fitted = _predict(model, coef, n, breakpoint)
+        residuals = y - fitted
+        sse = float(np.sum(residuals ** 2))
+        sst = float(np.sum((y - y.mean()) ** 2))
+        r2 = 1 - sse / sst if sst > 0 else 0.0
+        rmse = math.sqrt(sse / len(n))
+        aicc = len(n) * math.log(max(sse, 1e-12) / len(n)) + 2 * k
+        if len(n) - k - 1 > 0:
+            aicc += 2 * k * (k + 1) / (len(n) - k - 1)
+        
+        # 殘差 bootstrap: 在擬合空間重抽殘差、重新擬合、預測外推點
+        log_space = model in ('power', 'piecewise')
+        base = np.log(fitted) if log_space else fitted
+        space_residuals = (np.log(y) - base) if log_space else residuals
+        grid = np.unique(np.concatenate([
+            np.geomspace(n.min(), max(EXTRAPOLATE_VOLUMES), 60), EXTRAPOLATE_VOLUMES]))
+        boot = []
+        for _ in range(rounds):
+            resampled = base + rng.choice(space_residuals, size=len(n), replace=True)
+            boot_y = np.exp(resampled) if log_space else resampled
+            if not log_space or np.all(boot_y > 0):
+                boot_coef, boot_bp = _fit_once(model, n, boot_y, breakpoint)
+                boot.append(_predict(model, boot_coef, grid, boot_bp))
+        boot = np.array(boot) if boot else np.empty((0, len(grid)))
+        
+        fits.append({
+            'model': model,
+            'coef': coef,
+            'breakpoint': float(math.exp(breakpoint)) if breakpoint is not None else None,
+            'r2': r2,
+            'rmse': rmse,
+            'aicc': aicc,
+            'grid': grid,
+            'curve': _predict(model, coef, grid, breakpoint),
+            'band_low': np.percentile(boot, 2.5, axis=0) if len(boot) else None,
+            'band_high': np.percentile(boot, 97.5, axis=0) if len(boot) else None,
+            'extrapolation': {
+                int(v): {
+                    'value': float(_predict(model, coef, [v], breakpoint)[0]),
+                    'low': float(np.percentile(boot[:, np.searchsorted(grid, v)], 2.5)) if len(boot) else None,
+                    'high': float(np.percentile(boot[:, np.searchsorted(grid, v)], 97.5)) if len(boot) else None,
                 }
+                for v in EXTRAPOLATE_VOLUMES
+            },
+        })
+    
+    # 外推出非正值 (例如吞吐量的 linear 模型) 代表模型不適用,排到最後
+    for fit in fits:
+        fit['valid'] = all(p['value'] > 0 for p in fit['extrapolation'].values())
+    fits.sort(key=lambda f: (not f['valid'], f['aicc']))
+    return fits
+
+def build_scaling_report(results, volumes):
+    """對 SCALING_TARGETS 的每個指標擬合擴展模型,回傳 {key: {'label', 'points', 'fits'}}"""
+    report = {}
+    for key, metric, field, label in SCALING_TARGETS:
+        points = [(v, results[v][metric][field]) for v in volumes
+                  if results[v].get(metric, {}).get(field, 0) > 0]
+        if len(points) < 3:
+            continue
+        fits = fit_scaling_models([p[0] for p in points], [p[1] for p in points])
+        if fits:
+            report[key] = {'label': label, 'points': points, 'fits': fits}
+    return report
+
+def create_scaling_chart(scaling):
+    """產生容量規劃圖: 實測點、最佳模型曲線與 95% 信賴帶 (外推到 1000 萬筆)"""
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig.suptitle('容量規劃: 擴展模型擬合與外推', fontsize=16, fontweight='bold')
+    
+    for ax, (key, entry) in zip(axes.flat, scaling.items()):
+        best = entry['fits'][0]
+        xs, ys = zip(*entry['points'])
+        ax.plot(xs, ys, 'o', color='#333', markersize=8, label='實測')
+        ax.plot(best['grid'], best['curve'], '-', color='#667eea', linewidth=2,
+                label=f"{best['model']} (R²={best['r2']:.3f})")
+        if best['band_low'] is not None:
+            ax.fill_between(best['grid'], best['band_low'], best['band_high'],
+                            color='#667eea', alpha=0.2, label='95% 信賴帶')
+        for volume in EXTRAPOLATE_VOLUMES:
+            ax.axvline(volume, color='#F44336', linestyle='--', alpha=0.4)
+        ax.set_xscale('log')
+        ax.set_yscale('log')
+        ax.set_xlabel('資料量 (筆)', fontsize=12)
+        ax.set_ylabel(entry['label'], fontsize=12)
+        ax.set_title(entry['label'], fontsize=14, fontweight='bold')
+        ax.legend(fontsize=10)
+        ax.grid(True, alpha=0.3)
+    
+    plt.tight_layout()
+    output_file = 'test-results/scaling_model.png'
+    plt.savefig(output_file, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+    print(f"✅ 容量規劃圖表已儲存至: {output_file}")
+
+def create_pgstats_chart(results, pg_stats):
+    """把 PostgreSQL 統計與 HTTP 回應時間畫在同一條時間軸 (以 k6 測試開始為 0 秒)"""
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig.suptitle('HTTP 回應時間 vs PostgreSQL 統計', fontsize=16, fontweight='bold')
+    panels = (
+        (axes[0, 0], 'HTTP 平均回應時間 (ms)'),
+        (axes[0, 1], '/search 平均執行時間 (ms, pg_stat_statements)'),
+        (axes[1, 0], 'Shared buffer 命中率'),
+        (axes[1, 1], '等待中的 session 數'),
+    )
+    
+    for volume in sorted(pg_stats.keys()):
+        samples, _ = pg_stats[volume]
+        timeline = results[volume].get('latency_timeline', {}).get('points', [])
+        start = timeline[0][0] if timeline else samples[0]['epoch']
+        label = f'{volume:,} 筆'
+        if timeline:
+            axes[0, 0].plot([t - start for t, _ in timeline], [v for _, v in timeline], label=label, linewidth=1.5)
+        for ax, key in ((axes[0, 1], 'mean_exec_ms'), (axes[1, 0], 'buffer_hit_ratio'),
+                        (axes[1, 1], 'waiting_sessions')):
+            points = [(s['epoch'] - start, s[key]) for s in samples if s.get(key) is not None]
+            if points:
+                ax.plot([p[0] for p in points], [p[1] for p in points], label=label, linewidth=1.5)
+    
+    for ax, title in panels:
+        ax.set_xlabel('測試經過時間 (秒)', fontsize=12)
+        ax.set_title(title, fontsize=14, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+        if ax.get_lines():
+            ax.legend(fontsize=9)
+    
+    plt.tight_layout()
+    output_file = 'test-results/pg_stats_timeline.png'
+    plt.savefig(output_file, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+    print(f"✅ PostgreSQL 統計圖表已儲存至: {output_file}")
+
+def print_pgstats_summary(results, pg_stats):
+    """顯示各資料量的 PostgreSQL 統計摘要與 HTTP p95"""
+    if not pg_stats:
+        return
     
-    return data_volume, stats
+    def fmt(value, spec):
+        if value is not None:
+            return format(value, spec)
+        return '-'.rjust(int(re.match(r'>(\d+)', spec).group(1)))
+    
+    print("\n📡 PostgreSQL 統計 (測試期間):")
+    print("=" * 80)
+    print(f"{'資料量':>10} {'HTTP p95':>10} {'exec 平均':>10} {'buffer 命中':>12} {'title 索引命中':>14} {'temp':>10} {'等待':>6}")
+    print("-" * 80)
+    for volume in sorted(pg_stats.keys()):
+        summary = pg_stats[volume][1]
+        http_p95 = results[volume].get('http_req_duration', {}).get('p95', 0)
+        print(f"{volume:>10,} {http_p95:>8.2f}ms {fmt(summary['mean_exec_ms'], '>8.2f')}ms "
+              f"{fmt(summary['buffer_hit_ratio'], '>12.2%')} {fmt(summary['title_index_hit_ratio'], '>14.2%')} "
+              f"{summary['temp_bytes'] / 1024 / 1024:>8.1f}MB {summary['max_waiting_sessions']:>6}")
+    print("=" * 80)
+
+def print_scaling_report(scaling):
+    """顯示各指標的模型擬合結果與外推值"""
+    if not scaling:
+        return
+    
+    print("\n📐 容量規劃 (擴展模型擬合,依 AICc 排序,第一個為最佳,* 表示外推出非正值):")
+    for entry in scaling.values():
+        print("=" * 80)
+        print(entry['label'])
+        print(f"{'模型':<11} {'R²':>7} {'RMSE':>10} {'AICc':>9}   "
+              + "   ".join(f"{v // 1_000_000}M 預測 [95%]" for v in EXTRAPOLATE_VOLUMES))
+        print("-" * 80)
+        for fit in entry['fits']:
+            cells = []
+            for volume in EXTRAPOLATE_VOLUMES:
+                prediction = fit['extrapolation'][volume]
+                band = (f"[{prediction['low']:.1f}, {prediction['high']:.1f}]"
+                        if prediction['low'] is not None else '')
+                cells.append(f"{prediction['value']:>10.1f} {band}")
+            model = fit['model'] if fit['valid'] else fit['model'] + '*'
+            print(f"{model:<11} {fit['r2']:>7.3f} {fit['rmse']:>10.2f} {fit['aicc']:>9.2f}   "
+                  + "   ".join(cells))
+    print("=" * 80)
+    print("註: 吞吐量為測試期間的實際 req/s;load 場景受 VU 數與 sleep 限制,stress/spike 場景才接近上限")
 
 def create_visualization():
     """產生視覺化圖表"""
@@ -73,11 +496,23 @@ def create_visualization():
     
     # 解析所有檔案
     results = {}
+    breakdowns = {}
+    decompositions = defaultdict(dict)  # {backend: {volume: 拆解結果}}
+    pg_stats = {}  # {volume: (samples, summary)}
     for json_file in json_files:
         print(f"  📄 解析 {json_file}...", end=' ')
-        data_volume, stats = parse_k6_json(json_file)
+        data_volume, stats, tagged, components = parse_k6_json(json_file)
         if data_volume and stats:
             results[data_volume] = stats
+            for backend_name, summary in decompose_latency(components).items():
+                decompositions[backend_name][data_volume] = summary
+            samples, pg_summary = parse_pgstats(json_file)
+            if samples:
+                pg_stats[data_volume] = (samples, pg_summary)
+            overall_p99 = stats.get('http_req_duration', {}).get('p99', 0)
+            breakdowns[data_volume] = {
+                tag: breakdown_by_tag(tagged, tag, overall_p99) for tag in BREAKDOWN_TAGS
+            }
             print(f"✓ ({data_volume:,} 筆資料)")
         else:
             print("✗ (無法解析)")
@@ -168,8 +603,25 @@ def create_visualization():
     plt.savefig(output_file, dpi=300, bbox_inches='tight')
     print(f"\n✅ 圖表已儲存至: {output_file}")
     
+    # 查詢類別拆解圖表 (舊版 k6 腳本沒有 query tag 時略過)
+    if any(breakdowns[v]['query_class'] for v in volumes):
+        create_breakdown_chart(breakdowns, volumes)
+    
+    # 延遲拆解圖表 (需要 k6 腳本的 backend_overhead / network_time 指標)
+    if decompositions:
+        create_decomposition_chart(decompositions)
+    
+    # 容量規劃模型 (至少需要 3 個資料量)
+    scaling = build_scaling_report(results, volumes)
+    if scaling:
+        create_scaling_chart(scaling)
+    
+    # PostgreSQL 統計時間軸 (需要 pg_stats_sampler 的輸出)
+    if pg_stats:
+        create_pgstats_chart(results, pg_stats)
+    
     # 產生 HTML 報告
-    create_html_report(results, volumes, output_file)
+    create_html_report(results, volumes, output_file, breakdowns, decompositions, scaling, pg_stats)
     
     # 顯示摘要
     print("\n📊 測試結果摘要:")
@@ -185,8 +637,134 @@ def create_visualization():
               f"{http_duration.get('p99', 0):>10.2f}ms  "
               f"{iterations.get('count', 0):>10,}")
     print("=" * 80)
+    
+    print_query_breakdown(breakdowns, volumes)
+    print_latency_decomposition(decompositions)
+    print_scaling_report(scaling)
+    print_pgstats_summary(results, pg_stats)
+
+def create_decomposition_chart(decompositions):
+    """產生各後端在不同資料量下的延遲組成堆疊圖 (平均 ms 與佔比)"""
+    backends = sorted(decompositions.keys())
+    colors = {'db': '#2196F3', 'backend': '#FF9800', 'network': '#9C27B0'}
+    
+    fig, axes = plt.subplots(len(backends), 2, figsize=(16, 6 * len(backends)), squeeze=False)
+    fig.suptitle('端到端延遲拆解: 資料庫 vs 後端 vs 網路', fontsize=16, fontweight='bold')
+    
+    for row, backend_name in enumerate(backends):
+        volumes = sorted(decompositions[backend_name].keys())
+        x_pos = range(len(volumes))
+        bottoms_ms = [0.0] * len(volumes)
+        bottoms_share = [0.0] * len(volumes)
+        ax_ms, ax_share = axes[row, 0], axes[row, 1]
+        
+        for component, label in LATENCY_COMPONENTS:
+            avg_ms = [decompositions[backend_name][v][component]['avg'] for v in volumes]
+            share = [decompositions[backend_name][v]['share'][component] * 100 for v in volumes]
+            ax_ms.bar(x_pos, avg_ms, bottom=bottoms_ms, label=label, color=colors[component], alpha=0.8)
+            ax_share.bar(x_pos, share, bottom=bottoms_share, label=label, color=colors[component], alpha=0.8)
+            bottoms_ms = [b + v for b, v in zip(bottoms_ms, avg_ms)]
+            bottoms_share = [b + v for b, v in zip(bottoms_share, share)]
+        
+        for ax, ylabel, title in ((ax_ms, '平均時間 (ms)', f'{backend_name}: 平均延遲組成'),
+                                  (ax_share, '佔比 (%)', f'{backend_name}: 延遲佔比')):
+            ax.set_xticks(x_pos)
+            ax.set_xticklabels([f'{v:,}' for v in volumes], rotation=45, ha='right')
+            ax.set_xlabel('資料量 (筆)', fontsize=12)
+            ax.set_ylabel(ylabel, fontsize=12)
+            ax.set_title(title, fontsize=14, fontweight='bold')
+            ax.legend(fontsize=10)
+            ax.grid(True, alpha=0.3, axis='y')
+    
+    plt.tight_layout()
+    output_file = 'test-results/latency_decomposition.png'
+    plt.savefig(output_file, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+    print(f"✅ 延遲拆解圖表已儲存至: {output_file}")
+
+def print_latency_decomposition(decompositions):
+    """顯示各後端、各資料量的延遲組成"""
+    if not decompositions:
+        return
+    
+    print("\n🧩 延遲拆解 (平均值,括號內為佔比):")
+    print("=" * 80)
+    print(f"{'後端':<8} {'資料量':>10} {'資料庫查詢':>16} {'後端處理':>16} {'網路/連線':>16} {'總計':>10}")
+    print("-" * 80)
+    for backend_name in sorted(decompositions.keys()):
+        for volume in sorted(decompositions[backend_name].keys()):
+            summary = decompositions[backend_name][volume]
+            cells = [f"{summary[c]['avg']:>7.2f}ms ({summary['share'][c]:>4.0%})" for c, _ in LATENCY_COMPONENTS]
+            print(f"{backend_name:<8} {volume:>10,} {cells[0]:>16} {cells[1]:>16} {cells[2]:>16} "
+                  f"{summary['total']['avg']:>8.2f}ms")
+    print("=" * 80)
+    print("註: 資料庫查詢時間來自 meta.queryTimeMs (整數毫秒),後端處理 = http_req_waiting - 資料庫查詢")
+
+def create_breakdown_chart(breakdowns, volumes):
+    """產生各查詢類別在不同資料量下的 p95 / p99 圖表"""
+    classes = sorted({row['value'] for v in volumes for row in breakdowns[v]['query_class']})
+    
+    fig, axes = plt.subplots(1, 2, figsize=(16, 6))
+    fig.suptitle('查詢類別延遲拆解', fontsize=16, fontweight='bold')
+    
+    for ax, metric, title in ((axes[0], 'http_req_duration', 'HTTP 回應時間 p99'),
+                              (axes[1], 'search_duration', '資料庫查詢時間 p99')):
+        for query_class in classes:
+            series = []
+            for v in volumes:
+                row = next((r for r in breakdowns[v]['query_class'] if r['value'] == query_class), None)
+                series.append(row[metric].get('p99', 0) if row and row[metric] else 0)
+            ax.plot(volumes, series, 'o-', label=query_class, linewidth=2, markersize=6)
+        ax.set_xlabel('資料量 (筆)', fontsize=12)
+        ax.set_ylabel('p99 (ms)', fontsize=12)
+        ax.set_title(title, fontsize=14, fontweight='bold')
+        ax.legend(fontsize=10)
+        ax.grid(True, alpha=0.3)
+        if len(volumes) > 3:
+            ax.set_xscale('log')
+    
+    plt.tight_layout()
+    output_file = 'test-results/query_breakdown.png'
+    plt.savefig(output_file, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+    print(f"✅ 查詢拆解圖表已儲存至: {output_file}")
+
+def print_query_breakdown(breakdowns, volumes, top_n=5):
+    """顯示各資料量下 p99 貢獻最大的查詢與各類別統計"""
+    if not any(breakdowns[v]['query'] for v in volumes):
+        return
+    
+    print("\n🔎 查詢拆解 (依 p99 尾端貢獻排序):")
+    for volume in volumes:
+        print("=" * 80)
+        print(f"資料量: {volume:,} 筆")
+        print(f"{'類別':<15} {'請求數':>8} {'p50':>10} {'p99':>10} {'DB p99':>10} {'尾端佔比':>10}")
+        print("-" * 80)
+        for row in breakdowns[volume]['query_class']:
+            http_duration = row['http_req_duration']
+            print(f"{row['value']:<15} {http_duration['count']:>8,} "
+                  f"{http_duration['p50']:>8.2f}ms {http_duration['p99']:>8.2f}ms "
+                  f"{row['search_duration'].get('p99', 0):>8.2f}ms {row['tail_share']:>9.1%}")
+        if breakdowns[volume]['query_kind']:
+            # 使用 build_workload.py 的工作負載時才有 query_kind (prefix / fragment / typo / exact)
+            print("-" * 80)
+            print(f"{'查詢類型':<15} {'請求數':>8} {'p50':>10} {'p99':>10} {'DB p99':>10} {'尾端佔比':>10}")
+            for row in breakdowns[volume]['query_kind']:
+                http_duration = row['http_req_duration']
+                print(f"{row['value']:<15} {http_duration['count']:>8,} "
+                      f"{http_duration['p50']:>8.2f}ms {http_duration['p99']:>8.2f}ms "
+                      f"{row['search_duration'].get('p99', 0):>8.2f}ms {row['tail_share']:>9.1%}")
+        print("-" * 80)
+        print(f"{'最差查詢':<15} {'請求數':>8} {'p50':>10} {'p99':>10} {'DB p99':>10} {'尾端佔比':>10}")
+        for row in breakdowns[volume]['query'][:top_n]:
+            http_duration = row['http_req_duration']
+            print(f"{row['value']:<15} {http_duration['count']:>8,} "
+                  f"{http_duration['p50']:>8.2f}ms {http_duration['p99']:>8.2f}ms "
+                  f"{row['search_duration'].get('p99', 0):>8.2f}ms {row['tail_share']:>9.1%}")
+    print("=" * 80)
 
-def create_html_report(results, volumes, chart_file):
+def create_html_report(results, volumes, chart_file, breakdowns=None, decompositions=None, scaling=None,
+                       pg_stats=None):
     """產生 HTML 報告"""
     html = f"""<!DOCTYPE html>
 <html lang="zh-TW">
@@ -430,7 +1008,21 @@ def create_html_report(results, volumes, chart_file):
                 </tbody>
             </table>
         </div>
-        
+"""
+    
+    if breakdowns and any(breakdowns[v]['query'] for v in volumes):
+        html += create_breakdown_html(breakdowns, volumes)
+    
+    if decompositions:
+        html += create_decomposition_html(decompositions)
+    
+    if scaling:
+        html += create_scaling_html(scaling)
+    
+    if pg_stats:
+        html += create_pgstats_html(results, pg_stats)
+    
+    html += """
         <div class="footer">
             <p>🚀 Generated by pg_trgm Performance Test Suite</p>
             <p>使用 k6 負載測試工具 | PostgreSQL pg_trgm 模糊搜尋</p>
@@ -447,6 +1039,206 @@ def create_html_report(results, volumes, chart_file):
     print(f"✅ HTML 報告已儲存至: {output_file}")
     print(f"   在瀏覽器開啟: file://{output_file}")
 
+def create_breakdown_html(breakdowns, volumes):
+    """產生查詢拆解的 HTML 區塊"""
+    html = """
+        <div class="chart-container">
+            <h2>🔎 查詢類別延遲拆解</h2>
+            <img src="query_breakdown.png" alt="查詢類別延遲拆解">
+        </div>
+"""
+    
+    for volume in volumes:
+        html += f"""
+        <div class="table-container" style="margin-bottom: 30px;">
+            <h2>🔎 查詢拆解 - {volume:,} 筆</h2>
+            <table>
+                <thead>
+                    <tr>
+                        <th>類別 / 查詢</th>
+                        <th>請求數</th>
+                        <th>p50</th>
+                        <th>p95</th>
+                        <th>p99</th>
+                        <th>DB 查詢 p99</th>
+                        <th>p99 尾端佔比</th>
+                    </tr>
+                </thead>
+                <tbody>
+"""
+        for tag in BREAKDOWN_TAGS:
+            for row in breakdowns[volume][tag]:
+                http_duration = row['http_req_duration']
+                p99_class = 'good' if http_duration['p99'] < 100 else 'warning' if http_duration['p99'] < 500 else 'bad'
+                # tag 值 (特別是查詢字串) 來自工作負載,輸出前必須跳脫
+                value = html_lib.escape(str(row['value']))
+                label = f"<strong>{value}</strong>" if tag != 'query' else value
+                html += f"""
+                    <tr>
+                        <td>{label}</td>
+                        <td>{http_duration['count']:,}</td>
+                        <td>{http_duration['p50']:.2f}ms</td>
+                        <td>{http_duration['p95']:.2f}ms</td>
+                        <td><span class="metric-value {p99_class}">{http_duration['p99']:.2f}ms</span></td>
+                        <td>{row['search_duration'].get('p99', 0):.2f}ms</td>
+                        <td>{row['tail_share']:.1%}</td>
+                    </tr>
+"""
+        html += """
+                </tbody>
+            </table>
+        </div>
+"""
+    
+    return html
+
+def create_decomposition_html(decompositions):
+    """產生延遲拆解的 HTML 區塊"""
+    html = """
+        <div class="chart-container">
+            <h2>🧩 端到端延遲拆解</h2>
+            <img src="latency_decomposition.png" alt="延遲拆解">
+        </div>
+        
+        <div class="table-container" style="margin-bottom: 30px;">
+            <h2>🧩 延遲組成 (平均值)</h2>
+            <table>
+                <thead>
+                    <tr>
+                        <th>後端</th>
+                        <th>資料量</th>
+                        <th>資料庫查詢</th>
+                        <th>後端處理</th>
+                        <th>網路 / 連線</th>
+                        <th>總計</th>
+                        <th>樣本數</th>
+                    </tr>
+                </thead>
+                <tbody>
+"""
+    for backend_name in sorted(decompositions.keys()):
+        for volume in sorted(decompositions[backend_name].keys()):
+            summary = decompositions[backend_name][volume]
+            cells = ''.join(
+                f"<td>{summary[c]['avg']:.2f}ms ({summary['share'][c]:.0%})</td>"
+                for c, _ in LATENCY_COMPONENTS
+            )
+            html += f"""
+                    <tr>
+                        <td><strong>{backend_name}</strong></td>
+                        <td>{volume:,} 筆</td>
+                        {cells}
+                        <td><span class="metric-value">{summary['total']['avg']:.2f}ms</span></td>
+                        <td>{summary['count']:,}</td>
+                    </tr>
+"""
+    html += """
+                </tbody>
+            </table>
+        </div>
+"""
+    return html
+
+def create_scaling_html(scaling):
+    """產生容量規劃的 HTML 區塊"""
+    headers = ''.join(f"<th>{v // 1_000_000}M 筆預測 (95% 信賴帶)</th>" for v in EXTRAPOLATE_VOLUMES)
+    html = f"""
+        <div class="chart-container">
+            <h2>📐 容量規劃: 擴展模型</h2>
+            <img src="scaling_model.png" alt="擴展模型">
+        </div>
+        
+        <div class="table-container" style="margin-bottom: 30px;">
+            <h2>📐 模型擬合與外推 (依 AICc 排序)</h2>
+            <table>
+                <thead>
+                    <tr>
+                        <th>指標</th>
+                        <th>模型</th>
+                        <th>R²</th>
+                        <th>RMSE</th>
+                        <th>AICc</th>
+                        {headers}
+                    </tr>
+                </thead>
+                <tbody>
+"""
+    for entry in scaling.values():
+        for rank, fit in enumerate(entry['fits']):
+            cells = ''
+            for volume in EXTRAPOLATE_VOLUMES:
+                prediction = fit['extrapolation'][volume]
+                band = (f" ({prediction['low']:.1f} – {prediction['high']:.1f})"
+                        if prediction['low'] is not None else '')
+                cells += f"<td>{prediction['value']:.1f}{band}</td>"
+            model = fit['model'] if fit['valid'] else f"{fit['model']} (不適用)"
+            model = f"<strong>{model}</strong>" if rank == 0 else model
+            html += f"""
+                    <tr>
+                        <td>{entry['label'] if rank == 0 else ''}</td>
+                        <td>{model}</td>
+                        <td>{fit['r2']:.3f}</td>
+                        <td>{fit['rmse']:.2f}</td>
+                        <td>{fit['aicc']:.2f}</td>
+                        {cells}
+                    </tr>
+"""
+    html += """
+                </tbody>
+            </table>
+        </div>
+"""
+    return html
+
+def create_pgstats_html(results, pg_stats):
+    """產生 PostgreSQL 統計的 HTML 區塊"""
+    html = """
+        <div class="chart-container">
+            <h2>📡 HTTP 回應時間 vs PostgreSQL 統計</h2>
+            <img src="pg_stats_timeline.png" alt="PostgreSQL 統計">
+        </div>
+        
+        <div class="table-container" style="margin-bottom: 30px;">
+            <h2>📡 PostgreSQL 統計 (測試期間)</h2>
+            <table>
+                <thead>
+                    <tr>
+                        <th>資料量</th>
+                        <th>HTTP p95</th>
+                        <th>/search 平均執行時間</th>
+                        <th>Shared buffer 命中率</th>
+                        <th>idx_title_trgm 命中率</th>
+                        <th>Temp I/O</th>
+                        <th>最多等待 session</th>
+                    </tr>
+                </thead>
+                <tbody>
+"""
+    for volume in sorted(pg_stats.keys()):
+        summary = pg_stats[volume][1]
+        http_p95 = results[volume].get('http_req_duration', {}).get('p95', 0)
+        mean_exec = f"{summary['mean_exec_ms']:.2f}ms" if summary['mean_exec_ms'] is not None else '-'
+        hit_ratio = f"{summary['buffer_hit_ratio']:.2%}" if summary['buffer_hit_ratio'] is not None else '-'
+        title_ratio = (f"{summary['title_index_hit_ratio']:.2%}"
+                       if summary['title_index_hit_ratio'] is not None else '-')
+        html += f"""
+                    <tr>
+                        <td><strong>{volume:,} 筆</strong></td>
+                        <td>{http_p95:.2f}ms</td>
+                        <td>{mean_exec}</td>
+                        <td>{hit_ratio}</td>
+                        <td>{title_ratio}</td>
+                        <td>{summary['temp_bytes'] / 1024 / 1024:.1f} MB</td>
+                        <td>{summary['max_waiting_sessions']}</td>
+                    </tr>
+"""
+    html += """
+                </tbody>
+            </table>
+        </div>
+"""
+    return html
+
 if __name__ == '__main__':
     print("=" * 80)
     print("pg_trgm 效能測試結果視覺化工具")
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+資料量掃描 (volume sweep) 協調工具: 漸進式成長 + 每個資料量的負載測試 + 斷點續跑
+
+run-performance-tests.sh 每個資料量都清空再重新產生,總插入筆數是各資料量的總和
+(100 → 1,000,000 共插入約 187 萬筆,其中大部分是重複產生前面已有的資料),狀態只存在 bash 變數裡。
+這裡改為讓 worlds 逐步成長:
+
+1. 成長: 只插入與下一個資料量的差額 (generate_test_data() 或語料快照的下一段,快照不足時以
+   generate_test_data() 補齊),之後 VACUUM ANALYZE,並確認 worlds 的實際筆數與資料量一致。
+   差額 >= 現有筆數 × --rebuild-ratio 時先移除 trigram 索引、插入後重建 (大量插入時比逐筆維護 GIN 快);
+   各次重建的筆數呈等比成長,總成本仍與最終筆數成線性。
+2. 負載: 執行選定的場景 (python loadgen.py 或 k6),同時以 pg_stats_sampler.py 取樣伺服器統計。
+3. 記錄: 彙總延遲百分位數、吞吐量、錯誤率與伺服器端指標 (平均執行時間、buffer hit ratio、
+   temp bytes、表格 / 索引大小),每完成一個資料量就寫入 checkpoint。
+
+中斷後以 --resume 指定 checkpoint 繼續,已完成的資料量不會重跑,worlds 從目前筆數接著成長。
+負載結果沿用 test-results/k6_<資料量>_<timestamp>.json 與 pgstats_<資料量>_<timestamp>.jsonl 的檔名,
+visualize_k6_results.py 可以直接分析。
+
+用法:
+    python3 scripts/volume_sweep.py                                     # 100 ~ 1,000,000,python 負載產生器
+    python3 scripts/volume_sweep.py --volumes 1000 10000 100000 --scenario stress
+    python3 scripts/volume_sweep.py --snapshot snapshots/wiki_1m.snap --load-generator k6
+    python3 scripts/volume_sweep.py --resume test-results/volume_sweep_20250101_120000.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+
+from corpus_snapshot import TRIGRAM_INDEXES, build_trigram_indexes, load_snapshot
+from db import connect
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 與 run-performance-tests.sh 相同的資料量級別
+DEFAULT_VOLUMES = [100, 500, 1000, 5000, 10000, 50000, 100000, 200000, 500000, 1000000]
+
+PERCENTILES = (50, 95, 99)
+
+# ============================================================================
+# 成長
+# ============================================================================
+
+def count_rows(cur):
+    cur.execute('SELECT COUNT(*) FROM worlds')
+    return cur.fetchone()[0]
+
+def missing_trigram_indexes(cur):
+    """TRIGRAM_INDEXES 中目前不存在於 worlds 的索引 (例如上次在重建索引時中斷)"""
+    cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'worlds' AND indexname = ANY(%s)",
+                (list(TRIGRAM_INDEXES),))
+    present = {row[0] for row in cur.fetchall()}
+    return [name for name in TRIGRAM_INDEXES if name not in present]
+
+def grow_to(conn, target, snapshot=None, rebuild_ratio=1.0):
+    """
+    讓 worlds 成長到 target 筆 (只插入差額),之後 VACUUM ANALYZE。
+    快照筆數不足時,其餘以 generate_test_data() 補齊 (記錄在 'generated')。
+    不論差額多少,最後都會重建缺少的 trigram 索引,量測前索引一定完整。
+    回傳 {'inserted', 'generated', 'rows', 'rebuilt_indexes', 'insert_s', 'index_s', 'vacuum_s'}。
+    """
+    cur = conn.cursor()
+    current = count_rows(cur)
+    delta = target - current
+    result = {'inserted': max(delta, 0), 'generated': 0, 'rebuilt_indexes': False, 'insert_s': 0.0, 'index_s': 0.0}
+
+    if delta > 0:
+        rebuild = current == 0 or delta >= current * rebuild_ratio
+        if rebuild:
+            for index in TRIGRAM_INDEXES:
+                cur.execute(f'DROP INDEX IF EXISTS {index}')
+        start = time.perf_counter()
+        if snapshot:
+            timings = load_snapshot(snapshot, limit=target, append=True, rebuild_indexes=False, log=lambda _: None)
+            result['inserted'] = timings['loaded']
+            shortfall = delta - timings['loaded']
+            if shortfall > 0:
+                cur.execute('SELECT * FROM generate_test_data(%s)', (shortfall,))
+                result['generated'] = shortfall
+                result['inserted'] += shortfall
+        else:
+            cur.execute('SELECT * FROM generate_test_data(%s)', (delta,))
+        result['insert_s'] = time.perf_counter() - start
+
+    missing = missing_trigram_indexes(cur)
+    if missing:
+        result['index_s'] = build_trigram_indexes(names=missing)
+        result['rebuilt_indexes'] = True
+
+    start = time.perf_counter()
+    cur.execute('VACUUM ANALYZE worlds')
+    result['vacuum_s'] = time.perf_counter() - start
+    result['rows'] = count_rows(cur)
+    cur.close()
+    return result
+
+def table_sizes(conn):
+    cur = conn.cursor()
+    cur.execute('SELECT * FROM get_data_stats()')
+    total_records, table_size, index_size, total_size = cur.fetchone()
+    cur.close()
+    return {'records': total_records, 'table_size': table_size, 'index_size': index_size, 'total_size': total_size}
+
+# ============================================================================
+# 負載測試
+# ============================================================================
+
+def run_load(config, output_file, stats_file):
+    """執行一次負載場景 (與 run-performance-tests.sh 的 run_k6_test 相同),回傳結束碼"""
+    sampler = None
+    if config['pg_stats']:
+        sampler = subprocess.Popen(
+            [sys.executable, os.path.join(SCRIPTS_DIR, 'pg_stats_sampler.py'),
+             '--interval', str(config['pg_stats_interval']), '--output', stats_file],
+            stdout=subprocess.DEVNULL)
+
+    if config['load_generator'] == 'python':
+        command = [sys.executable, os.path.join(SCRIPTS_DIR, 'loadgen.py'),
+                   '--scenario', config['scenario'], '--base-url', config['base_url'], '--output', output_file]
+        if config['backend']:
+            command += ['--backend', config['backend']]
+        if config['workload']:
+            command += ['--workload', config['workload']]
+    else:
+        command = ['k6', 'run', '-e', f"SCENARIO={config['scenario']}", '-e', f"BASE_URL={config['base_url']}"]
+        if config['backend']:
+            command += ['-e', f"BACKEND={config['backend']}"]
+        if config['workload']:
+            command += ['-e', f"WORKLOAD={os.path.abspath(config['workload'])}"]
+        command += ['--out', f'json={output_file}', os.path.join(SCRIPTS_DIR, '..', 'k6-tests', 'search-performance.js')]
+
+    try:
+        return subprocess.run(command).returncode
+    finally:
+        if sampler is not None:
+            sampler.send_signal(signal.SIGTERM)
+            sampler.wait()
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(len(sorted_values) * pct / 100), len(sorted_values) - 1)]
+
+def summarize_load(output_file):
+    """從 k6 相容 JSON 取出 /search 請求的延遲百分位數、吞吐量與錯誤率 (篩選條件與 visualize_k6_results.py 相同)"""
+    durations = []
+    failed = 0
+    first = last = None
+    try:
+        with open(output_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    obj = json.loads(line)
+                except ValueError:
+                    continue
+                if obj.get('type') != 'Point':
+                    continue
+                data = obj['data']
+                tags = data.get('tags', {})
+                if tags.get('group') != '' or 'scenario' not in tags:
+                    continue
+                if obj['metric'] == 'http_req_duration':
+                    durations.append(data['value'])
+                    stamp = data['time'][:19]
+                    first = stamp if first is None or stamp < first else first
+                    last = stamp if last is None or stamp > last else last
+                elif obj['metric'] == 'http_req_failed':
+                    failed += data['value']
+    except OSError:
+        return None
+    if not durations:
+        return None
+    durations.sort()
+    elapsed = (time.mktime(time.strptime(last, '%Y-%m-%dT%H:%M:%S')) -
+               time.mktime(time.strptime(first, '%Y-%m-%dT%H:%M:%S')))
+    summary = {f'p{pct}': percentile(durations, pct) for pct in PERCENTILES}
+    summary.update({
+        'requests': len(durations),
+        'error_rate': failed / len(durations),
+        'rps': len(durations) / elapsed if elapsed > 0 else None,
+    })
+    return summary
+
+def summarize_pgstats(stats_file):
+    """彙總 pg_stats_sampler.py 的樣本 (差值加總),回傳伺服器端指標"""
+    try:
+        with open(stats_file, 'r', encoding='utf-8') as f:
+            samples = [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        return None
+    if not samples:
+        return None
+    totals = {'blks_hit': 0.0, 'blks_read': 0.0, 'temp_bytes': 0.0, 'calls': 0.0, 'exec_ms': 0.0}
+    for sample in samples:
+        database = sample.get('deltas', {}).get('database', {})
+        statements = sample.get('deltas', {}).get('statements', {})
+        totals['blks_hit'] += database.get('blks_hit', 0)
+        totals['blks_read'] += database.get('blks_read', 0)
+        totals['temp_bytes'] += database.get('temp_bytes', 0)
+        totals['calls'] += statements.get('calls', 0)
+        totals['exec_ms'] += statements.get('total_exec_time', 0)
+    blocks = totals['blks_hit'] + totals['blks_read']
+    return {
+        'samples': len(samples),
+        'mean_exec_ms': totals['exec_ms'] / totals['calls'] if totals['calls'] else None,
+        'buffer_hit_ratio': totals['blks_hit'] / blocks if blocks else None,
+        'temp_bytes': totals['temp_bytes'],
+        'max_waiting_sessions': max(sample.get('waiting_sessions', 0) for sample in samples),
+    }
+
+# ============================================================================
+# checkpoint
+# ============================================================================
+
+def save_checkpoint(path, state):
+    """先寫暫存檔再改名,中斷時 checkpoint 不會只寫一半"""
+    state['updated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def load_checkpoint(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _fmt(value, spec, suffix=''):
+    return '-' if value is None else f'{value:{spec}}{suffix}'
+
+def print_report(state):
+    print("\n" + "=" * 120)
+    print("資料量掃描結果")
+    print("=" * 120)
+    print(f"{'資料量':>10} {'插入':>10} {'成長 s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} "
+          f"{'錯誤率':>7} {'DB 平均 ms':>11} {'hit ratio':>10} {'索引大小':>10}")
+    print('-' * 120)
+    for entry in state['completed']:
+        grow = entry['grow']
+        load = entry.get('load') or {}
+        server = entry.get('server') or {}
+        grow_s = grow['insert_s'] + grow['index_s'] + grow['vacuum_s']
+        print(f"{entry['volume']:>10,} {grow['inserted']:>10,} {grow_s:>8.1f} "
+              f"{_fmt(load.get('p50'), '.1f'):>9} {_fmt(load.get('p95'), '.1f'):>9} {_fmt(load.get('p99'), '.1f'):>9} "
+              f"{_fmt(load.get('rps'), '.1f'):>8} {_fmt(load.get('error_rate'), '.1%'):>7} "
+              f"{_fmt(server.get('mean_exec_ms'), '.2f'):>11} {_fmt(server.get('buffer_hit_ratio'), '.3f'):>10} "
+              f"{entry['sizes']['index_size']:>10}")
+    inserted = sum(entry['grow']['inserted'] for entry in state['completed'])
+    regenerated = sum(entry['volume'] for entry in state['completed'])
+    setup_s = sum(entry['grow']['insert_s'] + entry['grow']['index_s'] + entry['grow']['vacuum_s']
+                  for entry in state['completed'])
+    load_s = sum(entry['load_s'] for entry in state['completed'])
+    print(f"\n📈 共插入 {inserted:,} 筆 (每個資料量重新產生需 {regenerated:,} 筆),"
+          f"準備資料 {setup_s:.1f}s / 負載測試 {load_s:.1f}s")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='資料量掃描: worlds 漸進式成長、每個資料量執行負載場景,可斷點續跑')
+    parser.add_argument('--volumes', type=int, nargs='+', default=DEFAULT_VOLUMES,
+                        help='資料量 (遞增,預設與 run-performance-tests.sh 相同)')
+    parser.add_argument('--snapshot', metavar='PATH',
+                        help='以語料快照 (scripts/corpus_snapshot.py) 的下一段成長,預設為 generate_test_data()')
+    parser.add_argument('--rebuild-ratio', type=float, default=1.0,
+                        help='差額 >= 現有筆數 × 此值時移除索引、插入後重建 (預設: 1.0,即資料量翻倍以上)')
+    parser.add_argument('--load-generator', choices=['python', 'k6'], default=os.environ.get('LOAD_GENERATOR', 'python'),
+                        help='負載產生器 (預設: python,即 scripts/loadgen.py)')
+    parser.add_argument('--scenario', default=os.environ.get('K6_SCENARIO', 'load'), help='負載場景 (預設: load)')
+    parser.add_argument('--base-url', default=os.environ.get('BASE_URL', 'http://[::1]:3000'), help='backend 位址')
+    parser.add_argument('--backend', default=os.environ.get('BACKEND'), help='backend 名稱 tag (node / go)')
+    parser.add_argument('--workload', default=os.environ.get('WORKLOAD') or None,
+                        help='build_workload.py 產生的查詢工作負載')
+    parser.add_argument('--no-pg-stats', action='store_true', help='不同步取樣 PostgreSQL 統計')
+    parser.add_argument('--pg-stats-interval', type=float, default=1.0, help='統計取樣間隔秒數 (預設: 1)')
+    parser.add_argument('--skip-load', action='store_true', help='只成長資料、不跑負載 (量測成長成本用)')
+    parser.add_argument('--resume', metavar='CHECKPOINT', help='從 checkpoint 繼續 (其餘參數沿用 checkpoint 的設定)')
+    parser.add_argument('--output', default=None,
+                        help='checkpoint / 結果 JSON (預設: test-results/volume_sweep_<timestamp>.json)')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+
+    if args.resume:
+        checkpoint = args.resume
+        state = load_checkpoint(checkpoint)
+        config = state['config']
+        print(f"↩️  從 {checkpoint} 繼續 (已完成 {len(state['completed'])}/{len(config['volumes'])} 個資料量)")
+    else:
+        tag = time.strftime('%Y%m%d_%H%M%S')
+        checkpoint = args.output or os.path.join('test-results', f'volume_sweep_{tag}.json')
+        config = {
+            'volumes': sorted(set(args.volumes)),
+            'snapshot': args.snapshot,
+            'rebuild_ratio': args.rebuild_ratio,
+            'load_generator': args.load_generator,
+            'scenario': args.scenario,
+            'base_url': args.base_url,
+            'backend': args.backend,
+            'workload': args.workload,
+            'pg_stats': not args.no_pg_stats,
+            'pg_stats_interval': args.pg_stats_interval,
+            'skip_load': args.skip_load,
+            'tag': tag,
+        }
+        state = {'config': config, 'completed': [], 'started_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        os.makedirs(os.path.dirname(checkpoint) or '.', exist_ok=True)
+        save_checkpoint(checkpoint, state)
+
+    if not config['skip_load'] and config['load_generator'] == 'k6' and not shutil.which('k6'):
+        print("❌ 找不到 k6,請安裝或改用 --load-generator python")
+        sys.exit(1)
+
+    done = {entry['volume'] for entry in state['completed']}
+    remaining = [volume for volume in config['volumes'] if volume not in done]
+
+    print("=" * 80)
+    print("資料量掃描 (漸進式成長)")
+    print("=" * 80)
+    print(f"資料量: {', '.join(f'{v:,}' for v in config['volumes'])}")
+    print(f"資料來源: {config['snapshot'] or 'generate_test_data()'}"
+          f"{' (不足的部分以 generate_test_data() 補齊)' if config['snapshot'] else ''}")
+    print(f"負載: {'略過' if config['skip_load'] else config['load_generator'] + ' / ' + config['scenario']}")
+    print(f"checkpoint: {checkpoint}")
+
+    conn = connect(autocommit=True)
+    try:
+        cur = conn.cursor()
+        current = count_rows(cur)
+        if not state['completed']:
+            print("\n🔧 清空 worlds...", end=' ', flush=True)
+            cur.execute('TRUNCATE worlds RESTART IDENTITY')
+            print("✓")
+        elif remaining and current > remaining[0]:
+            print(f"❌ worlds 目前有 {current:,} 筆,已超過下一個資料量 {remaining[0]:,},無法繼續成長")
+            sys.exit(1)
+        elif current != state['completed'][-1]['volume']:
+            print(f"⚠️  worlds 目前有 {current:,} 筆 (checkpoint 最後完成 {state['completed'][-1]['volume']:,} 筆)")
+        if state['completed'] and remaining:
+            missing = missing_trigram_indexes(cur)
+            if missing:
+                print(f"⚠️  缺少索引 {', '.join(missing)} (上次可能在重建索引時中斷),成長後會重建")
+        cur.close()
+
+        for volume in remaining:
+            print(f"\n📈 成長到 {volume:,} 筆...", end=' ', flush=True)
+            grow = grow_to(conn, volume, config['snapshot'], config['rebuild_ratio'])
+            rebuilt = f", 重建索引 {grow['index_s']:.1f}s" if grow['rebuilt_indexes'] else ''
+            print(f"✓ (+{grow['inserted']:,} 筆 {grow['insert_s']:.1f}s{rebuilt}, VACUUM ANALYZE {grow['vacuum_s']:.1f}s)")
+            if grow['generated']:
+                print(f"⚠️  快照筆數不足,其中 {grow['generated']:,} 筆改以 generate_test_data() 補齊")
+            if grow['rows'] != volume:
+                print(f"❌ worlds 實際有 {grow['rows']:,} 筆,與資料量 {volume:,} 不符,停止掃描")
+                sys.exit(1)
+            entry = {'volume': volume, 'grow': grow, 'sizes': table_sizes(conn), 'load_s': 0.0}
+
+            if not config['skip_load']:
+                output_file = os.path.join('test-results', f"k6_{volume}_{config['tag']}.json")
+                stats_file = os.path.join('test-results', f"pgstats_{volume}_{config['tag']}.jsonl")
+                start = time.perf_counter()
+                returncode = run_load(config, output_file, stats_file)
+                entry['load_s'] = time.perf_counter() - start
+                if returncode != 0:
+                    print(f"⚠️  負載測試結束碼 {returncode}")
+                entry.update({
+                    'load_file': output_file,
+                    'load': summarize_load(output_file),
+                    'server': summarize_pgstats(stats_file) if config['pg_stats'] else None,
+                })
+
+            state['completed'].append(entry)
+            save_checkpoint(checkpoint, state)
+            print(f"💾 checkpoint: {len(state['completed'])}/{len(config['volumes'])}")
+    except KeyboardInterrupt:
+        print(f"\n⏸️  已中斷,以 --resume {checkpoint} 繼續")
+        sys.exit(130)
+    finally:
+        conn.close()
+
+    state['finished_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    save_checkpoint(checkpoint, state)
+    print_report(state)
+    print(f"\n✅ 結果已儲存至: {checkpoint}")
+    if not config['skip_load']:
+        print("   圖表: python3 scripts/visualize_k6_results.py")
+
+if __name__ == '__main__':
+    main()